@@ -8,12 +8,149 @@ __license__     = 'MIT'
 
 # import standard modules
 import argparse
+import concurrent.futures
+import hashlib
+import io
+import json
 import matplotlib.pyplot as plt
+import mmap
+import multiprocessing.shared_memory
 import numpy as np
+import os
 import os.path
 import pathlib                  # python 3.4+
 import re
 import socket
+import time
+import zlib
+
+# zstandard is only required to read .dat.zst files
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# numpy's loadtxt is implemented in C since v1.23
+NUMPY_C_LOADTXT = tuple( int(v) for v in re.findall( r'\d+', np.__version__ )[:2] ) >= (1, 23)
+
+# number of bytes per read request, large sequential reads are important for
+# the network mounts where the latency of a request dominates
+READAHEAD_SIZE  = 16*1024**2
+
+# artificial latency in s added to every read request, allows to test the
+# behaviour on network mounts with a local folder
+IO_LATENCY      = float( os.environ.get( 'TJKPY_IO_LATENCY', 0. ) )
+
+# time axes are represented by uniformly sampled segments if the samples
+# deviate by less than this fraction of the sampling interval, and if there
+# are not more than TIMEBASE_MAX_SEGMENTS segments (see get_timebase)
+TIMEBASE_RTOL           = 1e-2
+TIMEBASE_MAX_SEGMENTS   = 100
+
+# memory budget in bytes for data read into memory by this process, can be
+# set by the environment variable TJKPY_MEMORY_BUDGET (in MB), default is
+# half of the physical memory; readers choose how to load a file such that
+# it fits into the budget (see choose_load_strategy)
+if os.environ.get( 'TJKPY_MEMORY_BUDGET' ):
+    MEMORY_BUDGET   = int( float( os.environ['TJKPY_MEMORY_BUDGET'] )*1024**2 )
+else:
+    try:
+        MEMORY_BUDGET   = os.sysconf( 'SC_PAGE_SIZE' ) * os.sysconf( 'SC_PHYS_PAGES' ) // 2
+    except (AttributeError, ValueError, OSError):
+        # os.sysconf does not exist on windows
+        MEMORY_BUDGET   = 4*1024**3
+
+# fraction of the memory budget caches may use at most (see get_cache_budget)
+# and fraction of the available memory used per chunk when streaming
+MEMORY_CACHE_FRACTION   = .25
+MEMORY_CHUNK_FRACTION   = .05
+
+# memory in bytes held by the caches of this process, see set_memory_resident
+MEMORY_RESIDENT = {}
+
+# number of bytes read from the beginning of a file to estimate its size in memory
+ESTIMATE_BYTES  = 256*1024
+
+# estimates of estimate_memory per file, with size and modification time of
+# the file they were made for, i.e. a file is only sampled again if it changed
+MEMORY_ESTIMATES    = {}
+
+# calibration formulas of long traces are evaluated in blocks of this many
+# values (fitting into the cache of a core) on a thread pool, see eval_blocks;
+# arrays with less than EVAL_MIN_SIZE values are evaluated in one go
+EVAL_BLOCK_SIZE = 32*1024
+EVAL_MIN_SIZE   = 256*1024
+EVAL_N_WORKERS  = int( os.environ.get( 'TJKPY_EVAL_WORKERS', os.cpu_count() or 1 ) )
+
+# folders in which the shot folders are searched, additional folders can be
+# prepended by setting the environment variable TJKPY_DATA (os.pathsep-separated)
+DATA_ROOTS  = [ 
+                '/data6/', 
+                '/data5/', 
+                '/data4/', 
+                '/data3/', 
+                '/data2/', 
+                '/data1/',
+                'Z:/'       # for windows tjk-monitor PC in the lab
+              ]
+if os.environ.get( 'TJKPY_DATA' ):
+    DATA_ROOTS  = os.environ['TJKPY_DATA'].split( os.pathsep ) + DATA_ROOTS
+
+# folder where derived data (row indices, etc.) is stored, can be changed by
+# setting the environment variable TJKPY_CACHE
+CACHE_DIR   = os.environ.get( 'TJKPY_CACHE',
+                              os.path.join( os.path.expanduser('~'), '.cache', 'tjkpy' ) )
+
+# socket of the local shot cache service (see tjk_shmcache.py), the service
+# is used by get_traces if the socket exists, can be changed by setting the
+# environment variable TJKPY_SHMCACHE
+SHMCACHE_SOCKET = os.environ.get( 'TJKPY_SHMCACHE', os.path.join( CACHE_DIR, 'shmcache.sock' ) )
+
+# folder where POSIX shared memory segments appear as files (Linux)
+SHM_DIR     = '/dev/shm'
+
+# shared memory segments attached without SHM_DIR, kept open until exit
+SHM_SEGMENTS    = {}
+
+# suffixes of compressed tjk-monitor files (see tjk_compress.py), searched 
+# in this order if the uncompressed file does not exist
+COMPRESSED_SUFFIXES = [ '.gz', '.zst' ]
+
+# suffix of the index of the compressed blocks, stored next to the file
+BLOCK_INDEX_SUFFIX  = '.idx.npz'
+
+# calibrations of the diagnostics, for each diagnostic a list of entries
+# valid from shot 'shot_min' on (sorted); a new calibration is added as a new
+# entry, derived results depending on it are then recalculated only for the
+# shots it applies to (see get_provenance)
+CALIBRATIONS    = {
+        # line-averaged density from interferometer voltage, 1e17 m^-3/V
+        # factor changed after the damage and repair by e.ho in summer 2022
+        'interferometer'    : [ { 'shot_min': 0,     'factor': 3.883 },
+                                { 'shot_min': 13032, 'factor': 3.883/2. },
+                              ],
+        # IDM211 diodes at the 2.45 GHz directional coupler, fit from data
+        # sheet: dBm = a1 + (a2-a1)/(1 + (U/a3)**a4), damping of the coupler in dB
+        'P2GHz'             : [ { 'shot_min': 0,
+                                  'a1': 42.26782054007, 'a2': -28.92407247331,
+                                  'a3': -0.5508373840567, 'a4': 0.4255365582241,
+                                  'damping_fw': 60.49, 'damping_bw': 60.11 },
+                              ],
+        # diode at the 8 GHz directional coupler, U in mV,
+        # klystron (p.144 of PhD-notes from AKS): P = a1*exp(a2*|U|**a3),
+        # TWT (p.34 of PhD-notes from AKS):       P = ((U/a1)**2/a2)**(1/a3)
+        'P8GHz'             : [ { 'shot_min': 0,
+                                  'klystron': [ 17.5637, 0.332023, 0.458919 ],
+                                  'twt':      [ .771523, 4.97773, 1.394 ] },
+                              ],
+        # PKR261 gauge (manual): p = 10**(slope*U - offset), gas correction
+        # factors, reproducibility as relative error
+        'PKR261'            : [ { 'shot_min': 0, 'slope': 1.667, 'offset': 9.33, 'rel_error': .05,
+                                  'gas_factors': { 'H': 2.4, 'D': 2.4, 'He': 5.9, 'Ne': 4.1,
+                                                   'Ar': .8, 'Kr': .5, 'Xe': .4 } },
+                              ],
+        }
 
 
 def get_shot_path( shot ):
@@ -40,17 +177,7 @@ def get_shot_path( shot ):
         print('               might trigger some side effects')
         shot = int(shot)
 
-    possible_folders    = [ 
-                            '/data6/', 
-                            '/data5/', 
-                            '/data4/', 
-                            '/data3/', 
-                            '/data2/', 
-                            '/data1/',
-                            'Z:/'       # for windows tjk-monitor PC in the lab
-                          ]
-
-    for prePath in possible_folders:
+    for prePath in DATA_ROOTS:
         #shot_path   = '{0}/shot{1:d}/'.format( prePath, shot )
         shot_path   = pathlib.Path( prePath + '/shot' + str(shot) )
         if os.path.isdir(shot_path):
@@ -111,6 +238,317 @@ def get_gas( shot ):
 #}}}
 
 
+def get_fname_data( shot, fname_in='' ):
+#{{{
+    """
+    Return the filename of the file saved by tjk-monitor.vi for a certain shot.
+
+    Parameters
+    ----------
+    shot : int
+        Shot number
+    fname_in : str, optional
+        Allows to optionally specify a filename explicitely (if it would not 
+        be located at the default locations, for example).
+
+    Returns
+    -------
+    str or pathlib.Path
+        Filename of the tjk-monitor file, if the shot folder is not found, 
+        the filename is relative to the local active folder. A compressed 
+        file (see COMPRESSED_SUFFIXES) is returned if only that one exists.
+    """
+
+    if isinstance(fname_in, pathlib.PurePath):
+        fname_data  = fname_in
+    elif len(fname_in) == 0:
+        path_data   = get_shot_path( shot )
+        # if shot path is not found, use local active folder
+        if isinstance(path_data, int) and (path_data == -1):
+            path_data  = ''
+        fname_data  = pathlib.Path( path_data, 'interferometer', 'shot{0:d}.dat'.format( shot ) )
+        # older campaigns might be stored compressed
+        if not os.path.isfile( fname_data ):
+            for suffix in COMPRESSED_SUFFIXES:
+                if os.path.isfile( str(fname_data) + suffix ):
+                    fname_data  = pathlib.Path( str(fname_data) + suffix )
+                    break
+    else:
+        fname_data  = fname_in
+
+    return fname_data
+#}}}
+
+
+def get_cache_fname( fname_data, suffix ):
+#{{{
+    """
+    Return the filename in CACHE_DIR used to store data derived from a file.
+
+    The absolute path of the data file is hashed into the filename, such that
+    files with the same name from different data folders do not collide.
+
+    Parameters
+    ----------
+    fname_data : str or pathlib.Path
+        Filename of the tjk-monitor file.
+    suffix : str
+        Suffix identifying the type of derived data, e.g. 'rowidx.npz'.
+
+    Returns
+    -------
+    str
+        Full path of the cache file (the file itself might not exist).
+    """
+
+    fname_abs   = os.path.abspath( fname_data )
+    key         = hashlib.md5( fname_abs.encode() ).hexdigest()[:12]
+
+    return os.path.join( CACHE_DIR, '{0}_{1}.{2}'.format( pathlib.Path(fname_abs).stem, key, suffix ) )
+#}}}
+
+
+def is_compressed( fname_data ):
+#{{{
+    """
+    Returns True if a tjk-monitor file is compressed (see COMPRESSED_SUFFIXES).
+
+    Parameters
+    ----------
+    fname_data : str or pathlib.Path
+        Filename of the tjk-monitor file.
+
+    Returns
+    -------
+    bool
+    """
+
+    return os.path.splitext( str(fname_data) )[1] in COMPRESSED_SUFFIXES
+#}}}
+
+
+def decompress_block( data, fmt ):
+    #{{{
+    """
+    Decompresses a single gzip member or zstd frame.
+
+    Parameters
+    ----------
+    data : bytes
+        Compressed block.
+    fmt : str
+        Compression format, '.gz' or '.zst'.
+
+    Returns
+    -------
+    bytes
+        Decompressed block.
+    """
+
+    if fmt == '.gz':
+        return zlib.decompress( data, wbits=31 )
+
+    # frames might not contain their decompressed size
+    return zstandard.ZstdDecompressor().decompressobj().decompress( data )
+    #}}}
+
+
+def get_block_index( fname_data, silent=True ):
+    #{{{
+    """
+    Returns the offsets of the compressed blocks of a compressed file.
+
+    Compressed tjk-monitor files consist of independent blocks (gzip members
+    or zstd frames, the first block contains only the header), any byte 
+    range of the uncompressed file can then be read by decompressing only 
+    the blocks it covers. The index is written next to the file by 
+    tjk_compress.py (together with the row index of the uncompressed file, 
+    see get_row_index). If it is missing (e.g. file compressed with gzip),
+    the blocks are found by decompressing the file once, the index is then 
+    stored in CACHE_DIR.
+
+    Parameters
+    ----------
+    fname_data : str or pathlib.Path
+        Filename of the compressed tjk-monitor file.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    dict
+        Dictionary with keys 'coffsets' (offsets of the blocks in the 
+        compressed file), 'uoffsets' (offsets of the blocks in the 
+        uncompressed file, both with the size of the file as last element),
+        'size' (of the compressed file) and optionally the keys of the row 
+        index. Returns errValue (-1) on error.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    fmt     = os.path.splitext( str(fname_data) )[1]
+    if (fmt == '.zst') and (zstandard is None):
+        print( '    ERROR: module zstandard is required to read <{0}>'.format( fname_data ) )
+        return errValue
+
+    fstat       = os.stat( fname_data )
+    fname_side  = str(fname_data) + BLOCK_INDEX_SUFFIX
+    fname_index = get_cache_fname( fname_data, 'blkidx.npz' )
+
+    # side index is copied together with the file, the cached one is only 
+    # valid for an unchanged file
+    for fname_idx in [ fname_side, fname_index ]:
+        if os.path.isfile( fname_idx ):
+            with np.load( fname_idx ) as f_index:
+                block_index = { key: f_index[key] for key in f_index.files }
+            if (     (block_index['size'] == fstat.st_size)
+                 and ((fname_idx == fname_side) or (block_index['mtime'] == fstat.st_mtime_ns)) ):
+                return block_index
+
+    if not silent:
+        print( '    building block index of {0}'.format( fname_data ) )
+
+    # find the ends of the blocks by decompressing the file once
+    chunk_size  = 1024**2
+    coffsets    = [ 0 ]
+    uoffsets    = [ 0 ]
+    with open( fname_data, 'rb' ) as f:
+        data    = f.read()
+    pos     = 0
+    while pos < len(data):
+        if fmt == '.gz':
+            decomp  = zlib.decompressobj( wbits=31 )
+        else:
+            decomp  = zstandard.ZstdDecompressor().decompressobj()
+        n_out   = 0
+        pos_in  = pos
+        while (not decomp.eof) and (pos_in < len(data)):
+            n_out  += len( decomp.decompress( data[pos_in:pos_in+chunk_size] ) )
+            pos_in  = min( pos_in+chunk_size, len(data) )
+        if not decomp.eof:
+            print( '    ERROR: file <{0}> is truncated'.format( fname_data ) )
+            return errValue
+        pos     = pos_in - len(decomp.unused_data)
+        coffsets.append( pos )
+        uoffsets.append( uoffsets[-1] + n_out )
+
+    block_index = { 'coffsets'  : np.array( coffsets, dtype=np.int64 ),
+                    'uoffsets'  : np.array( uoffsets, dtype=np.int64 ),
+                    'size'      : np.int64( fstat.st_size ),
+                    'mtime'     : np.int64( fstat.st_mtime_ns ),
+                  }
+
+    # store index in cache, but do not fail if that is not possible
+    try:
+        os.makedirs( CACHE_DIR, exist_ok=True )
+        np.savez( fname_index, **block_index )
+    except OSError as err:
+        if not silent:
+            print( '    WARNING: block index could not be stored: {0}'.format( err ) )
+
+    return block_index
+    #}}}
+
+
+def read_byte_range( fname_data, byte_start, byte_end, n_workers=1 ):
+    #{{{
+    """
+    Reads a byte range of a (possibly compressed) tjk-monitor file.
+
+    For compressed files, the byte range refers to the uncompressed file,
+    only the blocks covering it are decompressed (see get_block_index).
+
+    Parameters
+    ----------
+    fname_data : str or pathlib.Path
+        Filename of the tjk-monitor file.
+    byte_start : int
+        First byte.
+    byte_end : int
+        Last byte (exclusive).
+    n_workers : int, optional
+        Number of blocks decompressed in parallel.
+
+    Returns
+    -------
+    bytes
+        Content of the byte range, returns errValue (-1) on error.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    if not is_compressed( fname_data ):
+        with open( fname_data, 'rb' ) as f:
+            f.seek( byte_start )
+            return f.read( max( byte_end - byte_start, 0 ) )
+
+    block_index = get_block_index( fname_data )
+    if isinstance(block_index, int):
+        return errValue
+    fmt         = os.path.splitext( str(fname_data) )[1]
+    coffsets    = block_index['coffsets']
+    uoffsets    = block_index['uoffsets']
+
+    byte_end    = min( byte_end, int(uoffsets[-1]) )
+    if byte_end <= byte_start:
+        return b''
+    ii_first    = int( np.searchsorted( uoffsets, byte_start, side='right' ) ) - 1
+    ii_last     = int( np.searchsorted( uoffsets, byte_end, side='left' ) )
+
+    with open( fname_data, 'rb' ) as f:
+        f.seek( int(coffsets[ii_first]) )
+        data    = f.read( int(coffsets[ii_last] - coffsets[ii_first]) )
+    blocks  = [ data[ coffsets[ii]-coffsets[ii_first] : coffsets[ii+1]-coffsets[ii_first] ]
+                for ii in range( ii_first, ii_last ) ]
+
+    # zlib and zstandard release the GIL, i.e. threads are sufficient
+    if (n_workers > 1) and (len(blocks) > 1):
+        with concurrent.futures.ThreadPoolExecutor( max_workers=n_workers ) as executor:
+            blocks  = list( executor.map( lambda block: decompress_block( block, fmt ), blocks ) )
+    else:
+        blocks  = [ decompress_block( block, fmt ) for block in blocks ]
+
+    data    = b''.join( blocks )
+    if (byte_start == uoffsets[ii_first]) and (byte_end == uoffsets[ii_last]):
+        return data
+
+    return data[ byte_start-uoffsets[ii_first] : byte_end-uoffsets[ii_first] ]
+    #}}}
+
+
+def get_data_size( fname_data ):
+    #{{{
+    """
+    Returns the size of a (possibly compressed) tjk-monitor file.
+
+    Parameters
+    ----------
+    fname_data : str or pathlib.Path
+        Filename of the tjk-monitor file.
+
+    Returns
+    -------
+    int
+        Size in bytes, of the uncompressed file for compressed files, returns
+        errValue (-1) on error.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    if not is_compressed( fname_data ):
+        return os.path.getsize( fname_data )
+
+    block_index = get_block_index( fname_data )
+    if isinstance(block_index, int):
+        return errValue
+
+    return int( block_index['uoffsets'][-1] )
+    #}}}
+
+
 def get_header( shot, fname_in='', silent=False ):
     #{{{
     """
@@ -151,16 +589,10 @@ def get_header( shot, fname_in='', silent=False ):
 
     # read header of tjk-monitor (or tjk-multimeter, or whatever it might be called by now) file
     # filename of tjk-monitor(/-multimeter) file
-    if isinstance(fname_in, pathlib.PurePath):
-        fname_data  = fname_in
-    elif len(fname_in) == 0:
-        path_data   = get_shot_path( shot )
-        # if shot path is not found, use local active folder
-        if (path_data == -1):
-            path_data  = ''
-        fname_data  = path_data+'interferometer/shot{0:d}.dat'.format( shot )
-    else:
-        fname_data  = fname_in
+    fname_data  = get_fname_data( shot, fname_in=fname_in )
+    # only the first block of compressed files is decompressed
+    if is_compressed( fname_data ):
+        return parse_header( read_file( fname_data, n_bytes=64*1024 ) )
     # number of lines that include the header
     n_headerlines = 4
     # read file line-by-line and only keep last line as this contains the channel names
@@ -173,137 +605,2422 @@ def get_header( shot, fname_in='', silent=False ):
 #    channel_names = re.split( r'\t+', channel_names[0].rstrip( '\t') )
     channel_names = re.split( r'\t+', channel_names[0] )
 
-    return channel_names
-#}}}
+    return channel_names
+#}}}
+
+
+def get_column_nr( shot, str2find, fname_in='', silent=False):
+    #{{{
+    """
+    Return the column number of a specified time trace from tjk-monitor.vi file
+
+    Copied from tjk_monitor.pro on 26.09.2018.
+
+    Parameters
+    ----------
+    shot : int
+        Shot number
+    str2find : str
+        String used to identify the column number. 
+    fname_in : str, optional
+        Allows to optionally specify a filename explicitely (if it would not 
+        be located at the default locations, for example).
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    """
+
+    if not silent:
+        print( 'get_column_nr' )
+
+    # value to return in case of error
+    errValue = -1
+
+    # get header of the tjk-multimeter file
+    strArr2search = get_header( shot, fname_in=fname_in, silent=silent )
+
+    # search header for string str2find
+    if str2find in strArr2search:
+        str_id = strArr2search.index( str2find )
+    else:
+        print( '    ERROR: <{0}> not in header of tjk-monitor file' )
+        return errValue
+
+    if not silent:
+        print( '    shot={0:d}, channel name={1}, channel number found={2:d}'.format( shot, str2find, str_id ))
+
+    return str_id
+
+    #}}}
+
+
+def get_row_index( fname_data, n_rows_step=1000, silent=True ):
+    #{{{
+    """
+    Returns a sparse index of byte offsets of the rows of a tjk-monitor file.
+
+    The offset and the value of the time column is stored for every 
+    n_rows_step-th row. The index is built on first access by scanning the 
+    file once (memory-mapped) and stored in CACHE_DIR; it is rebuilt if size 
+    or modification time of the data file changed. For compressed files, 
+    the offsets refer to the uncompressed file, the index is taken from the
+    block index if it contains one (see get_block_index).
+
+    Parameters
+    ----------
+    fname_data : str or pathlib.Path
+        Filename of the tjk-monitor file.
+    n_rows_step : int, optional
+        Number of rows between two entries of the index.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    dict
+        Dictionary with keys 'offsets' (byte offsets of indexed rows), 'time'
+        (time in ms of indexed rows), 'end' (byte offset after last complete
+        row), 'n_rows' (number of complete rows), 'n_cols' (number of 
+        columns), 'n_rows_step', 'size' and 'mtime' (of the data file). 
+        Returns errValue (-1) on error.
+    """
+
+    if not silent:
+        print( 'get_row_index' )
+
+    # value to return in case of error
+    errValue    = -1
+
+    fstat       = os.stat( fname_data )
+    fname_index = get_cache_fname( fname_data, 'rowidx.npz' )
+
+    # use stored index if it is still up-to-date
+    if os.path.isfile( fname_index ):
+        with np.load( fname_index ) as f_index:
+            row_index = { key: f_index[key] for key in f_index.files }
+        if (     ('n_cols' in row_index)
+             and (row_index['n_cols'] > 0)
+             and (row_index['size'] == fstat.st_size)
+             and (row_index['mtime'] == fstat.st_mtime_ns)
+             and (row_index['n_rows_step'] == n_rows_step) ):
+            if not silent:
+                print( '    using row index from {0}'.format( fname_index ) )
+            return row_index
+
+    if fstat.st_size == 0:
+        print( '    ERROR: file <{0}> is empty'.format( fname_data ) )
+        return errValue
+
+    if is_compressed( fname_data ):
+        block_index = get_block_index( fname_data, silent=silent )
+        if isinstance(block_index, int):
+            return errValue
+        # row index of the uncompressed file stored by tjk_compress.py
+        if ('offsets' in block_index) and (block_index['n_rows_step'] == n_rows_step):
+            return { key: block_index[key] for key in 
+                     ['offsets', 'time', 'end', 'n_rows', 'n_cols', 'n_rows_step', 'size', 'mtime'] }
+        row_index   = calc_row_index( read_file( fname_data ), n_rows_step )
+    else:
+        with open( fname_data, 'rb' ) as f:
+            with mmap.mmap( f.fileno(), 0, access=mmap.ACCESS_READ ) as buf:
+                row_index   = calc_row_index( buf, n_rows_step )
+    if isinstance(row_index, int):
+        print( '    ERROR: file <{0}> has an incomplete header'.format( fname_data ) )
+        return errValue
+    row_index['size']   = np.int64( fstat.st_size )
+    row_index['mtime']  = np.int64( fstat.st_mtime_ns )
+
+    # store index in cache, but do not fail if that is not possible
+    try:
+        os.makedirs( CACHE_DIR, exist_ok=True )
+        np.savez( fname_index, **row_index )
+    except OSError as err:
+        if not silent:
+            print( '    WARNING: row index could not be stored: {0}'.format( err ) )
+
+    if not silent:
+        print( '    row index built, n_rows={0}, n_entries={1}'.format( 
+                row_index['n_rows'], len(row_index['offsets']) ) )
+
+    return row_index
+    #}}}
+
+
+def calc_row_index( buf, n_rows_step=1000 ):
+    #{{{
+    """
+    Calculates the sparse row index from the content of a tjk-monitor file.
+
+    Used by get_row_index.
+
+    Parameters
+    ----------
+    buf : bytes, bytearray or mmap.mmap
+        Content of the file.
+    n_rows_step : int, optional
+        Number of rows between two entries of the index.
+
+    Returns
+    -------
+    dict
+        Row index as returned by get_row_index (without size and modification
+        time of the file), returns errValue (-1) if the header is incomplete.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    # number of lines that include the header
+    n_headerlines = 4
+
+    # positions of all line breaks, found in a single vectorized pass
+    buf_arr     = np.frombuffer( buf, dtype=np.uint8 )
+    newlines    = np.flatnonzero( buf_arr == ord('\n') )
+    del buf_arr
+
+    if len(newlines) < n_headerlines:
+        return errValue
+
+    # row i starts after line break n_headerlines-1+i, only rows 
+    # terminated by a line break are complete (file might still be written)
+    n_rows  = len(newlines) - n_headerlines
+    offsets = newlines[ (n_headerlines-1):-1:n_rows_step ] + 1
+    time    = np.array( [ float( buf[ offset:offset+64 ].split(None, 1)[0] ) 
+                          for offset in offsets ] )
+    # number of columns from the header, known before the first row is written
+    n_cols  = count_columns( buf, newlines[n_headerlines-1]+1 )
+
+    return { 'offsets'      : offsets.astype( np.int64 ),
+             'time'         : time,
+             'end'          : np.int64( newlines[-1] + 1 ),
+             'n_rows'       : np.int64( n_rows ),
+             'n_cols'       : np.int64( n_cols ),
+             'n_rows_step'  : np.int64( n_rows_step ),
+           }
+    #}}}
+
+
+def get_row_range( row_index, t_start=None, t_end=None ):
+    #{{{
+    """
+    Returns the range of entries of the row index covering a time window.
+
+    Parameters
+    ----------
+    row_index : dict
+        Row index as returned by get_row_index.
+    t_start : float, optional
+        Start of the time window in ms.
+    t_end : float, optional
+        End of the time window in ms.
+
+    Returns
+    -------
+    list
+        List containing first entry (last indexed row before t_start) and
+        last entry (first indexed row after t_end, exclusive).
+    """
+
+    time    = row_index['time']
+
+    if t_start is None:
+        ii_start    = 0
+    else:
+        ii_start    = max( int( np.searchsorted( time, t_start, side='right' ) ) - 1, 0 )
+    if t_end is None:
+        ii_end      = len(time)
+    else:
+        ii_end      = int( np.searchsorted( time, t_end, side='right' ) )
+
+    return [ ii_start, ii_end ]
+    #}}}
+
+
+def get_byte_range( row_index, ii_start, ii_end ):
+    #{{{
+    """
+    Returns the byte range in the file of a range of entries of the row index.
+
+    Parameters
+    ----------
+    row_index : dict
+        Row index as returned by get_row_index.
+    ii_start : int
+        First entry.
+    ii_end : int
+        Last entry (exclusive), the range ends at the end of the last 
+        complete row of the file if it exceeds the index.
+
+    Returns
+    -------
+    list
+        List containing first byte and last byte (exclusive).
+    """
+
+    offsets     = row_index['offsets']
+    byte_start  = offsets[ii_start] if ii_start < len(offsets) else row_index['end']
+    byte_end    = offsets[ii_end] if ii_end < len(offsets) else row_index['end']
+
+    return [ int(byte_start), int(byte_end) ]
+    #}}}
+
+
+def parse_body( body, n_cols, usecols=None ):
+    #{{{
+    """
+    Parses data rows of a tjk-monitor file in bulk.
+
+    The format is rigid (tab-separated floats, fixed number of columns, 
+    optionally a trailing tab), which allows to convert the whole body at 
+    once instead of line by line. A last line without line break (file still 
+    being written) is ignored.
+
+    Parameters
+    ----------
+    body : bytes, bytearray or memoryview
+        Data rows, i.e. without header.
+    n_cols : int
+        Number of columns in the file.
+    usecols : list of int, optional
+        Columns to return, all columns if not set.
+
+    Returns
+    -------
+    numpy.array
+        2D numpy.array with shape (n_rows, n_cols) or (n_rows, len(usecols)).
+    """
+
+    n_cols_out  = n_cols if usecols is None else len(usecols)
+
+    # ignore incomplete last line (the body is not copied)
+    body    = memoryview( body ).cast( 'B' )
+    byte_end    = len(body)
+    while (byte_end > 0) and (body[byte_end-1] != ord('\n')):
+        byte_end   -= 1
+    body    = body[:byte_end]
+    if (len(body) == 0) or ((len(body) < 64) and bytes( body ).isspace()):
+        return np.zeros( (0, n_cols_out) )
+
+    # numpy's loadtxt is implemented in C since v1.23 and then is the fastest 
+    # bulk converter available (and only converts the columns requested),
+    # before it was pure python and np.fromstring is much faster
+    if NUMPY_C_LOADTXT:
+        return np.loadtxt( io.BytesIO( body ), usecols=usecols, ndmin=2 )
+
+    values  = np.fromstring( bytes( body ), dtype=np.float64, sep=' ' )
+    if (values.size % n_cols) != 0:
+        raise ValueError( 'parse_body: number of values ({0}) is not a multiple of the number of columns ({1})'.format( 
+                          values.size, n_cols ) )
+    data    = values.reshape( -1, n_cols )
+    if usecols is not None:
+        data    = data[:,usecols]
+
+    return data
+    #}}}
+
+
+def select_time_window( data, t_start=None, t_end=None ):
+    #{{{
+    """
+    Restricts data rows to a time window (time is stored in the first column).
+
+    Parameters
+    ----------
+    data : numpy.array
+        2D numpy.array with shape (n_rows, n_cols).
+    t_start : float, optional
+        Start of the time window in ms.
+    t_end : float, optional
+        End of the time window in ms.
+
+    Returns
+    -------
+    numpy.array
+        Rows within the time window.
+    """
+
+    if (len(data) == 0) or ((t_start is None) and (t_end is None)):
+        return data
+
+    in_window   = np.ones( len(data), dtype=bool )
+    if t_start is not None:
+        in_window  &= (data[:,0] >= t_start)
+    if t_end is not None:
+        in_window  &= (data[:,0] <= t_end)
+
+    # avoid a copy if all rows are within the window
+    if np.all( in_window ):
+        return data
+
+    return data[in_window]
+    #}}}
+
+
+def get_body_range( fname_data ):
+    #{{{
+    """
+    Returns the byte range of the complete data rows of a tjk-monitor file.
+
+    Only the header and the end of the file are read. A last line without 
+    line break (file still being written) is excluded.
+
+    Parameters
+    ----------
+    fname_data : str or pathlib.Path
+        Filename of the tjk-monitor file.
+
+    Returns
+    -------
+    list
+        List containing first byte of the first data row and last byte 
+        (exclusive) of the last complete data row.
+    """
+
+    # number of lines that include the header
+    n_headerlines = 4
+
+    with open( fname_data, 'rb' ) as f:
+        for ii in range(n_headerlines):
+            f.readline()
+        byte_start  = f.tell()
+
+        # search backwards for the last line break
+        byte_end    = f.seek( 0, os.SEEK_END )
+        block_size  = 65536
+        while byte_end > byte_start:
+            pos     = max( byte_end - block_size, byte_start )
+            f.seek( pos )
+            block   = f.read( byte_end - pos )
+            id_nl   = block.rfind( b'\n' )
+            if id_nl >= 0:
+                byte_end    = pos + id_nl + 1
+                break
+            byte_end    = pos
+
+    return [ byte_start, max( byte_end, byte_start ) ]
+    #}}}
+
+
+def split_body( fname_data, byte_start, byte_end, n_parts ):
+    #{{{
+    """
+    Splits a byte range of a tjk-monitor file into parts aligned to lines.
+
+    Parameters
+    ----------
+    fname_data : str or pathlib.Path
+        Filename of the tjk-monitor file.
+    byte_start : int
+        First byte, must be the start of a line.
+    byte_end : int
+        Last byte (exclusive), must be the end of a line.
+    n_parts : int
+        Number of parts.
+
+    Returns
+    -------
+    list
+        List of n_parts+1 (or less, if parts would be empty) byte offsets, 
+        each of them being the start of a line.
+    """
+
+    bounds  = [ byte_start ]
+    with open( fname_data, 'rb' ) as f:
+        for ii in range( 1, n_parts ):
+            pos = byte_start + ii*(byte_end - byte_start)//n_parts
+            if pos <= bounds[-1]:
+                continue
+            # move to start of next line
+            f.seek( pos-1 )
+            f.readline()
+            pos = f.tell()
+            if bounds[-1] < pos < byte_end:
+                bounds.append( pos )
+    bounds.append( byte_end )
+
+    return bounds
+    #}}}
+
+
+def parse_range_into( fname_data, byte_start, byte_end, n_cols, usecols, out ):
+    #{{{
+    """
+    Reads and parses a byte range of a tjk-monitor file into a given array.
+
+    Used as worker function for read_data_parallel.
+
+    Parameters
+    ----------
+    fname_data : str or pathlib.Path
+        Filename of the tjk-monitor file.
+    byte_start : int
+        First byte, must be the start of a line.
+    byte_end : int
+        Last byte (exclusive), must be the end of a line.
+    n_cols : int
+        Number of columns in the file.
+    usecols : list of int or None
+        Columns to parse, all columns if None.
+    out : numpy.array
+        2D numpy.array (or view) with shape (n_rows, n_cols_out) of the range.
+    """
+
+    with open( fname_data, 'rb' ) as f:
+        f.seek( byte_start )
+        body    = f.read( byte_end - byte_start )
+
+    out[:]  = parse_body( body, n_cols, usecols=usecols )
+    #}}}
+
+
+def parse_range_shm( fname_data, byte_start, byte_end, n_cols, usecols, 
+                     shm_name, shape, row_start, n_rows ):
+    #{{{
+    """
+    Reads and parses a byte range of a tjk-monitor file into shared memory.
+
+    Used as worker function for read_data_parallel if processes are used,
+    the parsed rows are written directly into the array in shared memory
+    instead of being sent back to the main process.
+
+    Parameters
+    ----------
+    fname_data : str or pathlib.Path
+        Filename of the tjk-monitor file.
+    byte_start : int
+        First byte, must be the start of a line.
+    byte_end : int
+        Last byte (exclusive), must be the end of a line.
+    n_cols : int
+        Number of columns in the file.
+    usecols : list of int or None
+        Columns to parse, all columns if None.
+    shm_name : str
+        Name of the shared memory block.
+    shape : tuple
+        Shape of the complete array in shared memory.
+    row_start : int
+        First row of the range in the complete array.
+    n_rows : int
+        Number of rows of the range.
+    """
+
+    shm = multiprocessing.shared_memory.SharedMemory( name=shm_name )
+    try:
+        data    = np.ndarray( shape, dtype=np.float64, buffer=shm.buf )
+        parse_range_into( fname_data, byte_start, byte_end, n_cols, usecols, 
+                          data[row_start:row_start+n_rows] )
+        del data
+    finally:
+        shm.close()
+    #}}}
+
+
+def read_data_parallel( fname_data, usecols=None, n_workers=None, use_processes=True, 
+                        silent=True ):
+    #{{{
+    """
+    Reads all columns of a tjk-monitor file, parsing parts of it in parallel.
+
+    The body of the file is split into byte ranges aligned to line breaks.
+    The number of rows per range is counted first (memory-mapped), such that
+    the final array can be allocated once and every worker writes its rows 
+    directly into it, no concatenation is required.
+
+    Parameters
+    ----------
+    fname_data : str or pathlib.Path
+        Filename of the tjk-monitor file.
+    usecols : list of int, optional
+        Columns to return, all columns if not set.
+    n_workers : int, optional
+        Number of workers, number of CPUs if not set.
+    use_processes : bool, optional
+        If True, processes are used (parsing holds the GIL), the workers then 
+        write into shared memory which is copied once at the end. Otherwise 
+        threads write directly into the final array.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    numpy.array
+        2D numpy.array with shape (n_rows, n_channels) or (n_rows, len(usecols)).
+    """
+
+    if n_workers is None:
+        n_workers   = os.cpu_count() or 1
+
+    byte_start, byte_end    = get_body_range( fname_data )
+    bounds  = split_body( fname_data, byte_start, byte_end, n_workers )
+
+    # count rows of every range to preallocate the final array
+    with open( fname_data, 'rb' ) as f:
+        with mmap.mmap( f.fileno(), 0, access=mmap.ACCESS_READ ) as buf:
+            n_rows  = []
+            for ii in range( len(bounds)-1 ):
+                buf_arr = np.frombuffer( buf, dtype=np.uint8, count=bounds[ii+1]-bounds[ii], 
+                                         offset=bounds[ii] )
+                n_rows.append( int( np.count_nonzero( buf_arr == ord('\n') ) ) )
+                del buf_arr
+            n_cols  = count_columns( buf, byte_start )
+    row_starts  = np.concatenate( ( [0], np.cumsum( n_rows ) ) ).astype( int )
+    shape       = ( int(row_starts[-1]), n_cols if usecols is None else len(usecols) )
+
+    if not silent:
+        print( '    parsing {0} rows in {1} parts using {2} {3}'.format( 
+                shape[0], len(n_rows), n_workers, 'processes' if use_processes else 'threads' ) )
+
+    if (shape[0] == 0) or (shape[1] == 0):
+        return np.zeros( shape )
+
+    if use_processes:
+        shm = multiprocessing.shared_memory.SharedMemory( create=True, size=8*shape[0]*shape[1] )
+        try:
+            with concurrent.futures.ProcessPoolExecutor( max_workers=n_workers ) as executor:
+                futures = [ executor.submit( parse_range_shm, fname_data, bounds[ii], bounds[ii+1],
+                                             n_cols, usecols, shm.name, shape, 
+                                             row_starts[ii], n_rows[ii] )
+                            for ii in range( len(n_rows) ) ]
+                for future in futures:
+                    future.result()
+            data    = np.ndarray( shape, dtype=np.float64, buffer=shm.buf ).copy()
+        finally:
+            shm.close()
+            shm.unlink()
+    else:
+        data    = np.empty( shape )
+        with concurrent.futures.ThreadPoolExecutor( max_workers=n_workers ) as executor:
+            futures = [ executor.submit( parse_range_into, fname_data, bounds[ii], bounds[ii+1],
+                                         n_cols, usecols, data[row_starts[ii]:row_starts[ii+1]] )
+                        for ii in range( len(n_rows) ) ]
+            for future in futures:
+                future.result()
+
+    return data
+    #}}}
+
+
+def read_file( fname_data, n_bytes=None, block_size=None, latency=None ):
+    #{{{
+    """
+    Reads a file (or its beginning) into memory using large sequential reads.
+
+    On network mounts, the latency of every read request dominates, hence 
+    the file is read with unbuffered requests of block_size bytes directly 
+    into a preallocated buffer.
+
+    Parameters
+    ----------
+    fname_data : str or pathlib.Path
+        Filename.
+    n_bytes : int, optional
+        Number of bytes to read from the beginning, whole file if not set.
+    block_size : int, optional
+        Number of bytes per read request, READAHEAD_SIZE if not set.
+    latency : float, optional
+        Artificial latency in s added to every read request (for testing),
+        IO_LATENCY if not set.
+
+    Returns
+    -------
+    bytearray
+        Content of the file, decompressed for compressed files (the blocks 
+        are decompressed in parallel).
+    """
+
+    if is_compressed( fname_data ):
+        size    = get_data_size( fname_data )
+        if n_bytes is not None:
+            size    = min( size, n_bytes )
+        return bytearray( read_byte_range( fname_data, 0, size, n_workers=os.cpu_count() or 1 ) )
+
+    if block_size is None:
+        block_size  = READAHEAD_SIZE
+    if latency is None:
+        latency     = IO_LATENCY
+
+    with open( fname_data, 'rb', buffering=0 ) as f:
+        size    = os.fstat( f.fileno() ).st_size
+        if n_bytes is not None:
+            size    = min( size, n_bytes )
+        buf     = bytearray( size )
+        view    = memoryview( buf )
+        pos     = 0
+        while pos < size:
+            if latency > 0:
+                time.sleep( latency )
+            n_read  = f.readinto( view[ pos:min( pos+block_size, size ) ] )
+            if not n_read:
+                break
+            pos    += n_read
+        view.release()
+
+    # file might have been shorter than expected
+    del buf[pos:]
+
+    return buf
+    #}}}
+
+
+def prefetch_files( fnames, n_workers=32, max_inflight=None, n_bytes=None, 
+                    latency=None ):
+    #{{{
+    """
+    Generator reading many files concurrently, yielding them when complete.
+
+    The reads are done in a thread pool, i.e. waiting for the (network) file
+    system overlaps for all files in flight. The number of files in flight 
+    (read or waiting to be consumed) is bounded to limit the memory usage.
+
+    Parameters
+    ----------
+    fnames : list of str or pathlib.Path
+        Filenames.
+    n_workers : int, optional
+        Number of concurrent read requests.
+    max_inflight : int, optional
+        Maximum number of files read ahead, 2*n_workers if not set.
+    n_bytes : int, optional
+        Number of bytes to read from the beginning of each file, whole file
+        if not set (see read_file).
+    latency : float, optional
+        Artificial latency in s added to every read request (see read_file).
+
+    Yields
+    ------
+    list
+        List containing filename and its content as bytearray (None if the
+        file could not be read), in order of completion.
+    """
+
+    if max_inflight is None:
+        max_inflight    = 2*n_workers
+
+    fnames  = iter( fnames )
+    with concurrent.futures.ThreadPoolExecutor( max_workers=n_workers ) as executor:
+        inflight    = {}
+        while True:
+            # keep the pool busy, but do not read arbitrarily far ahead
+            for fname in fnames:
+                future  = executor.submit( read_file, fname, n_bytes=n_bytes, latency=latency )
+                inflight[future]    = fname
+                if len(inflight) >= max_inflight:
+                    break
+            if len(inflight) == 0:
+                break
+
+            done, pending   = concurrent.futures.wait( inflight, 
+                                return_when=concurrent.futures.FIRST_COMPLETED )
+            for future in done:
+                fname   = inflight.pop( future )
+                try:
+                    yield [ fname, future.result() ]
+                except OSError as err:
+                    print( '    ERROR: file <{0}> could not be read: {1}'.format( fname, err ) )
+                    yield [ fname, None ]
+    #}}}
+
+
+def parse_header( buf ):
+    #{{{
+    """
+    Returns the channel names from the content of a tjk-monitor file.
+
+    Same as get_header, but working on data already in memory.
+
+    Parameters
+    ----------
+    buf : bytes or bytearray
+        Content of the file (at least the header).
+
+    Returns
+    -------
+    list
+        List of channel names, returns errValue (-1) if the header is 
+        incomplete.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    # number of lines that include the header
+    n_headerlines = 4
+
+    lines   = buf.split( b'\n', n_headerlines )
+    if len(lines) < n_headerlines+1:
+        return errValue
+
+    # get_header keeps the line break at the end
+    return re.split( r'\t+', lines[n_headerlines-1].decode() + '\n' )
+    #}}}
+
+
+def count_columns( buf, byte_start ):
+    #{{{
+    """
+    Returns the number of columns as given by the header of a tjk-monitor file.
+
+    The channel names of the last header line are separated by tabs (they
+    might contain spaces), i.e. the number of columns is known even if the
+    file does not contain any data row yet.
+
+    Parameters
+    ----------
+    buf : bytes, bytearray or mmap.mmap
+        Content of the file (at least the header).
+    byte_start : int
+        Byte offset of the first data row, i.e. after the header.
+
+    Returns
+    -------
+    int
+    """
+
+    line_start  = buf.rfind( b'\n', 0, max( byte_start-1, 0 ) ) + 1
+
+    return len( [ chName for chName in bytes( buf[ line_start:byte_start ] ).split( b'\t' )
+                  if len( chName.strip() ) > 0 ] )
+    #}}}
+
+
+def read_buffer( buf, usecols=None, t_start=None, t_end=None ):
+    #{{{
+    """
+    Parses the data of a tjk-monitor file already in memory.
+
+    Parameters
+    ----------
+    buf : bytes or bytearray
+        Content of the file, including the header.
+    usecols : list of int, optional
+        Columns to return (in this order), all columns if not set.
+    t_start : float, optional
+        Start of the time window in ms.
+    t_end : float, optional
+        End of the time window in ms.
+
+    Returns
+    -------
+    numpy.array
+        2D numpy.array with shape (n_rows, n_channels) or (n_rows, len(usecols)).
+    """
+
+    # number of lines that include the header
+    n_headerlines = 4
+
+    byte_start  = 0
+    for ii in range(n_headerlines):
+        byte_start  = buf.find( b'\n', byte_start ) + 1
+        if byte_start == 0:
+            return np.zeros( (0, 0 if usecols is None else len(usecols)) )
+    body    = memoryview( buf )[byte_start:]
+    n_cols  = count_columns( buf, byte_start )
+
+    if (t_start is None) and (t_end is None):
+        data    = parse_body( body, n_cols, usecols=usecols )
+    elif usecols is None:
+        data    = parse_body( body, n_cols )
+        data    = select_time_window( data, t_start=t_start, t_end=t_end )
+    else:
+        # time column is required to select the time window
+        data    = parse_body( body, n_cols, usecols=[0]+list(usecols) )
+        data    = select_time_window( data, t_start=t_start, t_end=t_end )[:,1:]
+    body.release()
+
+    return data
+    #}}}
+
+
+def set_memory_resident( name, n_bytes ):
+    #{{{
+    """
+    Registers the memory held by a cache, it is subtracted from the budget.
+
+    Parameters
+    ----------
+    name : str
+        Name of the cache.
+    n_bytes : int
+        Current size of the cache in bytes, 0 removes the cache.
+    """
+
+    if n_bytes > 0:
+        MEMORY_RESIDENT[name]   = int( n_bytes )
+    else:
+        MEMORY_RESIDENT.pop( name, None )
+    #}}}
+
+
+def get_memory_available():
+    #{{{
+    """
+    Returns the memory available for reading data.
+
+    This is the memory budget minus the memory held by caches (see
+    set_memory_resident), but not more than the memory the operating system
+    reports as available (Linux only), i.e. other processes are considered.
+
+    Returns
+    -------
+    int
+        Available memory in bytes.
+    """
+
+    available   = MEMORY_BUDGET - sum( MEMORY_RESIDENT.values() )
+    try:
+        with open( '/proc/meminfo' ) as f_meminfo:
+            for line in f_meminfo:
+                if line.startswith( 'MemAvailable:' ):
+                    available   = min( available, int( line.split()[1] )*1024 )
+                    break
+    except (OSError, ValueError):
+        pass
+
+    return max( available, 0 )
+    #}}}
+
+
+def get_cache_budget( n_bytes_max=None ):
+    #{{{
+    """
+    Returns the maximum size of a cache.
+
+    Parameters
+    ----------
+    n_bytes_max : int, optional
+        Maximum size of the cache in bytes, if it was not limited by the
+        memory budget.
+
+    Returns
+    -------
+    int
+        Maximum size in bytes, MEMORY_CACHE_FRACTION of the memory budget
+        at most.
+    """
+
+    budget  = int( MEMORY_CACHE_FRACTION*MEMORY_BUDGET )
+    if n_bytes_max is not None:
+        budget  = min( budget, int(n_bytes_max) )
+
+    return budget
+    #}}}
+
+
+def get_chunk_rows( bytes_per_row, n_rows_min=1000 ):
+    #{{{
+    """
+    Returns the number of rows per chunk when streaming a file.
+
+    A chunk uses MEMORY_CHUNK_FRACTION of the available memory.
+
+    Parameters
+    ----------
+    bytes_per_row : float
+        Memory per row in bytes (text and parsed values).
+    n_rows_min : int, optional
+        Minimum number of rows per chunk.
+
+    Returns
+    -------
+    int
+        Number of rows per chunk.
+    """
+
+    return max( n_rows_min, int( MEMORY_CHUNK_FRACTION*get_memory_available() // max( bytes_per_row, 1 ) ) )
+    #}}}
+
+
+def estimate_memory( fname_data, n_cols_used=None ):
+    #{{{
+    """
+    Estimates the memory required to read a tjk-monitor file.
+
+    Only the beginning of the file is read, the number of rows is estimated
+    from the size of the file and the length of the first rows. The result is
+    kept in MEMORY_ESTIMATES until the file changes.
+
+    Parameters
+    ----------
+    fname_data : str or pathlib.Path
+        Filename of the tjk-monitor file.
+    n_cols_used : int, optional
+        Number of columns to be read, all columns if not set.
+
+    Returns
+    -------
+    dict
+        Dictionary with keys 'n_rows' (estimated), 'n_cols', 'size' (of the
+        uncompressed file), 'full' (memory in bytes when reading the file at
+        once, i.e. text and float64 values), 'compact' (memory in bytes when
+        parsing chunk by chunk into float32, time in float64). Returns
+        errValue (-1) on error.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    # number of lines that include the header
+    n_headerlines = 4
+
+    try:
+        fstat   = os.stat( fname_data )
+    except OSError:
+        return errValue
+    key     = os.path.abspath( fname_data )
+    if MEMORY_ESTIMATES.get( key, [None] )[0] == ( fstat.st_size, fstat.st_mtime_ns ):
+        n_rows, n_cols, size    = MEMORY_ESTIMATES[key][1]
+    else:
+        size    = get_data_size( fname_data )
+        if size < 0:
+            return errValue
+        buf     = read_file( fname_data, n_bytes=ESTIMATE_BYTES )
+
+        byte_start  = 0
+        for ii in range(n_headerlines):
+            byte_start  = buf.find( b'\n', byte_start ) + 1
+            if byte_start == 0:
+                return errValue
+        n_lines = buf.count( b'\n', byte_start )
+        n_cols  = count_columns( buf, byte_start )
+        if n_lines == 0:
+            n_rows  = 0
+        else:
+            # sample covers the whole file for small files
+            bytes_per_row   = ( buf.rfind( b'\n' ) + 1 - byte_start ) / n_lines
+            n_rows          = int( np.ceil( (size - byte_start) / bytes_per_row ) )
+        MEMORY_ESTIMATES[key]   = [ ( fstat.st_size, fstat.st_mtime_ns ), ( n_rows, n_cols, size ) ]
+
+    if n_rows == 0:
+        return { 'n_rows': 0, 'n_cols': n_cols, 'size': size, 'full': size, 'compact': 0 }
+    if n_cols_used is None:
+        n_cols_used = n_cols
+
+    return { 'n_rows'   : n_rows,
+             'n_cols'   : n_cols,
+             'size'     : size,
+             'full'     : size + 8*n_rows*n_cols_used,
+             'compact'  : 4*n_rows*(n_cols_used+1),
+           }
+    #}}}
+
+
+def choose_load_strategy( fname_data, n_cols_used=None, silent=True ):
+    #{{{
+    """
+    Chooses how to read a whole tjk-monitor file within the memory budget.
+
+    Strategies, in this order:
+        'full'      file is read into memory and parsed at once (fastest)
+        'compact'   file is parsed chunk by chunk into float32 (time column
+                    in float64), i.e. the text is never completely in memory;
+                    read_data returns a single 2D array, it uses 'mmap'
+                    instead if the time column is requested
+        'mmap'      binary cache (see build_npy_cache), built chunk by chunk
+                    if necessary, is memory-mapped, the operating system
+                    then only keeps the parts accessed in memory
+    If the binary cache is up-to-date, 'mmap' is always chosen. Processing
+    a file chunk by chunk, iter_traces chooses the size of the chunks
+    according to the memory budget as well.
+
+    Parameters
+    ----------
+    fname_data : str or pathlib.Path
+        Filename of the tjk-monitor file.
+    n_cols_used : int, optional
+        Number of columns to be read, all columns if not set.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    str
+        'full', 'compact' or 'mmap'.
+    """
+
+    fname_npy   = get_cache_fname( fname_data, 'npy' )
+    if os.path.isfile( fname_npy ) and (os.stat( fname_npy ).st_mtime_ns == os.stat( fname_data ).st_mtime_ns):
+        return 'mmap'
+
+    estimate    = estimate_memory( fname_data, n_cols_used=n_cols_used )
+    if isinstance(estimate, int):
+        # let the reader report the error
+        return 'full'
+    available   = get_memory_available()
+
+    if estimate['full'] <= available:
+        strategy    = 'full'
+    elif estimate['compact'] <= (1.-MEMORY_CHUNK_FRACTION)*available:
+        strategy    = 'compact'
+    else:
+        strategy    = 'mmap'
+
+    if not silent:
+        print( '    load strategy {0}: {1:.0f} MB required (full), {2:.0f} MB available'.format(
+                strategy, estimate['full']/1024**2, available/1024**2 ) )
+
+    return strategy
+    #}}}
+
+
+def read_data_chunked( fname_data, usecols, out, silent=True ):
+    #{{{
+    """
+    Parses a tjk-monitor file chunk by chunk into preallocated arrays.
+
+    Only one chunk of the file is in memory at a time (see get_chunk_rows),
+    the values are converted to the type of the output arrays.
+
+    Parameters
+    ----------
+    fname_data : str or pathlib.Path
+        Filename of the tjk-monitor file.
+    usecols : list of int
+        Columns to read (in this order).
+    out : numpy.array or list of numpy.array
+        2D array with shape (n_rows, len(usecols)), e.g. a memory-mapped 
+        file, or one 1D array per column, n_rows as in get_row_index.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    int
+        Number of rows read, returns errValue (-1) on error.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    row_index   = get_row_index( fname_data, silent=silent )
+    if isinstance(row_index, int):
+        return errValue
+
+    n_rows_step     = int( row_index['n_rows_step'] )
+    bytes_per_row   = ( int(row_index['end']) / max( int(row_index['n_rows']), 1 ) 
+                        + 8*(row_index['n_cols']+len(usecols)) )
+    n_entries_chunk = max( 1, get_chunk_rows( bytes_per_row, n_rows_min=n_rows_step ) // n_rows_step )
+
+    n_read  = 0
+    for ii in range( 0, len(row_index['offsets']), n_entries_chunk ):
+        byte_start, byte_end    = get_byte_range( row_index, ii, ii+n_entries_chunk )
+        body    = read_byte_range( fname_data, byte_start, byte_end )
+        if isinstance(body, int):
+            return errValue
+        data    = parse_body( body, row_index['n_cols'], usecols=usecols )
+        if isinstance(out, list):
+            for jj, out_col in enumerate( out ):
+                out_col[n_read:n_read+len(data)]    = data[:,jj]
+        else:
+            out[n_read:n_read+len(data)]    = data
+        n_read += len(data)
+
+    if not silent:
+        print( '    {0} rows parsed in chunks of {1} rows'.format( n_read, n_entries_chunk*n_rows_step ) )
+
+    return n_read
+    #}}}
+
+
+def get_npy_cache( fname_data, silent=True ):
+    #{{{
+    """
+    Returns the binary cache of a tjk-monitor file, if it is up-to-date.
+
+    The binary cache (see build_npy_cache) contains all columns as .npy file
+    in CACHE_DIR, it is memory-mapped, i.e. only the rows and columns that 
+    are accessed are actually read. 
+
+    Parameters
+    ----------
+    fname_data : str or pathlib.Path
+        Filename of the tjk-monitor file.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    numpy.memmap
+        2D array with shape (n_rows, n_channels) (copy-on-write), returns 
+        errValue (-1) if there is no up-to-date binary cache.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    fname_npy   = get_cache_fname( fname_data, 'npy' )
+    try:
+        # the cache file gets the modification time of the data file
+        if os.stat( fname_npy ).st_mtime_ns != os.stat( fname_data ).st_mtime_ns:
+            return errValue
+        data    = np.load( fname_npy, mmap_mode='c' )
+    except (OSError, ValueError):
+        return errValue
+    # built from a file without data rows by an older version
+    if data.shape[0] == 0:
+        return errValue
+
+    if not silent:
+        print( '    using binary cache {0}'.format( fname_npy ) )
+
+    return data
+    #}}}
+
+
+def build_npy_cache( fname_data, n_workers=1, silent=True ):
+    #{{{
+    """
+    Parses a tjk-monitor file and stores all columns as binary cache.
+
+    Files without data rows (e.g. header only, while still being written)
+    are not cached. If the file does not fit into the memory budget (see 
+    choose_load_strategy), it is parsed chunk by chunk directly into the
+    cache file.
+
+    Parameters
+    ----------
+    fname_data : str or pathlib.Path
+        Filename of the tjk-monitor file.
+    n_workers : int, optional
+        Number of workers used to parse large files in parallel.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    str
+        Filename of the binary cache, returns errValue (-1) on error.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    fname_npy   = get_cache_fname( fname_data, 'npy' )
+
+    # file might still change while being parsed, then the cache is outdated
+    fstat       = os.stat( fname_data )
+    estimate    = estimate_memory( fname_data )
+    # nothing to cache for a file without data rows (yet)
+    if (not isinstance(estimate, int)) and (estimate['n_rows'] == 0):
+        if not silent:
+            print( '    binary cache not built, <{0}> contains no data rows'.format( fname_data ) )
+        return errValue
+    # write to temporary file first, readers never see incomplete files
+    fname_tmp   = '{0}.{1}.tmp'.format( fname_npy, os.getpid() )
+
+    try:
+        os.makedirs( CACHE_DIR, exist_ok=True )
+        if isinstance(estimate, int) or (estimate['full'] <= get_memory_available()):
+            data    = read_data( fname_data, n_workers=n_workers, strategy='full', silent=silent )
+            if isinstance(data, int):
+                return errValue
+            with open( fname_tmp, 'wb' ) as f_npy:
+                np.save( f_npy, np.ascontiguousarray( data ) )
+        else:
+            row_index   = get_row_index( fname_data, silent=silent )
+            if isinstance(row_index, int):
+                return errValue
+            data    = np.lib.format.open_memmap( fname_tmp, mode='w+', dtype=np.float64,
+                            shape=( int(row_index['n_rows']), int(row_index['n_cols']) ) )
+            n_read  = read_data_chunked( fname_data, list( range( data.shape[1] ) ), data, silent=silent )
+            data.flush()
+            if n_read != data.shape[0]:
+                print( '    ERROR: binary cache could not be built, {0} of {1} rows parsed'.format(
+                        n_read, data.shape[0] ) )
+                del data
+                os.remove( fname_tmp )
+                return errValue
+        os.utime( fname_tmp, ns=( fstat.st_atime_ns, fstat.st_mtime_ns ) )
+        os.replace( fname_tmp, fname_npy )
+    except OSError as err:
+        print( '    ERROR: binary cache could not be stored: {0}'.format( err ) )
+        if os.path.isfile( fname_tmp ):
+            os.remove( fname_tmp )
+        return errValue
+
+    if not silent:
+        print( '    binary cache built, shape={0}'.format( data.shape ) )
+
+    return fname_npy
+    #}}}
+
+
+def read_data( fname_data, usecols=None, t_start=None, t_end=None, n_workers=1, 
+               strategy=None, silent=True ):
+    #{{{
+    """
+    Reads all columns of a tjk-monitor file, optionally within a time window.
+
+    If a time window is given, the sparse row index (see get_row_index) is 
+    binary-searched and only the rows it covers are read and parsed.
+    If an up-to-date binary cache exists (see build_npy_cache), it is used
+    instead of the file. If the whole file is read, it is loaded such that it
+    fits into the memory budget (see choose_load_strategy).
+
+    Parameters
+    ----------
+    fname_data : str or pathlib.Path
+        Filename of the tjk-monitor file.
+    usecols : list of int, optional
+        Columns to return (in this order), all columns if not set.
+    t_start : float, optional
+        Start of the time window in ms (same unit as column 'Zeit [ms]').
+    t_end : float, optional
+        End of the time window in ms (same unit as column 'Zeit [ms]').
+    n_workers : int, optional
+        If larger than 1, large files are parsed in parallel (only if the 
+        whole file is read), see read_data_parallel.
+    strategy : str, optional
+        Load strategy if the whole file is read, see choose_load_strategy,
+        chosen according to the memory budget if not set. For 'compact', 
+        the columns are float32, if the time column (0) is requested 'mmap'
+        is used instead as it would lose precision in float32. For 'mmap' 
+        the binary cache is returned (memory-mapped) if usecols is not set.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    numpy.array
+        2D numpy.array with shape (n_rows, n_channels) or (n_rows, len(usecols)),
+        returns errValue (-1) on error.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    # files smaller than this are always parsed serially
+    size_parallel   = 8*1024**2
+
+    if usecols is not None:
+        usecols = [ int(col) for col in usecols ]
+
+    # binary cache is much faster than parsing (rows are sorted by time)
+    data    = get_npy_cache( fname_data, silent=silent )
+    if not isinstance(data, int):
+        ii_start, ii_end    = 0, len(data)
+        if t_start is not None:
+            ii_start    = np.searchsorted( data[:,0], t_start, side='left' )
+        if t_end is not None:
+            ii_end      = np.searchsorted( data[:,0], t_end, side='right' )
+        if usecols is None:
+            return data[ii_start:ii_end]
+        return data[ii_start:ii_end,usecols]
+
+    # full file requested
+    if (t_start is None) and (t_end is None):
+        if strategy is None:
+            strategy    = choose_load_strategy( fname_data, n_cols_used=None if usecols is None else len(usecols),
+                                                silent=silent )
+        # time axis keeps float64, binary cache is float64 and memory-mapped
+        if (strategy == 'compact') and ((usecols is None) or (0 in usecols)):
+            strategy    = 'mmap'
+        if strategy == 'mmap':
+            if not isinstance( build_npy_cache( fname_data, silent=silent ), int ):
+                return read_data( fname_data, usecols=usecols, silent=silent )
+            # cache could not be written, e.g. disk full
+            strategy    = 'compact'
+        if strategy == 'compact':
+            row_index   = get_row_index( fname_data, silent=silent )
+            if isinstance(row_index, int):
+                return errValue
+            if usecols is None:
+                usecols = list( range( int(row_index['n_cols']) ) )
+            data    = np.empty( ( int(row_index['n_rows']), len(usecols) ),
+                                dtype=np.float64 if 0 in usecols else np.float32 )
+            n_read  = read_data_chunked( fname_data, usecols, data, silent=silent )
+            if n_read < 0:
+                return errValue
+            return data[:n_read]
+        if (n_workers > 1) and (os.path.getsize( fname_data ) > size_parallel) \
+           and not is_compressed( fname_data ):
+            return read_data_parallel( fname_data, usecols=usecols, n_workers=n_workers, 
+                                       silent=silent )
+        # read file with large sequential reads and parse it from memory
+        return read_buffer( read_file( fname_data ), usecols=usecols )
+
+    row_index   = get_row_index( fname_data, silent=silent )
+    if isinstance(row_index, int):
+        return errValue
+
+    ii_start, ii_end    = get_row_range( row_index, t_start=t_start, t_end=t_end )
+    byte_start, byte_end    = get_byte_range( row_index, ii_start, ii_end )
+
+    body    = read_byte_range( fname_data, byte_start, byte_end, n_workers=n_workers )
+    if isinstance(body, int):
+        return errValue
+
+    if not silent:
+        print( '    reading rows {0} to {1} from file'.format( 
+                ii_start*row_index['n_rows_step'], 
+                min( ii_end*row_index['n_rows_step'], row_index['n_rows'] ) ) )
+
+    # time column is required to select the time window
+    if usecols is None:
+        data    = parse_body( body, row_index['n_cols'] )
+        data    = select_time_window( data, t_start=t_start, t_end=t_end )
+    else:
+        data    = parse_body( body, row_index['n_cols'], usecols=[0]+usecols )
+        data    = select_time_window( data, t_start=t_start, t_end=t_end )[:,1:]
+
+    return data
+    #}}}
+
+
+def request_shmcache( request, socket_path=None, timeout=60. ):
+    #{{{
+    """
+    Sends a request to the local shot cache service and returns its answer.
+
+    Requests and answers are JSON-encoded dictionaries, one per line.
+
+    Parameters
+    ----------
+    request : dict
+        Request, e.g. {'cmd': 'get', 'fname': '/data6/shot13277/...'}.
+    socket_path : str, optional
+        Unix socket of the service, SHMCACHE_SOCKET if not set.
+    timeout : float, optional
+        Timeout in s (parsing a large shot takes a while).
+
+    Returns
+    -------
+    dict
+        Answer of the service, returns errValue (-1) if the service is not
+        running.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    if socket_path is None:
+        socket_path = SHMCACHE_SOCKET
+    if (not hasattr( socket, 'AF_UNIX' )) or (not os.path.exists( socket_path )):
+        return errValue
+
+    try:
+        with socket.socket( socket.AF_UNIX, socket.SOCK_STREAM ) as sock:
+            sock.settimeout( timeout )
+            sock.connect( socket_path )
+            sock.sendall( json.dumps( request ).encode() + b'\n' )
+            answer  = sock.makefile( 'rb' ).readline()
+    except OSError:
+        return errValue
+    if len(answer) == 0:
+        return errValue
+
+    return json.loads( answer.decode() )
+    #}}}
+
+
+def attach_shm( name, shape, dtype ):
+    #{{{
+    """
+    Returns an array backed by an existing shared memory segment.
+
+    No data is copied. On Linux, the segment is memory-mapped privately
+    (copy-on-write) from SHM_DIR and unmapped when the array is deleted; the
+    data stays valid even if the segment is removed in the meantime. Writing
+    to the array (e.g. the calc_* functions modify their input) only copies
+    the pages written to, the segment itself is never modified. Without
+    SHM_DIR, the segment can not be mapped privately and a copy is returned.
+
+    Parameters
+    ----------
+    name : str
+        Name of the shared memory segment.
+    shape : tuple of int
+        Shape of the array.
+    dtype : str
+        Data type of the array.
+
+    Returns
+    -------
+    numpy.array
+        Writeable array backed by the shared memory segment, returns errValue
+        (-1) if the segment does not exist (anymore).
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    n_bytes = int( np.prod( shape ) )*np.dtype( dtype ).itemsize
+
+    try:
+        if os.path.isdir( SHM_DIR ):
+            with open( os.path.join( SHM_DIR, name ), 'rb' ) as f:
+                buf = mmap.mmap( f.fileno(), 0, access=mmap.ACCESS_COPY )
+        else:
+            if name not in SHM_SEGMENTS:
+                SHM_SEGMENTS[name]  = multiprocessing.shared_memory.SharedMemory( name=name )
+            buf = SHM_SEGMENTS[name].buf
+    except (OSError, ValueError):
+        return errValue
+
+    data    = np.frombuffer( buf, dtype=dtype, count=n_bytes//np.dtype( dtype ).itemsize )
+    data    = data.reshape( shape )
+    if not os.path.isdir( SHM_DIR ):
+        data    = data.copy()
+
+    return data
+    #}}}
+
+
+def get_data_shmcache( fname_data, socket_path=None, silent=True ):
+    #{{{
+    """
+    Returns all columns of a tjk-monitor file from the local shot cache service.
+
+    The file is parsed by the service only once, every further request (of
+    any process on this machine) attaches to the same shared memory.
+
+    Parameters
+    ----------
+    fname_data : str or pathlib.Path
+        Filename of the tjk-monitor file.
+    socket_path : str, optional
+        Unix socket of the service, SHMCACHE_SOCKET if not set.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    list
+        List containing the channel names and a copy-on-write 2D numpy.array
+        with shape (n_rows, n_channels), see attach_shm, returns errValue (-1) if the service is
+        not running or could not provide the file.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    answer  = request_shmcache( { 'cmd': 'get', 'fname': os.path.abspath( fname_data ) },
+                                socket_path=socket_path )
+    if isinstance(answer, int):
+        return errValue
+    if 'error' in answer:
+        if not silent:
+            print( '    shot cache: {0}'.format( answer['error'] ) )
+        return errValue
+
+    data    = attach_shm( answer['name'], tuple(answer['shape']), answer['dtype'] )
+    if isinstance(data, int):
+        return errValue
+
+    if not silent:
+        print( '    shot cache: attached to {0}, shape={1}'.format( answer['name'], data.shape ) )
+
+    return [ answer['header'], data ]
+    #}}}
+
+
+def get_trace( shot, fname_in='', chName='', chNr=None, t_start=None, t_end=None, 
+               silent=False ):
+    #{{{
+    """
+    Returns the time trace of a single channel from a single shot.
+
+    Copied from tjk_monitor.pro on 26.09.2018, adapted later.
+
+    Parameters
+    ----------
+    shot : int
+        Shot number
+    fname_in : str, optional
+        Allows to optionally specify a filename explicitely (if it would not 
+        be located at the default locations, for example).
+    chName : str, optional
+    chNr : int, optional
+    t_start : float, optional
+        Start of time window in ms, if not set, trace starts at beginning.
+    t_end : float, optional
+        End of time window in ms, if not set, trace ends at end of file.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+    Returns
+    -------
+
+    """
+
+    if not silent:
+        print( 'get_trace' )
+
+    # value to return in case of error
+    errValue = 0
+
+    # check if keywords are properly set
+    ## check if both channel name and channel number are set
+    if (len(chName)>0) and (chNr!=None):
+        print( '    ERROR: both, channel name and number were set' )
+        print( '           only one is allowed, will exit now' )
+        return errValue
+    ## check if both, channel name and channel number are not set
+    if (len(chName)==0) and (chNr==None):
+        print( '    ERROR: channel name or number need to be set' )
+        print( '           will exit now' )
+        return errValue
+
+    # filename of time trace file
+    fname_data  = get_fname_data( shot, fname_in=fname_in )
+
+    # check if file exists
+    if not os.path.isfile( fname_data ):
+        print( '    ERROR: file <{0}> does not exist'.format( fname_data ))
+        return errValue
+
+    # get channel number if channel name is set
+    if len(chName) > 0:
+        chNr = get_column_nr( shot, chName, fname_in=fname_in, silent=silent )
+        if not silent:
+            print( '    shot={0:d}, channel name={1}, channel number={2:d}'.format( shot, chName, chNr ) )
+
+    # read data, only the requested column is converted
+    time_trace = read_data( fname_data, usecols=[chNr], t_start=t_start, t_end=t_end, silent=silent )
+    if isinstance(time_trace, int):
+        return errValue
+
+    if not silent:
+        print( '    time trace successfully read from file into memory, shape={0}'.format( time_trace.shape ) )
+
+    return time_trace[:,0]
+    #}}}
+
+
+def get_traces( shot, chNames, fname_in='', t_start=None, t_end=None, n_workers=1, 
+                buffer=None, silent=False ):
+    #{{{
+    """
+    Returns the time traces of several channels from a single shot.
+
+    Contrary to calling get_trace for every channel, the file is only read
+    and parsed once. Whole files are loaded according to the memory budget
+    (see choose_load_strategy): traces are float32 for 'compact' and
+    views into the binary cache (copy-on-write) for 'mmap'.
+
+    If the local shot cache service is running (see tjk_shmcache.py), the
+    traces are copy-on-write views into its shared memory (see attach_shm),
+    the file is then parsed only once for all processes on this machine.
+
+    Parameters
+    ----------
+    shot : int
+        Shot number
+    chNames : list of str
+        Names of the channels as written in the header of the file.
+    fname_in : str, optional
+        Allows to optionally specify a filename explicitely (if it would not 
+        be located at the default locations, for example).
+    t_start : float, optional
+        Start of time window in ms, if not set, traces start at beginning.
+    t_end : float, optional
+        End of time window in ms, if not set, traces end at end of file.
+    n_workers : int, optional
+        Number of workers used to parse large files in parallel.
+    buffer : bytes or bytearray, optional
+        Content of the file if already in memory (see prefetch_files), the
+        file is then not read again.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    dict
+        Dictionary with channel names as keys and time traces as values,
+        returns errValue (0) on error.
+    """
+
+    if not silent:
+        print( 'get_traces' )
+
+    # value to return in case of error
+    errValue = 0
+
+    if buffer is None:
+        # filename of time trace file
+        fname_data  = get_fname_data( shot, fname_in=fname_in )
+
+        # check if file exists
+        if not os.path.isfile( fname_data ):
+            print( '    ERROR: file <{0}> does not exist'.format( fname_data ))
+            return errValue
+
+        # shot already parsed by the local shot cache service, no copy needed
+        cached  = get_data_shmcache( fname_data, silent=silent )
+        if not isinstance(cached, int):
+            header, data    = cached
+            if not all( chName in header for chName in chNames ):
+                print( '    ERROR: channel not in header of tjk-monitor file' )
+                return errValue
+            ii_start, ii_end    = 0, len(data)
+            if t_start is not None:
+                ii_start    = np.searchsorted( data[:,0], t_start, side='left' )
+            if t_end is not None:
+                ii_end      = np.searchsorted( data[:,0], t_end, side='right' )
+            return { chName: data[ii_start:ii_end,header.index(chName)] for chName in chNames }
+
+        # get channel numbers, header is read only once
+        header  = get_header( shot, fname_in=fname_data, silent=silent )
+    else:
+        header  = parse_header( buffer )
+        if isinstance(header, int):
+            print( '    ERROR: incomplete header' )
+            return errValue
+    chNrs   = []
+    for chName in chNames:
+        if chName not in header:
+            print( '    ERROR: <{0}> not in header of tjk-monitor file'.format( chName ) )
+            return errValue
+        chNrs.append( header.index( chName ) )
+
+    # read data
+    # only the requested columns are converted (each only once)
+    usecols     = list( dict.fromkeys( chNrs ) )
+    # whole file is loaded such that it fits into the memory budget
+    strategy    = None
+    if (buffer is None) and (t_start is None) and (t_end is None):
+        strategy    = choose_load_strategy( fname_data, n_cols_used=len(usecols), silent=silent )
+    if strategy == 'mmap':
+        data    = read_data( fname_data, strategy='mmap', silent=silent )
+        if isinstance(data, int):
+            return errValue
+        # views into the memory-mapped binary cache, nothing is copied
+        return { chName: data[:,chNr] for chName, chNr in zip(chNames, chNrs) }
+    if strategy == 'compact':
+        row_index   = get_row_index( fname_data, silent=silent )
+        if isinstance(row_index, int):
+            return errValue
+        # time axis (column 0) keeps its precision
+        traces  = [ np.empty( int(row_index['n_rows']), dtype=np.float64 if chNr == 0 else np.float32 )
+                    for chNr in usecols ]
+        n_read  = read_data_chunked( fname_data, usecols, traces, silent=silent )
+        if n_read < 0:
+            return errValue
+        return { chName: traces[usecols.index(chNr)][:n_read] for chName, chNr in zip(chNames, chNrs) }
+    if buffer is None:
+        time_traces = read_data( fname_data, usecols=usecols, t_start=t_start, t_end=t_end, 
+                                 n_workers=n_workers, strategy=strategy, silent=silent )
+    else:
+        time_traces = read_buffer( buffer, usecols=usecols, t_start=t_start, t_end=t_end )
+    if isinstance(time_traces, int):
+        return errValue
+
+    if not silent:
+        print( '    time traces successfully read from file into memory, shape={0}'.format( time_traces.shape ) )
+
+    return { chName: time_traces[:,usecols.index(chNr)] for chName, chNr in zip(chNames, chNrs) }
+    #}}}
+
+
+def get_traces_shots( shots, chNames, t_start=None, t_end=None, n_workers=32, 
+                      latency=None, silent=True ):
+    #{{{
+    """
+    Returns the time traces of several channels from many shots.
+
+    All files are read concurrently with large read-ahead buffers (see 
+    prefetch_files), i.e. the latency of network mounts is paid only once 
+    per batch and not once per shot. The files are parsed from memory as 
+    soon as they arrive.
+
+    Parameters
+    ----------
+    shots : list of int
+        Shot numbers.
+    chNames : list of str
+        Names of the channels as written in the header of the file.
+    t_start : float, optional
+        Start of time window in ms.
+    t_end : float, optional
+        End of time window in ms.
+    n_workers : int, optional
+        Number of concurrent read requests.
+    latency : float, optional
+        Artificial latency in s added to every read request (see read_file).
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    dict
+        Dictionary with shot numbers as keys and dictionaries as returned by
+        get_traces as values, shots which could not be read are omitted.
+    """
+
+    fnames  = { get_fname_data( shot ): shot for shot in shots }
+    fnames  = { fname: shot for fname, shot in fnames.items() if os.path.isfile( fname ) }
+
+    traces  = {}
+    for fname, buf in prefetch_files( list(fnames), n_workers=n_workers, latency=latency ):
+        shot    = fnames[fname]
+        if buf is None:
+            continue
+        traces_shot = get_traces( shot, chNames, t_start=t_start, t_end=t_end, 
+                                  buffer=buf, silent=True )
+        if not isinstance(traces_shot, int):
+            traces[shot]    = traces_shot
+        if not silent:
+            print( 'get_traces_shots: shot {0} read'.format( shot ) )
+
+    return { shot: traces[shot] for shot in shots if shot in traces }
+    #}}}
+
+
+def get_timebase( time, rtol=TIMEBASE_RTOL, max_segments=TIMEBASE_MAX_SEGMENTS ):
+    #{{{
+    """
+    Returns an implicit representation of a time axis.
+
+    tjk-monitor samples with a fixed rate, i.e. the time axis is described
+    by start time, sampling interval and number of samples. Irregularities
+    (gaps, changes of the sampling rate) start a new segment. If the time
+    axis can not be described by a few uniform segments, it is kept 
+    explicitly.
+
+    Parameters
+    ----------
+    time : numpy.array
+        Time axis.
+    rtol : float, optional
+        Maximum deviation of a sample from its uniform segment, as fraction
+        of the sampling interval.
+    max_segments : int, optional
+        Maximum number of segments.
+
+    Returns
+    -------
+    dict
+        Dictionary with keys 'n' (number of samples), 'segments' (list of 
+        [index of first sample, time of first sample, sampling interval])
+        and 'time' (None, or the explicit time axis if it is not uniform).
+        The time axis of the whole shot is uniform if there is only one 
+        segment, then 't0' and 'dt' are simply the values of this segment.
+    """
+
+    n_pts   = len(time)
+    if n_pts < 2:
+        return { 'n': n_pts, 'segments': [ [0, float( time[0] ) if n_pts else 0., 0.] ], 'time': None }
+
+    steps   = np.diff( time )
+
+    # usual case of a single uniform segment is checked without any loop
+    dt      = (time[-1] - time[0]) / (n_pts - 1)
+    if (dt > 0) and (np.max( np.abs( time - (time[0] + dt*np.arange( n_pts )) ) ) <= rtol*dt):
+        return { 'n': n_pts, 'segments': [ [0, float( time[0] ), float( dt )] ], 'time': None }
+
+    segments    = []
+    ii_start    = 0
+    while ii_start < n_pts:
+        if (ii_start == n_pts-1) or (len(segments) == max_segments):
+            break
+        # run of (approximately) equal sampling intervals
+        step        = steps[ii_start]
+        deviating   = np.abs( steps[ii_start:] - step ) > rtol*abs( step )
+        n_steps     = int( np.argmax( deviating ) ) if np.any( deviating ) else len(deviating)
+        n_steps     = max( n_steps, 1 )
+        ii_end      = ii_start + n_steps
+        dt          = (time[ii_end] - time[ii_start]) / n_steps
+        if (dt <= 0) or (np.max( np.abs( time[ii_start:ii_end+1] 
+                                         - (time[ii_start] + dt*np.arange( n_steps+1 )) ) ) > rtol*dt):
+            break
+        segments.append( [ ii_start, float( time[ii_start] ), float( dt ) ] )
+        ii_start    = ii_end + 1
+
+    if ii_start == n_pts-1 and (len(segments) < max_segments):
+        segments.append( [ ii_start, float( time[ii_start] ), 0. ] )
+        ii_start    = n_pts
+    if ii_start < n_pts:
+        # not representable by a few uniform segments
+        return { 'n': n_pts, 'segments': [], 'time': time }
+
+    return { 'n': n_pts, 'segments': segments, 'time': None }
+    #}}}
+
+
+def index_to_time( timebase, ids ):
+    #{{{
+    """
+    Returns the time of samples from their indices.
+
+    Parameters
+    ----------
+    timebase : dict
+        Time axis as returned by get_timebase.
+    ids : int or numpy.array
+        Indices of the samples.
+
+    Returns
+    -------
+    float or numpy.array
+        Time of the samples.
+    """
+
+    if timebase['time'] is not None:
+        return timebase['time'][ids]
+
+    segments    = np.array( timebase['segments'] )
+    kk          = np.searchsorted( segments[:,0], ids, side='right' ) - 1
+
+    return segments[kk,1] + (ids - segments[kk,0])*segments[kk,2]
+    #}}}
+
+
+def timebase_to_time( timebase, ii_start=0, ii_end=None ):
+    #{{{
+    """
+    Returns the time axis (or a part of it) explicitly.
+
+    Parameters
+    ----------
+    timebase : dict
+        Time axis as returned by get_timebase.
+    ii_start : int, optional
+        Index of first sample.
+    ii_end : int, optional
+        Index of last sample (exclusive), number of samples if not set.
+
+    Returns
+    -------
+    numpy.array
+    """
+
+    if ii_end is None:
+        ii_end  = timebase['n']
+
+    return index_to_time( timebase, np.arange( ii_start, ii_end ) )
+    #}}}
+
+
+def time_to_index( timebase, t, side='left' ):
+    #{{{
+    """
+    Returns the index at which a time would be inserted into the time axis.
+
+    Same as numpy.searchsorted applied to the explicit time axis, but only
+    requires some arithmetic.
+
+    Parameters
+    ----------
+    timebase : dict
+        Time axis as returned by get_timebase.
+    t : float
+        Time.
+    side : str, optional
+        'left': index of first sample with time >= t,
+        'right': index of first sample with time > t.
+
+    Returns
+    -------
+    int
+    """
+
+    if timebase['time'] is not None:
+        return int( np.searchsorted( timebase['time'], t, side=side ) )
+
+    segments    = timebase['segments']
+    kk          = max( int( np.searchsorted( [ seg[1] for seg in segments ], t, side='right' ) ) - 1, 0 )
+    ii_first, t0, dt    = segments[kk]
+    ii_next     = segments[kk+1][0] if kk+1 < len(segments) else timebase['n']
+
+    # small tolerance, such that times of samples are found despite round-off
+    if dt > 0:
+        pos = (t - t0) / dt
+    else:
+        pos = 0. if t == t0 else np.sign( t - t0 )*np.inf
+    if side == 'left':
+        ii  = np.ceil( pos - 1e-6 ) if np.isfinite( pos ) else (0 if pos < 0 else ii_next - ii_first)
+    else:
+        ii  = np.floor( pos + 1e-6 ) + 1 if np.isfinite( pos ) else (0 if pos < 0 else ii_next - ii_first)
+
+    return int( min( max( ii, 0 ), ii_next - ii_first ) ) + ii_first
+    #}}}
+
+
+def slice_timebase( timebase, ii_start, ii_end ):
+    #{{{
+    """
+    Returns the time axis of a range of samples.
+
+    Parameters
+    ----------
+    timebase : dict
+        Time axis as returned by get_timebase.
+    ii_start : int
+        Index of first sample.
+    ii_end : int
+        Index of last sample (exclusive).
+
+    Returns
+    -------
+    dict
+        Time axis as returned by get_timebase.
+    """
+
+    ii_end  = max( min( ii_end, timebase['n'] ), ii_start )
+    if timebase['time'] is not None:
+        return { 'n': ii_end - ii_start, 'segments': [], 'time': timebase['time'][ii_start:ii_end] }
+
+    segments    = []
+    for kk, (ii_first, t0, dt) in enumerate( timebase['segments'] ):
+        ii_next = timebase['segments'][kk+1][0] if kk+1 < len(timebase['segments']) else timebase['n']
+        if (ii_next <= ii_start) or (ii_first >= ii_end):
+            continue
+        ii_first_new    = max( ii_first, ii_start )
+        segments.append( [ ii_first_new - ii_start, t0 + (ii_first_new - ii_first)*dt, dt ] )
+    if len(segments) == 0:
+        segments    = [ [0, 0., 0.] ]
+
+    return { 'n': ii_end - ii_start, 'segments': segments, 'time': None }
+    #}}}
+
+
+def get_file_timebase( fname_data, silent=True ):
+    #{{{
+    """
+    Returns the time axis of a tjk-monitor file as implicit representation.
+
+    The time column is parsed only once, the result is stored in CACHE_DIR
+    (rebuilt if size or modification time of the data file changed).
+
+    Parameters
+    ----------
+    fname_data : str or pathlib.Path
+        Filename of the tjk-monitor file.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    dict
+        Time axis as returned by get_timebase, returns errValue (-1) on error.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    fstat       = os.stat( fname_data )
+    fname_tb    = get_cache_fname( fname_data, 'timebase.json' )
+
+    if os.path.isfile( fname_tb ):
+        with open( fname_tb, 'r' ) as f_tb:
+            stored  = json.load( f_tb )
+        if (stored['size'] == fstat.st_size) and (stored['mtime'] == fstat.st_mtime_ns):
+            if not stored['irregular']:
+                return { 'n': stored['n'], 'segments': stored['segments'], 'time': None }
+            if not silent:
+                print( '    time axis is not uniform, reading time column' )
+
+    time    = read_data( fname_data, usecols=[0], silent=silent )
+    if isinstance(time, int):
+        return errValue
+    timebase    = get_timebase( time[:,0] )
+
+    try:
+        os.makedirs( CACHE_DIR, exist_ok=True )
+        with open( fname_tb, 'w' ) as f_tb:
+            json.dump( { 'size'         : fstat.st_size,
+                         'mtime'        : fstat.st_mtime_ns,
+                         'n'            : timebase['n'],
+                         'segments'     : timebase['segments'],
+                         'irregular'    : timebase['time'] is not None }, f_tb )
+    except OSError as err:
+        if not silent:
+            print( '    WARNING: time axis could not be stored: {0}'.format( err ) )
+
+    if not silent:
+        print( '    time axis: {0} samples, {1} uniform segment(s)'.format( 
+                timebase['n'], len(timebase['segments']) ) )
+
+    return timebase
+    #}}}
+
+
+def read_rows( fname_data, usecols, ii_start, ii_end, silent=True ):
+    #{{{
+    """
+    Reads a range of rows of a tjk-monitor file.
+
+    Only the part of the file covering the rows is read and parsed (see
+    get_row_index), or the rows are taken from the binary cache.
+
+    Parameters
+    ----------
+    fname_data : str or pathlib.Path
+        Filename of the tjk-monitor file.
+    usecols : list of int
+        Columns to return (in this order).
+    ii_start : int
+        First row.
+    ii_end : int
+        Last row (exclusive).
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    numpy.array
+        2D numpy.array with shape (ii_end-ii_start, len(usecols)), returns
+        errValue (-1) on error.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    usecols = [ int(col) for col in usecols ]
+
+    data    = get_npy_cache( fname_data, silent=silent )
+    if not isinstance(data, int):
+        return data[ii_start:ii_end,usecols]
+
+    row_index   = get_row_index( fname_data, silent=silent )
+    if isinstance(row_index, int):
+        return errValue
+
+    n_rows_step = int( row_index['n_rows_step'] )
+    entry_start = ii_start // n_rows_step
+    entry_end   = -(-ii_end // n_rows_step)
+    byte_start, byte_end    = get_byte_range( row_index, entry_start, entry_end )
+
+    body    = read_byte_range( fname_data, byte_start, byte_end )
+    if isinstance(body, int):
+        return errValue
+
+    data    = parse_body( body, row_index['n_cols'], usecols=usecols )
+
+    return data[ ii_start - entry_start*n_rows_step : ii_end - entry_start*n_rows_step ]
+    #}}}
+
+
+def get_traces_timebase( shot, chNames, fname_in='', t_start=None, t_end=None, silent=False ):
+    #{{{
+    """
+    Returns the time traces of several channels and their implicit time axis.
+
+    Same as get_traces, but the time column is not read (see 
+    get_file_timebase), time windows are converted to rows arithmetically.
+    Use timebase_to_time to get the time axis explicitly.
+
+    Parameters
+    ----------
+    shot : int
+        Shot number
+    chNames : list of str
+        Names of the channels as written in the header of the file.
+    fname_in : str, optional
+        Allows to optionally specify a filename explicitely (if it would not 
+        be located at the default locations, for example).
+    t_start : float, optional
+        Start of time window in ms, if not set, traces start at beginning.
+    t_end : float, optional
+        End of time window in ms, if not set, traces end at end of file.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    list
+        List containing the time axis (see get_timebase) and a dictionary 
+        with channel names as keys and time traces as values, returns 
+        errValue (0) on error.
+    """
+
+    if not silent:
+        print( 'get_traces_timebase' )
+
+    # value to return in case of error
+    errValue = 0
+
+    # filename of time trace file
+    fname_data  = get_fname_data( shot, fname_in=fname_in )
+
+    # check if file exists
+    if not os.path.isfile( fname_data ):
+        print( '    ERROR: file <{0}> does not exist'.format( fname_data ))
+        return errValue
+
+    header  = get_header( shot, fname_in=fname_data, silent=silent )
+    chNrs   = []
+    for chName in chNames:
+        if chName not in header:
+            print( '    ERROR: <{0}> not in header of tjk-monitor file'.format( chName ) )
+            return errValue
+        chNrs.append( header.index( chName ) )
+    usecols = list( dict.fromkeys( chNrs ) )
+
+    timebase    = get_file_timebase( fname_data, silent=silent )
+    if isinstance(timebase, int):
+        return errValue
+
+    ii_start    = 0 if t_start is None else time_to_index( timebase, t_start, side='left' )
+    ii_end      = timebase['n'] if t_end is None else time_to_index( timebase, t_end, side='right' )
+    if (ii_start == 0) and (ii_end == timebase['n']):
+        data    = read_data( fname_data, usecols=usecols, silent=silent )
+    else:
+        data    = read_rows( fname_data, usecols, ii_start, ii_end, silent=silent )
+    if isinstance(data, int):
+        return errValue
+
+    if not silent:
+        print( '    time traces successfully read from file into memory, shape={0}'.format( data.shape ) )
+
+    return [ slice_timebase( timebase, ii_start, ii_start + data.shape[0] ),
+             { chName: data[:,usecols.index(chNr)] for chName, chNr in zip(chNames, chNrs) } ]
+    #}}}
+
+
+def iter_traces( shot, chNames, fname_in='', n_rows_chunk=None, 
+                 t_start=None, t_end=None, silent=True ):
+    #{{{
+    """
+    Generator yielding the time traces of several channels chunk by chunk.
+
+    Allows to process whole discharges without keeping them in memory. 
+    Chunks start at rows of the row index (see get_row_index), i.e. their
+    length is a multiple of its step size.
+
+    Parameters
+    ----------
+    shot : int
+        Shot number
+    chNames : list of str
+        Names of the channels as written in the header of the file.
+    fname_in : str, optional
+        Allows to optionally specify a filename explicitely (if it would not 
+        be located at the default locations, for example).
+    n_rows_chunk : int, optional
+        Approximate number of rows per chunk, chosen according to the memory
+        budget if not set (see get_chunk_rows).
+    t_start : float, optional
+        Start of time window in ms.
+    t_end : float, optional
+        End of time window in ms.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Yields
+    ------
+    dict
+        Dictionary with channel names as keys and chunks of the time traces 
+        as values. Nothing is yielded on error.
+    """
+
+    fname_data  = get_fname_data( shot, fname_in=fname_in )
+    if not os.path.isfile( fname_data ):
+        print( '    ERROR: file <{0}> does not exist'.format( fname_data ))
+        return
+
+    header  = get_header( shot, fname_in=fname_data, silent=True )
+    chNrs   = []
+    for chName in chNames:
+        if chName not in header:
+            print( '    ERROR: <{0}> not in header of tjk-monitor file'.format( chName ) )
+            return
+        chNrs.append( header.index( chName ) )
+
+    row_index   = get_row_index( fname_data, silent=silent )
+    if isinstance(row_index, int):
+        return
+
+    # time column first, required to select the time window
+    usecols = list( dict.fromkeys( [0] + chNrs ) )
+
+    if n_rows_chunk is None:
+        n_rows_chunk    = get_chunk_rows( int(row_index['end']) / max( int(row_index['n_rows']), 1 ) 
+                                          + 8*(row_index['n_cols']+len(usecols)) )
+    ii_start, ii_end    = get_row_range( row_index, t_start=t_start, t_end=t_end )
+    n_entries_chunk     = max( 1, n_rows_chunk // int(row_index['n_rows_step']) )
+
+    for ii in range( ii_start, ii_end, n_entries_chunk ):
+        byte_start, byte_end    = get_byte_range( row_index, ii, min( ii+n_entries_chunk, ii_end ) )
+        body    = read_byte_range( fname_data, byte_start, byte_end )
+        if isinstance(body, int):
+            return
+        data    = parse_body( body, row_index['n_cols'], usecols=usecols )
+        data    = select_time_window( data, t_start=t_start, t_end=t_end )
+        if len(data) > 0:
+            yield { chName: data[:,usecols.index(chNr)] for chName, chNr in zip(chNames, chNrs) }
+    #}}}
+
+
+def get_calibration( name, shot=None ):
+    #{{{
+    """
+    Returns the calibration of a diagnostic valid for a shot.
+
+    Parameters
+    ----------
+    name : str
+        Name of the calibration, key of CALIBRATIONS.
+    shot : int, optional
+        Shot number, the latest calibration is returned if not set.
+
+    Returns
+    -------
+    dict
+        Calibration entry, see CALIBRATIONS.
+    """
+
+    entries = CALIBRATIONS[name]
+    if shot is None:
+        return entries[-1]
+
+    entry   = entries[0]
+    for entry_next in entries[1:]:
+        if shot < entry_next['shot_min']:
+            break
+        entry   = entry_next
+
+    return entry
+    #}}}
 
 
-def get_column_nr( shot, str2find, fname_in='', silent=False):
+def get_provenance( shot, name, version, calibrations=(), params=None, fname_in='' ):
     #{{{
     """
-    Return the column number of a specified time trace from tjk-monitor.vi file
+    Returns the provenance key of a result derived from a shot.
 
-    Copied from tjk_monitor.pro on 26.09.2018.
+    The key is a hash of the fingerprint of the data file (size and
+    modification time), the name and version of the function calculating the
+    result, the calibrations valid for the shot and the parameter values. A
+    result stored with its key is up to date as long as the key does not
+    change, i.e. a new calibration only invalidates the results which depend
+    on it and only for the shots it applies to.
 
     Parameters
     ----------
     shot : int
         Shot number
-    str2find : str
-        String used to identify the column number. 
+    name : str
+        Name of the result.
+    version : int
+        Version of the function calculating the result, to be increased
+        whenever the function changes its output.
+    calibrations : list of str, optional
+        Names of the calibrations the result depends on, see CALIBRATIONS.
+    params : dict, optional
+        Parameter values the result depends on, must be JSON-serializable.
     fname_in : str, optional
-        Allows to optionally specify a filename explicitely (if it would not 
+        Allows to optionally specify a filename explicitely (if it would not
         be located at the default locations, for example).
-    silent : bool, optional
-        If True some useful (?) output will be printed to console.
 
     Returns
     -------
+    str
+        Provenance key (hexadecimal), returns errValue (-1) if the data
+        file does not exist.
     """
 
-    if not silent:
-        print( 'get_column_nr' )
-
     # value to return in case of error
-    errValue = -1
-
-    # get header of the tjk-multimeter file
-    strArr2search = get_header( shot, fname_in=fname_in, silent=silent )
+    errValue    = -1
 
-    # search header for string str2find
-    if str2find in strArr2search:
-        str_id = strArr2search.index( str2find )
-    else:
-        print( '    ERROR: <{0}> not in header of tjk-monitor file' )
+    fname_data  = get_fname_data( shot, fname_in=fname_in )
+    if not os.path.isfile( fname_data ):
         return errValue
-
-    if not silent:
-        print( '    shot={0:d}, channel name={1}, channel number found={2:d}'.format( shot, str2find, str_id ))
-
-    return str_id
-
+    fstat       = os.stat( fname_data )
+
+    # path is not part of the key, i.e. files can be moved to another data
+    # root without invalidating the results
+    provenance  = { 'name'          : name,
+                    'version'       : version,
+                    'shot'          : int( shot ),
+                    'size'          : fstat.st_size,
+                    'mtime'         : fstat.st_mtime_ns,
+                    'calibrations'  : { calib: get_calibration( calib, shot ) for calib in calibrations },
+                    'params'        : params if params is not None else {},
+                  }
+
+    return hashlib.md5( json.dumps( provenance, sort_keys=True ).encode() ).hexdigest()
     #}}}
 
 
-def get_trace( shot, fname_in='', chName='', chNr=None, silent=False ):
+def eval_blocks( func, U_in, n_workers=None, block_size=EVAL_BLOCK_SIZE ):
     #{{{
     """
-    Returns the time trace of a single channel from a single shot.
+    Evaluates an element-wise function of a time trace block by block.
 
-    Copied from tjk_monitor.pro on 26.09.2018, adapted later.
+    The blocks are processed on a thread pool, numpy releases the GIL for
+    the arithmetics and transcendental functions of the calibration
+    formulas. As the function is element-wise, the result is identical to
+    evaluating it for the whole trace at once. func gets views of U_in, i.e.
+    modifications of its input are applied to U_in as before.
 
     Parameters
     ----------
-    shot : int
-        Shot number
-    fname_in : str, optional
-        Allows to optionally specify a filename explicitely (if it would not 
-        be located at the default locations, for example).
-    chName : str, optional
-    chNr : int, optional
-    silent : bool, optional
-        If True some useful (?) output will be printed to console.
+    func : function
+        Element-wise function of one numpy.array returning a numpy.array of
+        the same length.
+    U_in : numpy.array
+        Time trace, scalars and short or multi-dimensional arrays are passed
+        to func directly.
+    n_workers : int, optional
+        Number of threads, EVAL_N_WORKERS if not set, 1 evaluates serially.
+    block_size : int, optional
+        Number of values per block.
+
     Returns
     -------
-
+    numpy.array
+        Result of func.
     """
 
-    if not silent:
-        print( 'get_trace' )
+    if n_workers is None:
+        n_workers   = EVAL_N_WORKERS
+    if ( (n_workers <= 1) or (not isinstance(U_in, np.ndarray)) or (U_in.ndim != 1)
+         or (len(U_in) < max( EVAL_MIN_SIZE, 2*block_size )) ):
+        return func( U_in )
 
-    # value to return in case of error
-    errValue = 0
+    # first block evaluated directly to get type of the result
+    result_block    = func( U_in[:block_size] )
+    result          = np.empty( len(U_in), dtype=result_block.dtype )
+    result[:block_size] = result_block
 
-    # check if keywords are properly set
-    ## check if both channel name and channel number are set
-    if (len(chName)>0) and (chNr!=None):
-        print( '    ERROR: both, channel name and number were set' )
-        print( '           only one is allowed, will exit now' )
-        return errValue
-    ## check if both, channel name and channel number are not set
-    if (len(chName)==0) and (chNr==None):
-        print( '    ERROR: channel name or number need to be set' )
-        print( '           will exit now' )
-        return errValue
+    def eval_block( ii ):
+        result[ii:ii+block_size]    = func( U_in[ii:ii+block_size] )
 
-    # filename of time trace file
-    if isinstance(fname_in, pathlib.PurePath):
-        fname_data  = fname_in
-    elif len(fname_in) == 0:
-        path_data   = get_shot_path( shot )
-        # if shot path is not found, use local active folder
-        if (path_data == -1):
-            path_data  = ''
-        fname_data  = path_data+'interferometer/shot{0:d}.dat'.format( shot )
-    else:
-        fname_data  = fname_in
+    with concurrent.futures.ThreadPoolExecutor( max_workers=n_workers ) as executor:
+        list( executor.map( eval_block, range( block_size, len(U_in), block_size ) ) )
 
-    # check if file exists
-    if not os.path.isfile( fname_data ):
-        print( '    ERROR: file <{0}> does not exist'.format( fname_data ))
-        return errValue
+    return result
+    #}}}
 
-    # get channel number if channel name is set
-    if len(chName) > 0:
-        chNr = get_column_nr( shot, chName, fname_in=fname_in, silent=silent )
-        if not silent:
-            print( '    shot={0:d}, channel name={1}, channel number={2:d}'.format( shot, chName, chNr ) )
 
-    # read data
-    time_trace = np.loadtxt( fname_data, skiprows=4)
+def calc_PKR261Pressure( U_in, shot=None, n_workers=None ):
+#{{{
+    """
+    Converts the signal of the PKR261 gauge to pressure.
 
-    if not silent:
-        print( '    time traces successfully read from file into memory, shape={0}'.format( time_trace.shape ) )
+    The conversion is from the PKR261 manual, the correction for the gas is
+    not applied (see calc_real_pressure).
 
-    return time_trace[:,chNr]
-    #}}}
+    Parameters
+    ----------
+    U_in : float or numpy.array
+        Signal of the gauge in volts.
+    shot : int, optional
+        Shot number, selects the calibration (latest if not set).
+    n_workers : int, optional
+        Number of threads for long time traces, see eval_blocks.
+
+    Returns
+    -------
+    float or numpy.array
+        Pressure (uncorrected for the gas).
+    """
+
+    calib   = get_calibration( 'PKR261', shot )
+    d       = calib['offset']     # according to PKR261 manual
+
+    return eval_blocks( lambda U_block: 10.**(calib['slope']*U_block-d), U_in, n_workers=n_workers )
+#}}}
 
 
-def calc_real_pressure( pressure, gas ):
+def calc_real_pressure( pressure, gas, shot=None ):
 #{{{
     """
     Calculates the real pressure for the PKR-device.
 
-    Correction values are from the manual.
+    Correction values are from the manual, see CALIBRATIONS['PKR261'].
     (Function originally from little_helper.pro from 26.09.2018)
 
     Parameters
@@ -312,6 +3029,8 @@ def calc_real_pressure( pressure, gas ):
         Neutral gas pressure.
     gas : str
         Gas abbreviated as in the periodic table of the elements.
+    shot : int, optional
+        Shot number, selects the calibration (latest if not set).
         
     Returns
     -------
@@ -320,22 +3039,13 @@ def calc_real_pressure( pressure, gas ):
 
     """
 
-    if gas == 'H':
-        corr = 2.4
-    elif gas == 'D':
+    gas_factors = get_calibration( 'PKR261', shot )['gas_factors']
+
+    if gas == 'D':
         print( '    you have choosen deuterium as gas, no calibration factor exists for this gas' )
         print( '    the same factor as for hydrogren will be used' )
-        corr = 2.4
-    elif gas == 'He':
-        corr =5.9
-    elif gas == 'Ne':
-        corr =4.1
-    elif gas == 'Ar':
-        corr =.8
-    elif gas == 'Kr':
-        corr =.5
-    elif gas == 'Xe':
-        corr =.4
+    if gas in gas_factors:
+        corr = gas_factors[gas]
     else:
         print( '    you chose a gas for which no calibration factor exists' )
         print( '    the input value will be returned without a change' )
@@ -347,7 +3057,7 @@ def calc_real_pressure( pressure, gas ):
 #}}}
 
 
-def get_pressure( shot, fname_in='', silent=True ):
+def get_pressure( shot, fname_in='', pressure=None, silent=True ):
     #{{{
     """
     This function returns the real pressure before plasma is started.
@@ -362,6 +3072,9 @@ def get_pressure( shot, fname_in='', silent=True ):
     fname_in : str, optional
         Allows to optionally specify a filename explicitely (if it would not 
         be located at the default locations, for example).
+    pressure : numpy.array, optional
+        Time trace of the pressure channel in volts. If set, the file is not
+        read again.
     silent : bool, optional
         If True some useful (?) output will be printed to console.
 
@@ -374,21 +3087,23 @@ def get_pressure( shot, fname_in='', silent=True ):
     # value to return in case of error
     errValue = -1
 
+    # calibration of the PKR261 gauge
+    calib   = get_calibration( 'PKR261', shot )
+
     # reproducibility error, absolute error is 30 % (according to manual)
-    PKR_error = .05
+    PKR_error = calib['rel_error']
 
-    chName = 'Pressure'
-    if (shot>=6464) and (shot <=6509):
-        chName = 'slot1'
+    chName = get_channel_config( shot )['p0'][0]
 
     if shot==6467:
         print( '    ATTENTION: no pressure time trace for recorded for this shot' )
         print( '               value will be set to what is written in Lab-book' )
-        p0 = calc_real_pressure( 5e-3, gas=get_gas(shot) )
+        p0 = calc_real_pressure( 5e-3, gas=get_gas(shot), shot=shot )
         return [ p0, PKR_error*p0 ]
 
     # get time traces
-    pressure = get_trace( shot, fname_in=fname_in, chName=chName, silent=silent )
+    if pressure is None:
+        pressure = get_trace( shot, fname_in=fname_in, chName=chName, silent=silent )
 
     # calculate mean of first 100 data points in time traces
     # (B0 and microwave should be turned off then)
@@ -396,18 +3111,17 @@ def get_pressure( shot, fname_in='', silent=True ):
     p0 = np.mean( pressure[ 0:pts2avg ] )
 
     # convert to mPa
-    d = 9.33                # according to PKR261 manual
-    p0 = 10.**(1.667*p0-d)
+    p0 = calc_PKR261Pressure( p0, shot=shot )
 
     # calculate real pressure (PKR261 is gas-sensitive)
     gas = get_gas( shot )
-    p0  = calc_real_pressure( p0, gas )
+    p0  = calc_real_pressure( p0, gas, shot=shot )
 
     # calculate error according to Fehlerfortpflanzung
     ## standard deviation of mean of time trace
     p0_volt_err  = np.std( pressure[0:pts2avg] ) / np.sqrt( pts2avg -1 )
-    ## p_err = dp/dU * U_err = 1.667*ln(10)*p0(U)*U_err
-    p0_error     = 1.667*np.log(10.) * p0 * p0_volt_err
+    ## p_err = dp/dU * U_err = slope*ln(10)*p0(U)*U_err
+    p0_error     = calib['slope']*np.log(10.) * p0 * p0_volt_err
     ## relative error
     p0_error_rel = p0_error / p0
 
@@ -433,10 +3147,11 @@ def get_pressure_labbook( shot, silent=True ):
     Returns
     -------
     numpy.array
-        numpy.array containing two floats.
+        numpy.array containing two floats, NaN if the shot is not listed.
 
     """
 
+    p0  = np.nan
 
     if shot == 12838:
         p0  = 3.
@@ -502,7 +3217,7 @@ def get_pressure_labbook( shot, silent=True ):
 #}}}
 
 
-def calc_2GHzPower( U_in, output='watt', direction='fw' ):
+def calc_2GHzPower( U_in, output='watt', direction='fw', shot=None, n_workers=None ):
 #{{{
     """
     This function calculates the power of the 2.45 GHz magnetron measured 
@@ -517,6 +3232,10 @@ def calc_2GHzPower( U_in, output='watt', direction='fw' ):
         Possible values are 'watt', 'dBm'.
     direction : str, optional
         Possible values are 'fw', 'bw'.
+    shot : int, optional
+        Shot number, selects the calibration (latest if not set).
+    n_workers : int, optional
+        Number of threads for long time traces, see eval_blocks.
 
     Returns
     -------
@@ -525,29 +3244,34 @@ def calc_2GHzPower( U_in, output='watt', direction='fw' ):
 
     """
 
-    # positive values lead to NaN in the following calculations
-    U_in[U_in>0]    = -1e-6
+    calib   = get_calibration( 'P2GHz', shot )
+
+    def convert( U_block ):
+        # positive values lead to NaN in the following calculations
+        U_block[U_block>0]  = -1e-6
 
-    # convert voltage signal (the time trace) from microwave diodes to dBm
-    # diodes used: IDM211 from IBF electronic GmbH, formula is from data sheet
-    signal_dBm  = 42.26782054007 + (-28.92407247331 - 42.26782054007) / ( 1. + (U_in / (-0.5508373840567) )**0.4255365582241 )
+        # convert voltage signal (the time trace) from microwave diodes to dBm
+        # diodes used: IDM211 from IBF electronic GmbH, formula is from data sheet
+        signal_dBm  = calib['a1'] + (calib['a2'] - calib['a1']) / ( 1. + (U_block / calib['a3'] )**calib['a4'] )
 
-    # account for damping of directional coupler
-    if direction == 'fw':
-        signal_dBm  += 60.49
-    elif direction == 'bw':
-        signal_dBm  += 60.11
+        # account for damping of directional coupler
+        if direction == 'fw':
+            signal_dBm  += calib['damping_fw']
+        elif direction == 'bw':
+            signal_dBm  += calib['damping_bw']
 
-    if output == 'watt':
-        signal2return   = 10**(signal_dBm/10.) * 1e-3
-    elif output == 'dBm':
-        signal2return   = signal_dBm
+        if output == 'watt':
+            signal2return   = 10**(signal_dBm/10.) * 1e-3
+        elif output == 'dBm':
+            signal2return   = signal_dBm
 
-    return signal2return
+        return signal2return
+
+    return eval_blocks( convert, U_in, n_workers=n_workers )
 #}}}
 
 
-def calc_8GHzPower( U_in, direction='fw', old=False ):
+def calc_8GHzPower( U_in, direction='fw', old=False, shot=None, n_workers=None ):
 #{{{
     """
     This function calculates the power of the 8 GHz klystron measured 
@@ -566,6 +3290,10 @@ def calc_8GHzPower( U_in, direction='fw', old=False ):
         Possible values are 'fw'. 'bw' is planned to be implemented later.
     old: bool, optional
         If true, old calibration made for the TWT is used.
+    shot : int, optional
+        Shot number, selects the calibration (latest if not set).
+    n_workers : int, optional
+        Number of threads for long time traces, see eval_blocks.
 
     Returns
     -------
@@ -575,37 +3303,484 @@ def calc_8GHzPower( U_in, direction='fw', old=False ):
 
     """
 
-    # scale input signal to mV (calibration was done with mV)
-    U_in *= 1e3
+    calib   = get_calibration( 'P8GHz', shot )
 
-    # optionally, use old calibration from TWT, see p.34 of PhD-notes from AKS
-    if old:
-        a1  = .771523
-        a2  = 4.97773
-        a3  = 1.394
+    def convert( U_block ):
+        # scale input signal to mV (calibration was done with mV)
+        U_block *= 1e3
 
-        P   = ( (U_in/a1)**2 * 1./a2 )**(1./a3)
-    else:
-        # use new calibration with Klystron, see p.144 of PD-notes from AKS
-        a1  = 17.5637
-        a2  = 0.332023
-        a3  = 0.458919 
+        # optionally, use old calibration from TWT, see p.34 of PhD-notes from AKS
+        if old:
+            a1, a2, a3  = calib['twt']
+
+            P   = ( (U_block/a1)**2 * 1./a2 )**(1./a3)
+        else:
+            # use new calibration with Klystron, see p.144 of PD-notes from AKS
+            a1, a2, a3  = calib['klystron']
+
+            P   = a1 * np.exp(a2 * np.abs(U_block)**a3)
 
-        P   = a1 * np.exp(a2 * np.abs(U_in)**a3)
+        return P
 
-    return P
+    return eval_blocks( convert, U_in, n_workers=n_workers )
 #}}}
 
 
-def get_lineAvgDensity( U_in, silent=True ):
+def get_lineAvgDensity( U_in, shot, silent=True ):
     #{{{
+    """
+    This function calculates the line-averaged density from the interferometer.
+
+    Parameters
+    ----------
+    U_in : numpy.array
+        Time trace of the interferometer signal in volts.
+    shot : int
+        Shot number, required as the calibration factor changed.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    numpy.array
+        Line-averaged density in units of 1e17 m^-3.
+    """
 
     # correct for offset at the end of the time trace
     # assumes that tjk-monitor is running after plasma is turned off
     n_pts_offset    = 100
-    offset_end      = U_in[(-1*n_pts_offset):]
-    U_in           += -1*offset_end
+    offset_end      = np.mean( U_in[(-1*n_pts_offset):] )
+    n_e             = U_in - offset_end
+
+    # scaling factor is 3.883e17 until the damage and repair by e.ho in 
+    # summer 2022, then it was changed to half of that
+    n_e    *= get_calibration( 'interferometer', shot )['factor']
+
+    if not silent:
+        print( 'get_lineAvgDensity: offset_end = {0}'.format( offset_end ) )
+
+    return n_e
+    #}}}
+
+
+def get_channel_config( shot ):
+#{{{
+    """
+    Returns the configuration of the channels recorded with tjk-monitor.
+
+    For each diagnostic, a list is stored containing
+      (1) channel name in tjk-monitor
+      (2) conversion factor (if single factor makes sense, NaN otherwise)
+      (3) physical units after applying conversion factor
+      (4) y-axis label for plot
+
+    Parameters
+    ----------
+    shot : int
+        Shot number, required as channel names changed over time.
+
+    Returns
+    -------
+    dict
+        Dictionary with the diagnostic as key and the list as value.
+    """
+
+    chCfg   = {}
+    chCfg['Ihel']       = ['I_Bh', 1, 'A', 
+                           r'$I_\mathrm{hel}$ in $\mathrm{A}$']
+    chCfg['B0']         = ['I_Bh', 0.24, 'mT', 
+                           r'$B_0$ in $\mathrm{mT}$']
+    chCfg['UB']         = ['U_B', 1, 'V', 
+                           r'$U_B$ in $\mathrm{V}$']
+    chCfg['optDiode']   = ['optDiode', 1, 'V', 
+                           r'optical diode in $\mathrm{V}$']
+    chCfg['Tcoil']      = ['Coil Temperature', 1, 'C', 
+                           r'$T_\mathrm{coil}$ in $^\circ\mathrm{C}$']
+    chCfg['P2GHz_in']   = ['2 GHz Richtk. forward', np.nan, 'W', 
+                           r'$P_\mathrm{in}$ in $\mathrm{kW}$']
+    chCfg['P2GHz_out']  = ['2 GHz Richtk. backward', np.nan, 'W', 
+                           r'$P_\mathrm{out}$ in $\mathrm{kW}$']
+    chCfg['P8GHz_in']   = ['8 GHz power', np.nan, 'W', 
+                           r'$P_\mathrm{in}$ in $\mathrm{kW}$']
+    chCfg['BoloSum']    = ['Bolo_sum', np.nan, 'V', 
+                           r'$P_\mathrm{rad}$ in $\mathrm{W}$']
+    chCfg['p0']         = ['Pressure', np.nan, 'Pa', 
+                           r'$p_0$ in $\mathrm{mPa}$']
+    if (shot>=6464) and (shot <=6509):
+        chCfg['p0'][0]  = 'slot1'
+    if shot >= 13316:   # TODO: this number needs to be corrected to some lower shotnumber
+        chCfg['interf'] = ['Interferometer digital', 1, '1e17 m^-3', 
+                           r'$\bar{n}_e$ in a.u.']
+    else:
+        chCfg['interf'] = ['Interferometer (Mueller)', 1, '1e17 m^-3', 
+                           r'$\bar{n}_e$ in a.u.']
+
+    return chCfg
+#}}}
+
+
+def get_discharge_window( time, power, threshold_rel=.1 ):
+    #{{{
+    """
+    Returns start and end of the discharge, detected from the heating power.
+
+    Parameters
+    ----------
+    time : numpy.array
+        Time axis.
+    power : numpy.array
+        Time trace of the heating power, e.g. P_abs at 2.45 GHz.
+    threshold_rel : float, optional
+        Heating is considered to be on when the power exceeds this fraction
+        of its maximum.
+
+    Returns
+    -------
+    list
+        List containing start and end time of the discharge, both are NaN if
+        no discharge was found.
+    """
+
+    power_max   = np.nanmax( power ) if len(power) > 0 else np.nan
+    if not (power_max > 0):
+        return [ np.nan, np.nan ]
+
+    ids_on  = np.flatnonzero( power > threshold_rel*power_max )
+
+    return [ time[ids_on[0]], time[ids_on[-1]] ]
+    #}}}
+
+
+def get_plateau( time, trace, t_on, t_off, frac=.5 ):
+    #{{{
+    """
+    Returns mean and standard deviation of a time trace during the plateau.
+
+    The plateau is taken as the central part of the discharge, i.e. a 
+    fraction frac of the time between t_on and t_off.
+
+    Parameters
+    ----------
+    time : numpy.array
+        Time axis.
+    trace : numpy.array
+        Time trace.
+    t_on : float
+        Start of discharge.
+    t_off : float
+        End of discharge.
+    frac : float, optional
+        Fraction of the discharge used as plateau.
+
+    Returns
+    -------
+    list
+        List containing two floats, NaN if plateau is empty.
+    """
+
+    t_mid       = .5*(t_on + t_off)
+    t_halfwidth = .5*frac*(t_off - t_on)
+    in_plateau  = (time >= t_mid-t_halfwidth) & (time <= t_mid+t_halfwidth)
+
+    if not np.any( in_plateau ):
+        return [ np.nan, np.nan ]
+
+    return [ np.mean( trace[in_plateau] ), np.std( trace[in_plateau] ) ]
+    #}}}
+
+
+def parse_shot_list( shots_str ):
+    #{{{
+    """
+    Returns the list of shot numbers from a string like '12838-12845,12850'.
+
+    Parameters
+    ----------
+    shots_str : str
+        Comma-separated shot numbers or ranges of shot numbers (first and 
+        last shot separated by '-', both included).
+
+    Returns
+    -------
+    list
+        List of shot numbers, returns errValue (-1) if string is not valid.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    shots   = []
+    for item in shots_str.replace( ' ', '' ).split( ',' ):
+        bounds  = item.split( '-' )
+        if (not all( bound.isdigit() for bound in bounds )) or (len(bounds) > 2):
+            return errValue
+        shots  += list( range( int(bounds[0]), int(bounds[-1])+1 ) )
+
+    if (len(shots) == 0) or (min(shots) <= 0):
+        return errValue
+
+    return shots
+    #}}}
+
+
+def resample_traces( times, traces, time_common ):
+    #{{{
+    """
+    Resamples time traces with individual time axes onto a common time axis.
+
+    Linear interpolation is done for all traces in one vectorized step: the
+    time axes are concatenated with an offset per trace, such that a single
+    binary search finds the neighbouring samples of all traces.
+
+    Parameters
+    ----------
+    times : list of numpy.array
+        Time axes of the traces, each must be sorted.
+    traces : list of numpy.array
+        Time traces.
+    time_common : numpy.array
+        Common time axis.
+
+    Returns
+    -------
+    numpy.array
+        2D numpy.array with shape (len(traces), len(time_common)), NaN for
+        points outside of the time range of a trace.
+    """
+
+    n_traces    = len(traces)
+    n_pts       = np.array( [ len(time) for time in times ] )
+
+    # offset between concatenated time axes, must exceed every time range
+    t_min       = min( np.min( time_common ), min( time[0] for time in times ) )
+    t_max       = max( np.max( time_common ), max( time[-1] for time in times ) )
+    t_span      = 2.*(t_max - t_min) + 1.
+
+    offsets     = np.arange( n_traces )[:,np.newaxis] * t_span
+    time_all    = np.concatenate( [ time - t_min for time in times ] )
+    time_all   += np.repeat( offsets[:,0], n_pts )
+    trace_all   = np.concatenate( traces )
+
+    # first and last index of each trace in the concatenated arrays
+    id_first    = np.concatenate( ( [0], np.cumsum( n_pts )[:-1] ) )[:,np.newaxis]
+    id_last     = id_first + n_pts[:,np.newaxis] - 1
+
+    query       = (time_common[np.newaxis,:] - t_min) + offsets
+    id_right    = np.searchsorted( time_all, query )
+    id_right    = np.clip( id_right, id_first+1, np.maximum( id_last, id_first+1 ) )
+    id_right    = np.minimum( id_right, len(time_all)-1 )
+    id_left     = id_right - 1
+
+    dt          = time_all[id_right] - time_all[id_left]
+    with np.errstate( divide='ignore', invalid='ignore' ):
+        weight  = np.where( dt > 0, (query - time_all[id_left]) / dt, 0. )
+    resampled   = (1. - weight)*trace_all[id_left] + weight*trace_all[id_right]
+
+    # no extrapolation
+    outside     = ( (query < time_all[id_first]) | (query > time_all[id_last]) 
+                   | (n_pts[:,np.newaxis] < 2) )
+    resampled[outside]  = np.nan
+
+    return resampled
+    #}}}
+
+
+def decimate_minmax( time, traces, n_bins=2000 ):
+    #{{{
+    """
+    Decimates time traces for plotting, keeping minimum and maximum per bin.
+
+    In contrast to simply taking every n-th point, spikes remain visible.
+
+    Parameters
+    ----------
+    time : numpy.array
+        Time axis.
+    traces : numpy.array
+        Time trace, or 2D numpy.array with one trace per row.
+    n_bins : int, optional
+        Number of bins, i.e. half of the number of points returned.
+
+    Returns
+    -------
+    list
+        List containing decimated time axis and decimated trace(s).
+    """
+
+    n_pts   = len(time)
+    if n_pts <= 2*n_bins:
+        return [ time, traces ]
+
+    bin_size    = n_pts // n_bins
+    n_used      = bin_size * n_bins
+
+    traces_bins = traces[..., :n_used].reshape( traces.shape[:-1] + (n_bins, bin_size) )
+    # fmin/fmax ignore NaN (e.g. from resampling) without a warning
+    trace_min   = np.fmin.reduce( traces_bins, axis=-1 )
+    trace_max   = np.fmax.reduce( traces_bins, axis=-1 )
+
+    time_dec    = np.repeat( time[:n_used:bin_size], 2 )
+    traces_dec  = np.stack( (trace_min, trace_max), axis=-1 ).reshape( traces.shape[:-1] + (2*n_bins,) )
+
+    return [ time_dec, traces_dec ]
+    #}}}
 
+
+class ShotTraces( dict ):
+    #{{{
+    """
+    Dictionary of the time traces of a shot, channels are read on first access.
+
+    Channels are cached once read, use load to read several channels with a
+    single pass over the file.
+    """
+
+    __slots__   = ( 'shot', )
+
+    def __init__( self, shot ):
+        """
+        Parameters
+        ----------
+        shot : Shot
+            Shot the traces belong to.
+        """
+        super().__init__()
+        self.shot   = shot
+
+    def __missing__( self, chName ):
+        self.load( [ chName ] )
+        return dict.__getitem__( self, chName )
+
+    def load( self, chNames ):
+        """
+        Reads several channels at once (channels already read are skipped).
+
+        Parameters
+        ----------
+        chNames : list of str
+            Names of the channels as written in the header of the file.
+
+        Raises
+        ------
+        KeyError
+            If a channel was not recorded or the file could not be read.
+        """
+        chNames = [ chName for chName in dict.fromkeys( chNames ) if chName not in self ]
+        if len(chNames) == 0:
+            return
+        traces  = get_traces( self.shot.shot, chNames, fname_in=self.shot.fname_data, silent=True )
+        if isinstance(traces, int):
+            raise KeyError( chNames[0] if len(chNames) == 1 else tuple(chNames) )
+        self.update( traces )
+    #}}}
+
+
+class Shot:
+    #{{{
+    """
+    Data of a single shot, read lazily.
+
+    The path of the data file is resolved once, header and time traces are
+    only read when they are accessed for the first time and are then kept
+    (calibrated quantities as well) until close is called, e.g.
+
+        with Shot( 13277 ) as shot:
+            plt.plot( shot.time, shot.ne )
+            n_e = shot.traces['Interferometer digital']
+    """
+
+    __slots__   = ( 'shot', 'fname_data', 'traces', 'cache' )
+
+    def __init__( self, shot, fname_in='' ):
+        """
+        Parameters
+        ----------
+        shot : int
+            Shot number
+        fname_in : str, optional
+            Allows to optionally specify a filename explicitely (if it would
+            not be located at the default locations, for example).
+        """
+        self.shot       = int( shot )
+        self.fname_data = get_fname_data( self.shot, fname_in=fname_in )
+        self.traces     = ShotTraces( self )
+        # header and calibrated quantities
+        self.cache      = {}
+
+    def __repr__( self ):
+        return 'Shot({0}, fname_data={1!r}, channels loaded: {2})'.format(
+                self.shot, str( self.fname_data ), len(self.traces) )
+
+    def __enter__( self ):
+        return self
+
+    def __exit__( self, exc_type, exc_value, traceback ):
+        self.close()
+
+    def close( self ):
+        """
+        Releases all time traces and calibrated quantities read so far.
+        """
+        self.traces.clear()
+        self.cache.clear()
+
+    def get_cached( self, key, func ):
+        """
+        Returns a cached quantity, calculated by func on first access.
+        """
+        if key not in self.cache:
+            self.cache[key] = func()
+        return self.cache[key]
+
+    @property
+    def exists( self ):
+        """True if the data file exists."""
+        return os.path.isfile( self.fname_data )
+
+    @property
+    def header( self ):
+        """Channel names as written in the header of the file."""
+        return self.get_cached( 'header', lambda: get_header( self.shot, fname_in=self.fname_data, silent=True ) )
+
+    @property
+    def gas( self ):
+        """Gas abbreviated as in the periodic table of the elements."""
+        return self.get_cached( 'gas', lambda: get_gas( self.shot ) )
+
+    @property
+    def chCfg( self ):
+        """Configuration of the channels, see get_channel_config."""
+        return self.get_cached( 'chCfg', lambda: get_channel_config( self.shot ) )
+
+    @property
+    def time( self ):
+        """Time axis in ms."""
+        return self.traces['Zeit [ms]']
+
+    @property
+    def p0( self ):
+        """Neutral gas pressure before the discharge in Pa, see get_pressure."""
+        return self.get_cached( 'p0', lambda: get_pressure( self.shot, pressure=self.traces[self.chCfg['p0'][0]] ) )[0]
+
+    @property
+    def p0_err( self ):
+        """Uncertainty of the neutral gas pressure in Pa."""
+        return self.get_cached( 'p0', lambda: get_pressure( self.shot, pressure=self.traces[self.chCfg['p0'][0]] ) )[1]
+
+    @property
+    def pabs2( self ):
+        """Absorbed power (forward - backward) at 2.45 GHz in W."""
+        def calc_pabs2():
+            self.traces.load( [ self.chCfg['P2GHz_in'][0], self.chCfg['P2GHz_out'][0] ] )
+            # note: calc_2GHzPower modifies its input, hence copies
+            return ( calc_2GHzPower( self.traces[self.chCfg['P2GHz_in'][0]].copy(),  output='watt', direction='fw', shot=self.shot )
+                    -calc_2GHzPower( self.traces[self.chCfg['P2GHz_out'][0]].copy(), output='watt', direction='bw', shot=self.shot ) )
+        return self.get_cached( 'pabs2', calc_pabs2 )
+
+    @property
+    def ne( self ):
+        """Line-averaged density in 1e17 m^-3, see get_lineAvgDensity."""
+        return self.get_cached( 'ne', lambda: get_lineAvgDensity( self.traces[self.chCfg['interf'][0]], self.shot ) )
     #}}}
 
 
@@ -634,8 +3809,15 @@ def plot_timetraces( shot, fname_out='',
 
     data2plot   = ['B0', 'Pin2', 'neMueller', 'BoloSum']
 
+    # all channels are read at once, the time column is not parsed
+    timebase_traces = get_traces_timebase( shot, [chCfg[key][0] for key in data2plot], 
+                                           silent=silent )
+    if isinstance(timebase_traces, int):
+        return
+    timebase, traces    = timebase_traces
+
     # get time axis and scale it to seconds
-    time    = get_trace(shot, chName='Zeit [ms]', silent=silent)
+    time    = timebase_to_time( timebase )
     time   *= 1e-3
 
     n_rows  = n_traces
@@ -646,7 +3828,7 @@ def plot_timetraces( shot, fname_out='',
 
     # fig return value of plt.subplot has list of all axes objects
     for i, ax in enumerate(fig.axes):
-        timetrace   = get_trace( shot, chName=chCfg[data2plot[i]][0], silent=silent)
+        timetrace   = traces[chCfg[data2plot[i]][0]].copy()
         if np.isfinite(chCfg[data2plot[i]][1]):
             timetrace *= chCfg[data2plot[i]][1]
         ax.plot( time, timetrace )
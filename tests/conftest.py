@@ -0,0 +1,89 @@
+# coding=utf-8
+
+"""
+Fixtures shared by the tests: the TJK-monitor module with its cache in a
+temporary folder and a small synthetic tjk-monitor file.
+"""
+
+
+# import standard modules
+import importlib
+import numpy as np
+import os
+import pytest
+import sys
+import threading
+import time
+
+sys.path.insert( 0, os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ) )
+
+
+# channels of the synthetic tjk-monitor file (as in recent campaigns)
+CHANNELS    = [ 'Zeit [ms]', 'I_Bh', 'U_B', 'Coil Temperature', '2 GHz Richtk. forward',
+                '2 GHz Richtk. backward', '8 GHz power', 'optDiode', 'Bolo_sum', 'Pressure',
+                'Interferometer digital', 'Interferometer (Mueller)' ]
+
+
+@pytest.fixture
+def tjk( tmp_path, monkeypatch ):
+    """TJK-monitor module, caches are written to a temporary folder."""
+    tjk = importlib.import_module( "TJK-monitor" )
+    monkeypatch.setattr( tjk, 'CACHE_DIR', str( tmp_path / 'cache' ) )
+    monkeypatch.setattr( tjk, 'SHMCACHE_SOCKET', str( tmp_path / 'shmcache.sock' ) )
+    return tjk
+
+
+def write_shot( fname_data, shot, n_rows=20000, seed=0 ):
+    """Writes a synthetic tjk-monitor file, returns the data written."""
+    rng     = np.random.default_rng( seed )
+    data    = rng.normal( size=( n_rows, len(CHANNELS) ) )
+    data[:,0]   = .1*np.arange( n_rows )
+    # microwave diodes give negative voltages (positive values are clipped)
+    data[:,4:6] = -np.abs( data[:,4:6] )
+    os.makedirs( os.path.dirname( fname_data ), exist_ok=True )
+    with open( fname_data, 'w' ) as f:
+        f.write( 'TJK-monitor\nshot {0}\ndate\n'.format( shot ) )
+        f.write( '\t'.join( CHANNELS ) + '\t\n' )
+        for row in data:
+            f.write( '\t'.join( '{0:f}'.format( value ) for value in row ) + '\t\n' )
+    # header only, as while tjk-monitor.vi starts writing
+    if n_rows == 0:
+        return data
+    return np.loadtxt( fname_data, skiprows=4 )
+
+
+def get_fname_shot( root, shot ):
+    """Filename of a shot below a data root (see tjk.DATA_ROOTS)."""
+    return root / 'shot{0}'.format( shot ) / 'interferometer' / 'shot{0}.dat'.format( shot )
+
+
+@pytest.fixture
+def shot_file( tmp_path ):
+    """Filename (pathlib.Path) and content of a synthetic shot 13400."""
+    fname_data  = tmp_path / 'shot13400' / 'interferometer' / 'shot13400.dat'
+    return [ fname_data, write_shot( fname_data, 13400 ) ]
+
+
+@pytest.fixture
+def data_root( tjk, tmp_path, monkeypatch ):
+    """Temporary data root, the only folder shots are searched in."""
+    root    = tmp_path / 'data'
+    root.mkdir()
+    monkeypatch.setattr( tjk, 'DATA_ROOTS', [ str( root ) ] )
+    return root
+
+
+@pytest.fixture
+def shmcache( tjk ):
+    """Runs the cache service (tjk_shmcache.py) in a thread, shut down afterwards."""
+    import tjk_shmcache
+    thread  = threading.Thread( target=tjk_shmcache.serve_shmcache,
+                                kwargs={ 'socket_path': tjk.SHMCACHE_SOCKET }, daemon=True )
+    thread.start()
+    for ii in range( 100 ):
+        if not isinstance( tjk.request_shmcache( {'cmd': 'stats'} ), int ):
+            break
+        time.sleep( .05 )
+    yield
+    tjk.request_shmcache( {'cmd': 'shutdown'} )
+    thread.join( timeout=5 )
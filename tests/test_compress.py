@@ -0,0 +1,105 @@
+# coding=utf-8
+
+"""
+Tests of compressed tjk-monitor files (tjk_compress.py and the readers of
+TJK-monitor.py): block index, full reads and time windows.
+"""
+
+
+# import standard modules
+import gzip
+import numpy as np
+import os
+
+import pytest
+
+from conftest import CHANNELS, get_fname_shot, write_shot
+import tjk_compress
+
+
+@pytest.fixture( params=[ '.gz', '.zst' ] )
+def compressed_shot( request, tjk, data_root ):
+    """Shot 13400 compressed in blocks, the uncompressed file removed."""
+    fmt         = request.param
+    if (fmt == '.zst') and (tjk.zstandard is None):
+        pytest.skip( 'module zstandard is not installed' )
+    fname_data  = get_fname_shot( data_root, 13400 )
+    data        = write_shot( fname_data, 13400 )
+    with open( fname_data, 'rb' ) as f:
+        content = f.read()
+    fname_comp  = tjk_compress.compress_file( fname_data, fmt=fmt, rows_per_block=2000, remove=True )
+    assert fname_comp == str( fname_data ) + fmt
+    return [ fname_comp, content, data ]
+
+
+@pytest.fixture
+def counted_blocks( tjk, monkeypatch ):
+    """Number of blocks decompressed."""
+    decompress_block    = tjk.decompress_block
+    n_blocks    = []
+    def decompress_block_counted( data, fmt ):
+        n_blocks.append( len(data) )
+        return decompress_block( data, fmt )
+    monkeypatch.setattr( tjk, 'decompress_block', decompress_block_counted )
+    return n_blocks
+
+
+def test_read_compressed( tjk, compressed_shot, counted_blocks ):
+    fname_comp, content, data   = compressed_shot
+    # found instead of the uncompressed file
+    assert not os.path.isfile( os.path.splitext( fname_comp )[0] )
+    assert str( tjk.get_fname_data( 13400 ) ) == fname_comp
+    assert os.path.isfile( fname_comp + tjk.BLOCK_INDEX_SUFFIX )
+    if fname_comp.endswith( '.gz' ):
+        with gzip.open( fname_comp, 'rb' ) as f:
+            assert f.read() == content
+
+    block_index = tjk.get_block_index( fname_comp )
+    # header and 10 blocks of 2000 rows
+    assert len(block_index['coffsets']) == 12
+    assert block_index['uoffsets'][-1] == len(content)
+    for byte_start, byte_end in [ (0, 10), (0, len(content)), (12345, 67890),
+                                  (block_index['uoffsets'][3], block_index['uoffsets'][5]),
+                                  (len(content)-5, len(content)+100) ]:
+        assert tjk.read_byte_range( fname_comp, byte_start, byte_end ) == content[byte_start:byte_end]
+
+    np.testing.assert_allclose( tjk.read_data( fname_comp ), data )
+    assert [ chName for chName in tjk.get_header( 13400, silent=True ) if chName.strip() ] == CHANNELS
+    np.testing.assert_allclose( tjk.get_trace( 13400, chName='optDiode', silent=True ), data[:,7], atol=1e-6 )
+
+    # time window, only the blocks covering it are decompressed
+    del counted_blocks[:]
+    window  = tjk.read_data( fname_comp, usecols=[0, 7], t_start=450., t_end=650. )
+    in_window   = (data[:,0] >= 450.) & (data[:,0] <= 650.)
+    np.testing.assert_allclose( window, data[in_window][:,[0, 7]] )
+    assert 0 < len(counted_blocks) <= 3
+
+
+def test_without_block_index( tjk, data_root ):
+    # compressed with gzip, i.e. a single block and no side index
+    fname_data  = get_fname_shot( data_root, 13401 )
+    data        = write_shot( fname_data, 13401, n_rows=5000 )
+    with open( fname_data, 'rb' ) as f:
+        content = f.read()
+    with gzip.open( str( fname_data ) + '.gz', 'wb' ) as f:
+        f.write( content )
+    os.remove( fname_data )
+
+    fname_comp  = str( tjk.get_fname_data( 13401 ) )
+    block_index = tjk.get_block_index( fname_comp )
+    assert block_index['uoffsets'].tolist() == [ 0, len(content) ]
+    assert os.path.isfile( tjk.get_cache_fname( fname_comp, 'blkidx.npz' ) )
+    np.testing.assert_allclose( tjk.read_data( fname_comp ), data )
+    window  = tjk.read_data( fname_comp, t_start=100., t_end=200. )
+    np.testing.assert_allclose( window, data[(data[:,0] >= 100.) & (data[:,0] <= 200.)] )
+
+
+def test_compress_shots( tjk, data_root ):
+    for shot in [ 13400, 13401 ]:
+        write_shot( get_fname_shot( data_root, shot ), shot, n_rows=3000 )
+    assert tjk_compress.compress_shots( [ 13400, 13401, 13402 ], remove=True ) == 2
+    assert os.path.isfile( str( get_fname_shot( data_root, 13400 ) ) + '.gz' )
+    assert not os.path.isfile( get_fname_shot( data_root, 13400 ) )
+    # compressed files are skipped
+    assert tjk_compress.compress_shots( [ 13400, 13401 ] ) == 0
+    assert isinstance( tjk_compress.compress_file( get_fname_shot( data_root, 13400 ), fmt='.xz' ), int )
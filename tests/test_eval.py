@@ -0,0 +1,63 @@
+# coding=utf-8
+
+"""
+Tests of the block-wise evaluation of the calibration formulas (eval_blocks
+in TJK-monitor.py): results identical to the evaluation in one go.
+"""
+
+
+# import standard modules
+import numpy as np
+
+import pytest
+
+
+# not a multiple of the block size, i.e. the last block is shorter
+N_VALUES    = 1000003
+
+
+@pytest.fixture
+def U_in():
+    """Long time trace of diode voltages, including positive values."""
+    rng     = np.random.default_rng( 0 )
+    return rng.uniform( -2., .1, size=N_VALUES ).astype( np.float32 )
+
+
+def test_eval_blocks( tjk, U_in ):
+    def func( U_block ):
+        return np.exp( -U_block )*np.sin( U_block ) + U_block**2
+    blocks_seen = []
+    def func_counted( U_block ):
+        blocks_seen.append( len(U_block) )
+        return func( U_block )
+
+    result  = tjk.eval_blocks( func_counted, U_in, n_workers=4, block_size=4096 )
+    assert result.dtype == func( U_in ).dtype
+    np.testing.assert_array_equal( result, func( U_in ) )
+    assert len(blocks_seen) == -(-N_VALUES//4096) and sum( blocks_seen ) == N_VALUES
+
+    # short traces, scalars and 2D arrays are evaluated in one go
+    del blocks_seen[:]
+    tjk.eval_blocks( func_counted, U_in[:tjk.EVAL_MIN_SIZE-1], n_workers=4, block_size=4096 )
+    assert blocks_seen == [ tjk.EVAL_MIN_SIZE-1 ]
+    assert tjk.eval_blocks( func, -.5, n_workers=4 ) == func( -.5 )
+    np.testing.assert_array_equal( tjk.eval_blocks( func, U_in[:4*4096].reshape( 4, -1 ), n_workers=4, block_size=16 ),
+                                   func( U_in[:4*4096].reshape( 4, -1 ) ) )
+
+
+@pytest.mark.parametrize( 'calc', [
+        lambda tjk, U, n: tjk.calc_2GHzPower( U, output='watt', direction='fw', shot=13400, n_workers=n ),
+        lambda tjk, U, n: tjk.calc_2GHzPower( U, output='dBm', direction='bw', shot=13400, n_workers=n ),
+        lambda tjk, U, n: tjk.calc_8GHzPower( U, shot=13400, n_workers=n ),
+        lambda tjk, U, n: tjk.calc_8GHzPower( U, old=True, shot=13400, n_workers=n ),
+        lambda tjk, U, n: tjk.calc_PKR261Pressure( U, shot=13400, n_workers=n ),
+        ] )
+def test_calibrations_blocked( tjk, U_in, calc ):
+    # the conversions modify their input (in place, also block-wise)
+    U_serial    = U_in.copy()
+    serial      = calc( tjk, U_serial, 1 )
+    U_blocked   = U_in.copy()
+    blocked     = calc( tjk, U_blocked, 4 )
+    assert blocked.dtype == serial.dtype
+    np.testing.assert_array_equal( blocked, serial )
+    np.testing.assert_array_equal( U_blocked, U_serial )
@@ -0,0 +1,81 @@
+# coding=utf-8
+
+"""
+Tests of the bulk export of shot ranges (tjk_export.py): order of the shots,
+time axis, summary rows and broken export files.
+"""
+
+
+# import standard modules
+import numpy as np
+
+import pytest
+
+from conftest import write_shot
+import tjk_export
+
+
+SHOTS       = [ 13403, 13400, 13402, 13401 ]
+CHANNELS    = [ 'optDiode', 'Bolo_sum' ]
+
+
+@pytest.fixture
+def shots( tjk, tmp_path, monkeypatch ):
+    """Synthetic shots of different length in a temporary data root."""
+    monkeypatch.setattr( tjk, 'DATA_ROOTS', [ str( tmp_path ) ] )
+    return { shot: write_shot( tmp_path / 'shot{0}'.format( shot ) / 'interferometer' /
+                               'shot{0}.dat'.format( shot ), shot, n_rows=3000 + 1000*ii, seed=ii )
+             for ii, shot in enumerate( sorted( SHOTS ) ) }
+
+
+def test_export_traces( shots, tmp_path ):
+    fname_out   = str( tmp_path / 'scan.tjkx' )
+    # a missing shot is skipped, the others keep the requested order
+    index   = tjk_export.export_shots( fname_out, SHOTS + [13499], CHANNELS, n_workers=4, max_inflight=2 )
+    assert [ entry['shot'] for entry in index['shots'] ] == SHOTS
+    assert tjk_export.read_export_index( fname_out ) == index
+
+    for shot in SHOTS:
+        time, data  = tjk_export.load_export_shot( fname_out, shot )
+        # time axis is not truncated to the data type of the values
+        assert time.dtype == np.float64
+        np.testing.assert_array_equal( time, shots[shot][:,0] )
+        np.testing.assert_allclose( data, shots[shot][:,[7, 8]], atol=1e-6 )
+    assert tjk_export.load_export_shot( fname_out, 13499 ) == -1
+
+
+def test_export_matrix( shots, tmp_path ):
+    fname_out   = str( tmp_path / 'scan.tjkx' )
+    tjk_export.export_shots( fname_out, SHOTS, CHANNELS, dt=1., t_start=10., t_end=250., n_workers=4 )
+    shots_out, time, matrix = tjk_export.load_export_matrix( fname_out )
+    assert shots_out == SHOTS
+    assert matrix.shape == ( len(SHOTS), len(time), len(CHANNELS) )
+    for ii, shot in enumerate( SHOTS ):
+        assert tjk_export.load_export_shot( fname_out, shot )[0] is None
+        np.testing.assert_allclose( matrix[ii,:,0], np.interp( time, shots[shot][:,0], shots[shot][:,7] ),
+                                    atol=1e-5 )
+
+
+def test_export_summary( shots, tmp_path ):
+    fname_out   = str( tmp_path / 'summary.tjkx' )
+    tjk_export.export_shots( fname_out, SHOTS, CHANNELS, t_start=10., t_end=250., summary=True,
+                             dtype='float64' )
+    shots_out, matrix   = tjk_export.load_export_summary( fname_out )
+    assert shots_out == SHOTS
+    assert matrix.shape == ( len(SHOTS), len(CHANNELS), len(tjk_export.SUMMARY_STATS) )
+    for ii, shot in enumerate( SHOTS ):
+        in_window   = (shots[shot][:,0] >= 10.) & (shots[shot][:,0] <= 250.)
+        for jj, col in enumerate( [7, 8] ):
+            trace   = shots[shot][in_window,col]
+            np.testing.assert_allclose( matrix[ii,jj], [ np.mean( trace ), np.std( trace ),
+                                                         np.min( trace ), np.max( trace ) ], atol=1e-9 )
+    assert tjk_export.load_export_matrix( fname_out ) == -1
+
+
+def test_broken_export_file( tmp_path ):
+    fname_out   = tmp_path / 'broken.tjkx'
+    fname_out.write_bytes( b'no export file' )
+    assert tjk_export.read_export_index( str( fname_out ) ) == -1
+    assert tjk_export.load_export_shot( str( fname_out ), 13400 ) == -1
+    assert tjk_export.load_export_matrix( str( fname_out ) ) == -1
+    assert tjk_export.load_export_summary( str( tmp_path / 'missing.tjkx' ) ) == -1
@@ -0,0 +1,83 @@
+# coding=utf-8
+
+"""
+Tests of the zero-copy hand-off of shot data to pandas and xarray
+(tjk_frame.py), for parsed data, the binary cache and the shot cache service.
+"""
+
+
+# import standard modules
+import numpy as np
+import os
+
+import pytest
+
+import tjk_frame
+
+
+CHANNELS    = [ 'optDiode', 'Bolo_sum' ]
+
+
+def check_frame( frame, data ):
+    assert frame.columns == CHANNELS
+    assert len(frame) == len(data)
+    np.testing.assert_allclose( frame.time, data[:,0] )
+    for chName, col in zip( CHANNELS, [7, 8] ):
+        np.testing.assert_allclose( frame[chName], data[:,col], atol=1e-6 )
+        assert np.shares_memory( frame[chName], frame.data )
+
+
+def test_frame_parsed_and_cached( tjk, shot_file ):
+    fname_data, data    = shot_file
+    frame   = tjk_frame.get_frame( 13400, chNames=CHANNELS, fname_in=fname_data )
+    check_frame( frame, data )
+
+    # binary cache holds all columns, only the requested ones are exposed
+    tjk.build_npy_cache( fname_data )
+    frame   = tjk_frame.get_frame( 13400, chNames=CHANNELS, fname_in=fname_data )
+    assert isinstance( frame.data, np.memmap )
+    check_frame( frame, data )
+
+
+def test_frame_time_window( tjk, shot_file ):
+    fname_data, data    = shot_file
+    frame   = tjk_frame.get_frame( 13400, chNames=CHANNELS, fname_in=fname_data, t_start=100., t_end=200. )
+    check_frame( frame, data[(data[:,0] >= 100.) & (data[:,0] <= 200.)] )
+
+
+def test_frame_without_time_column( tjk, shot_file ):
+    fname_data, data    = shot_file
+    frame   = tjk_frame.get_frame( 13400, fname_in=fname_data )
+    assert 'Zeit [ms]' not in frame.columns
+    assert len(frame.columns) == data.shape[1] - 1
+
+
+@pytest.mark.skipif( not os.path.isdir( '/dev/shm' ), reason='requires /dev/shm' )
+def test_frame_shmcache( tjk, shot_file, shmcache ):
+    fname_data, data    = shot_file
+    frame   = tjk_frame.get_frame( 13400, chNames=CHANNELS, fname_in=fname_data )
+    check_frame( frame, data )
+
+
+def test_to_pandas( tjk, shot_file ):
+    pytest.importorskip( 'pandas' )
+    fname_data, data    = shot_file
+    tjk.build_npy_cache( fname_data )
+    frame   = tjk_frame.get_frame( 13400, chNames=CHANNELS, fname_in=fname_data )
+    df      = frame.to_pandas()
+    assert list( df.columns ) == CHANNELS
+    assert df.attrs['units']['optDiode'] == 'V'
+    np.testing.assert_allclose( df.index.to_numpy(), data[:,0] )
+    assert tjk_frame.check_no_copy( frame, df ) == []
+    assert tjk_frame.check_no_copy( frame, frame.to_pandas( index='sample' ) ) == []
+
+
+def test_to_xarray( tjk, shot_file ):
+    pytest.importorskip( 'xarray' )
+    fname_data, data    = shot_file
+    frame   = tjk_frame.get_frame( 13400, chNames=CHANNELS, fname_in=fname_data )
+    ds      = frame.to_xarray()
+    assert sorted( ds.data_vars ) == sorted( CHANNELS )
+    assert ds['optDiode'].attrs['units'] == 'V'
+    np.testing.assert_allclose( ds['time'].values, data[:,0] )
+    assert tjk_frame.check_no_copy( frame, ds ) == []
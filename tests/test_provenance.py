@@ -0,0 +1,105 @@
+# coding=utf-8
+
+"""
+Tests of the versioned calibrations and provenance keys (get_provenance in
+TJK-monitor.py, tjk_results.py, tjk_summary.py): a new calibration entry only
+invalidates the results depending on it, for the shots it applies to.
+"""
+
+
+# import standard modules
+import glob
+import numpy as np
+import os
+import shutil
+
+import pytest
+
+from conftest import get_fname_shot, write_shot
+import tjk_results
+import tjk_summary
+
+
+SHOTS   = [ 13400, 13401, 13402 ]
+
+
+@pytest.fixture
+def shots( tjk, data_root, tmp_path, monkeypatch ):
+    """Shots SHOTS, results and summary database in a temporary folder."""
+    monkeypatch.setattr( tjk_results, 'RESULTS_DIR', str( tmp_path / 'results' ) )
+    monkeypatch.setattr( tjk_summary, 'FNAME_DB', str( tmp_path / 'summary.sqlite' ) )
+    # list copied, a new entry is not kept for other tests
+    monkeypatch.setitem( tjk.CALIBRATIONS, 'interferometer', list( tjk.CALIBRATIONS['interferometer'] ) )
+    for shot in SHOTS:
+        write_shot( get_fname_shot( data_root, shot ), shot, n_rows=2000, seed=shot )
+    return data_root
+
+
+def add_interferometer_calibration( tjk, shot_min, factor ):
+    tjk.CALIBRATIONS['interferometer'].append( { 'shot_min': shot_min, 'factor': factor } )
+
+
+def test_get_calibration( tjk, shots ):
+    assert tjk.get_calibration( 'interferometer', 13031 )['factor'] == 3.883
+    assert tjk.get_calibration( 'interferometer', 13032 )['factor'] == 3.883/2.
+    add_interferometer_calibration( tjk, 13401, 2. )
+    assert tjk.get_calibration( 'interferometer', 13400 )['factor'] == 3.883/2.
+    assert tjk.get_calibration( 'interferometer', 13401 )['factor'] == 2.
+    assert tjk.get_calibration( 'interferometer' )['factor'] == 2.
+
+
+def test_provenance_key( tjk, shots, tmp_path ):
+    def get_keys( calibrations=( 'interferometer', ), params=None ):
+        return [ tjk.get_provenance( shot, 'ne', 1, calibrations=calibrations, params=params ) for shot in SHOTS ]
+    keys    = get_keys()
+    assert len( set( keys ) ) == len(SHOTS)
+    assert get_keys() == keys
+
+    # only shots the new calibration applies to, only results depending on it
+    keys_p2 = get_keys( calibrations=( 'P2GHz', ) )
+    add_interferometer_calibration( tjk, 13401, 2. )
+    keys_new    = get_keys()
+    assert keys_new[0] == keys[0]
+    assert keys_new[1] != keys[1] and keys_new[2] != keys[2]
+    assert get_keys( calibrations=( 'P2GHz', ) ) == keys_p2
+
+    # parameters, version and data file are part of the key
+    assert get_keys( params={ 'frac': .4 } )[0] != keys_new[0]
+    assert tjk.get_provenance( 13400, 'ne', 2, calibrations=( 'interferometer', ) ) != keys_new[0]
+    os.utime( get_fname_shot( shots, 13400 ), ns=( 0, 10**18 ) )
+    assert get_keys()[0] != keys_new[0]
+
+    # path is not part of the key
+    fname_moved = tmp_path / 'moved' / 'shot13401.dat'
+    os.makedirs( fname_moved.parent )
+    shutil.copy2( get_fname_shot( shots, 13401 ), fname_moved )
+    assert tjk.get_provenance( 13401, 'ne', 1, calibrations=( 'interferometer', ),
+                               fname_in=fname_moved ) == keys_new[1]
+    assert tjk.get_provenance( 13499, 'ne', 1 ) == -1
+
+
+def test_new_calibration_results( tjk, shots ):
+    names   = [ 'ne', 'Pabs2', 'plateau' ]
+    assert tjk_results.update_results( names, SHOTS, n_workers=2 ) == len(names)*len(SHOTS)
+    ne      = { shot: tjk_results.get_result( 'ne', shot ) for shot in SHOTS }
+    pabs2   = tjk_results.get_result( 'Pabs2', 13401 )
+    assert tjk_results.get_outdated_shots( names, SHOTS ) == { name: [] for name in names }
+
+    add_interferometer_calibration( tjk, 13401, 2. )
+    assert tjk_results.get_outdated_shots( names, SHOTS ) == { 'ne': [ 13401, 13402 ], 'Pabs2': [],
+                                                               'plateau': [ 13401, 13402 ] }
+    assert tjk_results.update_results( names, SHOTS ) == 4
+    np.testing.assert_array_equal( tjk_results.get_result( 'ne', 13400 ), ne[13400] )
+    for shot in [ 13401, 13402 ]:
+        np.testing.assert_allclose( tjk_results.get_result( 'ne', shot ), ne[shot]*2./(3.883/2.), rtol=1e-6 )
+    np.testing.assert_array_equal( tjk_results.get_result( 'Pabs2', 13401 ), pabs2 )
+    # results with outdated keys were replaced
+    assert len( glob.glob( os.path.join( tjk_results.RESULTS_DIR, 'ne', '*.npz' ) ) ) == len(SHOTS)
+    assert tjk_results.prune_results() == 0
+
+
+def test_new_calibration_summary( tjk, shots ):
+    assert tjk_summary.ingest_shots( SHOTS, n_workers=1 ) == len(SHOTS)
+    add_interferometer_calibration( tjk, 13402, 2. )
+    assert tjk_summary.ingest_shots( SHOTS, n_workers=1 ) == 1
+    assert tjk_summary.ingest_shots( SHOTS, n_workers=1 ) == 0
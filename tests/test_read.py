@@ -0,0 +1,247 @@
+# coding=utf-8
+
+"""
+Tests of the readers of TJK-monitor.py: row index and time windows, load
+strategies of read_data and get_trace.
+"""
+
+
+# import standard modules
+import numpy as np
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from conftest import CHANNELS, get_fname_shot, write_shot
+
+
+@pytest.fixture
+def small_budget( tjk, monkeypatch ):
+    """Memory budget such that single columns are read 'compact'."""
+    monkeypatch.setattr( tjk, 'MEMORY_BUDGET', 1024**2 )
+
+
+def test_compact_keeps_time_float64( tjk, shot_file, small_budget ):
+    fname_data, data    = shot_file
+    assert tjk.choose_load_strategy( fname_data, n_cols_used=2 ) == 'compact'
+
+    traces  = tjk.read_data( fname_data, usecols=[7] )
+    assert traces.dtype == np.float32
+    np.testing.assert_allclose( traces[:,0], data[:,7], atol=1e-6 )
+
+    # time column is not truncated to float32
+    traces  = tjk.read_data( fname_data, usecols=[0, 7] )
+    assert traces.dtype == np.float64
+    np.testing.assert_array_equal( traces[:,0], data[:,0] )
+
+    traces  = tjk.get_traces( 13400, ['Zeit [ms]', 'optDiode'], fname_in=fname_data, silent=True )
+    assert traces['Zeit [ms]'].dtype == np.float64
+    np.testing.assert_array_equal( traces['Zeit [ms]'], data[:,0] )
+
+
+def test_estimate_cached_per_file( tjk, shot_file, monkeypatch ):
+    fname_data, data    = shot_file
+    read_file   = tjk.read_file
+    n_sampled   = []
+    def read_file_counted( fname, n_bytes=None, **kwargs ):
+        if n_bytes == tjk.ESTIMATE_BYTES:
+            n_sampled.append( fname )
+        return read_file( fname, n_bytes=n_bytes, **kwargs )
+    monkeypatch.setattr( tjk, 'read_file', read_file_counted )
+
+    for ii in range( 3 ):
+        trace   = tjk.get_trace( 13400, fname_in=fname_data, chName='optDiode', silent=True )
+        np.testing.assert_allclose( trace, data[:,7], atol=1e-6 )
+    assert len(n_sampled) == 1
+
+    # file changed, estimated again
+    with open( fname_data, 'a' ) as f:
+        f.write( '\t'.join( ['0']*data.shape[1] ) + '\t\n' )
+    tjk.get_trace( 13400, fname_in=fname_data, chName='optDiode', silent=True )
+    assert len(n_sampled) == 2
+
+
+def test_row_index( tjk, shot_file, monkeypatch ):
+    fname_data, data    = shot_file
+    row_index   = tjk.get_row_index( fname_data )
+    assert row_index['n_rows'] == len(data)
+    assert row_index['n_cols'] == data.shape[1]
+    # every n_rows_step-th row is indexed with its byte offset and time
+    np.testing.assert_array_equal( row_index['time'], data[::1000,0] )
+    with open( fname_data, 'rb' ) as f:
+        for offset, time in zip( row_index['offsets'], row_index['time'] ):
+            f.seek( offset )
+            assert float( f.readline().split()[0] ) == time
+    assert os.path.isfile( tjk.get_cache_fname( fname_data, 'rowidx.npz' ) )
+
+    # stored index is used as long as the file does not change
+    calc_row_index  = tjk.calc_row_index
+    def calc_row_index_failing( *args, **kwargs ):
+        raise AssertionError( 'row index rebuilt' )
+    monkeypatch.setattr( tjk, 'calc_row_index', calc_row_index_failing )
+    assert tjk.get_row_index( fname_data )['n_rows'] == len(data)
+    monkeypatch.setattr( tjk, 'calc_row_index', calc_row_index )
+
+    # rows appended, last one still incomplete
+    with open( fname_data, 'a' ) as f:
+        f.write( '\t'.join( ['3000.0'] + ['1.0']*(data.shape[1]-1) ) + '\t\n' )
+        f.write( '3000.1\t1.0\t' )
+    row_index   = tjk.get_row_index( fname_data )
+    assert row_index['n_rows'] == len(data) + 1
+    assert tjk.read_data( fname_data, t_start=2999. )[:,0].tolist() == [ 3000. ]
+
+
+@pytest.mark.parametrize( 't_start, t_end', [
+        ( 150., 250. ),         # within the file
+        ( 99.95, 100.05 ),      # around an indexed row
+        ( None, 50. ),          # at the beginning
+        ( 1950., None ),        # at the end
+        ( -10., 0. ),           # first sample only
+        ( 1999.9, 3000. ),      # last sample only
+        ( -10., -5. ),          # before the data
+        ( 2500., 3000. ),       # after the data
+        ( 300., 200. ),         # empty window
+        ] )
+def test_time_window( tjk, shot_file, t_start, t_end ):
+    fname_data, data    = shot_file
+    in_window   = np.ones( len(data), dtype=bool )
+    if t_start is not None:
+        in_window  &= data[:,0] >= t_start
+    if t_end is not None:
+        in_window  &= data[:,0] <= t_end
+
+    window  = tjk.read_data( fname_data, t_start=t_start, t_end=t_end )
+    np.testing.assert_allclose( window, data[in_window] )
+    window  = tjk.read_data( fname_data, usecols=[7, 3], t_start=t_start, t_end=t_end )
+    assert window.shape == ( np.count_nonzero( in_window ), 2 )
+    np.testing.assert_allclose( window, data[in_window][:,[7, 3]] )
+
+
+@pytest.mark.parametrize( 'use_processes', [ False, True ] )
+@pytest.mark.parametrize( 'usecols', [ None, [7, 0, 3] ] )
+def test_parallel_equals_serial( tjk, shot_file, use_processes, usecols ):
+    fname_data, data    = shot_file
+    serial      = tjk.read_buffer( tjk.read_file( fname_data ), usecols=usecols )
+    parallel    = tjk.read_data_parallel( fname_data, usecols=usecols, n_workers=4,
+                                          use_processes=use_processes )
+    np.testing.assert_array_equal( parallel, serial )
+    np.testing.assert_allclose( parallel, data if usecols is None else data[:,usecols] )
+
+    # ranges of the workers are aligned to line breaks and cover the body
+    byte_start, byte_end    = tjk.get_body_range( fname_data )
+    bounds  = tjk.split_body( fname_data, byte_start, byte_end, 7 )
+    assert bounds[0] == byte_start and bounds[-1] == byte_end
+    with open( fname_data, 'rb' ) as f:
+        buf = f.read()
+    assert all( buf[bound-1:bound] == b'\n' for bound in bounds[1:] )
+
+
+def test_parallel_header_only( tjk, tmp_path ):
+    fname_data  = tmp_path / 'shot13401.dat'
+    write_shot( fname_data, 13401, n_rows=0 )
+    for use_processes in [ False, True ]:
+        data    = tjk.read_data_parallel( fname_data, n_workers=4, use_processes=use_processes )
+        assert data.shape == ( 0, len(CHANNELS) )
+
+
+@pytest.mark.parametrize( 'c_loadtxt', [ True, False ] )
+def test_parse_body( tjk, monkeypatch, c_loadtxt ):
+    # bulk conversion with numpy's loadtxt or np.fromstring (older numpy)
+    monkeypatch.setattr( tjk, 'NUMPY_C_LOADTXT', c_loadtxt )
+    rows    = np.arange( 12. ).reshape( 4, 3 ) + .5
+
+    # with and without trailing tab
+    for end in [ '\t\n', '\n' ]:
+        body    = ''.join( '\t'.join( str(value) for value in row ) + end for row in rows ).encode()
+        np.testing.assert_array_equal( tjk.parse_body( body, 3 ), rows )
+        # columns in the requested order
+        np.testing.assert_array_equal( tjk.parse_body( body, 3, usecols=[2, 0] ), rows[:,[2, 0]] )
+        np.testing.assert_array_equal( tjk.parse_body( memoryview( body ), 3, usecols=[1] ), rows[:,[1]] )
+
+        # incomplete last line (file still being written) is ignored
+        assert tjk.parse_body( body + b'12.5\t13', 3 ).shape == ( 4, 3 )
+        assert tjk.parse_body( body[:-1], 3 ).shape == ( 3, 3 )
+
+    assert tjk.parse_body( b'', 3, usecols=[0] ).shape == ( 0, 1 )
+    assert tjk.parse_body( b'0.5\t1.5', 3 ).shape == ( 0, 3 )
+
+
+def test_read_buffer( tjk, shot_file ):
+    fname_data, data    = shot_file
+    buf     = tjk.read_file( fname_data )
+    assert [ chName for chName in tjk.parse_header( buf ) if chName.strip() ] == CHANNELS
+    np.testing.assert_allclose( tjk.read_buffer( buf ), data )
+    np.testing.assert_allclose( tjk.read_buffer( buf, usecols=[10, 1] ), data[:,[10, 1]] )
+    window  = tjk.read_buffer( buf, usecols=[7], t_start=100., t_end=200. )
+    np.testing.assert_allclose( window[:,0], data[(data[:,0] >= 100.) & (data[:,0] <= 200.),7] )
+
+    # header only, columns are known from the header
+    header  = buf[:tjk.get_body_range( fname_data )[0]]
+    assert tjk.read_buffer( header ).shape == ( 0, len(CHANNELS) )
+    assert tjk.read_buffer( header, usecols=[7, 8] ).shape == ( 0, 2 )
+    # incomplete header
+    assert isinstance( tjk.parse_header( header[:20] ), int )
+
+
+def test_read_file_latency( tjk, shot_file, monkeypatch ):
+    fname_data, data    = shot_file
+    with open( fname_data, 'rb' ) as f:
+        content = f.read()
+    # injected latency per request, as on a network mount
+    monkeypatch.setattr( tjk, 'IO_LATENCY', .01 )
+    block_size  = len(content)//9
+    t0      = time.perf_counter()
+    buf     = tjk.read_file( fname_data, block_size=block_size )
+    assert time.perf_counter() - t0 >= 10*.01
+    assert buf == content
+    assert tjk.read_file( fname_data, n_bytes=100, latency=0. ) == content[:100]
+
+
+def test_io_latency_environment( shot_file ):
+    fname_data, data    = shot_file
+    script  = ( 'import importlib, time; tjk = importlib.import_module( "TJK-monitor" ); '
+                't0 = time.perf_counter(); tjk.read_file( {0!r} ); '
+                'print( tjk.IO_LATENCY, time.perf_counter() - t0 )'.format( str( fname_data ) ) )
+    output  = subprocess.run( [ sys.executable, '-c', script ], check=True, capture_output=True, text=True,
+                              cwd=os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ),
+                              env=dict( os.environ, TJKPY_IO_LATENCY='0.2' ) ).stdout.split()
+    assert float( output[0] ) == .2
+    assert float( output[1] ) >= .2
+
+
+def test_prefetch_overlaps_latency( tjk, data_root, monkeypatch ):
+    shots   = list( range( 13400, 13408 ) )
+    fnames  = [ get_fname_shot( data_root, shot ) for shot in shots ]
+    data    = { shot: write_shot( fname, shot, n_rows=500, seed=shot ) for shot, fname in zip( shots, fnames ) }
+    monkeypatch.setattr( tjk, 'IO_LATENCY', .2 )
+
+    # requests of all files are in flight at the same time
+    t0      = time.perf_counter()
+    read    = dict( tjk.prefetch_files( fnames + [ data_root / 'missing.dat' ], n_workers=9 ) )
+    assert time.perf_counter() - t0 < .2*len(shots)/2
+    assert read[ data_root / 'missing.dat' ] is None
+    for fname in fnames:
+        with open( fname, 'rb' ) as f:
+            assert read[fname] == f.read()
+
+    # at most max_inflight files are read ahead of the consumer
+    n_submitted = []
+    read_file   = tjk.read_file
+    def read_file_counted( fname, **kwargs ):
+        n_submitted.append( fname )
+        return read_file( fname, **kwargs )
+    monkeypatch.setattr( tjk, 'read_file', read_file_counted )
+    monkeypatch.setattr( tjk, 'IO_LATENCY', 0. )
+    prefetch    = tjk.prefetch_files( fnames, n_workers=2, max_inflight=3 )
+    next( prefetch )
+    assert len(n_submitted) <= 3
+    assert len( list( prefetch ) ) == len(fnames) - 1
+
+    traces  = tjk.get_traces_shots( shots + [13499], ['Zeit [ms]', 'optDiode'], t_start=10., t_end=20. )
+    assert list( traces ) == shots
+    for shot in shots:
+        in_window   = (data[shot][:,0] >= 10.) & (data[shot][:,0] <= 20.)
+        np.testing.assert_allclose( traces[shot]['optDiode'], data[shot][in_window,7], atol=1e-6 )
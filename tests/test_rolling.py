@@ -0,0 +1,49 @@
+# coding=utf-8
+
+"""
+Tests of the rolling-window statistics (tjk_rolling.py) against a direct
+calculation for every window.
+"""
+
+
+# import standard modules
+import numpy as np
+import pytest
+
+import tjk_rolling
+
+
+def calc_direct( x, window, ddof=1 ):
+    stats   = { 'mean': np.empty( len(x) ), 'std': np.empty( len(x) ), 'median': np.empty( len(x) ) }
+    for ii in range( len(x) ):
+        values  = x[ max( 0, ii-window+1 ):ii+1 ]
+        stats['mean'][ii]   = np.mean( values )
+        stats['std'][ii]    = np.std( values, ddof=ddof ) if len(values) > ddof else np.nan
+        stats['median'][ii] = np.median( values )
+    return stats
+
+
+@pytest.mark.parametrize( 'window', [ 1, 2, 7, 10, 64 ] )
+@pytest.mark.parametrize( 'n_pts', [ 1, 63, 200 ] )
+def test_chunked_equals_direct( window, n_pts ):
+    x       = np.random.default_rng( window ).normal( size=n_pts ) + 1e3
+    direct  = calc_direct( x, window )
+    stats   = tjk_rolling.rolling_stats( x, window, stats=('mean', 'std', 'median'), chunk_size=17 )
+    np.testing.assert_allclose( stats['mean'], direct['mean'], rtol=0, atol=1e-9 )
+    np.testing.assert_allclose( stats['std'], direct['std'], rtol=0, atol=1e-9 )
+    np.testing.assert_array_equal( stats['median'], direct['median'] )
+
+
+def test_std_with_offset():
+    # small fluctuations on a large offset, prone to cancellation
+    x       = 1e6 + 1e-3*np.random.default_rng( 0 ).normal( size=1000 )
+    direct  = calc_direct( x, 2 )
+    mean, std   = tjk_rolling.calc_rolling_sums( x, 2 )
+    np.testing.assert_allclose( std[1:], direct['std'][1:], rtol=1e-6 )
+
+
+def test_median_without_scipy( monkeypatch ):
+    monkeypatch.setattr( tjk_rolling, 'scipy', None )
+    x       = np.random.default_rng( 1 ).normal( size=300 )
+    stats   = tjk_rolling.rolling_stats( x, 10, stats=('median',), chunk_size=31 )
+    np.testing.assert_array_equal( stats['median'], calc_direct( x, 10 )['median'] )
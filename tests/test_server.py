@@ -0,0 +1,83 @@
+# coding=utf-8
+
+"""
+Tests of the HTTP server (tjk_server.py) on localhost: shot info, tiles and
+summary rows of a range of shots.
+"""
+
+
+# import standard modules
+import json
+import numpy as np
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from conftest import write_shot
+import tjk_server
+import tjk_summary
+
+
+@pytest.fixture
+def server( tjk, tmp_path, monkeypatch ):
+    """Server on an ephemeral port of localhost, data of shots 13400 and 13401."""
+    monkeypatch.setattr( tjk, 'DATA_ROOTS', [ str( tmp_path ) ] )
+    monkeypatch.setattr( tjk_summary, 'FNAME_DB', str( tmp_path / 'summary.sqlite' ) )
+    data    = { shot: write_shot( tmp_path / 'shot{0}'.format( shot ) / 'interferometer' /
+                                  'shot{0}.dat'.format( shot ), shot, n_rows=5000, seed=shot )
+                for shot in [ 13400, 13401 ] }
+    tjk_summary.ingest_shots( list( data ), n_workers=1 )
+
+    server  = tjk_server.make_server( host='localhost', port=0 )
+    thread  = threading.Thread( target=server.serve_forever, daemon=True )
+    thread.start()
+    yield [ 'http://localhost:{0}'.format( server.server_address[1] ), data ]
+    server.shutdown()
+    server.server_close()
+    thread.join( timeout=5 )
+
+
+def get( url ):
+    with urllib.request.urlopen( url, timeout=10 ) as response:
+        return [ response.read(), response.headers ]
+
+
+def test_shot_info_and_tiles( server ):
+    url, data   = server
+    info    = json.loads( get( url + '/api/shot/13400' )[0] )
+    assert info['n_rows'] == 5000
+    assert 'optDiode' in info['channels']
+    assert info['n_levels'] == 4
+
+    # level 0, binary: samples of the first tile
+    body, headers   = get( url + '/api/shot/13400/tile?channel=optDiode&level=0&index=1&format=bin' )
+    n_bins  = int( headers['X-Tile-Bins'] )
+    assert n_bins == tjk_server.TILE_SIZE
+    t       = np.frombuffer( body, dtype='<f8', count=n_bins )
+    v_min   = np.frombuffer( body, dtype='<f4', count=n_bins, offset=8*n_bins )
+    np.testing.assert_array_equal( t, data[13400][1024:2048,0] )
+    np.testing.assert_allclose( v_min, data[13400][1024:2048,7], atol=1e-6 )
+
+    # coarsest level, JSON: one tile covers the whole shot with min/max of 8 samples
+    tile    = json.loads( get( url + '/api/shot/13400/tile?channel=optDiode&level=3&index=0' )[0] )
+    assert len(tile['t']) == 625
+    np.testing.assert_allclose( tile['max'], data[13400][:,7].reshape( -1, 8 ).max( axis=1 ), atol=1e-6 )
+
+    # served from the tile cache the second time, its size is counted
+    assert get( url + '/api/shot/13400/tile?channel=optDiode&level=3&index=0' )[0] == json.dumps( tile ).encode()
+    assert tjk_server.tile_cache['nbytes'] == sum( len(encoded[0])
+                                                   for encoded in tjk_server.tile_cache['entries'].values() )
+
+    with pytest.raises( urllib.error.HTTPError ) as err:
+        get( url + '/api/shot/13400/tile?channel=optDiode&level=0&index=5' )
+    assert err.value.code == 404
+
+
+def test_shots_range( server ):
+    url, data   = server
+    rows    = json.loads( get( url + '/api/shots?shot_start=13400&shot_end=13401' )[0] )
+    assert [ row['shot'] for row in rows ] == [ 13400, 13401 ]
+    rows    = json.loads( get( url + '/api/shots?shot_start=13401&shot_end=13500' )[0] )
+    assert [ row['shot'] for row in rows ] == [ 13401 ]
@@ -0,0 +1,37 @@
+# coding=utf-8
+
+"""
+Tests of get_traces with the local shot cache service (tjk_shmcache.py).
+"""
+
+
+# import standard modules
+import numpy as np
+import os
+
+import pytest
+
+pytestmark  = pytest.mark.skipif( not os.path.isdir( '/dev/shm' ), reason='requires /dev/shm' )
+
+
+def test_traces_from_shmcache( tjk, shot_file, shmcache ):
+    fname_data, data    = shot_file
+    assert not isinstance( tjk.get_data_shmcache( fname_data ), int )
+
+    traces  = tjk.get_traces( 13400, ['Zeit [ms]', 'optDiode'], fname_in=fname_data, silent=True )
+    np.testing.assert_allclose( traces['optDiode'], data[:,7], atol=1e-6 )
+
+
+def test_calc_modifies_private_copy( tjk, shot_file, shmcache ):
+    fname_data, data    = shot_file
+    chName  = '2 GHz Richtk. forward'
+
+    # same call as without the service, the input is modified in place
+    U_in    = tjk.get_traces( 13400, [chName], fname_in=fname_data, silent=True )[chName]
+    power   = tjk.calc_2GHzPower( U_in, shot=13400 )
+    U_in   *= 1e3
+    assert np.all( np.isfinite( power ) )
+
+    # shared memory segment is not modified by the writes above
+    traces  = tjk.get_traces( 13400, [chName], fname_in=fname_data, silent=True )
+    np.testing.assert_allclose( traces[chName], data[:,4], atol=1e-6 )
@@ -0,0 +1,71 @@
+# coding=utf-8
+
+"""
+Tests of the lazy Shot object of TJK-monitor.py: data is read on first access
+only, kept until close, several channels are read in a single pass.
+"""
+
+
+# import standard modules
+import numpy as np
+
+import pytest
+
+from conftest import CHANNELS
+
+
+@pytest.fixture
+def counted_reads( tjk, monkeypatch ):
+    """Channels requested from get_traces, one list per call."""
+    get_traces  = tjk.get_traces
+    reads       = []
+    def get_traces_counted( shot, chNames, **kwargs ):
+        reads.append( list( chNames ) )
+        return get_traces( shot, chNames, **kwargs )
+    monkeypatch.setattr( tjk, 'get_traces', get_traces_counted )
+    return reads
+
+
+def test_lazy_traces( tjk, shot_file, counted_reads ):
+    fname_data, data    = shot_file
+    shot    = tjk.Shot( 13400, fname_in=fname_data )
+    assert shot.exists
+    # nothing read on creation
+    assert counted_reads == [] and len(shot.traces) == 0
+
+    np.testing.assert_array_equal( shot.time, data[:,0] )
+    np.testing.assert_allclose( shot.traces['optDiode'], data[:,7], atol=1e-6 )
+    assert shot.traces['optDiode'] is shot.traces['optDiode']
+    assert counted_reads == [ [ 'Zeit [ms]' ], [ 'optDiode' ] ]
+
+    # single pass for the channels not read yet
+    shot.traces.load( [ 'optDiode', 'Bolo_sum', 'Coil Temperature' ] )
+    assert counted_reads[-1] == [ 'Bolo_sum', 'Coil Temperature' ]
+    np.testing.assert_allclose( shot.traces['Bolo_sum'], data[:,8], atol=1e-6 )
+    assert len(counted_reads) == 3
+
+    with pytest.raises( KeyError ):
+        shot.traces['not recorded']
+    assert 'not recorded' not in shot.traces
+
+
+def test_cached_quantities( tjk, shot_file, counted_reads ):
+    fname_data, data    = shot_file
+    with tjk.Shot( 13400, fname_in=fname_data ) as shot:
+        assert [ chName for chName in shot.header if chName.strip() ] == CHANNELS
+        ne      = shot.ne
+        assert shot.ne is ne
+        np.testing.assert_allclose( ne, tjk.get_lineAvgDensity( data[:,10].astype( np.float32 ), 13400 ),
+                                    rtol=1e-5, atol=1e-6 )
+        assert counted_reads == [ [ 'Interferometer digital' ] ]
+    # released on close
+    assert len(shot.traces) == 0 and len(shot.cache) == 0
+    assert shot.traces['Interferometer digital'].shape == ( len(data), )
+    assert len(counted_reads) == 2
+
+
+def test_missing_shot( tjk, tmp_path ):
+    shot    = tjk.Shot( 13499, fname_in=tmp_path / 'shot13499.dat' )
+    assert not shot.exists
+    with pytest.raises( KeyError ):
+        shot.time
@@ -0,0 +1,82 @@
+# coding=utf-8
+
+"""
+Tests of the summary database (tjk_summary.py): ingest, query and command
+line, including header-only and missing shots.
+"""
+
+
+# import standard modules
+import os
+import sys
+
+import pytest
+
+from conftest import get_fname_shot, write_shot
+import tjk_summary
+
+
+@pytest.fixture
+def fname_db( tjk, tmp_path, monkeypatch ):
+    """Summary database in a temporary folder."""
+    fname_db    = str( tmp_path / 'summary.sqlite' )
+    monkeypatch.setattr( tjk_summary, 'FNAME_DB', fname_db )
+    return fname_db
+
+
+def test_ingest_and_query( data_root, fname_db ):
+    for shot in [ 13410, 13412 ]:
+        write_shot( get_fname_shot( data_root, shot ), shot, n_rows=2000, seed=shot )
+    # header only (still being written), 13413 does not exist
+    write_shot( get_fname_shot( data_root, 13411 ), 13411, n_rows=0 )
+
+    assert tjk_summary.ingest_shots( [ 13410, 13411, 13412, 13413 ], n_workers=2 ) == 3
+    assert tjk_summary.get_shots() == [ 13410, 13411, 13412 ]
+    row     = tjk_summary.query_summary( where='shot=?', params=(13411,) )[0]
+    # NaN is stored as NULL
+    assert row['B0_max'] is None
+    row     = tjk_summary.query_summary( where='shot=?', params=(13410,) )[0]
+    assert row['fname'] == str( get_fname_shot( data_root, 13410 ) )
+    assert row['B0_max'] is not None
+
+    # nothing changed, nothing recalculated
+    assert tjk_summary.ingest_shots( [ 13410, 13411, 13412, 13413 ] ) == 0
+    # header-only file completed, only this shot is recalculated
+    write_shot( get_fname_shot( data_root, 13411 ), 13411, n_rows=2000 )
+    os.utime( get_fname_shot( data_root, 13411 ), ns=( 0, 10**18 ) )
+    assert tjk_summary.ingest_shots( [ 13410, 13411, 13412, 13413 ] ) == 1
+    assert tjk_summary.query_summary( where='shot=?', params=(13411,) )[0]['B0_max'] is not None
+    assert tjk_summary.ingest_shots( [ 13410, 13411 ], force=True ) == 2
+
+
+def test_ingest_failing_shot( data_root, fname_db, monkeypatch, capsys ):
+    for shot in [ 13410, 13411, 13412 ]:
+        write_shot( get_fname_shot( data_root, shot ), shot, n_rows=2000, seed=shot )
+
+    calc_summary    = tjk_summary.calc_summary
+    def calc_summary_failing( shot, **kwargs ):
+        if shot == 13411:
+            raise ValueError( 'corrupt file' )
+        return calc_summary( shot, **kwargs )
+    monkeypatch.setattr( tjk_summary, 'calc_summary', calc_summary_failing )
+
+    # the other shots of the batch are stored
+    assert tjk_summary.ingest_shots( [ 13410, 13411, 13412 ], n_workers=2 ) == 2
+    assert tjk_summary.get_shots() == [ 13410, 13412 ]
+    assert 'shot 13411 skipped' in capsys.readouterr().out
+
+
+def test_command_line( data_root, fname_db, monkeypatch, capsys ):
+    for shot in [ 13410, 13411 ]:
+        write_shot( get_fname_shot( data_root, shot ), shot, n_rows=2000, seed=shot )
+
+    monkeypatch.setattr( sys, 'argv', [ 'tjk_summary.py', 'ingest', '-s', '13410', '-e', '13412' ] )
+    tjk_summary.main()
+    assert '2 shots ingested' in capsys.readouterr().out
+
+    monkeypatch.setattr( sys, 'argv', [ 'tjk_summary.py', 'query', '-w', 'shot>13410', '-c', 'shot,fname' ] )
+    tjk_summary.main()
+    lines   = capsys.readouterr().out.splitlines()
+    assert lines[0] == 'shot\tfname'
+    assert lines[1] == '13411\t{0}'.format( get_fname_shot( data_root, 13411 ) )
+    assert lines[-1] == '1 shots found'
@@ -0,0 +1,72 @@
+# coding=utf-8
+
+"""
+Tests of the implicit time axis (get_timebase, time_to_index, slice_timebase
+in TJK-monitor.py) for uniform, jittered, segmented and irregular samples.
+"""
+
+
+# import standard modules
+import numpy as np
+
+import pytest
+
+
+def get_time_axes():
+    """Time axes with the number of segments expected (None: explicit)."""
+    rng         = np.random.default_rng( 0 )
+    uniform     = 5. + .1*np.arange( 10000 )
+    jittered    = uniform + 1e-4*rng.uniform( -1, 1, size=len(uniform) )
+    # sampling rate changed, then a gap
+    segmented   = np.concatenate( ( .1*np.arange( 3000 ), 300. + .05*np.arange( 2000 ),
+                                    500. + .1*np.arange( 1000 ) ) )
+    irregular   = np.cumsum( rng.uniform( .05, .15, size=5000 ) )
+    return [ [ 'uniform', uniform, 1 ], [ 'jittered', jittered, 1 ],
+             [ 'segmented', segmented, 3 ], [ 'irregular', irregular, None ] ]
+
+
+@pytest.mark.parametrize( 'name, time, n_segments', get_time_axes() )
+def test_timebase( tjk, name, time, n_segments ):
+    timebase    = tjk.get_timebase( time )
+    assert timebase['n'] == len(time)
+    if n_segments is None:
+        assert timebase['time'] is not None
+    else:
+        assert timebase['time'] is None
+        assert len(timebase['segments']) == n_segments
+    # deviations of jittered samples are within the tolerance
+    time_implicit   = tjk.timebase_to_time( timebase )
+    np.testing.assert_allclose( time_implicit, time, rtol=0, atol=tjk.TIMEBASE_RTOL*.1 )
+
+    # same as searchsorted on the explicit time axis
+    t_query = np.concatenate( ( time_implicit[::97], time_implicit[::89] + 1e-3, time_implicit[::83] - 1e-3,
+                                [ time[0] - 1., time[-1] + 1., time_implicit[-1] ] ) )
+    for side in [ 'left', 'right' ]:
+        for t in t_query:
+            assert tjk.time_to_index( timebase, t, side=side ) == np.searchsorted( time_implicit, t, side=side )
+
+
+@pytest.mark.parametrize( 'name, time, n_segments', get_time_axes() )
+def test_slice_timebase( tjk, name, time, n_segments ):
+    timebase    = tjk.get_timebase( time )
+    for ii_start, ii_end in [ (0, len(time)), (10, 20), (2990, 3010), (2500, 5500),
+                              (len(time)-1, len(time)), (100, 100), (len(time)-5, len(time)+10) ]:
+        sliced  = tjk.slice_timebase( timebase, ii_start, ii_end )
+        assert sliced['n'] == len(time[ii_start:ii_end])
+        np.testing.assert_allclose( tjk.timebase_to_time( sliced ), time[ii_start:ii_end], rtol=0,
+                                    atol=tjk.TIMEBASE_RTOL*.1 )
+        np.testing.assert_allclose( tjk.timebase_to_time( timebase, ii_start, min( ii_end, len(time) ) ),
+                                    time[ii_start:ii_end], rtol=0, atol=tjk.TIMEBASE_RTOL*.1 )
+
+
+def test_file_timebase( tjk, shot_file, monkeypatch ):
+    fname_data, data    = shot_file
+    timebase    = tjk.get_file_timebase( fname_data )
+    assert timebase['segments'] == [ [ 0, 0., pytest.approx( .1 ) ] ]
+    np.testing.assert_allclose( tjk.timebase_to_time( timebase ), data[:,0], atol=1e-9 )
+
+    # stored, the time column is not parsed again
+    def read_data( *args, **kwargs ):
+        raise AssertionError( 'time column parsed' )
+    monkeypatch.setattr( tjk, 'read_data', read_data )
+    assert tjk.get_file_timebase( fname_data ) == timebase
@@ -0,0 +1,82 @@
+# coding=utf-8
+
+"""
+Tests of the watcher (tjk_watcher.py) in polling mode: shots written after
+start are ingested, header-only and failing shots do not stop it.
+"""
+
+
+# import standard modules
+import glob
+import os
+import time
+import types
+
+import pytest
+
+from conftest import get_fname_shot, write_shot
+import tjk_quicklook
+import tjk_summary
+import tjk_watcher
+
+
+@pytest.fixture
+def watcher( tjk, data_root, tmp_path, monkeypatch ):
+    """Runs watch_roots, calls actions[n_iter] before the n_iter-th scan."""
+    monkeypatch.setattr( tjk_summary, 'FNAME_DB', str( tmp_path / 'summary.sqlite' ) )
+    monkeypatch.setattr( tjk_quicklook, 'QUICKLOOK_DIR', str( tmp_path / 'quicklook' ) )
+    # existing shot, only newer shots are considered
+    write_shot( get_fname_shot( data_root, 13420 ), 13420, n_rows=2000 )
+
+    def run( actions, max_iter ):
+        n_iter  = []
+        def sleep( seconds ):
+            n_iter.append( seconds )
+            if len(n_iter) in actions:
+                actions[len(n_iter)]()
+        monkeypatch.setattr( tjk_watcher, 'time', types.SimpleNamespace( time=time.time, sleep=sleep ) )
+        tjk_watcher.watch_roots( roots=[ str( data_root ) ], settle_time=0., use_inotify=False,
+                                 max_iter=max_iter )
+        assert len(n_iter) == max_iter
+
+    return run
+
+
+def get_quicklooks( shot ):
+    return glob.glob( os.path.join( tjk_quicklook.QUICKLOOK_DIR, '{0}_*.png'.format( shot ) ) )
+
+
+def test_new_and_header_only_shots( tjk, data_root, watcher ):
+    fname_13421 = get_fname_shot( data_root, 13421 )
+    def complete():
+        # header only (still being written): neither binary cache nor summary
+        assert isinstance( tjk.get_npy_cache( fname_13421 ), int )
+        assert tjk_summary.get_shots() == []
+        write_shot( fname_13421, 13421, n_rows=2000 )
+        os.utime( fname_13421, ns=( 0, 10**18 ) )
+    watcher( { 1: lambda: write_shot( fname_13421, 13421, n_rows=0 ),
+               2: complete,
+               3: lambda: write_shot( get_fname_shot( data_root, 13422 ), 13422, n_rows=2000 ) },
+             max_iter=4 )
+
+    assert tjk_summary.get_shots() == [ 13421, 13422 ]
+    for shot in [ 13421, 13422 ]:
+        assert len( get_quicklooks( shot ) ) == 1
+        assert not isinstance( tjk.get_npy_cache( get_fname_shot( data_root, shot ) ), int )
+    assert len( get_quicklooks( 13420 ) ) == 0
+
+
+def test_failing_shot( data_root, watcher, monkeypatch, capsys ):
+    ingest_shots    = tjk_summary.ingest_shots
+    def ingest_shots_failing( shots, **kwargs ):
+        if 13421 in shots:
+            raise IndexError( 'index 7 is out of bounds' )
+        return ingest_shots( shots, **kwargs )
+    monkeypatch.setattr( tjk_summary, 'ingest_shots', ingest_shots_failing )
+
+    watcher( { 1: lambda: write_shot( get_fname_shot( data_root, 13421 ), 13421, n_rows=2000 ),
+               2: lambda: write_shot( get_fname_shot( data_root, 13422 ), 13422, n_rows=2000 ) },
+             max_iter=3 )
+    assert 'shot 13421 could not be ingested (IndexError' in capsys.readouterr().out
+    assert tjk_summary.get_shots() == [ 13422 ]
+    assert len( get_quicklooks( 13422 ) ) == 1
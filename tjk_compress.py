@@ -0,0 +1,243 @@
+# coding=utf-8
+
+__author__      = 'Alf Köhn-Seemann'
+__email__       = 'koehn@igvp.uni-stuttgart.de'
+__copyright__   = 'University of Stuttgart'
+__license__     = 'MIT'
+
+"""
+Compression of tjk-monitor files with random access.
+
+The file is compressed in independent blocks (gzip members or zstd frames)
+of a fixed number of rows, the header is a block of its own. The result is
+a valid .gz/.zst file (gunzip, zstd -d work as usual), additionally an index
+of the block offsets and the row index (see get_row_index in TJK-monitor.py)
+is stored next to it. The readers in TJK-monitor.py then decompress only the
+blocks they need, e.g. for the header or a time window, full reads
+decompress all blocks in parallel. Compressed files are found automatically
+if the uncompressed one does not exist, e.g.
+
+    python tjk_compress.py -s 8000 -e 9999 --remove
+"""
+
+
+# import standard modules
+import argparse
+import concurrent.futures
+import numpy as np
+import os
+import zlib
+
+# import some TJ-K related function
+import importlib    # required due to the dash in the filename
+tjk = importlib.import_module("TJK-monitor")
+
+
+# number of rows per compressed block (multiple of the step of the row index)
+ROWS_PER_BLOCK  = 10000
+
+# default compression levels
+COMPRESSION_LEVELS  = { '.gz': 6, '.zst': 9 }
+
+
+def compress_block( data, fmt, level ):
+    #{{{
+    """
+    Compresses a block into a single gzip member or zstd frame.
+
+    Parameters
+    ----------
+    data : bytes
+        Uncompressed block.
+    fmt : str
+        Compression format, '.gz' or '.zst'.
+    level : int
+        Compression level.
+
+    Returns
+    -------
+    bytes
+        Compressed block.
+    """
+
+    if fmt == '.gz':
+        compressor  = zlib.compressobj( level, zlib.DEFLATED, 31 )
+        return compressor.compress( data ) + compressor.flush()
+
+    return tjk.zstandard.ZstdCompressor( level=level ).compress( data )
+    #}}}
+
+
+def compress_file( fname_data, fmt='.gz', level=None, rows_per_block=ROWS_PER_BLOCK,
+                   n_workers=None, remove=False, silent=True ):
+    #{{{
+    """
+    Compresses a tjk-monitor file in blocks and stores the block index.
+
+    Parameters
+    ----------
+    fname_data : str or pathlib.Path
+        Filename of the (uncompressed) tjk-monitor file.
+    fmt : str, optional
+        Compression format, one of tjk.COMPRESSED_SUFFIXES.
+    level : int, optional
+        Compression level, COMPRESSION_LEVELS if not set.
+    rows_per_block : int, optional
+        Number of rows per block, rounded to a multiple of the step of the
+        row index.
+    n_workers : int, optional
+        Number of blocks compressed in parallel, os.cpu_count() if not set.
+    remove : bool, optional
+        If True, the uncompressed file is removed afterwards.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    str
+        Filename of the compressed file, returns errValue (-1) on error.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    if fmt not in tjk.COMPRESSED_SUFFIXES:
+        print( 'compress_file: ERROR, unknown format <{0}>'.format( fmt ) )
+        return errValue
+    if (fmt == '.zst') and (tjk.zstandard is None):
+        print( 'compress_file: ERROR, module zstandard is required for <{0}>'.format( fmt ) )
+        return errValue
+    if level is None:
+        level   = COMPRESSION_LEVELS[fmt]
+
+    fstat       = os.stat( fname_data )
+    row_index   = tjk.get_row_index( fname_data, silent=silent )
+    if isinstance(row_index, int):
+        return errValue
+    with open( fname_data, 'rb' ) as f:
+        data    = f.read()
+    if len(data) != fstat.st_size:
+        print( 'compress_file: ERROR, <{0}> changed while being read'.format( fname_data ) )
+        return errValue
+
+    # header, blocks of rows, incomplete last line (if any) in last block
+    step        = max( 1, rows_per_block // int(row_index['n_rows_step']) )
+    uoffsets    = [ 0 ] + [ int(offset) for offset in row_index['offsets'][::step] ] + [ len(data) ]
+    uoffsets    = sorted( set( uoffsets ) )
+    blocks      = [ data[uoffsets[ii]:uoffsets[ii+1]] for ii in range( len(uoffsets)-1 ) ]
+
+    # zlib and zstandard release the GIL, i.e. threads are sufficient
+    with concurrent.futures.ThreadPoolExecutor( max_workers=n_workers or os.cpu_count() ) as executor:
+        blocks  = list( executor.map( lambda block: compress_block( block, fmt, level ), blocks ) )
+    coffsets    = np.concatenate( ( [0], np.cumsum( [ len(block) for block in blocks ] ) ) )
+
+    fname_comp  = str(fname_data) + fmt
+    fname_tmp   = '{0}.{1}.tmp'.format( fname_comp, os.getpid() )
+    try:
+        with open( fname_tmp, 'wb' ) as f_comp:
+            for block in blocks:
+                f_comp.write( block )
+        # keep the modification time of the original file
+        os.utime( fname_tmp, ns=( fstat.st_atime_ns, fstat.st_mtime_ns ) )
+        fstat_comp  = os.stat( fname_tmp )
+
+        block_index = { 'coffsets'  : coffsets.astype( np.int64 ),
+                        'uoffsets'  : np.array( uoffsets, dtype=np.int64 ),
+                        'size'      : np.int64( fstat_comp.st_size ),
+                        'mtime'     : np.int64( fstat_comp.st_mtime_ns ) }
+        for key in ['offsets', 'time', 'end', 'n_rows', 'n_cols', 'n_rows_step']:
+            block_index[key]    = row_index[key]
+        with open( fname_comp + tjk.BLOCK_INDEX_SUFFIX, 'wb' ) as f_index:
+            np.savez( f_index, **block_index )
+        os.replace( fname_tmp, fname_comp )
+    except OSError as err:
+        print( 'compress_file: ERROR, <{0}> could not be written: {1}'.format( fname_comp, err ) )
+        if os.path.isfile( fname_tmp ):
+            os.remove( fname_tmp )
+        return errValue
+
+    if remove:
+        os.remove( fname_data )
+
+    if not silent:
+        print( '    {0}: {1:.1f} MB -> {2:.1f} MB, {3} blocks'.format(
+                fname_comp, fstat.st_size/1024**2, coffsets[-1]/1024**2, len(blocks) ) )
+
+    return fname_comp
+    #}}}
+
+
+def compress_shots( shots, fmt='.gz', level=None, remove=False, silent=True ):
+    #{{{
+    """
+    Compresses the tjk-monitor files of several shots.
+
+    Shots which are already compressed or do not exist are skipped.
+
+    Parameters
+    ----------
+    shots : list of int
+        Shot numbers.
+    fmt : str, optional
+        Compression format, one of tjk.COMPRESSED_SUFFIXES.
+    level : int, optional
+        Compression level, COMPRESSION_LEVELS if not set.
+    remove : bool, optional
+        If True, the uncompressed files are removed afterwards.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    int
+        Number of files which were compressed.
+    """
+
+    n_done  = 0
+    for shot in shots:
+        fname_data  = tjk.get_fname_data( shot )
+        if (not os.path.isfile( fname_data )) or tjk.is_compressed( fname_data ):
+            continue
+        fname_comp  = compress_file( fname_data, fmt=fmt, level=level, remove=remove, silent=silent )
+        if not isinstance(fname_comp, int):
+            n_done += 1
+
+    return n_done
+    #}}}
+
+
+def main():
+#{{{
+    # initialize parser for command line options
+    parser  = argparse.ArgumentParser( description='compress tjk-monitor files with random access' )
+    parser.add_argument( "-s", "--shot_start", type=int, default=None,
+            help='First shot number' )
+    parser.add_argument( "-e", "--shot_end", type=int, default=None,
+            help='Last shot number (default: first shot number)' )
+    parser.add_argument( "-f", "--files", type=str, nargs='+', default=[],
+            help='Filenames of tjk-monitor files (instead of shot numbers)' )
+    parser.add_argument( "--format", type=str, default='.gz', choices=tjk.COMPRESSED_SUFFIXES,
+            help='Compression format' )
+    parser.add_argument( "-l", "--level", type=int, default=None,
+            help='Compression level' )
+    parser.add_argument( "--remove", action='store_true',
+            help='Remove the uncompressed files' )
+    # read all arguments from command line
+    args    = parser.parse_args()
+
+    n_done  = 0
+    for fname_data in args.files:
+        fname_comp  = compress_file( fname_data, fmt=args.format, level=args.level,
+                                     remove=args.remove, silent=False )
+        if not isinstance(fname_comp, int):
+            n_done += 1
+    if args.shot_start is not None:
+        shot_end    = args.shot_end if args.shot_end is not None else args.shot_start
+        n_done     += compress_shots( range( args.shot_start, shot_end+1 ), fmt=args.format,
+                                      level=args.level, remove=args.remove, silent=False )
+    print( '{0} files compressed'.format( n_done ) )
+#}}}
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,489 @@
+# coding=utf-8
+
+__author__      = 'Alf Köhn-Seemann'
+__email__       = 'koehn@igvp.uni-stuttgart.de'
+__copyright__   = 'University of Stuttgart'
+__license__     = 'MIT'
+
+"""
+Cross-correlation and coherence between channels of tjk-monitor data.
+
+Cross-correlations are calculated via FFT, block by block (overlap-save),
+i.e. the cost grows with n*log(max_lag) instead of n*max_lag and long traces
+are processed with bounded memory. Coherence is calculated from Welch cross
+spectra (see tjk_spectral.py). Several shots are processed in parallel, the
+lag and peak values can be stored in the summary database, e.g.
+
+    python tjk_correlation.py -s 13277 --max_lag 20
+    python tjk_correlation.py -s 12838-12887 --store
+"""
+
+
+# import standard modules
+import argparse
+import concurrent.futures
+import functools
+import numpy as np
+
+# import some TJ-K related function
+import importlib    # required due to the dash in the filename
+tjk = importlib.import_module("TJK-monitor")
+import tjk_spectral
+import tjk_summary
+
+
+# channel pairs typically correlated
+CORRELATION_PAIRS   = [ ( 'Interferometer digital', 'optDiode' ),
+                        ( 'Interferometer digital', 'Bolo_sum' ),
+                        ( 'optDiode',               'Bolo_sum' ) ]
+
+# columns of the correlation table in the summary database
+# units: lag in ms, frequency in Hz
+CORRELATION_COLUMNS = [ 'lag_peak', 'corr_peak', 'corr_zero', 'coh_mean', 'coh_max', 'f_coh_max' ]
+
+
+@functools.lru_cache( maxsize=32 )
+def get_fft_setup( max_lag, block_size=None ):
+    #{{{
+    """
+    Returns FFT length and block length for block-wise cross-correlation.
+
+    Parameters
+    ----------
+    max_lag : int
+        Maximum lag in samples.
+    block_size : int, optional
+        Number of samples per block, chosen such that the FFT length is a
+        power of two of at least 8 times the lag range if not set.
+
+    Returns
+    -------
+    list
+        List containing FFT length and block length.
+    """
+
+    n_lags  = 2*max_lag + 1
+    if block_size is None:
+        nfft        = 1 << int( np.ceil( np.log2( 8*n_lags ) ) )
+        block_size  = nfft - 2*max_lag
+    else:
+        nfft        = 1 << int( np.ceil( np.log2( block_size + 2*max_lag ) ) )
+
+    return [ nfft, block_size ]
+    #}}}
+
+
+def calc_xcorr( x, y, max_lag, block_size=None, n_batch=64 ):
+    #{{{
+    """
+    Returns the normalized cross-correlation of two time traces.
+
+    The trace x is split into blocks, each block is correlated with the
+    corresponding part of y extended by max_lag on both sides (overlap-save),
+    n_batch blocks are transformed at once.
+
+    Parameters
+    ----------
+    x : numpy.array
+        Time trace.
+    y : numpy.array
+        Time trace with the same length as x.
+    max_lag : int
+        Maximum lag in samples.
+    block_size : int, optional
+        Number of samples per block, see get_fft_setup.
+    n_batch : int, optional
+        Number of blocks transformed at once.
+
+    Returns
+    -------
+    numpy.array
+        Correlation coefficients for lags -max_lag to max_lag, the value at
+        lag k correlates x[i] with y[i+k], i.e. positive lags mean that y
+        follows x.
+    """
+
+    n_pts   = min( len(x), len(y) )
+    max_lag = int( min( max_lag, max( n_pts-1, 0 ) ) )
+    if n_pts < 2:
+        return np.full( 2*max_lag+1, np.nan )
+    nfft, block_size    = get_fft_setup( max_lag, block_size )
+
+    x_c     = np.asarray( x[:n_pts], dtype=np.float64 ) - np.mean( x[:n_pts] )
+    y_c     = np.asarray( y[:n_pts], dtype=np.float64 ) - np.mean( y[:n_pts] )
+    norm    = n_pts * np.std( x_c ) * np.std( y_c )
+
+    # zero-padded traces, blocks of y are extended by max_lag on both sides
+    n_blocks    = -(-n_pts // block_size)
+    x_pad       = np.zeros( n_blocks*block_size )
+    x_pad[:n_pts]   = x_c
+    y_pad       = np.zeros( n_blocks*block_size + 2*max_lag )
+    y_pad[max_lag:max_lag+n_pts]    = y_c
+    x_blocks    = x_pad.reshape( n_blocks, block_size )
+    y_blocks    = np.lib.stride_tricks.sliding_window_view( y_pad, block_size+2*max_lag )[::block_size][:n_blocks]
+
+    # cross spectra are summed up, only one inverse FFT is required
+    cross   = 0.
+    for ii in range( 0, n_blocks, n_batch ):
+        X       = np.fft.rfft( x_blocks[ii:ii+n_batch], n=nfft, axis=-1 )
+        Y       = np.fft.rfft( y_blocks[ii:ii+n_batch], n=nfft, axis=-1 )
+        cross   = cross + np.sum( np.conj( X )*Y, axis=0 )
+    corr    = np.fft.irfft( cross, n=nfft )[:2*max_lag+1]
+
+    if not (norm > 0):
+        return np.full( 2*max_lag+1, np.nan )
+
+    return corr / norm
+    #}}}
+
+
+def calc_coherence( x, y, fs, nperseg=1024, noverlap=None, window='hann', n_rows_chunk=100000 ):
+    #{{{
+    """
+    Returns the magnitude-squared coherence and cross phase of two traces.
+
+    Welch's method, the segments are taken chunk by chunk (see
+    tjk_spectral.iter_segments).
+
+    Parameters
+    ----------
+    x : numpy.array
+        Time trace.
+    y : numpy.array
+        Time trace with the same length as x.
+    fs : float
+        Sampling frequency in Hz.
+    nperseg : int, optional
+        Length of a segment.
+    noverlap : int, optional
+        Number of samples two neighbouring segments overlap, nperseg/2 if
+        not set.
+    window : str, optional
+        Name of the window function, one of tjk_spectral.WINDOWS.
+    n_rows_chunk : int, optional
+        Number of samples processed at once.
+
+    Returns
+    -------
+    list
+        List containing frequencies in Hz, coherence and cross phase in rad
+        (NaN if the traces are shorter than one segment).
+    """
+
+    if noverlap is None:
+        noverlap    = nperseg // 2
+
+    win, scale  = tjk_spectral.get_window( window, nperseg, fs )
+    freq        = np.fft.rfftfreq( nperseg, d=1./fs )
+
+    n_pts   = min( len(x), len(y) )
+    data    = np.column_stack( (x[:n_pts], y[:n_pts]) )
+    chunks  = ( data[ii:ii+n_rows_chunk] for ii in range( 0, n_pts, n_rows_chunk ) )
+
+    pxx = pyy = pxy = 0.
+    n_seg   = 0
+    for id_first, segments in tjk_spectral.iter_segments( chunks, nperseg, noverlap ):
+        segments    = segments - np.mean( segments, axis=-1, keepdims=True )
+        segments   *= win
+        spectra     = np.fft.rfft( segments, axis=-1 )
+        pxx         = pxx + np.sum( spectra[:,0].real**2 + spectra[:,0].imag**2, axis=0 )
+        pyy         = pyy + np.sum( spectra[:,1].real**2 + spectra[:,1].imag**2, axis=0 )
+        pxy         = pxy + np.sum( np.conj( spectra[:,0] )*spectra[:,1], axis=0 )
+        n_seg      += len(segments)
+
+    if n_seg == 0:
+        return [ freq, np.full( len(freq), np.nan ), np.full( len(freq), np.nan ) ]
+
+    with np.errstate( invalid='ignore', divide='ignore' ):
+        coherence   = (pxy.real**2 + pxy.imag**2) / (pxx * pyy)
+
+    return [ freq, coherence, np.angle( pxy ) ]
+    #}}}
+
+
+def get_correlations( shot, pairs=CORRELATION_PAIRS, fname_in='', max_lag=10., nperseg=1024,
+                      discharge_only=True, silent=True ):
+    #{{{
+    """
+    Calculates cross-correlation and coherence of channel pairs of a shot.
+
+    All channels are read at once (see Shot in TJK-monitor.py).
+
+    Parameters
+    ----------
+    shot : int
+        Shot number
+    pairs : list of tuple, optional
+        Pairs of channel names as written in the header of the file.
+    fname_in : str, optional
+        Allows to optionally specify a filename explicitely (if it would not
+        be located at the default locations, for example).
+    max_lag : float, optional
+        Maximum lag in ms.
+    nperseg : int, optional
+        Length of a segment for the coherence.
+    discharge_only : bool, optional
+        If True, only the discharge (see get_discharge_window) is used.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    dict
+        Dictionary with keys 'lag' (in ms), 'freq' (in Hz), 't_start' and
+        't_end' (time window used, in ms) and the pairs of channel names, the
+        values for the pairs are dictionaries with keys 'xcorr', 'coherence',
+        'phase' and the keys of CORRELATION_COLUMNS. Returns errValue (-1) on
+        error.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    with tjk.Shot( shot, fname_in=fname_in ) as shot_data:
+        if not shot_data.exists:
+            print( 'get_correlations: ERROR, no data found for shot {0}'.format( shot ) )
+            return errValue
+        chNames = list( dict.fromkeys( [ chName for pair in pairs for chName in pair ] ) )
+        missing = [ chName for chName in chNames if chName not in shot_data.header ]
+        if len(missing) > 0:
+            print( 'get_correlations: ERROR, <{0}> not recorded in shot {1}'.format( missing[0], shot ) )
+            return errValue
+        shot_data.traces.load( [ 'Zeit [ms]' ] + chNames )
+
+        time    = shot_data.time
+        if len(time) < 2:
+            return errValue
+        dt      = np.median( np.diff( time ) )
+        fs      = 1e3/dt
+
+        ii_start, ii_end    = 0, len(time)
+        if discharge_only:
+            try:
+                t_on, t_off = tjk.get_discharge_window( time, shot_data.pabs2 )
+            except KeyError:
+                t_on, t_off = np.nan, np.nan
+            if np.isfinite( t_on ):
+                ii_start, ii_end    = np.searchsorted( time, [t_on, t_off], side='left' )
+                ii_end += 1
+            elif not silent:
+                print( 'get_correlations: no discharge found, whole shot {0} used'.format( shot ) )
+
+        n_lag   = int( round( max_lag/dt ) )
+        result  = { 'lag'       : np.arange( -n_lag, n_lag+1 )*dt,
+                    't_start'   : time[ii_start],
+                    't_end'     : time[ii_end-1] }
+        for chName_x, chName_y in pairs:
+            x   = shot_data.traces[chName_x][ii_start:ii_end]
+            y   = shot_data.traces[chName_y][ii_start:ii_end]
+
+            xcorr   = calc_xcorr( x, y, n_lag )
+            freq, coherence, phase  = calc_coherence( x, y, fs, nperseg=nperseg )
+            result['freq']  = freq
+
+            pair    = { 'xcorr': xcorr, 'coherence': coherence, 'phase': phase }
+            if np.any( np.isfinite( xcorr ) ):
+                ii_peak             = np.nanargmax( np.abs( xcorr ) )
+                pair['lag_peak']    = result['lag'][ii_peak]
+                pair['corr_peak']   = xcorr[ii_peak]
+                pair['corr_zero']   = xcorr[len(xcorr)//2]
+            else:
+                pair['lag_peak']    = pair['corr_peak'] = pair['corr_zero'] = np.nan
+            # DC is excluded, segment means are removed
+            if np.any( np.isfinite( coherence[1:] ) ):
+                ii_max              = np.nanargmax( coherence[1:] ) + 1
+                pair['coh_max']     = coherence[ii_max]
+                pair['f_coh_max']   = freq[ii_max]
+                pair['coh_mean']    = np.nanmean( coherence[1:] )
+            else:
+                pair['coh_max']     = pair['f_coh_max'] = pair['coh_mean'] = np.nan
+            result[(chName_x, chName_y)]    = pair
+
+            if not silent:
+                print( '    shot={0}: {1} / {2}: peak {3:.3f} at lag {4:.3f} ms, max. coherence {5:.3f} at {6:.1f} Hz'.format(
+                        shot, chName_x, chName_y, pair['corr_peak'], pair['lag_peak'],
+                        pair['coh_max'], pair['f_coh_max'] ) )
+
+    return result
+    #}}}
+
+
+def get_correlations_shots( shots, pairs=CORRELATION_PAIRS, n_workers=4, **kwargs ):
+    #{{{
+    """
+    Calculates cross-correlation and coherence of channel pairs for many shots.
+
+    Shots are processed in parallel, keyword arguments are passed to
+    get_correlations.
+
+    Parameters
+    ----------
+    shots : list of int
+        Shot numbers.
+    pairs : list of tuple, optional
+        Pairs of channel names as written in the header of the file.
+    n_workers : int, optional
+        Number of shots processed in parallel.
+
+    Returns
+    -------
+    dict
+        Dictionary with shot numbers as keys and the results of
+        get_correlations as values, shots which could not be processed are
+        omitted.
+    """
+
+    with concurrent.futures.ThreadPoolExecutor( max_workers=n_workers ) as executor:
+        results = executor.map( lambda shot: get_correlations( shot, pairs=pairs, **kwargs ), shots )
+        results = dict( zip( shots, results ) )
+
+    return { shot: result for shot, result in results.items() if not isinstance(result, int) }
+    #}}}
+
+
+def open_correlation_db( fname_db='' ):
+    #{{{
+    """
+    Opens the summary database and creates the correlation table if necessary.
+
+    Parameters
+    ----------
+    fname_db : str, optional
+        Filename of the database, tjk_summary.FNAME_DB is used if not set.
+
+    Returns
+    -------
+    sqlite3.Connection
+    """
+
+    con = tjk_summary.open_db( fname_db )
+    con.execute( 'CREATE TABLE IF NOT EXISTS correlation ('
+                 'shot INTEGER, channel_x TEXT, channel_y TEXT, t_start REAL, t_end REAL, '
+                 + ', '.join( '{0} REAL'.format( column ) for column in CORRELATION_COLUMNS ) +
+                 ', PRIMARY KEY (shot, channel_x, channel_y))' )
+    con.commit()
+
+    return con
+    #}}}
+
+
+def store_correlations( results, fname_db='' ):
+    #{{{
+    """
+    Stores the lag and peak values of many shots in the summary database.
+
+    Parameters
+    ----------
+    results : dict
+        Dictionary as returned by get_correlations_shots.
+    fname_db : str, optional
+        Filename of the database, tjk_summary.FNAME_DB is used if not set.
+
+    Returns
+    -------
+    int
+        Number of rows written.
+    """
+
+    rows    = []
+    for shot, result in results.items():
+        for key, pair in result.items():
+            if not isinstance(key, tuple):
+                continue
+            # sqlite3 does not know numpy types
+            rows.append( [ int(shot), key[0], key[1], float( result['t_start'] ), float( result['t_end'] ) ]
+                         + [ float( pair[column] ) for column in CORRELATION_COLUMNS ] )
+
+    con = open_correlation_db( fname_db )
+    con.executemany( 'INSERT OR REPLACE INTO correlation VALUES ({0})'.format(
+                        ', '.join( ['?']*(5+len(CORRELATION_COLUMNS)) ) ), rows )
+    con.commit()
+    con.close()
+
+    return len(rows)
+    #}}}
+
+
+def plot_correlations( result, fig, title='' ):
+    #{{{
+    """
+    Plots cross-correlation (left column) and coherence (right column).
+
+    Parameters
+    ----------
+    result : dict
+        Result of get_correlations.
+    fig : matplotlib.figure.Figure
+        Figure to plot into, will be cleared.
+    title : str, optional
+        Title on top of the figure.
+    """
+
+    fig.clf()
+
+    pairs   = [ key for key in result if isinstance(key, tuple) ]
+    n_rows  = len(pairs)
+    for ii, pair in enumerate( pairs ):
+        ax_corr = fig.add_subplot( n_rows, 2, 2*ii+1 )
+        ax_corr.plot( result['lag'], result[pair]['xcorr'] )
+        ax_corr.axvline( result[pair]['lag_peak'], color='grey', linestyle='--' )
+        ax_corr.set_ylabel( '{0} /\n{1}'.format( *pair ) )
+
+        ax_coh  = fig.add_subplot( n_rows, 2, 2*ii+2 )
+        ax_coh.plot( result['freq'][1:]*1e-3, result[pair]['coherence'][1:] )
+        ax_coh.set_ylim( 0, 1 )
+        ax_coh.set_ylabel( 'coherence' )
+
+        if ii == n_rows-1:
+            ax_corr.set_xlabel( 'lag in ms' )
+            ax_coh.set_xlabel( 'f in kHz' )
+
+    if len(title) > 0:
+        fig.suptitle( title )
+    #}}}
+
+
+def main():
+#{{{
+    import matplotlib.pyplot as plt
+
+    # initialize parser for command line options
+    parser  = argparse.ArgumentParser( description='cross-correlation and coherence of tjk-monitor channels' )
+    parser.add_argument( "-s", "--shots", type=str, default='13277',
+            help='Shot numbers, e.g. "12838-12887,12890"' )
+    parser.add_argument( "-p", "--pairs", type=str, nargs='+', default=None,
+            help='Channel pairs separated by a colon, e.g. "optDiode:Bolo_sum"' )
+    parser.add_argument( "--max_lag", type=float, default=10.,
+            help='Maximum lag in ms' )
+    parser.add_argument( "-n", "--nperseg", type=int, default=1024,
+            help='Number of samples per segment for the coherence' )
+    parser.add_argument( "--whole_shot", action='store_true',
+            help='Use the whole shot instead of the discharge only' )
+    parser.add_argument( "-j", "--n_workers", type=int, default=4,
+            help='Number of shots processed in parallel' )
+    parser.add_argument( "--store", action='store_true',
+            help='Store lag and peak values in the summary database' )
+    # read all arguments from command line
+    args    = parser.parse_args()
+
+    shots   = tjk.parse_shot_list( args.shots )
+    if isinstance(shots, int):
+        print( 'ERROR: invalid list of shots <{0}>'.format( args.shots ) )
+        return
+    pairs   = CORRELATION_PAIRS if args.pairs is None else [ tuple( pair.split( ':' ) ) for pair in args.pairs ]
+
+    results = get_correlations_shots( shots, pairs=pairs, n_workers=args.n_workers,
+                                      max_lag=args.max_lag, nperseg=args.nperseg,
+                                      discharge_only=not args.whole_shot, silent=False )
+    if args.store:
+        print( '{0} rows stored'.format( store_correlations( results ) ) )
+    elif len(results) == 1:
+        shot    = list( results )[0]
+        fig     = plt.figure( figsize=(10,8) )
+        plot_correlations( results[shot], fig, title='#{0}'.format( shot ) )
+        plt.show()
+#}}}
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,463 @@
+# coding=utf-8
+
+__author__      = 'Alf Köhn-Seemann'
+__email__       = 'koehn@igvp.uni-stuttgart.de'
+__copyright__   = 'University of Stuttgart'
+__license__     = 'MIT'
+
+"""
+Bulk export of time traces of many shots into a single binary file.
+
+Shots are read and processed in parallel and written chunk by chunk (one
+chunk per shot), i.e. memory usage is bounded independent of the number of
+shots. Chunks are written in the order of the requested shots. The file
+contains an index at the end, every chunk can be accessed directly as
+memory-mapped array; with a common time axis, all shots together can be
+accessed as one (shot x time x channel) array, e.g.
+
+    python tjk_export.py -s 12838 -e 12887 -c I_Bh Pressure --dt 1 -o scan.tjkx
+
+Instead of the traces, a summary row (see SUMMARY_STATS) per shot and channel
+can be exported, accessible as one (shot x channel x statistic) array:
+
+    python tjk_export.py -s 12838 -e 12887 -c I_Bh Pressure --summary -o scan.tjkx
+
+File layout:
+    8 bytes     magic string EXPORT_MAGIC
+    8 bytes     offset of the index (uint64, little endian)
+    ...         chunks, C-ordered arrays with shape (n_rows, n_channels), or
+                (n_channels, n_stats) for a summary export, each preceded by
+                the time axis (float64) of the shot if there is no common one
+    ...         index, JSON encoded
+"""
+
+
+# import standard modules
+import argparse
+import collections
+import concurrent.futures
+import json
+import numpy as np
+import os
+import struct
+
+# import some TJ-K related function
+import importlib    # required due to the dash in the filename
+tjk = importlib.import_module("TJK-monitor")
+
+
+EXPORT_MAGIC    = b'TJKEXP02'
+
+# statistics of the summary export, numpy functions applied to each trace
+SUMMARY_STATS   = [ 'mean', 'std', 'min', 'max' ]
+
+
+def calc_export_chunk( shot, chNames, time_common=None, t_start=None, t_end=None,
+                       dtype='float32', summary=False ):
+    #{{{
+    """
+    Reads and processes the time traces of one shot for the export.
+
+    Parameters
+    ----------
+    shot : int
+        Shot number
+    chNames : list of str
+        Names of the channels as written in the header of the file.
+    time_common : numpy.array, optional
+        Common time axis in ms, traces are resampled onto it (NaN outside of
+        the time range of the shot). If not set, the original samples are
+        exported together with their time axis.
+    t_start : float, optional
+        Start of time window in ms.
+    t_end : float, optional
+        End of time window in ms.
+    dtype : str, optional
+        Data type of the exported values.
+    summary : bool, optional
+        If True, the statistics SUMMARY_STATS of each trace are exported
+        instead of the trace.
+
+    Returns
+    -------
+    list
+        List containing the time axis in ms (float64, None with common time
+        axis or for a summary) and a 2D numpy.array with shape
+        (n_rows, n_channels), or (n_channels, n_stats) for a summary. Returns
+        errValue (-1) on error.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    fname_data  = tjk.get_fname_data( shot )
+    if not os.path.isfile( fname_data ):
+        return errValue
+
+    traces  = tjk.get_traces( shot, ['Zeit [ms]'] + list(chNames), t_start=t_start, t_end=t_end,
+                              buffer=tjk.read_file( fname_data ), silent=True )
+    if isinstance(traces, int):
+        return errValue
+
+    # time is kept in float64, ms timestamps of long shots do not fit into float32
+    time    = traces['Zeit [ms]']
+    if summary:
+        if len(time) == 0:
+            return errValue
+        chunk   = np.array( [ [ getattr( np, stat )( traces[chName] ) for stat in SUMMARY_STATS ]
+                              for chName in chNames ], dtype=dtype )
+        time    = None
+    elif time_common is None:
+        chunk   = np.empty( (len(time), len(chNames)), dtype=dtype )
+        for ii, chName in enumerate( chNames ):
+            chunk[:,ii]     = traces[chName]
+        time    = np.ascontiguousarray( time, dtype='<f8' )
+    else:
+        resampled   = tjk.resample_traces( [time]*len(chNames),
+                                           [ traces[chName] for chName in chNames ],
+                                           time_common )
+        chunk   = np.ascontiguousarray( resampled.T, dtype=dtype )
+        time    = None
+
+    return [ time, chunk ]
+    #}}}
+
+
+def export_shots( fname_out, shots, chNames, dt=None, t_start=None, t_end=None,
+                  dtype='float32', summary=False, n_workers=8, max_inflight=None, silent=True ):
+    #{{{
+    """
+    Exports time traces of many shots into a single binary file.
+
+    Shots are written in the given order, missing shots are skipped.
+
+    Parameters
+    ----------
+    fname_out : str
+        Filename of the export file.
+    shots : list of int
+        Shot numbers.
+    chNames : list of str
+        Names of the channels as written in the header of the file.
+    dt : float, optional
+        If set, all traces are resampled onto a common time axis with this
+        step in ms, ranging from t_start to t_end (both required then).
+    t_start : float, optional
+        Start of time window in ms.
+    t_end : float, optional
+        End of time window in ms.
+    dtype : str, optional
+        Data type of the exported values.
+    summary : bool, optional
+        If True, a summary row (see SUMMARY_STATS) per shot and channel is
+        exported instead of the traces (no common time axis then).
+    n_workers : int, optional
+        Number of shots processed in parallel.
+    max_inflight : int, optional
+        Maximum number of processed shots kept in memory, 2*n_workers if
+        not set.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    dict
+        Index of the export file, returns errValue (-1) on error.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    if max_inflight is None:
+        max_inflight    = 2*n_workers
+
+    if summary and (dt is not None):
+        print( 'export_shots: ERROR, summary export has no common time axis' )
+        return errValue
+    if dt is not None:
+        if (t_start is None) or (t_end is None):
+            print( 'export_shots: ERROR, common time axis requires t_start and t_end' )
+            return errValue
+        time_common = t_start + dt*np.arange( int( np.floor( (t_end - t_start)/dt ) ) + 1 )
+    else:
+        time_common = None
+
+    index   = { 'channels'  : list( chNames ),
+                'dtype'     : np.dtype( dtype ).str,
+                'timebase'  : None if dt is None else { 't_start': t_start, 'dt': dt,
+                                                        'n': len(time_common) },
+                'summary'   : list( SUMMARY_STATS ) if summary else None,
+                't_start'   : t_start,
+                't_end'     : t_end,
+                'shots'     : [],
+              }
+
+    shots   = iter( shots )
+    with open( fname_out, 'wb' ) as f_out:
+        # placeholder for offset of index
+        f_out.write( EXPORT_MAGIC + struct.pack( '<Q', 0 ) )
+
+        with concurrent.futures.ThreadPoolExecutor( max_workers=n_workers ) as executor:
+            # futures in the order of the shots, chunks are written in this order
+            inflight    = collections.deque()
+            while True:
+                # bounded number of shots in flight, keeps memory usage bounded
+                for shot in shots:
+                    future  = executor.submit( calc_export_chunk, shot, chNames,
+                                               time_common=time_common, t_start=t_start,
+                                               t_end=t_end, dtype=dtype, summary=summary )
+                    inflight.append( ( shot, future ) )
+                    if len(inflight) >= max_inflight:
+                        break
+                if len(inflight) == 0:
+                    break
+
+                shot, future    = inflight.popleft()
+                result          = future.result()
+                if isinstance(result, int):
+                    if not silent:
+                        print( 'export_shots: shot {0} skipped'.format( shot ) )
+                    continue
+                time, chunk     = result
+                entry   = { 'shot': shot, 'offset_time': None, 'n_rows': chunk.shape[0] }
+                if time is not None:
+                    entry['offset_time']    = f_out.tell()
+                    f_out.write( time.tobytes() )
+                entry['offset'] = f_out.tell()
+                f_out.write( chunk.tobytes() )
+                index['shots'].append( entry )
+                if not silent:
+                    print( 'export_shots: shot {0} written, {1} rows'.format( shot, chunk.shape[0] ) )
+
+        # append index and write its offset into the header
+        offset_index    = f_out.tell()
+        f_out.write( json.dumps( index ).encode() )
+        f_out.seek( len(EXPORT_MAGIC) )
+        f_out.write( struct.pack( '<Q', offset_index ) )
+
+    return index
+    #}}}
+
+
+def read_export_index( fname_in ):
+    #{{{
+    """
+    Returns the index of an export file.
+
+    Parameters
+    ----------
+    fname_in : str
+        Filename of the export file.
+
+    Returns
+    -------
+    dict
+        Index of the export file, returns errValue (-1) if the file is not
+        a (complete) export file.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    if not os.path.isfile( fname_in ):
+        print( 'read_export_index: ERROR, file <{0}> does not exist'.format( fname_in ) )
+        return errValue
+
+    with open( fname_in, 'rb' ) as f_in:
+        header  = f_in.read( len(EXPORT_MAGIC) + 8 )
+        if (len(header) < len(EXPORT_MAGIC) + 8) or (header[:len(EXPORT_MAGIC)] != EXPORT_MAGIC):
+            print( 'read_export_index: ERROR, <{0}> is not an export file'.format( fname_in ) )
+            return errValue
+        offset_index    = struct.unpack( '<Q', header[len(EXPORT_MAGIC):] )[0]
+        if offset_index == 0:
+            print( 'read_export_index: ERROR, <{0}> is incomplete'.format( fname_in ) )
+            return errValue
+        f_in.seek( offset_index )
+        try:
+            index   = json.loads( f_in.read().decode() )
+        except ValueError:
+            print( 'read_export_index: ERROR, index of <{0}> is corrupt'.format( fname_in ) )
+            return errValue
+
+    return index
+    #}}}
+
+
+def load_export_shot( fname_in, shot, index=None ):
+    #{{{
+    """
+    Returns the exported traces of one shot as memory-mapped array.
+
+    Parameters
+    ----------
+    fname_in : str
+        Filename of the export file.
+    shot : int
+        Shot number
+    index : dict, optional
+        Index of the export file, read from file if not set.
+
+    Returns
+    -------
+    list
+        List containing the time axis in ms (numpy.memmap, None with common
+        time axis or for a summary export) and a numpy.memmap with shape
+        (n_rows, n_channels), or (n_channels, n_stats) for a summary export.
+        Returns errValue (-1) if the shot is not in the file.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    if index is None:
+        index   = read_export_index( fname_in )
+        if isinstance(index, int):
+            return errValue
+    for entry in index['shots']:
+        if entry['shot'] == shot:
+            n_cols  = len(index['channels']) if index['summary'] is None else len(index['summary'])
+            data    = np.memmap( fname_in, dtype=index['dtype'], mode='r', offset=entry['offset'],
+                                 shape=( entry['n_rows'], n_cols ) )
+            if entry['offset_time'] is None:
+                time    = None
+            else:
+                time    = np.memmap( fname_in, dtype='<f8', mode='r', offset=entry['offset_time'],
+                                     shape=( entry['n_rows'], ) )
+            return [ time, data ]
+
+    print( 'load_export_shot: ERROR, shot {0} not in <{1}>'.format( shot, fname_in ) )
+    return errValue
+    #}}}
+
+
+def load_export_matrix( fname_in, index=None ):
+    #{{{
+    """
+    Returns all shots of an export file with common time axis as one array.
+
+    Parameters
+    ----------
+    fname_in : str
+        Filename of the export file.
+    index : dict, optional
+        Index of the export file, read from file if not set.
+
+    Returns
+    -------
+    list
+        List containing the shot numbers (in the order of the array), the
+        common time axis in ms and a numpy.memmap with shape
+        (n_shots, n_time, n_channels). Returns errValue (-1) if the file has
+        no common time axis.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    if index is None:
+        index   = read_export_index( fname_in )
+        if isinstance(index, int):
+            return errValue
+    if index['timebase'] is None:
+        print( 'load_export_matrix: ERROR, export file has no common time axis' )
+        return errValue
+
+    timebase    = index['timebase']
+    time        = timebase['t_start'] + timebase['dt']*np.arange( timebase['n'] )
+    shots       = [ entry['shot'] for entry in index['shots'] ]
+    if len(shots) == 0:
+        return [ shots, time, np.zeros( (0, timebase['n'], len(index['channels'])) ) ]
+
+    # chunks have equal size and are written back to back
+    matrix  = np.memmap( fname_in, dtype=index['dtype'], mode='r',
+                         offset=index['shots'][0]['offset'],
+                         shape=( len(shots), timebase['n'], len(index['channels']) ) )
+
+    return [ shots, time, matrix ]
+    #}}}
+
+
+def load_export_summary( fname_in, index=None ):
+    #{{{
+    """
+    Returns all shots of a summary export file as one array.
+
+    Parameters
+    ----------
+    fname_in : str
+        Filename of the export file.
+    index : dict, optional
+        Index of the export file, read from file if not set.
+
+    Returns
+    -------
+    list
+        List containing the shot numbers (in the order of the array) and a
+        numpy.memmap with shape (n_shots, n_channels, n_stats), channels and
+        statistics as in index['channels'] and index['summary']. Returns
+        errValue (-1) if the file is not a summary export.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    if index is None:
+        index   = read_export_index( fname_in )
+        if isinstance(index, int):
+            return errValue
+    if index['summary'] is None:
+        print( 'load_export_summary: ERROR, export file is not a summary export' )
+        return errValue
+
+    shots   = [ entry['shot'] for entry in index['shots'] ]
+    shape   = ( len(shots), len(index['channels']), len(index['summary']) )
+    if len(shots) == 0:
+        return [ shots, np.zeros( shape ) ]
+
+    # chunks have equal size and are written back to back
+    matrix  = np.memmap( fname_in, dtype=index['dtype'], mode='r',
+                         offset=index['shots'][0]['offset'], shape=shape )
+
+    return [ shots, matrix ]
+    #}}}
+
+
+def main():
+#{{{
+    # initialize parser for command line options
+    parser  = argparse.ArgumentParser( description='export time traces of many shots into one binary file' )
+    parser.add_argument( "-s", "--shot_start", type=int, required=True,
+            help='First shot number' )
+    parser.add_argument( "-e", "--shot_end", type=int, default=None,
+            help='Last shot number (default: first shot number)' )
+    parser.add_argument( "-c", "--channels", type=str, nargs='+', required=True,
+            help='Channel names' )
+    parser.add_argument( "-o", "--fname_out", type=str, required=True,
+            help='Filename of the export file' )
+    parser.add_argument( "--dt", type=float, default=None,
+            help='Step of common time axis in ms (requires --t_start and --t_end)' )
+    parser.add_argument( "--t_start", type=float, default=None,
+            help='Start of time window in ms' )
+    parser.add_argument( "--t_end", type=float, default=None,
+            help='End of time window in ms' )
+    parser.add_argument( "--dtype", type=str, default='float32',
+            help='Data type of exported values' )
+    parser.add_argument( "--summary", action='store_true',
+            help='Export summary rows ({0}) instead of traces'.format( ', '.join( SUMMARY_STATS ) ) )
+    parser.add_argument( "-j", "--n_workers", type=int, default=8,
+            help='Number of shots processed in parallel' )
+    # read all arguments from command line
+    args    = parser.parse_args()
+
+    shot_end    = args.shot_end if args.shot_end is not None else args.shot_start
+    index       = export_shots( args.fname_out, range( args.shot_start, shot_end+1 ), args.channels,
+                                dt=args.dt, t_start=args.t_start, t_end=args.t_end,
+                                dtype=args.dtype, summary=args.summary, n_workers=args.n_workers,
+                                silent=False )
+    if not isinstance(index, int):
+        print( '{0} shots exported to {1}'.format( len(index['shots']), args.fname_out ) )
+#}}}
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,375 @@
+# coding=utf-8
+
+__author__      = 'Alf Köhn-Seemann'
+__email__       = 'koehn@igvp.uni-stuttgart.de'
+__copyright__   = 'University of Stuttgart'
+__license__     = 'MIT'
+
+"""
+Time traces of a shot as a frame, handed to pandas or xarray without copies.
+
+A ShotFrame keeps the 2D buffer as returned by the readers of TJK-monitor.py
+(parsed array, memory-mapped binary cache or shared memory of the shot cache
+service) together with the names and column numbers of the requested
+channels, their units (see get_channel_config) and the implicit time axis
+(see get_timebase). to_pandas and to_xarray wrap the columns of this buffer,
+i.e. the columns of the DataFrame/Dataset are views of it and the time axis
+is built only once per frame, e.g.
+
+    import tjk_frame
+    frame   = tjk_frame.get_frame( 13277 )
+    df      = frame.to_pandas()
+    ds      = frame.to_xarray()
+
+The command line checks that no column is copied along the way:
+
+    python tjk_frame.py -s 13277
+"""
+
+
+# import standard modules
+import argparse
+import numpy as np
+import os
+import time
+import tracemalloc
+
+# pandas and xarray are only required for the conversions
+try:
+    import pandas
+except ImportError:
+    pandas = None
+try:
+    import xarray
+except ImportError:
+    xarray = None
+
+# import some TJ-K related function
+import importlib    # required due to the dash in the filename
+tjk = importlib.import_module("TJK-monitor")
+
+
+# unit of the raw signals for which get_channel_config gives no single factor
+RAW_UNIT    = 'V'
+
+
+def get_units( shot, chNames ):
+    #{{{
+    """
+    Returns the units of the recorded signals of channels.
+
+    The unit of get_channel_config is used if its conversion factor is 1, the
+    recorded signal is RAW_UNIT otherwise (and for unknown channels).
+
+    Parameters
+    ----------
+    shot : int
+        Shot number, required as channel names changed over time.
+    chNames : list of str
+        Names of the channels as written in the header of the file.
+
+    Returns
+    -------
+    dict
+        Dictionary with channel names as keys and units as values.
+    """
+
+    chCfg   = tjk.get_channel_config( shot )
+    units   = { chName: RAW_UNIT for chName in chNames }
+    if 'Zeit [ms]' in units:
+        units['Zeit [ms]']  = 'ms'
+    for chName, factor, unit, label in chCfg.values():
+        if (chName in units) and (factor == 1):
+            units[chName]   = unit
+
+    return units
+    #}}}
+
+
+class ShotFrame:
+    #{{{
+    """
+    Time traces of a shot as columns of a single 2D buffer.
+
+    The buffer is never copied: channels are views of its columns and the
+    conversions to pandas or xarray wrap these views. The buffer might hold
+    more columns than requested (e.g. the binary cache), only the requested
+    channels are exposed.
+    """
+
+    def __init__( self, shot, data, columns, usecols, timebase, units=None ):
+        """
+        Parameters
+        ----------
+        shot : int
+            Shot number
+        data : numpy.array
+            2D array with shape (n_rows, n_columns).
+        columns : list of str
+            Channel names.
+        usecols : list of int
+            Column of data for each channel.
+        timebase : dict
+            Time axis of the rows as returned by get_timebase.
+        units : dict, optional
+            Units of the channels, see get_units.
+        """
+        self.shot       = int( shot )
+        self.data       = data
+        self.columns    = list( columns )
+        self.usecols    = [ int(col) for col in usecols ]
+        self.timebase   = timebase
+        self.units      = get_units( self.shot, self.columns ) if units is None else units
+        # explicit time axis, built on first access
+        self.time_cache = None
+
+    def __repr__( self ):
+        return 'ShotFrame({0}, shape={1}, dtype={2}, {3})'.format(
+                self.shot, (len(self), len(self.columns)), self.data.dtype, type(self.data).__name__ )
+
+    def __len__( self ):
+        return self.data.shape[0]
+
+    def __contains__( self, chName ):
+        return chName in self.columns
+
+    def __getitem__( self, chName ):
+        """Time trace of a channel (view of the buffer)."""
+        return self.data[:,self.usecols[self.columns.index( chName )]]
+
+    @property
+    def time( self ):
+        """Time axis in ms, see timebase_to_time."""
+        if self.time_cache is None:
+            self.time_cache = tjk.timebase_to_time( self.timebase )
+        return self.time_cache
+
+    @property
+    def attrs( self ):
+        """Metadata attached to DataFrame and Dataset."""
+        return { 'shot'     : self.shot,
+                 'units'    : dict( self.units ),
+                 'timebase' : { 'n': self.timebase['n'], 'segments': self.timebase['segments'] } }
+
+    def to_pandas( self, index='time' ):
+        """
+        Returns the traces as pandas.DataFrame sharing the buffer.
+
+        Parameters
+        ----------
+        index : str, optional
+            'time': time axis in ms as index, 'sample': RangeIndex of the
+            samples (nothing is built).
+
+        Returns
+        -------
+        pandas.DataFrame
+            Returns errValue (-1) if pandas is not installed.
+        """
+        # value to return in case of error
+        errValue    = -1
+
+        if pandas is None:
+            print( 'to_pandas: ERROR, module pandas is required' )
+            return errValue
+
+        if index == 'time':
+            index   = pandas.Index( self.time, name='Zeit [ms]', copy=False )
+        else:
+            index   = pandas.RangeIndex( len(self), name='sample' )
+        # no consolidation into a new 2D block with copy=False
+        df  = pandas.DataFrame( { chName: self[chName] for chName in self.columns }, index=index, copy=False )
+        df.attrs.update( self.attrs )
+
+        return df
+
+    def to_xarray( self ):
+        """
+        Returns the traces as xarray.Dataset sharing the buffer.
+
+        Returns
+        -------
+        xarray.Dataset
+            One variable per channel (with its unit) along the dimension
+            'time', returns errValue (-1) if xarray is not installed.
+        """
+        # value to return in case of error
+        errValue    = -1
+
+        if xarray is None:
+            print( 'to_xarray: ERROR, module xarray is required' )
+            return errValue
+
+        attrs   = self.attrs
+        del attrs['units']
+        return xarray.Dataset(
+                    data_vars={ chName: ( 'time', self[chName], { 'units': self.units[chName] } )
+                                for chName in self.columns },
+                    coords={ 'time': ( 'time', self.time, { 'units': 'ms' } ) },
+                    attrs=attrs )
+    #}}}
+
+
+def get_frame( shot, chNames=None, fname_in='', t_start=None, t_end=None, n_workers=1, silent=True ):
+    #{{{
+    """
+    Returns the time traces of a shot as ShotFrame.
+
+    The time column is not read, the time axis is taken from its implicit
+    representation (see get_file_timebase). If the shot is available from
+    the shot cache service or as binary cache (see build_npy_cache, which is
+    built if the file does not fit into the memory budget), the frame is a
+    view of it, otherwise only the requested channels are parsed into a new
+    buffer. In both cases, the frame exposes only the requested channels.
+
+    Parameters
+    ----------
+    shot : int
+        Shot number
+    chNames : list of str, optional
+        Names of the channels as written in the header of the file, all
+        channels if not set (the time column is never included).
+    fname_in : str, optional
+        Allows to optionally specify a filename explicitely (if it would not
+        be located at the default locations, for example).
+    t_start : float, optional
+        Start of time window in ms, if not set, traces start at beginning.
+    t_end : float, optional
+        End of time window in ms, if not set, traces end at end of file.
+    n_workers : int, optional
+        Number of workers used to parse large files in parallel.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    ShotFrame
+        Returns errValue (-1) on error.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    fname_data  = tjk.get_fname_data( shot, fname_in=fname_in )
+    if not os.path.isfile( fname_data ):
+        print( 'get_frame: ERROR, file <{0}> does not exist'.format( fname_data ) )
+        return errValue
+
+    # last entry of the header is the line break
+    header  = [ chName for chName in tjk.get_header( shot, fname_in=fname_data, silent=True )
+                if len(chName.strip()) > 0 ]
+    if chNames is None:
+        chNames = header[1:]
+    chNames = [ chName for chName in dict.fromkeys( chNames ) if chName != header[0] ]
+    missing = [ chName for chName in chNames if chName not in header ]
+    if len(missing) > 0:
+        print( 'get_frame: ERROR, <{0}> not in header of tjk-monitor file'.format( missing[0] ) )
+        return errValue
+    usecols = [ header.index( chName ) for chName in chNames ]
+
+    timebase    = tjk.get_file_timebase( fname_data, silent=silent )
+    if isinstance(timebase, int):
+        return errValue
+    ii_start    = 0 if t_start is None else tjk.time_to_index( timebase, t_start, side='left' )
+    ii_end      = timebase['n'] if t_end is None else tjk.time_to_index( timebase, t_end, side='right' )
+    whole_file  = (ii_start == 0) and (ii_end == timebase['n'])
+
+    # buffers holding all columns, rows are sliced (views)
+    cached  = tjk.get_data_shmcache( fname_data, silent=silent )
+    if not isinstance(cached, int):
+        header_cached, data = cached
+        usecols = [ header_cached.index( chName ) for chName in chNames ]
+    else:
+        data    = tjk.get_npy_cache( fname_data, silent=silent )
+        if isinstance(data, int) and whole_file and \
+           (tjk.choose_load_strategy( fname_data, n_cols_used=len(usecols), silent=silent ) == 'mmap'):
+            if not isinstance( tjk.build_npy_cache( fname_data, silent=silent ), int ):
+                data    = tjk.get_npy_cache( fname_data, silent=silent )
+    if not isinstance(data, int):
+        data    = data[ii_start:ii_end]
+    # requested columns only, parsed into a new buffer
+    else:
+        if whole_file:
+            data    = tjk.read_data( fname_data, usecols=usecols, n_workers=n_workers, silent=silent )
+        else:
+            data    = tjk.read_rows( fname_data, usecols, ii_start, ii_end, silent=silent )
+        if isinstance(data, int):
+            return errValue
+        usecols = list( range( len(chNames) ) )
+
+    if not silent:
+        print( 'get_frame: shot={0}, shape={1}, {2}'.format( shot, data.shape, type(data).__name__ ) )
+
+    return ShotFrame( shot, data, chNames, usecols, tjk.slice_timebase( timebase, ii_start, ii_start + data.shape[0] ) )
+    #}}}
+
+
+def check_no_copy( frame, converted ):
+    #{{{
+    """
+    Checks that the columns of a DataFrame or Dataset are views of the frame.
+
+    Parameters
+    ----------
+    frame : ShotFrame
+        Frame the object was created from.
+    converted : pandas.DataFrame or xarray.Dataset
+        Result of frame.to_pandas() or frame.to_xarray().
+
+    Returns
+    -------
+    list
+        Channel names of the columns which are not views of the buffer.
+    """
+
+    copied  = []
+    for chName in frame.columns:
+        if (pandas is not None) and isinstance(converted, pandas.DataFrame):
+            values  = converted[chName].to_numpy( copy=False )
+        else:
+            values  = converted[chName].values
+        if not np.shares_memory( values, frame.data ):
+            copied.append( chName )
+
+    return copied
+    #}}}
+
+
+def main():
+#{{{
+    # initialize parser for command line options
+    parser  = argparse.ArgumentParser( description='hand tjk-monitor data to pandas/xarray without copies' )
+    parser.add_argument( "-s", "--shot", type=int, default=13277,
+            help='Shot number' )
+    parser.add_argument( "-c", "--channels", type=str, nargs='+', default=None,
+            help='Names of the channels (default: all)' )
+    # read all arguments from command line
+    args    = parser.parse_args()
+
+    t0      = time.perf_counter()
+    frame   = get_frame( args.shot, chNames=args.channels, silent=False )
+    if isinstance(frame, int):
+        return
+    print( '{0}: read in {1:.3f} s, buffer {2:.1f} MB'.format(
+            frame, time.perf_counter()-t0, frame.data.nbytes/1024**2 ) )
+    # explicit time axis is built once per frame, not per conversion
+    frame.time
+
+    for name, convert in [ ( 'pandas', frame.to_pandas ), ( 'xarray', frame.to_xarray ) ]:
+        tracemalloc.start()
+        t0          = time.perf_counter()
+        converted   = convert()
+        t_convert   = time.perf_counter() - t0
+        n_bytes     = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        if isinstance(converted, int):
+            continue
+        copied  = check_no_copy( frame, converted )
+        print( '{0}: converted in {1:.4f} s, peak allocation {2:.3f} MB, {3} of {4} columns copied{5}'.format(
+                name, t_convert, n_bytes/1024**2, len(copied), len(frame.columns),
+                '' if len(copied) == 0 else ': ' + ', '.join( copied ) ) )
+#}}}
+
+
+if __name__ == '__main__':
+    main()
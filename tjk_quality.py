@@ -0,0 +1,406 @@
+# coding=utf-8
+
+__author__      = 'Alf Köhn-Seemann'
+__email__       = 'koehn@igvp.uni-stuttgart.de'
+__copyright__   = 'University of Stuttgart'
+__license__     = 'MIT'
+
+"""
+Data-quality scanner for tjk-monitor files.
+
+Every file is read once and all channels are checked in one vectorized pass
+for NaNs, flat lines (e.g. a gauge which is not connected), saturation,
+positive values of the microwave diodes (which calc_2GHzPower silently sets
+to -1e-6), missing channels and truncated files. The result is stored as
+bit flags in the summary database (see tjk_summary.py), such that bad shots
+can be skipped (or marked) before any analysis, e.g.
+
+    python tjk_quality.py scan -s 12838 -e 12887
+    python tjk_quality.py bad
+"""
+
+
+# import standard modules
+import argparse
+import concurrent.futures
+import numpy as np
+import os
+
+# import some TJ-K related function
+import importlib    # required due to the dash in the filename
+tjk = importlib.import_module("TJK-monitor")
+import tjk_summary
+
+
+# quality flags, stored as bit mask
+QUALITY_FLAGS   = {
+        'missing'   : 1,    # channel not recorded
+        'nan'       : 2,    # channel contains NaNs
+        'flat'      : 4,    # peak-to-peak value below FLAT_PTP
+        'saturated' : 8,    # many samples at the extreme value
+        'positive'  : 16,   # microwave diode with positive voltage
+        'time'      : 32,   # time axis not strictly increasing
+        'truncated' : 64,   # last line of file incomplete
+        'empty'     : 128,  # no data rows
+        }
+
+# channels with a peak-to-peak value (in V) below this are considered flat
+FLAT_PTP        = 1e-5
+
+# channels with more than this fraction of samples at the maximum (or
+# minimum) value are considered saturated
+SATURATED_FRAC  = 1e-3
+
+# microwave diodes with more than this fraction of positive samples are flagged
+POSITIVE_FRAC   = 1e-3
+
+# channels (see get_channel_config) which are expected in every file
+EXPECTED_CHANNELS   = [ 'B0', 'P2GHz_in', 'P2GHz_out', 'p0', 'interf' ]
+
+# channels (see get_channel_config) which are microwave diodes
+DIODE_CHANNELS      = [ 'P2GHz_in', 'P2GHz_out', 'P8GHz_in' ]
+
+
+def decode_flags( flags ):
+    #{{{
+    """
+    Returns the names of the quality flags set in a bit mask.
+
+    Parameters
+    ----------
+    flags : int
+        Bit mask of quality flags.
+
+    Returns
+    -------
+    list of str
+    """
+
+    return [ name for name, bit in QUALITY_FLAGS.items() if flags & bit ]
+    #}}}
+
+
+def open_quality_db( fname_db='' ):
+    #{{{
+    """
+    Opens the summary database and creates the quality tables if necessary.
+
+    Parameters
+    ----------
+    fname_db : str, optional
+        Filename of the database, tjk_summary.FNAME_DB is used if not set.
+
+    Returns
+    -------
+    sqlite3.Connection
+    """
+
+    con = tjk_summary.open_db( fname_db )
+    con.execute( 'CREATE TABLE IF NOT EXISTS quality ('
+                 'shot INTEGER PRIMARY KEY, size INTEGER, mtime INTEGER, '
+                 'n_rows INTEGER, flags INTEGER)' )
+    con.execute( 'CREATE TABLE IF NOT EXISTS quality_channels ('
+                 'shot INTEGER, channel TEXT, flags INTEGER, n_nan INTEGER, '
+                 'frac_saturated REAL, frac_positive REAL, ptp REAL, '
+                 'PRIMARY KEY (shot, channel))' )
+    con.execute( 'CREATE INDEX IF NOT EXISTS idx_quality_flags ON quality (flags)' )
+    con.commit()
+
+    return con
+    #}}}
+
+
+def scan_shot( shot, fname_in='' ):
+    #{{{
+    """
+    Checks the data quality of a single shot.
+
+    Parameters
+    ----------
+    shot : int
+        Shot number
+    fname_in : str, optional
+        Allows to optionally specify a filename explicitely (if it would not
+        be located at the default locations, for example).
+
+    Returns
+    -------
+    dict
+        Dictionary with keys 'shot', 'size', 'mtime', 'n_rows', 'flags' (of
+        the whole shot, i.e. of all channels combined) and 'channels' (a
+        dictionary with channel names as keys and dictionaries with the
+        per-channel results as values). Returns errValue (-1) if the file
+        does not exist.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    fname_data  = tjk.get_fname_data( shot, fname_in=fname_in )
+    if not os.path.isfile( fname_data ):
+        return errValue
+
+    fstat   = os.stat( fname_data )
+    result  = { 'shot'      : shot,
+                'size'      : fstat.st_size,
+                'mtime'     : fstat.st_mtime_ns,
+                'n_rows'    : 0,
+                'flags'     : 0,
+                'channels'  : {},
+              }
+
+    header  = tjk.get_header( shot, fname_in=fname_data, silent=True )
+    if isinstance(header, int) or (fstat.st_size == 0):
+        result['flags'] = QUALITY_FLAGS['empty'] | QUALITY_FLAGS['truncated']
+        return result
+    # last element of header contains the line break
+    chNames = [ chName.strip() for chName in header if len(chName.strip()) > 0 ]
+
+    # file still being written or not properly closed
+    size    = tjk.get_data_size( fname_data )
+    if tjk.read_byte_range( fname_data, size-1, size ) != b'\n':
+        result['flags'] |= QUALITY_FLAGS['truncated']
+
+    data    = tjk.read_data( fname_data )
+    if isinstance(data, int) or (data.shape[0] == 0):
+        result['flags'] |= QUALITY_FLAGS['empty']
+        return result
+    result['n_rows']    = data.shape[0]
+    n_cols  = min( data.shape[1], len(chNames) )
+    data    = data[:,:n_cols]
+
+    # all channels are checked at once
+    n_nan   = np.count_nonzero( np.isnan( data ), axis=0 )
+    v_max   = np.fmax.reduce( data, axis=0 )
+    v_min   = np.fmin.reduce( data, axis=0 )
+    ptp     = v_max - v_min
+    frac_saturated  = np.maximum( np.count_nonzero( data == v_max, axis=0 ),
+                                  np.count_nonzero( data == v_min, axis=0 ) ) / data.shape[0]
+    frac_positive   = np.count_nonzero( data > 0, axis=0 ) / data.shape[0]
+
+    flags   = np.zeros( n_cols, dtype=np.int64 )
+    flags[n_nan > 0]    |= QUALITY_FLAGS['nan']
+    flat    = ~(ptp >= FLAT_PTP)
+    flags[flat]         |= QUALITY_FLAGS['flat']
+    flags[(frac_saturated > SATURATED_FRAC) & ~flat]   |= QUALITY_FLAGS['saturated']
+
+    chCfg   = tjk.get_channel_config( shot )
+    diodes  = [ chCfg[key][0] for key in DIODE_CHANNELS ]
+    for ii in range(n_cols):
+        if (chNames[ii] in diodes) and (frac_positive[ii] > POSITIVE_FRAC):
+            flags[ii]  |= QUALITY_FLAGS['positive']
+    # time axis must be strictly increasing
+    if (data.shape[0] > 1) and np.any( np.diff( data[:,0] ) <= 0 ):
+        flags[0]   |= QUALITY_FLAGS['time']
+
+    for ii in range(n_cols):
+        result['channels'][chNames[ii]] = { 'flags'             : int( flags[ii] ),
+                                            'n_nan'             : int( n_nan[ii] ),
+                                            'frac_saturated'    : float( frac_saturated[ii] ),
+                                            'frac_positive'     : float( frac_positive[ii] ),
+                                            'ptp'               : float( ptp[ii] ) }
+    for key in EXPECTED_CHANNELS:
+        if chCfg[key][0] not in result['channels']:
+            result['channels'][chCfg[key][0]]   = { 'flags'             : QUALITY_FLAGS['missing'],
+                                                    'n_nan'             : 0,
+                                                    'frac_saturated'    : np.nan,
+                                                    'frac_positive'     : np.nan,
+                                                    'ptp'               : np.nan }
+
+    for channel in result['channels'].values():
+        result['flags'] |= channel['flags']
+
+    return result
+    #}}}
+
+
+def scan_shots( shots, fname_db='', n_workers=None, force=False, silent=True ):
+    #{{{
+    """
+    Checks the data quality of many shots in parallel and stores the flags.
+
+    Shots already scanned are only checked again if their data file changed
+    (size or modification time) or if force is set. The files are checked in
+    separate processes, the database is only written from the calling one.
+
+    Parameters
+    ----------
+    shots : list of int
+        Shot numbers.
+    fname_db : str, optional
+        Filename of the database, tjk_summary.FNAME_DB is used if not set.
+    n_workers : int, optional
+        Number of processes, os.cpu_count() if not set.
+    force : bool, optional
+        If True, all shots are checked again.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    int
+        Number of shots which were checked.
+    """
+
+    con = open_quality_db( fname_db )
+
+    # select shots which were not scanned yet or changed since
+    stored      = { row['shot']: (row['size'], row['mtime'])
+                    for row in con.execute( 'SELECT shot, size, mtime FROM quality' ) }
+    shots2do    = []
+    for shot in shots:
+        fname_data  = tjk.get_fname_data( shot )
+        if not os.path.isfile( fname_data ):
+            continue
+        fstat   = os.stat( fname_data )
+        if force or (stored.get( shot ) != (fstat.st_size, fstat.st_mtime_ns)):
+            shots2do.append( shot )
+
+    if not silent:
+        print( 'scan_shots: {0} of {1} shots need to be checked'.format( len(shots2do), len(shots) ) )
+
+    n_done  = 0
+    with concurrent.futures.ProcessPoolExecutor( max_workers=n_workers ) as executor:
+        for result in executor.map( scan_shot, shots2do, chunksize=4 ):
+            if isinstance(result, int):
+                continue
+            con.execute( 'INSERT OR REPLACE INTO quality VALUES (?, ?, ?, ?, ?)',
+                         [ result[key] for key in ['shot', 'size', 'mtime', 'n_rows', 'flags'] ] )
+            con.execute( 'DELETE FROM quality_channels WHERE shot=?', (result['shot'],) )
+            con.executemany( 'INSERT INTO quality_channels VALUES (?, ?, ?, ?, ?, ?, ?)',
+                             [ ( result['shot'], chName, channel['flags'], channel['n_nan'],
+                                 channel['frac_saturated'], channel['frac_positive'], channel['ptp'] )
+                               for chName, channel in result['channels'].items() ] )
+            n_done += 1
+            if (not silent) and result['flags']:
+                print( '    shot={0:d}: {1}'.format( result['shot'],
+                                                      ', '.join( decode_flags( result['flags'] ) ) ) )
+    con.commit()
+    con.close()
+
+    return n_done
+    #}}}
+
+
+def get_quality( shot, fname_db='' ):
+    #{{{
+    """
+    Returns the quality flags of a single shot.
+
+    Parameters
+    ----------
+    shot : int
+        Shot number
+    fname_db : str, optional
+        Filename of the database, tjk_summary.FNAME_DB is used if not set.
+
+    Returns
+    -------
+    dict
+        Dictionary with channel names as keys and bit masks of quality flags
+        as values, returns errValue (-1) if the shot was not scanned yet or
+        the file changed since.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    con     = open_quality_db( fname_db )
+    row     = con.execute( 'SELECT size, mtime FROM quality WHERE shot=?', (shot,) ).fetchone()
+    flags   = { row_ch['channel']: row_ch['flags'] for row_ch in
+                con.execute( 'SELECT channel, flags FROM quality_channels WHERE shot=?', (shot,) ) }
+    con.close()
+    if row is None:
+        return errValue
+
+    fname_data  = tjk.get_fname_data( shot )
+    if os.path.isfile( fname_data ):
+        fstat   = os.stat( fname_data )
+        if (row['size'], row['mtime']) != (fstat.st_size, fstat.st_mtime_ns):
+            return errValue
+
+    return flags
+    #}}}
+
+
+def get_bad_shots( shots=None, flags=sum( QUALITY_FLAGS.values() ), fname_db='' ):
+    #{{{
+    """
+    Returns the shots with certain quality flags set.
+
+    Parameters
+    ----------
+    shots : list of int, optional
+        Only these shots are considered, all scanned shots if not set.
+    flags : int, optional
+        Bit mask of the quality flags to consider, all flags if not set,
+        e.g. QUALITY_FLAGS['nan'] | QUALITY_FLAGS['truncated'].
+    fname_db : str, optional
+        Filename of the database, tjk_summary.FNAME_DB is used if not set.
+
+    Returns
+    -------
+    list
+        List of shot numbers.
+    """
+
+    con = open_quality_db( fname_db )
+    bad = [ row['shot'] for row in
+            con.execute( 'SELECT shot FROM quality WHERE (flags & ?) != 0 ORDER BY shot', (flags,) ) ]
+    con.close()
+
+    if shots is not None:
+        shots   = set( shots )
+        bad     = [ shot for shot in bad if shot in shots ]
+
+    return bad
+    #}}}
+
+
+def main():
+#{{{
+    # initialize parser for command line options
+    parser      = argparse.ArgumentParser( description='data-quality flags of tjk-monitor data' )
+    parser.add_argument( "--db", type=str, default='',
+            help='Filename of summary database (default: {0})'.format( tjk_summary.FNAME_DB ) )
+    subparsers  = parser.add_subparsers( dest='command', required=True )
+
+    parser_scan = subparsers.add_parser( 'scan', help='check the data quality of a range of shots' )
+    parser_scan.add_argument( "-s", "--shot_start", type=int, required=True,
+            help='First shot number' )
+    parser_scan.add_argument( "-e", "--shot_end", type=int, default=None,
+            help='Last shot number (default: first shot number)' )
+    parser_scan.add_argument( "-j", "--n_workers", type=int, default=None,
+            help='Number of shots processed in parallel (default: number of CPUs)' )
+    parser_scan.add_argument( "--force", action='store_true',
+            help='Check shots already stored in the database again' )
+
+    parser_bad  = subparsers.add_parser( 'bad', help='list shots with quality flags' )
+    parser_bad.add_argument( "-f", "--flags", type=str, nargs='+', default=list( QUALITY_FLAGS ),
+            choices=list( QUALITY_FLAGS ), help='Quality flags to consider' )
+
+    # read all arguments from command line
+    args    = parser.parse_args()
+
+    if args.command == 'scan':
+        shot_end    = args.shot_end if args.shot_end is not None else args.shot_start
+        n_done      = scan_shots( range( args.shot_start, shot_end+1 ), fname_db=args.db,
+                                  n_workers=args.n_workers, force=args.force, silent=False )
+        print( '{0} shots checked'.format( n_done ) )
+    elif args.command == 'bad':
+        flags   = sum( QUALITY_FLAGS[name] for name in args.flags )
+        con     = open_quality_db( args.db )
+        for row in con.execute( 'SELECT shot, flags FROM quality WHERE (flags & ?) != 0 ORDER BY shot',
+                                (flags,) ):
+            channels    = { row_ch['channel']: row_ch['flags'] for row_ch in
+                            con.execute( 'SELECT channel, flags FROM quality_channels WHERE shot=?',
+                                         (row['shot'],) ) }
+            print( '{0}\t{1}\t{2}'.format( row['shot'], ', '.join( decode_flags( row['flags'] & flags ) ),
+                '; '.join( '{0}: {1}'.format( chName, ', '.join( decode_flags( chFlags & flags ) ) )
+                           for chName, chFlags in channels.items() if chFlags & flags ) ) )
+        con.close()
+#}}}
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+# coding=utf-8
+
+__author__      = 'Alf Köhn-Seemann'
+__email__       = 'koehn@igvp.uni-stuttgart.de'
+__copyright__   = 'University of Stuttgart'
+__license__     = 'MIT'
+
+"""
+Quicklook images of shots, used as thumbnails in the gallery of tjk_shotview.py.
+
+A quicklook shows sparklines of B0, the absorbed power at 2.45 GHz and the
+line-averaged density of a shot in a small PNG. It is generated once per
+shot and stored in the cache, the filename contains the provenance key (see
+get_provenance in TJK-monitor.py), i.e. it is regenerated automatically if
+the data file or a calibration changes. Quicklooks of a campaign can be
+generated in advance (tjk_watcher.py does so for new shots), e.g.
+
+    python tjk_quicklook.py -s 12838 -e 12887
+"""
+
+
+# import standard modules
+import argparse
+import concurrent.futures
+import glob
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import os
+
+# import some TJ-K related function
+import importlib    # required due to the dash in the filename
+tjk = importlib.import_module("TJK-monitor")
+
+
+# folder where the quicklooks are stored
+QUICKLOOK_DIR       = os.path.join( tjk.CACHE_DIR, 'quicklook' )
+
+# version of make_quicklook, to be increased whenever the image changes
+QUICKLOOK_VERSION   = 1
+
+# size of the quicklooks in pixels (width, height)
+QUICKLOOK_SIZE      = ( 200, 120 )
+
+# sparklines: name, color, keys of get_channel_config of the channels required
+QUICKLOOK_TRACES    = [ [ 'B0',    'tab:blue',  [ 'B0' ] ],
+                        [ 'Pabs2', 'tab:red',   [ 'P2GHz_in', 'P2GHz_out' ] ],
+                        [ 'ne',    'tab:green', [ 'interf' ] ],
+                      ]
+
+# calibrations the quicklooks depend on, see tjk.CALIBRATIONS
+QUICKLOOK_CALIBRATIONS  = [ 'P2GHz', 'interferometer' ]
+
+
+def get_quicklook_fname( shot, fname_in='' ):
+    #{{{
+    """
+    Returns the filename of the (current) quicklook of a shot.
+
+    Parameters
+    ----------
+    shot : int
+        Shot number
+    fname_in : str, optional
+        Allows to optionally specify a filename explicitely (if it would not
+        be located at the default locations, for example).
+
+    Returns
+    -------
+    str
+        Filename of the quicklook, returns errValue (-1) if the data file
+        does not exist.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    key = tjk.get_provenance( shot, 'quicklook', QUICKLOOK_VERSION, calibrations=QUICKLOOK_CALIBRATIONS,
+                              params={ 'size': QUICKLOOK_SIZE, 'traces': QUICKLOOK_TRACES },
+                              fname_in=fname_in )
+    if isinstance(key, int):
+        return errValue
+
+    return os.path.join( QUICKLOOK_DIR, '{0:d}_{1}.png'.format( shot, key ) )
+    #}}}
+
+
+def make_quicklook( shot, fname_in='', silent=True ):
+    #{{{
+    """
+    Generates the quicklook of a shot, if it does not exist yet.
+
+    Parameters
+    ----------
+    shot : int
+        Shot number
+    fname_in : str, optional
+        Allows to optionally specify a filename explicitely (if it would not
+        be located at the default locations, for example).
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    str
+        Filename of the quicklook, returns errValue (-1) if the file could
+        not be read.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    fname_ql    = get_quicklook_fname( shot, fname_in=fname_in )
+    if isinstance(fname_ql, int):
+        if not silent:
+            print( 'make_quicklook: ERROR, no data file for shot {0}'.format( shot ) )
+        return errValue
+    if os.path.isfile( fname_ql ):
+        return fname_ql
+
+    # matplotlib's object-oriented interface without pyplot is thread-safe
+    dpi     = 100
+    fig     = Figure( figsize=( QUICKLOOK_SIZE[0]/dpi, QUICKLOOK_SIZE[1]/dpi ), dpi=dpi )
+    FigureCanvasAgg( fig )
+    axes    = fig.subplots( len(QUICKLOOK_TRACES), 1, sharex=True )
+    fig.subplots_adjust( left=.02, right=.98, bottom=.02, top=.85, hspace=.1 )
+    fig.suptitle( '#{0}'.format( shot ), fontsize=8, y=.99 )
+
+    with tjk.Shot( shot, fname_in=fname_in ) as shot_data:
+        header  = shot_data.header
+        if isinstance(header, int):
+            if not silent:
+                print( 'make_quicklook: ERROR, shot {0} could not be read'.format( shot ) )
+            return errValue
+        # only channels which were actually recorded, all read at once
+        recorded    = [ all( shot_data.chCfg[key][0] in header for key in keys )
+                        for name, color, keys in QUICKLOOK_TRACES ]
+        try:
+            shot_data.traces.load( [ 'Zeit [ms]' ] + [ shot_data.chCfg[key][0]
+                                   for (name, color, keys), ok in zip( QUICKLOOK_TRACES, recorded ) if ok
+                                   for key in keys ] )
+        except KeyError:
+            if not silent:
+                print( 'make_quicklook: ERROR, shot {0} could not be read'.format( shot ) )
+            return errValue
+
+        for ax, (name, color, keys), ok in zip( axes, QUICKLOOK_TRACES, recorded ):
+            ax.set_axis_off()
+            if not ok:
+                continue
+            if name == 'Pabs2':
+                trace   = shot_data.pabs2
+            elif name == 'ne':
+                trace   = shot_data.ne
+            else:
+                trace   = shot_data.traces[shot_data.chCfg[name][0]] * shot_data.chCfg[name][1]
+            time_dec, trace_dec = tjk.decimate_minmax( shot_data.time, trace, n_bins=QUICKLOOK_SIZE[0] )
+            ax.plot( time_dec, trace_dec, color=color, linewidth=.7 )
+            ax.text( 0., 1., name, transform=ax.transAxes, fontsize=6, va='top', color=color )
+
+    os.makedirs( QUICKLOOK_DIR, exist_ok=True )
+    # quicklooks of older versions of the same shot are not needed anymore
+    for fname_old in glob.glob( os.path.join( QUICKLOOK_DIR, '{0:d}_*.png'.format( shot ) ) ):
+        os.remove( fname_old )
+    fname_tmp   = '{0}.{1}.tmp'.format( fname_ql, os.getpid() )
+    fig.savefig( fname_tmp, format='png', dpi=dpi )
+    os.replace( fname_tmp, fname_ql )
+
+    if not silent:
+        print( '    shot={0:d}: quicklook written'.format( shot ) )
+
+    return fname_ql
+    #}}}
+
+
+def make_quicklooks( shots, n_workers=4, silent=True ):
+    #{{{
+    """
+    Generates the quicklooks of several shots in parallel.
+
+    Parameters
+    ----------
+    shots : list of int
+        Shot numbers.
+    n_workers : int, optional
+        Number of shots processed in parallel.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    int
+        Number of shots with a quicklook.
+    """
+
+    with concurrent.futures.ThreadPoolExecutor( max_workers=n_workers ) as executor:
+        fnames  = list( executor.map( lambda shot: make_quicklook( shot, silent=silent ), shots ) )
+
+    return sum( not isinstance(fname_ql, int) for fname_ql in fnames )
+    #}}}
+
+
+def main():
+#{{{
+    # initialize parser for command line options
+    parser  = argparse.ArgumentParser( description='generate quicklook images of tjk-monitor data' )
+    parser.add_argument( "-s", "--shot_start", type=int, required=True,
+            help='First shot number' )
+    parser.add_argument( "-e", "--shot_end", type=int, default=None,
+            help='Last shot number (default: first shot number)' )
+    parser.add_argument( "-j", "--n_workers", type=int, default=4,
+            help='Number of shots processed in parallel' )
+    # read all arguments from command line
+    args    = parser.parse_args()
+
+    shot_end    = args.shot_end if args.shot_end is not None else args.shot_start
+    n_done      = make_quicklooks( range( args.shot_start, shot_end+1 ), n_workers=args.n_workers,
+                                   silent=False )
+    print( '{0} quicklooks available'.format( n_done ) )
+#}}}
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,432 @@
+# coding=utf-8
+
+__author__      = 'Alf Köhn-Seemann'
+__email__       = 'koehn@igvp.uni-stuttgart.de'
+__copyright__   = 'University of Stuttgart'
+__license__     = 'MIT'
+
+"""
+Cache of derived results (calibrated time traces, plateau values) of shots.
+
+Every result is stored together with its provenance key (see get_provenance
+in TJK-monitor.py), calculated from the fingerprint of the data file, the
+version of the function calculating the result, the calibrations the result
+depends on (only the entries valid for the shot) and the parameter values.
+A result is recalculated only if its key changed, e.g. after adding a new
+interferometer calibration to tjk.CALIBRATIONS valid from some shot on, only
+'ne' and 'plateau' of these shots are recalculated, e.g.
+
+    python tjk_results.py status -s 12838 -e 13300
+    python tjk_results.py update -s 12838 -e 13300 -r ne plateau
+    python tjk_results.py prune
+"""
+
+
+# import standard modules
+import argparse
+import concurrent.futures
+import glob
+import json
+import numpy as np
+import os
+
+# import some TJ-K related function
+import importlib    # required due to the dash in the filename
+tjk = importlib.import_module("TJK-monitor")
+
+
+# folder where the results are stored, one subfolder per result
+RESULTS_DIR = os.path.join( tjk.CACHE_DIR, 'results' )
+
+
+def calc_pabs2( shot_data, params ):
+    #{{{
+    """
+    Absorbed power (forward - backward) at 2.45 GHz in W.
+    """
+    return { 'Pabs2': shot_data.pabs2 }
+    #}}}
+
+
+def calc_p8ghz( shot_data, params ):
+    #{{{
+    """
+    Forward power at 8 GHz in W.
+    """
+    # note: calc_8GHzPower modifies its input, hence copy
+    U_in    = shot_data.traces[shot_data.chCfg['P8GHz_in'][0]].copy()
+    return { 'P8GHz': tjk.calc_8GHzPower( U_in, direction='fw', shot=shot_data.shot ) }
+    #}}}
+
+
+def calc_ne( shot_data, params ):
+    #{{{
+    """
+    Line-averaged density in 1e17 m^-3.
+    """
+    return { 'ne': shot_data.ne }
+    #}}}
+
+
+def calc_p0( shot_data, params ):
+    #{{{
+    """
+    Neutral gas pressure before the discharge and its uncertainty in Pa.
+    """
+    return { 'p0': np.array( [ shot_data.p0, shot_data.p0_err ] ) }
+    #}}}
+
+
+def calc_plateau( shot_data, params ):
+    #{{{
+    """
+    Discharge window in ms and density plateau in 1e17 m^-3.
+    """
+    t_on, t_off     = tjk.get_discharge_window( shot_data.time, shot_data.pabs2 )
+    ne, ne_err      = tjk.get_plateau( shot_data.time, shot_data.ne, t_on, t_off, frac=params['frac'] )
+    return { 'plateau': np.array( [ t_on, t_off, ne, ne_err ] ) }
+    #}}}
+
+
+# derived results: function calculating the result, version of the function
+# (to be increased whenever its output changes), calibrations the result
+# depends on (see tjk.CALIBRATIONS) and default parameter values
+DERIVED_RESULTS = {
+        'Pabs2'     : [ calc_pabs2,   1, [ 'P2GHz' ],                   {} ],
+        'P8GHz'     : [ calc_p8ghz,   1, [ 'P8GHz' ],                   {} ],
+        'ne'        : [ calc_ne,      1, [ 'interferometer' ],          {} ],
+        'p0'        : [ calc_p0,      1, [ 'PKR261' ],                  {} ],
+        'plateau'   : [ calc_plateau, 1, [ 'P2GHz', 'interferometer' ], { 'frac': .5 } ],
+        }
+
+
+def get_params( name, params=None ):
+    #{{{
+    """
+    Returns the parameter values of a result, defaults completed.
+
+    Parameters
+    ----------
+    name : str
+        Name of the result, key of DERIVED_RESULTS.
+    params : dict, optional
+        Parameter values differing from the defaults.
+
+    Returns
+    -------
+    dict
+    """
+
+    params_all  = dict( DERIVED_RESULTS[name][3] )
+    if params is not None:
+        params_all.update( params )
+    return params_all
+    #}}}
+
+
+def get_result_key( name, shot, params=None, fname_in='' ):
+    #{{{
+    """
+    Returns the provenance key of a result of a shot.
+
+    Parameters
+    ----------
+    name : str
+        Name of the result, key of DERIVED_RESULTS.
+    shot : int
+        Shot number
+    params : dict, optional
+        Parameter values differing from the defaults.
+    fname_in : str, optional
+        Allows to optionally specify a filename explicitely (if it would not
+        be located at the default locations, for example).
+
+    Returns
+    -------
+    str
+        Provenance key, returns errValue (-1) if the data file does not exist.
+    """
+
+    func, version, calibrations, defaults = DERIVED_RESULTS[name]
+    return tjk.get_provenance( shot, name, version, calibrations=calibrations,
+                               params=get_params( name, params ), fname_in=fname_in )
+    #}}}
+
+
+def get_result_fname( name, shot, key ):
+    #{{{
+    """
+    Returns the filename of a stored result.
+    """
+    return os.path.join( RESULTS_DIR, name, '{0:d}_{1}.npz'.format( shot, key ) )
+    #}}}
+
+
+def load_result_params( fname_result ):
+    #{{{
+    """
+    Returns the parameter values a stored result was calculated with.
+    """
+    with np.load( fname_result ) as data:
+        return json.loads( str( data['params'] ) )
+    #}}}
+
+
+def get_result( name, shot, fname_in='', params=None, shot_data=None, silent=True ):
+    #{{{
+    """
+    Returns a derived result of a shot, calculated only if not stored yet.
+
+    The result is stored with its provenance key, results of the same shot
+    and parameter values with an outdated key are removed.
+
+    Parameters
+    ----------
+    name : str
+        Name of the result, key of DERIVED_RESULTS.
+    shot : int
+        Shot number
+    fname_in : str, optional
+        Allows to optionally specify a filename explicitely (if it would not
+        be located at the default locations, for example).
+    params : dict, optional
+        Parameter values differing from the defaults.
+    shot_data : tjk.Shot, optional
+        Shot to calculate the result from, allows to calculate several
+        results with the file read only once.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    numpy.array
+        The result, returns errValue (-1) if the file does not exist or
+        channels required are missing.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    params  = get_params( name, params )
+    key     = get_result_key( name, shot, params=params, fname_in=fname_in )
+    if isinstance(key, int):
+        if not silent:
+            print( 'get_result: ERROR, no data file for shot {0}'.format( shot ) )
+        return errValue
+
+    fname_result    = get_result_fname( name, shot, key )
+    if os.path.isfile( fname_result ):
+        with np.load( fname_result ) as data:
+            return data[name]
+
+    if shot_data is None:
+        shot_data   = tjk.Shot( shot, fname_in=fname_in )
+    try:
+        result  = DERIVED_RESULTS[name][0]( shot_data, params )[name]
+    except KeyError as err:
+        if not silent:
+            print( 'get_result: ERROR, shot {0}: channel {1} not found'.format( shot, err ) )
+        return errValue
+
+    # outdated results of the same shot and parameters are not needed anymore
+    for fname_old in glob.glob( get_result_fname( name, shot, '*' ) ):
+        try:
+            if load_result_params( fname_old ) == params:
+                os.remove( fname_old )
+        except (OSError, ValueError, KeyError):
+            continue
+
+    os.makedirs( os.path.dirname( fname_result ), exist_ok=True )
+    fname_tmp   = '{0}.{1}.tmp'.format( fname_result, os.getpid() )
+    try:
+        with open( fname_tmp, 'wb' ) as f_result:
+            np.savez( f_result, **{ name: result, 'params': json.dumps( params, sort_keys=True ) } )
+        os.replace( fname_tmp, fname_result )
+    except OSError as err:
+        print( 'get_result: ERROR, <{0}> could not be written: {1}'.format( fname_result, err ) )
+        if os.path.isfile( fname_tmp ):
+            os.remove( fname_tmp )
+
+    if not silent:
+        print( '    shot={0:d}: {1} calculated'.format( shot, name ) )
+
+    return result
+    #}}}
+
+
+def get_outdated_shots( names, shots, params=None ):
+    #{{{
+    """
+    Returns the shots for which results are missing or outdated.
+
+    Parameters
+    ----------
+    names : list of str
+        Names of the results, keys of DERIVED_RESULTS.
+    shots : list of int
+        Shot numbers, shots without data file are skipped.
+    params : dict, optional
+        Parameter values differing from the defaults, per result name.
+
+    Returns
+    -------
+    dict
+        Dictionary with the result names as keys and lists of shot numbers
+        as values.
+    """
+
+    if params is None:
+        params  = {}
+
+    outdated    = { name: [] for name in names }
+    for shot in shots:
+        for name in names:
+            key = get_result_key( name, shot, params=params.get( name ) )
+            if isinstance(key, int):
+                continue
+            if not os.path.isfile( get_result_fname( name, shot, key ) ):
+                outdated[name].append( shot )
+
+    return outdated
+    #}}}
+
+
+def update_results( names, shots, params=None, n_workers=4, silent=True ):
+    #{{{
+    """
+    Calculates the missing or outdated results of several shots.
+
+    All results of a shot are calculated from the same tjk.Shot, i.e. the
+    file is read only once. Shots are processed in parallel.
+
+    Parameters
+    ----------
+    names : list of str
+        Names of the results, keys of DERIVED_RESULTS.
+    shots : list of int
+        Shot numbers.
+    params : dict, optional
+        Parameter values differing from the defaults, per result name.
+    n_workers : int, optional
+        Number of shots processed in parallel.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    int
+        Number of results which were (re-)calculated.
+    """
+
+    if params is None:
+        params  = {}
+
+    outdated    = get_outdated_shots( names, shots, params=params )
+    shots2do    = sorted( set( shot for shots_name in outdated.values() for shot in shots_name ) )
+    if not silent:
+        print( 'update_results: {0} of {1} shots need to be (re-)calculated'.format( len(shots2do), len(shots) ) )
+
+    def update_shot( shot ):
+        n_done  = 0
+        with tjk.Shot( shot ) as shot_data:
+            for name in names:
+                if shot not in outdated[name]:
+                    continue
+                result  = get_result( name, shot, params=params.get( name ), shot_data=shot_data, silent=silent )
+                if not isinstance(result, int):
+                    n_done += 1
+        return n_done
+
+    with concurrent.futures.ThreadPoolExecutor( max_workers=n_workers ) as executor:
+        n_done  = sum( executor.map( update_shot, shots2do ) )
+
+    return n_done
+    #}}}
+
+
+def prune_results( names=None, silent=True ):
+    #{{{
+    """
+    Removes stored results which are outdated.
+
+    A result is outdated if its provenance key, calculated with the parameter
+    values stored with the result, changed or if the data file does not
+    exist anymore.
+
+    Parameters
+    ----------
+    names : list of str, optional
+        Names of the results, all results of DERIVED_RESULTS if not set.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    int
+        Number of results which were removed.
+    """
+
+    if names is None:
+        names   = list( DERIVED_RESULTS )
+
+    n_removed   = 0
+    for name in names:
+        for fname_result in glob.glob( os.path.join( RESULTS_DIR, name, '*.npz' ) ):
+            shot, key   = os.path.basename( fname_result )[:-4].split( '_' )
+            try:
+                params  = load_result_params( fname_result )
+            except (OSError, ValueError, KeyError):
+                params  = None
+            if (params is not None) and (get_result_key( name, int(shot), params=params ) == key):
+                continue
+            os.remove( fname_result )
+            n_removed  += 1
+            if not silent:
+                print( '    removed {0}'.format( fname_result ) )
+
+    return n_removed
+    #}}}
+
+
+def main():
+#{{{
+    # initialize parser for command line options
+    parser      = argparse.ArgumentParser( description='cache of derived results of tjk-monitor data' )
+    subparsers  = parser.add_subparsers( dest='command', required=True )
+
+    parser_status   = subparsers.add_parser( 'status', help='count missing or outdated results' )
+    parser_update   = subparsers.add_parser( 'update', help='calculate missing or outdated results' )
+    for subparser in [ parser_status, parser_update ]:
+        subparser.add_argument( "-s", "--shot_start", type=int, required=True,
+                help='First shot number' )
+        subparser.add_argument( "-e", "--shot_end", type=int, default=None,
+                help='Last shot number (default: first shot number)' )
+        subparser.add_argument( "-r", "--results", type=str, nargs='+', default=list( DERIVED_RESULTS ),
+                choices=list( DERIVED_RESULTS ), help='Results to consider' )
+    parser_update.add_argument( "-j", "--n_workers", type=int, default=4,
+            help='Number of shots processed in parallel' )
+
+    parser_prune    = subparsers.add_parser( 'prune', help='remove outdated results' )
+
+    # read all arguments from command line
+    args    = parser.parse_args()
+
+    if args.command == 'prune':
+        print( '{0} results removed'.format( prune_results( silent=False ) ) )
+        return
+
+    shot_end    = args.shot_end if args.shot_end is not None else args.shot_start
+    shots       = range( args.shot_start, shot_end+1 )
+    if args.command == 'status':
+        outdated    = get_outdated_shots( args.results, shots )
+        for name in args.results:
+            print( '{0}\t{1} shots outdated\t{2}'.format( name, len(outdated[name]),
+                   ', '.join( str(shot) for shot in outdated[name] ) ) )
+    elif args.command == 'update':
+        n_done  = update_results( args.results, shots, n_workers=args.n_workers, silent=False )
+        print( '{0} results calculated'.format( n_done ) )
+#}}}
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,442 @@
+# coding=utf-8
+
+__author__      = 'Alf Köhn-Seemann'
+__email__       = 'koehn@igvp.uni-stuttgart.de'
+__copyright__   = 'University of Stuttgart'
+__license__     = 'MIT'
+
+"""
+Rolling-window statistics of time traces.
+
+Moving mean and standard deviation are calculated from cumulative sums,
+moving minimum and maximum with the van Herk/Gil-Werman algorithm (the
+vectorized equivalent of a monotonic deque), i.e. the computational cost does
+not depend on the window size. The moving median uses the rank filter of
+scipy.ndimage, i.e. its cost grows only with log(window).
+
+All statistics are trailing windows, the value at sample i is calculated
+from samples i-window+1 to i (fewer at the beginning of the trace). The
+calculation is done chunk by chunk with an overlap of window-1 samples, such
+that it works on streamed traces (see iter_traces in TJK-monitor.py) and
+gives the same result as for the complete trace.
+"""
+
+
+# import standard modules
+import argparse
+import heapq
+import matplotlib.pyplot as plt
+import numpy as np
+
+# scipy is only required for a fast moving median
+try:
+    import scipy.ndimage
+except ImportError:
+    scipy = None
+
+# import some TJ-K related function
+import importlib    # required due to the dash in the filename
+tjk = importlib.import_module("TJK-monitor")
+
+
+# statistics which can be calculated
+ROLLING_STATS   = [ 'mean', 'std', 'min', 'max', 'median' ]
+
+
+def calc_rolling_sums( x, window, ddof=1 ):
+    #{{{
+    """
+    Returns trailing-window mean and standard deviation using cumulative sums.
+
+    To avoid round-off errors of sum(x**2) - sum(x)**2/n for signals with an
+    offset, the mean is subtracted before summing: the trace is split into
+    blocks of the window size, the windows ending in a block are summed
+    relative to the mean of this and the previous block (which contain them
+    completely).
+
+    Parameters
+    ----------
+    x : numpy.array
+        Time trace.
+    window : int
+        Number of samples per window.
+    ddof : int, optional
+        Delta degrees of freedom for the standard deviation.
+
+    Returns
+    -------
+    list
+        List containing moving mean and moving standard deviation.
+    """
+
+    n_pts   = len(x)
+    if n_pts == 0:
+        return [ np.zeros( 0 ), np.zeros( 0 ) ]
+
+    # one block of padding in front, pairs of consecutive blocks
+    n_blocks    = -(-n_pts // window)
+    padded      = np.zeros( (n_blocks+1)*window )
+    padded[window:window+n_pts] = x
+    valid       = np.zeros( (n_blocks+1)*window, dtype=bool )
+    valid[window:window+n_pts]  = True
+    padded      = padded.reshape( n_blocks+1, window )
+    valid       = valid.reshape( n_blocks+1, window )
+    pairs       = np.concatenate( ( padded[:-1], padded[1:] ), axis=1 )
+    valid       = np.concatenate( ( valid[:-1], valid[1:] ), axis=1 )
+
+    shift   = np.sum( pairs, axis=1 ) / np.sum( valid, axis=1 )
+    dev     = np.where( valid, pairs - shift[:,None], 0. )
+    cs1     = np.concatenate( ( np.zeros( (n_blocks, 1) ), np.cumsum( dev, axis=1 ) ), axis=1 )
+    cs2     = np.concatenate( ( np.zeros( (n_blocks, 1) ), np.cumsum( dev**2, axis=1 ) ), axis=1 )
+
+    # window ending at sample window+k of a pair covers samples k+1 to window+k
+    ids_end = np.arange( window+1, 2*window+1 )
+    sum1    = (cs1[:,ids_end] - cs1[:,ids_end-window]).ravel()[:n_pts]
+    sum2    = (cs2[:,ids_end] - cs2[:,ids_end-window]).ravel()[:n_pts]
+    shift   = np.repeat( shift, window )[:n_pts]
+    counts  = np.minimum( np.arange( 1, n_pts+1 ), window )
+
+    mean    = sum1 / counts
+    with np.errstate( divide='ignore', invalid='ignore' ):
+        var = (sum2 - sum1**2/counts) / (counts - ddof)
+    var[counts <= ddof] = np.nan
+
+    return [ mean + shift, np.sqrt( np.maximum( var, 0. ) ) ]
+    #}}}
+
+
+def calc_rolling_extremum( x, window, func=np.maximum ):
+    #{{{
+    """
+    Returns trailing-window maximum (or minimum) in O(n).
+
+    van Herk/Gil-Werman algorithm: the trace is split into blocks of the
+    window size, for which prefix and suffix extrema are calculated, every
+    window then spans the suffix of one block and the prefix of the next.
+
+    Parameters
+    ----------
+    x : numpy.array
+        Time trace.
+    window : int
+        Number of samples per window.
+    func : numpy.ufunc, optional
+        np.maximum or np.minimum.
+
+    Returns
+    -------
+    numpy.array
+        Moving maximum (or minimum).
+    """
+
+    n_pts   = len(x)
+    if (n_pts == 0) or (window == 1):
+        return x.astype( np.float64 )
+
+    fill    = -np.inf if func is np.maximum else np.inf
+
+    # pad front (partial windows at the beginning) and back (full blocks)
+    n_blocks    = -(-(n_pts + window - 1) // window)
+    padded      = np.full( n_blocks*window, fill )
+    padded[window-1:window-1+n_pts] = x
+    blocks      = padded.reshape( n_blocks, window )
+
+    prefix  = func.accumulate( blocks, axis=1 ).ravel()
+    suffix  = func.accumulate( blocks[:,::-1], axis=1 )[:,::-1].ravel()
+
+    # window ending at sample i of x covers padded[i:i+window]
+    ids     = np.arange( n_pts )
+    return func( suffix[ids], prefix[ids+window-1] )
+    #}}}
+
+
+def calc_expanding_median( x ):
+    #{{{
+    """
+    Returns the median of x[:i+1] for every i in O(n log n).
+
+    Two heaps hold the lower (as negative values) and the upper half.
+    """
+
+    lower, upper    = [], []
+    median  = np.empty( len(x) )
+    for ii, value in enumerate( x.tolist() ):
+        if (len(lower) == 0) or (value <= -lower[0]):
+            heapq.heappush( lower, -value )
+        else:
+            heapq.heappush( upper, value )
+        # lower half has the same number of values as upper one or one more
+        if len(lower) > len(upper) + 1:
+            heapq.heappush( upper, -heapq.heappop( lower ) )
+        elif len(upper) > len(lower):
+            heapq.heappush( lower, -heapq.heappop( upper ) )
+        if len(lower) > len(upper):
+            median[ii]  = -lower[0]
+        else:
+            median[ii]  = .5*(upper[0] - lower[0])
+
+    return median
+    #}}}
+
+
+def calc_rolling_median( x, window, state=None ):
+    #{{{
+    """
+    Returns trailing-window median, optionally continuing a previous chunk.
+
+    The full windows are calculated with the rank filter of scipy.ndimage
+    (O(n log(window))), the partial windows at the beginning of the trace
+    with calc_expanding_median. Without scipy, windows are sorted in blocks
+    (O(n window)). The last window-1 samples are carried over between
+    chunks.
+
+    Parameters
+    ----------
+    x : numpy.array
+        Time trace (or chunk of it).
+    window : int
+        Number of samples per window.
+    state : numpy.array, optional
+        State returned for the previous chunk.
+
+    Returns
+    -------
+    list
+        List containing the moving median and the state for the next chunk.
+    """
+
+    overlap = np.zeros( 0 ) if state is None else state
+    data    = np.concatenate( (overlap, np.asarray( x, dtype=np.float64 )) )
+
+    median  = np.empty( len(data) )
+    # partial windows exist only at the beginning of the trace
+    n_partial   = min( window-1, len(data) )
+    if len(overlap) < n_partial:
+        median[:n_partial]  = calc_expanding_median( data[:n_partial] )
+
+    if len(data) >= window:
+        if scipy is not None:
+            # centered filter, window ending at sample i is centered at
+            # i-window+1+window//2
+            ranks   = [ window//2 ] if window % 2 else [ window//2-1, window//2 ]
+            filtered    = [ scipy.ndimage.rank_filter( data, rank=rank, size=window, mode='nearest' )
+                            for rank in ranks ]
+            ids     = np.arange( window-1, len(data) ) - window + 1 + window//2
+            median[window-1:]   = np.mean( [ values[ids] for values in filtered ], axis=0 )
+        else:
+            windows = np.lib.stride_tricks.sliding_window_view( data, window )
+            n_rows  = max( 1, 2**20 // window )
+            for ii in range( 0, len(windows), n_rows ):
+                median[window-1+ii:window-1+ii+n_rows]  = np.median( windows[ii:ii+n_rows], axis=1 )
+
+    state   = data[ max( len(data)-(window-1), 0 ): ] if window > 1 else data[:0]
+
+    return [ median[len(overlap):], state ]
+    #}}}
+
+
+def calc_rolling_stats( x, window, stats=('mean', 'std'), ddof=1, state=None ):
+    #{{{
+    """
+    Returns rolling-window statistics, optionally continuing a previous chunk.
+
+    The last window-1 samples of each chunk are kept as overlap for the next
+    one, the result is identical to processing the complete trace at once.
+
+    Parameters
+    ----------
+    x : numpy.array
+        Time trace (or chunk of it).
+    window : int
+        Number of samples per window.
+    stats : list of str, optional
+        Statistics to calculate, see ROLLING_STATS.
+    ddof : int, optional
+        Delta degrees of freedom for the standard deviation.
+    state : dict, optional
+        State returned for the previous chunk.
+
+    Returns
+    -------
+    list
+        List containing a dictionary with the statistics as keys and their
+        values for the samples of x, and the state for the next chunk.
+    """
+
+    if state is None:
+        state   = { 'overlap': np.zeros( 0 ), 'median': None }
+
+    x       = np.asarray( x, dtype=np.float64 )
+    overlap = state['overlap']
+    data    = np.concatenate( (overlap, x) )
+
+    result  = {}
+    if ('mean' in stats) or ('std' in stats):
+        mean, std   = calc_rolling_sums( data, window, ddof=ddof )
+        if 'mean' in stats:
+            result['mean']  = mean[len(overlap):]
+        if 'std' in stats:
+            result['std']   = std[len(overlap):]
+    if 'max' in stats:
+        result['max']   = calc_rolling_extremum( data, window, np.maximum )[len(overlap):]
+    if 'min' in stats:
+        result['min']   = calc_rolling_extremum( data, window, np.minimum )[len(overlap):]
+    if 'median' in stats:
+        result['median'], state['median']   = calc_rolling_median( x, window, state=state['median'] )
+
+    state['overlap']    = data[ max( len(data)-(window-1), 0 ): ] if window > 1 else data[:0]
+
+    return [ result, state ]
+    #}}}
+
+
+def iter_rolling_stats( chunks, window, stats=('mean', 'std'), ddof=1 ):
+    #{{{
+    """
+    Generator yielding rolling-window statistics chunk by chunk.
+
+    Parameters
+    ----------
+    chunks : iterable of numpy.array
+        Chunks of the time trace.
+    window : int
+        Number of samples per window.
+    stats : list of str, optional
+        Statistics to calculate, see ROLLING_STATS.
+    ddof : int, optional
+        Delta degrees of freedom for the standard deviation.
+
+    Yields
+    ------
+    dict
+        Dictionary with the statistics as keys and their values for the
+        samples of the chunk.
+    """
+
+    state   = None
+    for chunk in chunks:
+        result, state   = calc_rolling_stats( chunk, window, stats=stats, ddof=ddof, state=state )
+        yield result
+    #}}}
+
+
+def rolling_stats( x, window, stats=('mean', 'std'), ddof=1, chunk_size=1000000 ):
+    #{{{
+    """
+    Returns rolling-window statistics of a time trace.
+
+    Parameters
+    ----------
+    x : numpy.array
+        Time trace.
+    window : int
+        Number of samples per window.
+    stats : list of str, optional
+        Statistics to calculate, see ROLLING_STATS.
+    ddof : int, optional
+        Delta degrees of freedom for the standard deviation.
+    chunk_size : int, optional
+        The trace is processed in chunks of this size (bounds round-off
+        errors of the cumulative sums and memory usage).
+
+    Returns
+    -------
+    dict
+        Dictionary with the statistics as keys and numpy.arrays of the same
+        length as x as values.
+    """
+
+    chunks  = ( x[ii:ii+chunk_size] for ii in range( 0, max( len(x), 1 ), chunk_size ) )
+    results = list( iter_rolling_stats( chunks, window, stats=stats, ddof=ddof ) )
+
+    return { stat: np.concatenate( [ result[stat] for result in results ] ) for stat in stats }
+    #}}}
+
+
+def iter_rolling_traces( traces, window, stats=('mean', 'std'), ddof=1 ):
+    #{{{
+    """
+    Generator yielding rolling-window statistics of streamed traces.
+
+    Parameters
+    ----------
+    traces : iterable of dict
+        Chunks as yielded by iter_traces in TJK-monitor.py.
+    window : int
+        Number of samples per window.
+    stats : list of str, optional
+        Statistics to calculate, see ROLLING_STATS.
+    ddof : int, optional
+        Delta degrees of freedom for the standard deviation.
+
+    Yields
+    ------
+    dict
+        Dictionary with the channel names as keys and dictionaries as
+        yielded by iter_rolling_stats as values (the time column, if
+        present, is passed through unchanged).
+    """
+
+    states  = {}
+    for chunk in traces:
+        result  = {}
+        for chName, values in chunk.items():
+            if chName == 'Zeit [ms]':
+                result[chName]  = values
+                continue
+            result[chName], states[chName]  = calc_rolling_stats( values, window, stats=stats,
+                                                                  ddof=ddof, state=states.get( chName ) )
+        yield result
+    #}}}
+
+
+def main():
+#{{{
+    # initialize parser for command line options
+    parser  = argparse.ArgumentParser( description='plot rolling-window statistics of time traces' )
+    parser.add_argument( "-s", "--shot", type=int, required=True,
+            help='Shot number' )
+    parser.add_argument( "-c", "--channels", type=str, nargs='+', required=True,
+            help='Channel names' )
+    parser.add_argument( "-w", "--window", type=int, default=100,
+            help='Number of samples per window' )
+    parser.add_argument( "--stats", type=str, nargs='+', default=['mean', 'std'],
+            choices=ROLLING_STATS, help='Statistics to calculate' )
+    parser.add_argument( "--t_start", type=float, default=None,
+            help='Start of time window in ms' )
+    parser.add_argument( "--t_end", type=float, default=None,
+            help='End of time window in ms' )
+    # read all arguments from command line
+    args    = parser.parse_args()
+
+    chunks  = tjk.iter_traces( args.shot, ['Zeit [ms]'] + args.channels,
+                               t_start=args.t_start, t_end=args.t_end )
+    results = list( iter_rolling_traces( chunks, args.window, stats=args.stats ) )
+    if len(results) == 0:
+        return
+
+    time    = np.concatenate( [ result['Zeit [ms]'] for result in results ] )
+    fig, axs    = plt.subplots( len(args.channels), 1, sharex=True, squeeze=False )
+    for ax, chName in zip( axs[:,0], args.channels ):
+        stats   = { stat: np.concatenate( [ result[chName][stat] for result in results ] )
+                    for stat in args.stats }
+        if 'mean' in stats:
+            ax.plot( time, stats['mean'], label='mean' )
+            if 'std' in stats:
+                ax.fill_between( time, stats['mean']-stats['std'], stats['mean']+stats['std'],
+                                 alpha=.3, label='mean $\\pm$ std' )
+        elif 'std' in stats:
+            ax.plot( time, stats['std'], label='std' )
+        for stat in ('min', 'max', 'median'):
+            if stat in stats:
+                ax.plot( time, stats[stat], label=stat )
+        ax.set_ylabel( chName )
+        ax.legend( loc='upper right' )
+    axs[-1,0].set_xlabel( 'time in ms' )
+    axs[0,0].set_title( '#{0}, window {1} samples'.format( args.shot, args.window ) )
+    plt.show()
+#}}}
+
+
+if __name__ == '__main__':
+    main()
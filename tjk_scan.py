@@ -0,0 +1,647 @@
+# coding=utf-8
+
+__author__      = 'Alf Köhn-Seemann'
+__email__       = 'koehn@igvp.uni-stuttgart.de'
+__copyright__   = 'University of Stuttgart'
+__license__     = 'MIT'
+
+"""
+Parameter scans over many shots, e.g. density vs neutral gas pressure.
+
+For a list of shots and the quantities on the x- and y-axis, all required
+channels are read concurrently (see get_traces_shots in TJK-monitor.py), the
+traces of all shots are stacked into 2D arrays (padded with NaN), and the
+discharge windows and plateau values of all shots are calculated at once.
+Shots with (approximately) the same x-value are grouped, the confidence
+intervals of the group means are estimated by bootstrapping, e.g.
+
+    python tjk_scan.py -s 12838-12887 -x p0_labbook -y ne
+
+Quantities are the keys of SCAN_QUANTITIES or of get_channel_config with a
+finite conversion factor (their plateau value is used).
+"""
+
+
+# import standard modules
+import argparse
+import matplotlib.pyplot as plt
+import numpy as np
+
+# import some TJ-K related function
+import importlib    # required due to the dash in the filename
+tjk = importlib.import_module("TJK-monitor")
+
+
+# derived quantities: diagnostics (keys of get_channel_config) required and
+# axis label
+SCAN_QUANTITIES = {
+        'p0'            : [ ['p0'],                     r'$p_0$ in $\mathrm{mPa}$' ],
+        'p0_labbook'    : [ [],                         r'$p_0$ (lab book) in $\mathrm{mPa}$' ],
+        'ne'            : [ ['interf', 'P2GHz_in', 'P2GHz_out'],
+                            r'$\bar{n}_e$ in $10^{17}\,\mathrm{m}^{-3}$' ],
+        'Pabs2'         : [ ['P2GHz_in', 'P2GHz_out'],  r'$P_\mathrm{abs}$ in $\mathrm{W}$' ],
+        'P8GHz'         : [ ['P8GHz_in', 'P2GHz_in', 'P2GHz_out'],
+                            r'$P_\mathrm{8\,GHz}$ in $\mathrm{W}$' ],
+        }
+
+# number of bootstrap samples and confidence level in percent
+N_BOOT      = 1000
+CONF_LEVEL  = 95.
+
+
+def get_scan_diagnostics( quantities ):
+    #{{{
+    """
+    Returns the diagnostics which are required to calculate some quantities.
+
+    Plateau values require the discharge window, i.e. the 2.45 GHz power.
+
+    Parameters
+    ----------
+    quantities : list of str
+        Keys of SCAN_QUANTITIES or of get_channel_config.
+
+    Returns
+    -------
+    list
+        List of keys of get_channel_config, returns errValue (-1) if a
+        quantity is unknown.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    chCfg   = tjk.get_channel_config( 0 )
+
+    diagnostics = []
+    for quantity in quantities:
+        if quantity in SCAN_QUANTITIES:
+            diagnostics += SCAN_QUANTITIES[quantity][0]
+        elif (quantity in chCfg) and np.isfinite( chCfg[quantity][1] ):
+            diagnostics += [ quantity, 'P2GHz_in', 'P2GHz_out' ]
+        else:
+            print( 'get_scan_diagnostics: ERROR, unknown quantity <{0}>'.format( quantity ) )
+            return errValue
+
+    return list( dict.fromkeys( diagnostics ) )
+    #}}}
+
+
+def load_scan_traces( shots, diagnostics, n_workers=32, silent=True ):
+    #{{{
+    """
+    Reads the time traces of several diagnostics from many shots concurrently.
+
+    Channel names change between shots (see get_channel_config), shots with
+    the same channel names are read together.
+
+    Parameters
+    ----------
+    shots : list of int
+        Shot numbers.
+    diagnostics : list of str
+        Keys of get_channel_config.
+    n_workers : int, optional
+        Number of concurrent read requests.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    dict
+        Dictionary with shot numbers as keys and dictionaries with the
+        diagnostics and 'time' as keys and the time traces as values, shots
+        which could not be read are omitted.
+    """
+
+    groups  = {}
+    for shot in shots:
+        chCfg   = tjk.get_channel_config( shot )
+        chNames = tuple( [ 'Zeit [ms]' ] + [ chCfg[key][0] for key in diagnostics ] )
+        groups.setdefault( chNames, [] ).append( shot )
+
+    traces  = {}
+    for chNames, shots_group in groups.items():
+        traces_group    = tjk.get_traces_shots( shots_group, list( dict.fromkeys( chNames ) ),
+                                                n_workers=n_workers, silent=silent )
+        for shot, traces_shot in traces_group.items():
+            traces[shot]    = { key: traces_shot[chName] for key, chName in zip( diagnostics, chNames[1:] ) }
+            traces[shot]['time']    = traces_shot['Zeit [ms]']
+
+    return { shot: traces[shot] for shot in shots if shot in traces }
+    #}}}
+
+
+def stack_traces( traces, key ):
+    #{{{
+    """
+    Returns the time traces of many shots as one 2D array padded with NaN.
+
+    Parameters
+    ----------
+    traces : dict
+        Dictionary as returned by load_scan_traces.
+    key : str
+        Diagnostic (or 'time').
+
+    Returns
+    -------
+    numpy.array
+        2D numpy.array with one row per shot.
+    """
+
+    n_pts   = max( [ len(traces_shot[key]) for traces_shot in traces.values() ] + [0] )
+    stacked = np.full( (len(traces), n_pts), np.nan )
+    for ii, traces_shot in enumerate( traces.values() ):
+        stacked[ii,:len(traces_shot[key])]  = traces_shot[key]
+
+    return stacked
+    #}}}
+
+
+def calc_discharge_windows( time, power, threshold_rel=.1 ):
+    #{{{
+    """
+    Returns start and end of the discharges of many shots.
+
+    Same as get_discharge_window in TJK-monitor.py, applied to all rows of
+    stacked arrays at once.
+
+    Parameters
+    ----------
+    time : numpy.array
+        2D numpy.array of time axes, one row per shot.
+    power : numpy.array
+        2D numpy.array of heating powers, one row per shot.
+    threshold_rel : float, optional
+        Heating is considered to be on when the power exceeds this fraction
+        of its maximum.
+
+    Returns
+    -------
+    list
+        List containing two numpy.arrays, start and end time of the
+        discharges (NaN if no discharge was found).
+    """
+
+    with np.errstate( invalid='ignore' ):
+        power_max   = np.nanmax( np.where( np.isnan( power ), -np.inf, power ), axis=1 )
+        is_on       = power > threshold_rel*power_max[:,None]
+    found   = np.any( is_on, axis=1 ) & (power_max > 0)
+
+    rows    = np.arange( time.shape[0] )
+    ii_on   = np.argmax( is_on, axis=1 )
+    ii_off  = time.shape[1] - 1 - np.argmax( is_on[:,::-1], axis=1 )
+
+    t_on    = np.where( found, time[rows,ii_on],  np.nan )
+    t_off   = np.where( found, time[rows,ii_off], np.nan )
+
+    return [ t_on, t_off ]
+    #}}}
+
+
+def calc_plateaus( time, traces, t_on, t_off, frac=.5 ):
+    #{{{
+    """
+    Returns mean and standard deviation of the plateau of many shots.
+
+    Same as get_plateau in TJK-monitor.py, applied to all rows of stacked
+    arrays at once.
+
+    Parameters
+    ----------
+    time : numpy.array
+        2D numpy.array of time axes, one row per shot.
+    traces : numpy.array
+        2D numpy.array of time traces, one row per shot.
+    t_on : numpy.array
+        Start of discharges.
+    t_off : numpy.array
+        End of discharges.
+    frac : float, optional
+        Fraction of the discharge used as plateau.
+
+    Returns
+    -------
+    list
+        List containing two numpy.arrays, NaN if plateau is empty.
+    """
+
+    t_mid       = .5*(t_on + t_off)
+    t_halfwidth = .5*frac*(t_off - t_on)
+    with np.errstate( invalid='ignore' ):
+        in_plateau  = (time >= (t_mid-t_halfwidth)[:,None]) & (time <= (t_mid+t_halfwidth)[:,None])
+
+    counts  = np.sum( in_plateau, axis=1 )
+    with np.errstate( invalid='ignore', divide='ignore' ):
+        mean    = np.sum( np.where( in_plateau, traces, 0. ), axis=1 ) / counts
+        var     = np.sum( np.where( in_plateau, (traces - mean[:,None])**2, 0. ), axis=1 ) / counts
+
+    return [ mean, np.sqrt( var ) ]
+    #}}}
+
+
+def apply_calibration( func, stacked, shots, name, **kwargs ):
+    #{{{
+    """
+    Applies a calibration function to stacked time traces of many shots.
+
+    Shots with the same calibration are processed at once, i.e. all shots
+    in a single call if the calibration did not change during the scan.
+
+    Parameters
+    ----------
+    func : function
+        Calibration function with the keyword argument shot, e.g.
+        tjk.calc_2GHzPower.
+    stacked : numpy.array
+        Time traces as returned by stack_traces, might be modified by func.
+    shots : list of int
+        Shot numbers of the rows.
+    name : str
+        Name of the calibration, key of tjk.CALIBRATIONS.
+    **kwargs
+        Further arguments passed to func.
+
+    Returns
+    -------
+    numpy.array
+        Calibrated time traces.
+    """
+
+    shot_mins   = np.array( [ tjk.get_calibration( name, shot )['shot_min'] for shot in shots ] )
+    if np.all( shot_mins == shot_mins[0] ):
+        return func( stacked, shot=shots[0], **kwargs )
+
+    calibrated  = np.empty( stacked.shape )
+    for shot_min in np.unique( shot_mins ):
+        rows                = np.flatnonzero( shot_mins == shot_min )
+        calibrated[rows]    = func( stacked[rows], shot=shots[rows[0]], **kwargs )
+
+    return calibrated
+    #}}}
+
+
+def calc_scan_values( traces, quantities, frac=.5, silent=True ):
+    #{{{
+    """
+    Calculates the scalar values of some quantities for many shots.
+
+    Parameters
+    ----------
+    traces : dict
+        Dictionary as returned by load_scan_traces.
+    quantities : list of str
+        Keys of SCAN_QUANTITIES or of get_channel_config.
+    frac : float, optional
+        Fraction of the discharge used as plateau.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    dict
+        Dictionary with the quantities and 'shot' as keys and numpy.arrays
+        (one value per shot) as values, the uncertainties are stored with the
+        suffix '_err'.
+    """
+
+    shots   = list( traces )
+    values  = { 'shot': np.array( shots, dtype=int ) }
+    if len(shots) == 0:
+        for quantity in quantities:
+            values[quantity]            = np.zeros( 0 )
+            values[quantity + '_err']   = np.zeros( 0 )
+        return values
+
+    lengths = np.array( [ len(traces_shot['time']) for traces_shot in traces.values() ] )
+    time    = stack_traces( traces, 'time' )
+
+    # discharge windows are only required for plateau values
+    t_on    = t_off = None
+    if any( quantity not in ('p0', 'p0_labbook') for quantity in quantities ):
+        # note: calc_2GHzPower modifies its input, the stacked arrays are copies
+        Pabs2   = ( apply_calibration( tjk.calc_2GHzPower, stack_traces( traces, 'P2GHz_in' ),  shots,
+                                       'P2GHz', output='watt', direction='fw' )
+                   -apply_calibration( tjk.calc_2GHzPower, stack_traces( traces, 'P2GHz_out' ), shots,
+                                       'P2GHz', output='watt', direction='bw' ) )
+        t_on, t_off = calc_discharge_windows( time, Pabs2 )
+        values['t_on'], values['t_off'] = t_on, t_off
+
+    chCfg   = tjk.get_channel_config( 0 )
+    for quantity in quantities:
+        if quantity == 'p0':
+            # only the first samples are used, i.e. no need to stack
+            p0  = np.array( [ tjk.get_pressure( shot, pressure=traces[shot]['p0'] ) for shot in shots ] )
+            values['p0'], values['p0_err']  = p0[:,0], p0[:,1]
+            continue
+        elif quantity == 'p0_labbook':
+            p0  = np.array( [ tjk.get_pressure_labbook( shot ) for shot in shots ] )
+            values['p0_labbook'], values['p0_labbook_err']  = p0[:,0], p0[:,1]
+            continue
+        elif quantity == 'ne':
+            # offset is taken from the end of each trace, calibration depends on the shot
+            stacked = stack_traces( traces, 'interf' )
+            for ii, shot in enumerate( shots ):
+                stacked[ii,:lengths[ii]]    = tjk.get_lineAvgDensity( stacked[ii,:lengths[ii]], shot )
+        elif quantity == 'Pabs2':
+            stacked = Pabs2
+        elif quantity == 'P8GHz':
+            stacked = apply_calibration( tjk.calc_8GHzPower, stack_traces( traces, 'P8GHz_in' ), shots,
+                                         'P8GHz', direction='fw' )
+        else:
+            stacked = stack_traces( traces, quantity ) * chCfg[quantity][1]
+        values[quantity], values[quantity + '_err'] = calc_plateaus( time, stacked, t_on, t_off, frac=frac )
+
+    if not silent:
+        print( 'calc_scan_values: {0} shots, {1} samples'.format( len(shots), np.sum( lengths ) ) )
+
+    return values
+    #}}}
+
+
+def group_scan_values( x, bins=None, rtol=1e-3 ):
+    #{{{
+    """
+    Returns the group of each shot of a scan.
+
+    Parameters
+    ----------
+    x : numpy.array
+        Values of the scanned quantity.
+    bins : int or numpy.array, optional
+        Number of bins of equal width or bin edges. If not set, shots with
+        the same x-value (within a relative tolerance) form a group.
+    rtol : float, optional
+        Relative tolerance if bins is not set.
+
+    Returns
+    -------
+    numpy.array
+        Group index of each shot, -1 for shots without valid x-value.
+    """
+
+    valid   = np.isfinite( x )
+    groups  = np.full( len(x), -1 )
+    if not np.any( valid ):
+        return groups
+
+    if bins is None:
+        x_sorted    = np.unique( x[valid] )
+        is_new      = np.concatenate( ( [True], np.diff( x_sorted ) > rtol*np.abs( x_sorted[1:] ) ) )
+        edges       = x_sorted[is_new]
+        groups[valid]   = np.searchsorted( edges, x[valid], side='right' ) - 1
+    else:
+        if np.ndim( bins ) == 0:
+            bins    = np.linspace( np.min( x[valid] ), np.max( x[valid] ), int(bins)+1 )
+        groups[valid]   = np.clip( np.searchsorted( bins, x[valid], side='right' ) - 1, 0, len(bins)-2 )
+        groups[valid & ((x < bins[0]) | (x > bins[-1]))]    = -1
+
+    # remove empty groups
+    used    = np.unique( groups[groups >= 0] )
+    groups[groups >= 0] = np.searchsorted( used, groups[groups >= 0] )
+
+    return groups
+    #}}}
+
+
+def bootstrap_scan( x, y, y_err=None, bins=None, n_boot=N_BOOT, conf_level=CONF_LEVEL, seed=None ):
+    #{{{
+    """
+    Returns the scan curve with bootstrap confidence intervals.
+
+    The shots of each group are resampled with replacement, all groups and
+    bootstrap samples are drawn at once. Groups containing only one shot
+    get the uncertainty of this shot as confidence interval.
+
+    Parameters
+    ----------
+    x : numpy.array
+        Values of the scanned quantity, one per shot.
+    y : numpy.array
+        Values of the dependent quantity, one per shot.
+    y_err : numpy.array, optional
+        Uncertainties of y, used for groups with a single shot.
+    bins : int or numpy.array, optional
+        See group_scan_values.
+    n_boot : int, optional
+        Number of bootstrap samples.
+    conf_level : float, optional
+        Confidence level in percent.
+    seed : int, optional
+        Seed of the random number generator.
+
+    Returns
+    -------
+    dict
+        Dictionary with keys 'x', 'y' (mean values of the groups), 'y_lo',
+        'y_hi' (confidence interval) and 'n' (number of shots per group).
+    """
+
+    x       = np.asarray( x, dtype=np.float64 )
+    y       = np.asarray( y, dtype=np.float64 )
+    y_err   = np.zeros( len(y) ) if y_err is None else np.asarray( y_err, dtype=np.float64 )
+
+    groups  = group_scan_values( x, bins=bins )
+    groups[~np.isfinite( y )]   = -1
+    valid   = groups >= 0
+    order   = np.argsort( groups[valid], kind='stable' )
+    groups  = groups[valid][order]
+    x, y, y_err = x[valid][order], y[valid][order], y_err[valid][order]
+
+    n_groups    = (groups[-1] + 1) if len(groups) > 0 else 0
+    counts  = np.bincount( groups, minlength=n_groups )
+    used    = counts > 0
+    counts  = counts[used]
+    starts  = np.concatenate( ( [0], np.cumsum( counts )[:-1] ) ).astype( int )
+    n_groups    = len(counts)
+
+    curve   = { 'x' : np.add.reduceat( x, starts ) / counts if n_groups > 0 else np.zeros( 0 ),
+                'y' : np.add.reduceat( y, starts ) / counts if n_groups > 0 else np.zeros( 0 ),
+                'n' : counts }
+    if n_groups == 0:
+        curve['y_lo']   = curve['y_hi'] = np.zeros( 0 )
+        return curve
+
+    # indices of all bootstrap samples of all groups, shape (n_boot, n_groups, max(counts)),
+    # entries beyond the size of a group are masked
+    rng     = np.random.default_rng( seed )
+    n_max   = np.max( counts )
+    ids     = starts[None,:,None] + (rng.random( (n_boot, n_groups, n_max) )*counts[None,:,None]).astype( int )
+    mask    = np.arange( n_max )[None,None,:] < counts[None,:,None]
+    means   = np.sum( np.where( mask, y[ids], 0. ), axis=2 ) / counts[None,:]
+
+    alpha   = .5*(100. - conf_level)
+    curve['y_lo'], curve['y_hi']    = np.percentile( means, [alpha, 100.-alpha], axis=0 )
+
+    single  = counts == 1
+    curve['y_lo'][single]   = y[starts[single]] - y_err[starts[single]]
+    curve['y_hi'][single]   = y[starts[single]] + y_err[starts[single]]
+
+    return curve
+    #}}}
+
+
+def run_scan( shots, x='p0', y='ne', bins=None, frac=.5, n_boot=N_BOOT, conf_level=CONF_LEVEL,
+              n_workers=32, seed=None, silent=True ):
+    #{{{
+    """
+    Returns the scan curve of a quantity vs another one for a list of shots.
+
+    Parameters
+    ----------
+    shots : list of int
+        Shot numbers.
+    x : str, optional
+        Scanned quantity, key of SCAN_QUANTITIES or of get_channel_config.
+    y : str, optional
+        Dependent quantity, key of SCAN_QUANTITIES or of get_channel_config.
+    bins : int or numpy.array, optional
+        See group_scan_values.
+    frac : float, optional
+        Fraction of the discharge used as plateau.
+    n_boot : int, optional
+        Number of bootstrap samples.
+    conf_level : float, optional
+        Confidence level in percent.
+    n_workers : int, optional
+        Number of concurrent read requests.
+    seed : int, optional
+        Seed of the random number generator.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    list
+        List containing the values of all shots (see calc_scan_values) and
+        the scan curve (see bootstrap_scan), returns errValue (-1) on error.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    diagnostics = get_scan_diagnostics( [x, y] )
+    if isinstance(diagnostics, int):
+        return errValue
+
+    traces  = load_scan_traces( shots, diagnostics, n_workers=n_workers, silent=silent )
+    if (not silent) and (len(traces) < len(shots)):
+        print( 'run_scan: {0} of {1} shots could not be read'.format( len(shots)-len(traces), len(shots) ) )
+
+    values  = calc_scan_values( traces, list( dict.fromkeys( [x, y] ) ), frac=frac, silent=silent )
+    curve   = bootstrap_scan( values[x], values[y], y_err=values[y + '_err'], bins=bins,
+                              n_boot=n_boot, conf_level=conf_level, seed=seed )
+
+    return [ values, curve ]
+    #}}}
+
+
+def get_label( quantity ):
+    #{{{
+    """
+    Returns the axis label of a quantity.
+
+    Parameters
+    ----------
+    quantity : str
+        Key of SCAN_QUANTITIES or of get_channel_config.
+
+    Returns
+    -------
+    str
+    """
+
+    if quantity in SCAN_QUANTITIES:
+        return SCAN_QUANTITIES[quantity][1]
+
+    return tjk.get_channel_config( 0 )[quantity][3]
+    #}}}
+
+
+def plot_scan( values, curve, x, y, fname_out='', title='' ):
+    #{{{
+    """
+    Plots the values of all shots and the scan curve.
+
+    Parameters
+    ----------
+    values : dict
+        Values of all shots as returned by calc_scan_values.
+    curve : dict
+        Scan curve as returned by bootstrap_scan.
+    x : str
+        Scanned quantity.
+    y : str
+        Dependent quantity.
+    fname_out : str, optional
+        If set, the figure is saved to this file instead of being shown.
+    title : str, optional
+        Title of the plot.
+    """
+
+    fig, ax = plt.subplots( figsize=(8,6) )
+
+    ax.plot( values[x], values[y], linestyle='none', marker='.', color='grey', alpha=.6,
+             label='single shots' )
+    ax.errorbar( curve['x'], curve['y'],
+                 yerr=[ curve['y'] - curve['y_lo'], curve['y_hi'] - curve['y'] ],
+                 marker='o', capsize=3, label='mean, {0:.0f}% confidence'.format( CONF_LEVEL ) )
+    ax.set_xlabel( get_label( x ) )
+    ax.set_ylabel( get_label( y ) )
+    ax.legend( loc='best' )
+    if len(title) > 0:
+        ax.set_title( title )
+
+    if len(fname_out) > 0:
+        fig.savefig( fname_out, bbox_inches='tight' )
+        plt.close( fig )
+    else:
+        plt.show()
+    #}}}
+
+
+def main():
+#{{{
+    # initialize parser for command line options
+    parser  = argparse.ArgumentParser( description='parameter scan over many shots with bootstrap confidence intervals' )
+    parser.add_argument( "-s", "--shots", type=str, required=True,
+            help='Shot numbers, e.g. "12838-12887,12890"' )
+    parser.add_argument( "-x", type=str, default='p0',
+            help='Scanned quantity (default: p0)' )
+    parser.add_argument( "-y", type=str, default='ne',
+            help='Dependent quantity (default: ne)' )
+    parser.add_argument( "-b", "--bins", type=int, default=None,
+            help='Number of bins (default: group shots with equal x)' )
+    parser.add_argument( "--n_boot", type=int, default=N_BOOT,
+            help='Number of bootstrap samples' )
+    parser.add_argument( "-j", "--n_workers", type=int, default=32,
+            help='Number of concurrent read requests' )
+    parser.add_argument( "-o", "--fname_out", type=str, default='',
+            help='Save plot to this file instead of showing it' )
+    # read all arguments from command line
+    args    = parser.parse_args()
+
+    shots   = tjk.parse_shot_list( args.shots )
+    if isinstance(shots, int):
+        print( 'ERROR: invalid list of shots <{0}>'.format( args.shots ) )
+        return
+
+    result  = run_scan( shots, x=args.x, y=args.y, bins=args.bins, n_boot=args.n_boot,
+                        n_workers=args.n_workers, silent=False )
+    if isinstance(result, int):
+        return
+    values, curve   = result
+
+    print( 'shot\t{0}\t{1}\t{1}_err'.format( args.x, args.y ) )
+    for ii, shot in enumerate( values['shot'] ):
+        print( '{0}\t{1:.4g}\t{2:.4g}\t{3:.4g}'.format( shot, values[args.x][ii],
+                                                        values[args.y][ii], values[args.y + '_err'][ii] ) )
+
+    plot_scan( values, curve, args.x, args.y, fname_out=args.fname_out,
+               title='shots {0}'.format( args.shots ) )
+#}}}
+
+
+if __name__ == '__main__':
+    main()
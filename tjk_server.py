@@ -0,0 +1,568 @@
+# coding=utf-8
+
+__author__      = 'Alf Köhn-Seemann'
+__email__       = 'koehn@igvp.uni-stuttgart.de'
+__copyright__   = 'University of Stuttgart'
+__license__     = 'MIT'
+
+"""
+Small HTTP server to browse shots with a web browser.
+
+Time traces are served as tiles of min/max pyramids: level 0 contains the
+samples, every following level halves the resolution (keeping minimum and
+maximum), every tile contains TILE_SIZE bins. A browser showing a time range
+with a certain number of pixels then only transfers the few tiles of the
+matching level, i.e. kilobytes instead of whole files. Pyramids and encoded
+tiles are cached by the server, e.g.
+
+    python tjk_server.py --port 8050
+    (open http://localhost:8050 in a browser)
+
+API (all responses are JSON, except binary tiles):
+    /api/shots?shot_start=..&shot_end=..            rows of the summary database
+    /api/shot/<shot>                                channels, number of samples,
+                                                    time range, number of levels
+    /api/shot/<shot>/tile?channel=..&level=..&index=..&format=json|bin
+        tile with the keys 't' (start time of the bins in ms), 'min', 'max';
+        binary tiles contain t (float64), min and max (float32) as little
+        endian arrays, one after the other, the number of bins is given in
+        the header X-Tile-Bins
+"""
+
+
+# import standard modules
+import argparse
+import collections
+import http.server
+import json
+import numpy as np
+import os
+import threading
+import urllib.parse
+
+# import some TJ-K related function
+import importlib    # required due to the dash in the filename
+tjk = importlib.import_module("TJK-monitor")
+import tjk_summary
+
+
+# number of bins per tile
+TILE_SIZE       = 1024
+
+# number of shots for which pyramids are kept in memory
+PYRAMID_CACHE_SHOTS = 8
+
+# maximum size of all encoded tiles kept in memory in bytes (limited by the
+# share of caches in the memory budget as well, see tjk.get_cache_budget)
+TILE_CACHE_SIZE = 64*1024**2
+
+# caches are shared by all threads of the server, the size of the encoded
+# tiles is counted on insertion and eviction
+pyramid_cache   = collections.OrderedDict()
+tile_cache      = { 'entries'   : collections.OrderedDict(),
+                    'nbytes'    : 0 }
+cache_lock      = threading.Lock()
+
+
+def build_pyramid( trace ):
+    #{{{
+    """
+    Returns the min/max pyramid of a time trace.
+
+    Level 0 are the samples, each following level combines two bins of the
+    previous one. The pyramid has about twice the size of the trace and is
+    built in O(n).
+
+    Parameters
+    ----------
+    trace : numpy.array
+        Time trace.
+
+    Returns
+    -------
+    list
+        List of the levels, every level is a list containing the minimum and
+        maximum values of its bins.
+    """
+
+    levels  = [ [ trace, trace ] ]
+    while len(levels[-1][0]) > TILE_SIZE:
+        v_min, v_max    = levels[-1]
+        if len(v_min) % 2:
+            # NaN is ignored by fmin/fmax
+            v_min   = np.append( v_min, np.nan )
+            v_max   = np.append( v_max, np.nan )
+        levels.append( [ np.fmin( v_min[0::2], v_min[1::2] ),
+                         np.fmax( v_max[0::2], v_max[1::2] ) ] )
+
+    return levels
+    #}}}
+
+
+def get_pyramid( shot, chName ):
+    #{{{
+    """
+    Returns time axis and min/max pyramid of a channel, from cache if possible.
+
+    Parameters
+    ----------
+    shot : int
+        Shot number
+    chName : str
+        Name of the channel as written in the header of the file, or None
+        (then only the time axis and the header is returned).
+
+    Returns
+    -------
+    dict
+        Dictionary with keys 'time', 'header' and 'pyramid' (see
+        build_pyramid, None if chName is None). Returns errValue (-1) if
+        the file or the channel does not exist.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    fname_data  = tjk.get_fname_data( shot )
+    if not os.path.isfile( fname_data ):
+        return errValue
+    key = ( str(fname_data), os.stat( fname_data ).st_mtime_ns )
+
+    with cache_lock:
+        entry   = pyramid_cache.get( key )
+        if entry is not None:
+            pyramid_cache.move_to_end( key )
+    if entry is None:
+        header  = tjk.get_header( shot, fname_in=fname_data, silent=True )
+        traces  = tjk.get_traces( shot, ['Zeit [ms]'], fname_in=fname_data, silent=True )
+        if isinstance(header, int) or isinstance(traces, int):
+            return errValue
+        entry   = { 'time'      : traces['Zeit [ms]'],
+                    'header'    : [ chName.strip() for chName in header if len(chName.strip()) > 0 ],
+                    'pyramids'  : {} }
+        with cache_lock:
+            pyramid_cache[key]  = entry
+            while len(pyramid_cache) > PYRAMID_CACHE_SHOTS:
+                pyramid_cache.popitem( last=False )
+
+    if chName is None:
+        return { 'time': entry['time'], 'header': entry['header'], 'pyramid': None }
+    if chName not in entry['header']:
+        return errValue
+
+    if chName not in entry['pyramids']:
+        traces  = tjk.get_traces( shot, [chName], fname_in=fname_data, silent=True )
+        if isinstance(traces, int):
+            return errValue
+        entry['pyramids'][chName]   = build_pyramid( traces[chName] )
+
+    return { 'time': entry['time'], 'header': entry['header'],
+             'pyramid': entry['pyramids'][chName] }
+    #}}}
+
+
+def get_tile( shot, chName, level, index ):
+    #{{{
+    """
+    Returns a single tile of the min/max pyramid of a channel.
+
+    Parameters
+    ----------
+    shot : int
+        Shot number
+    chName : str
+        Name of the channel as written in the header of the file.
+    level : int
+        Level of the pyramid, every bin contains 2**level samples.
+    index : int
+        Index of the tile, tile covers bins index*TILE_SIZE to
+        (index+1)*TILE_SIZE-1.
+
+    Returns
+    -------
+    dict
+        Dictionary with keys 'level', 'index', 't' (start time of the bins
+        in ms), 'min' and 'max', returns errValue (-1) if the tile does not
+        exist.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    entry   = get_pyramid( shot, chName )
+    if isinstance(entry, int) or (level < 0) or (level >= len(entry['pyramid'])) or (index < 0):
+        return errValue
+
+    v_min, v_max    = entry['pyramid'][level]
+    bins    = slice( index*TILE_SIZE, (index+1)*TILE_SIZE )
+    if bins.start >= len(v_min):
+        return errValue
+
+    return { 'level'    : level,
+             'index'    : index,
+             't'        : entry['time'][::2**level][bins],
+             'min'      : v_min[bins],
+             'max'      : v_max[bins] }
+    #}}}
+
+
+def encode_tile( tile, fmt='json' ):
+    #{{{
+    """
+    Encodes a tile for the HTTP response.
+
+    Parameters
+    ----------
+    tile : dict
+        Tile as returned by get_tile.
+    fmt : str, optional
+        'json' or 'bin' (see module docstring).
+
+    Returns
+    -------
+    bytes
+    """
+
+    if fmt == 'bin':
+        return ( np.ascontiguousarray( tile['t'], dtype='<f8' ).tobytes()
+                +np.ascontiguousarray( tile['min'], dtype='<f4' ).tobytes()
+                +np.ascontiguousarray( tile['max'], dtype='<f4' ).tobytes() )
+
+    # NaN is not valid JSON
+    to_list = lambda values: [ value if np.isfinite( value ) else None for value in values.tolist() ]
+    return json.dumps( { 'level'    : tile['level'],
+                         'index'    : tile['index'],
+                         't'        : to_list( tile['t'] ),
+                         'min'      : to_list( tile['min'] ),
+                         'max'      : to_list( tile['max'] ) } ).encode()
+    #}}}
+
+
+def get_tile_encoded( shot, chName, level, index, fmt='json' ):
+    #{{{
+    """
+    Returns an encoded tile, from the tile cache if possible.
+
+    Parameters
+    ----------
+    shot : int
+        Shot number
+    chName : str
+        Name of the channel as written in the header of the file.
+    level : int
+        Level of the pyramid.
+    index : int
+        Index of the tile.
+    fmt : str, optional
+        'json' or 'bin' (see module docstring).
+
+    Returns
+    -------
+    list
+        List containing the encoded tile and the number of bins, returns
+        errValue (-1) if the tile does not exist.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    fname_data  = tjk.get_fname_data( shot )
+    if not os.path.isfile( fname_data ):
+        return errValue
+    key = ( str(fname_data), os.stat( fname_data ).st_mtime_ns, chName, level, index, fmt )
+
+    with cache_lock:
+        if key in tile_cache['entries']:
+            tile_cache['entries'].move_to_end( key )
+            return tile_cache['entries'][key]
+
+    tile    = get_tile( shot, chName, level, index )
+    if isinstance(tile, int):
+        return errValue
+    encoded = [ encode_tile( tile, fmt=fmt ), len(tile['t']) ]
+
+    with cache_lock:
+        # another thread might have encoded the same tile meanwhile
+        if key in tile_cache['entries']:
+            return tile_cache['entries'][key]
+        tile_cache['entries'][key]  = encoded
+        tile_cache['nbytes']       += len(encoded[0])
+        budget  = tjk.get_cache_budget( TILE_CACHE_SIZE )
+        while tile_cache['nbytes'] > budget:
+            key_evict, encoded_evict    = tile_cache['entries'].popitem( last=False )
+            tile_cache['nbytes']       -= len(encoded_evict[0])
+        tjk.set_memory_resident( 'server tile cache', tile_cache['nbytes'] )
+
+    return encoded
+    #}}}
+
+
+def get_shot_info( shot ):
+    #{{{
+    """
+    Returns channels, time range and pyramid size of a shot.
+
+    Parameters
+    ----------
+    shot : int
+        Shot number
+
+    Returns
+    -------
+    dict
+        Returns errValue (-1) if the file does not exist.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    entry   = get_pyramid( shot, None )
+    if isinstance(entry, int):
+        return errValue
+
+    n_rows      = len(entry['time'])
+    n_levels    = 1
+    while -(-n_rows // 2**(n_levels-1)) > TILE_SIZE:
+        n_levels   += 1
+    summary     = tjk_summary.query_summary( where='shot=?', params=(shot,) )
+
+    return { 'shot'         : shot,
+             'channels'     : [ chName for chName in entry['header'] if chName != 'Zeit [ms]' ],
+             'n_rows'       : n_rows,
+             't_start'      : float( entry['time'][0] ) if n_rows > 0 else None,
+             't_end'        : float( entry['time'][-1] ) if n_rows > 0 else None,
+             'tile_size'    : TILE_SIZE,
+             'n_levels'     : n_levels,
+             'summary'      : summary[0] if len(summary) > 0 else None }
+    #}}}
+
+
+def replace_nan( data ):
+    #{{{
+    """
+    Returns a copy of nested lists/dictionaries with NaN replaced by None
+    (NaN is not valid JSON).
+    """
+
+    if isinstance(data, dict):
+        return { key: replace_nan( value ) for key, value in data.items() }
+    if isinstance(data, (list, tuple)):
+        return [ replace_nan( value ) for value in data ]
+    if isinstance(data, float) and not np.isfinite( data ):
+        return None
+    return data
+    #}}}
+
+
+class TraceRequestHandler( http.server.BaseHTTPRequestHandler ):
+    #{{{
+    """
+    Handles the requests of the HTTP server, see module docstring.
+    """
+
+    def send_body( self, body, content_type='application/json', status=200, headers=None ):
+        self.send_response( status )
+        self.send_header( 'Content-Type', content_type )
+        self.send_header( 'Content-Length', str( len(body) ) )
+        self.send_header( 'Access-Control-Allow-Origin', '*' )
+        for name, value in (headers or {}).items():
+            self.send_header( name, value )
+        self.end_headers()
+        self.wfile.write( body )
+
+    def send_json( self, data, status=200 ):
+        self.send_body( json.dumps( replace_nan( data ) ).encode(), status=status )
+
+    def do_GET( self ):
+        url     = urllib.parse.urlparse( self.path )
+        params  = { key: values[0] for key, values in urllib.parse.parse_qs( url.query ).items() }
+        parts   = [ part for part in url.path.split( '/' ) if part ]
+
+        try:
+            if len(parts) == 0:
+                self.send_body( VIEWER_HTML.encode(), content_type='text/html; charset=utf-8' )
+            elif parts == ['api', 'shots']:
+                self.send_json( tjk_summary.query_summary(
+                    where='shot>=? AND shot<=?',
+                    params=( int( params.get( 'shot_start', 0 ) ),
+                             int( params.get( 'shot_end', 2**31 ) ) ) ) )
+            elif (len(parts) == 3) and (parts[:2] == ['api', 'shot']):
+                info    = get_shot_info( int(parts[2]) )
+                if isinstance(info, int):
+                    self.send_json( { 'error': 'shot not found' }, status=404 )
+                else:
+                    self.send_json( info )
+            elif (len(parts) == 4) and (parts[:2] == ['api', 'shot']) and (parts[3] == 'tile'):
+                fmt     = params.get( 'format', 'json' )
+                tile    = get_tile_encoded( int(parts[2]), params['channel'], int( params['level'] ),
+                                            int( params['index'] ), fmt=fmt )
+                if isinstance(tile, int):
+                    self.send_json( { 'error': 'tile not found' }, status=404 )
+                elif fmt == 'bin':
+                    self.send_body( tile[0], content_type='application/octet-stream',
+                                    headers={ 'X-Tile-Bins': str( tile[1] ) } )
+                else:
+                    self.send_body( tile[0] )
+            else:
+                self.send_json( { 'error': 'unknown request' }, status=404 )
+        except (KeyError, ValueError) as err:
+            self.send_json( { 'error': 'invalid request ({0})'.format( err ) }, status=400 )
+
+    def log_message( self, format, *args ):
+        if not self.server.silent:
+            super().log_message( format, *args )
+    #}}}
+
+
+def make_server( host='localhost', port=8050, silent=True ):
+    #{{{
+    """
+    Returns the HTTP server, bound but not yet serving.
+
+    Parameters
+    ----------
+    host : str, optional
+        Address to listen on, only the local machine by default.
+    port : int, optional
+        Port to listen on, 0 for any free port (see server.server_address).
+    silent : bool, optional
+        If True, requests are not logged to console.
+
+    Returns
+    -------
+    http.server.ThreadingHTTPServer
+    """
+
+    server          = http.server.ThreadingHTTPServer( (host, port), TraceRequestHandler )
+    server.silent   = silent
+
+    return server
+    #}}}
+
+
+def serve( host='localhost', port=8050, silent=True ):
+    #{{{
+    """
+    Runs the HTTP server until it is interrupted.
+
+    Parameters
+    ----------
+    host : str, optional
+        Address to listen on, only the local machine by default.
+    port : int, optional
+        Port to listen on.
+    silent : bool, optional
+        If True, requests are not logged to console.
+    """
+
+    server  = make_server( host=host, port=port, silent=silent )
+    print( 'serving on http://{0}:{1}'.format( host, server.server_address[1] ) )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+    #}}}
+
+
+# minimal viewer: mouse wheel zooms, dragging pans, only the tiles of the
+# level matching the width of the canvas are requested
+VIEWER_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>TJ-K shot-view</title></head>
+<body style="font-family:sans-serif">
+shot <input id="shot" size="8"> <button onclick="loadShot()">load</button>
+channel <select id="channel" onchange="draw()"></select> <span id="status"></span><br>
+<canvas id="plot" width="1200" height="450" style="border:1px solid #ccc"></canvas>
+<script>
+let info = null, view = null, tiles = {};
+const canvas = document.getElementById('plot'), ctx = canvas.getContext('2d');
+async function loadShot() {
+    const shot = document.getElementById('shot').value;
+    const resp = await fetch('/api/shot/' + shot);
+    info = await resp.json();
+    if (info.error) { document.getElementById('status').textContent = info.error; return; }
+    const sel = document.getElementById('channel');
+    sel.innerHTML = info.channels.map(ch => '<option>' + ch + '</option>').join('');
+    view = [info.t_start, info.t_end];
+    draw();
+}
+async function getTile(channel, level, index) {
+    const key = [info.shot, channel, level, index].join('/');
+    if (!(key in tiles)) {
+        tiles[key] = fetch('/api/shot/' + info.shot + '/tile?channel=' + encodeURIComponent(channel)
+                           + '&level=' + level + '&index=' + index).then(r => r.ok ? r.json() : null);
+    }
+    return tiles[key];
+}
+async function draw() {
+    if (!info) return;
+    const channel = document.getElementById('channel').value;
+    const dt = (info.t_end - info.t_start) / Math.max(info.n_rows - 1, 1);
+    const n_samples = (view[1] - view[0]) / dt;
+    let level = Math.floor(Math.log2(Math.max(n_samples / canvas.width, 1)));
+    level = Math.min(level, info.n_levels - 1);
+    const bin = dt * 2**level, tileSpan = bin * info.tile_size;
+    const i0 = Math.max(0, Math.floor((view[0] - info.t_start) / tileSpan));
+    const i1 = Math.floor((view[1] - info.t_start) / tileSpan);
+    const requested = [];
+    for (let i = i0; i <= i1; i++) requested.push(getTile(channel, level, i));
+    const loaded = (await Promise.all(requested)).filter(t => t);
+    let vmin = Infinity, vmax = -Infinity;
+    for (const t of loaded) for (let j = 0; j < t.t.length; j++) {
+        if (t.t[j] < view[0] || t.t[j] > view[1] || t.min[j] === null) continue;
+        vmin = Math.min(vmin, t.min[j]); vmax = Math.max(vmax, t.max[j]);
+    }
+    if (vmax <= vmin) { vmax = vmin + 1; }
+    ctx.clearRect(0, 0, canvas.width, canvas.height);
+    ctx.strokeStyle = '#1f77b4'; ctx.beginPath();
+    const x = tt => (tt - view[0]) / (view[1] - view[0]) * canvas.width;
+    const y = v => canvas.height - 10 - (v - vmin) / (vmax - vmin) * (canvas.height - 20);
+    for (const t of loaded) for (let j = 0; j < t.t.length; j++) {
+        if (t.min[j] === null) continue;
+        ctx.moveTo(x(t.t[j]), y(t.min[j])); ctx.lineTo(x(t.t[j]), y(t.max[j]) - .5);
+    }
+    ctx.stroke();
+    document.getElementById('status').textContent = '#' + info.shot + ', '
+        + view[0].toFixed(1) + ' ms to ' + view[1].toFixed(1) + ' ms, level ' + level
+        + ', ' + vmin.toPrecision(4) + ' to ' + vmax.toPrecision(4);
+}
+canvas.addEventListener('wheel', e => {
+    if (!view) return;
+    e.preventDefault();
+    const tc = view[0] + e.offsetX / canvas.width * (view[1] - view[0]);
+    const f = e.deltaY > 0 ? 1.25 : 0.8;
+    view = [tc - (tc - view[0]) * f, tc + (view[1] - tc) * f];
+    draw();
+});
+let dragStart = null;
+canvas.addEventListener('mousedown', e => { dragStart = [e.offsetX, view]; });
+canvas.addEventListener('mouseup', () => { dragStart = null; });
+canvas.addEventListener('mousemove', e => {
+    if (!dragStart) return;
+    const shift = (dragStart[0] - e.offsetX) / canvas.width * (dragStart[1][1] - dragStart[1][0]);
+    view = [dragStart[1][0] + shift, dragStart[1][1] + shift];
+    draw();
+});
+</script></body></html>
+"""
+
+
+def main():
+#{{{
+    # initialize parser for command line options
+    parser  = argparse.ArgumentParser( description='HTTP server to browse shots with a web browser' )
+    parser.add_argument( "--host", type=str, default='localhost',
+            help='Address to listen on' )
+    parser.add_argument( "-p", "--port", type=int, default=8050,
+            help='Port to listen on' )
+    parser.add_argument( "-v", "--verbose", action='store_true',
+            help='Log requests to console' )
+    # read all arguments from command line
+    args    = parser.parse_args()
+
+    serve( host=args.host, port=args.port, silent=not args.verbose )
+#}}}
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,382 @@
+# coding=utf-8
+
+__author__      = 'Alf Köhn-Seemann'
+__email__       = 'koehn@igvp.uni-stuttgart.de'
+__copyright__   = 'University of Stuttgart'
+__license__     = 'MIT'
+
+"""
+Local cache service keeping parsed shots in shared memory.
+
+Several viewers and scripts on one machine often open the same (recent)
+shots. This service parses every shot only once and keeps it in a
+multiprocessing.shared_memory segment, clients (get_traces in TJK-monitor.py)
+attach to it without copying. Shots are evicted in least-recently-used order
+if the memory budget is exceeded; clients which are still attached keep
+their data. Communication is done via a local Unix socket, e.g.
+
+    python tjk_shmcache.py --budget 4096 &
+    python tjk_shmcache.py --stats
+
+Requests and answers are JSON-encoded dictionaries, one per line:
+    {'cmd': 'get', 'fname': ...}    parse file (if not cached yet), answer
+                                    contains name, shape and dtype of the
+                                    shared memory segment and the header
+    {'cmd': 'stats'}                cached files and memory usage
+    {'cmd': 'shutdown'}             remove all segments and stop the service
+"""
+
+
+# import standard modules
+import argparse
+import collections
+import json
+import multiprocessing.shared_memory
+import numpy as np
+import os
+import socket
+import threading
+
+# import some TJ-K related function
+import importlib    # required due to the dash in the filename
+tjk = importlib.import_module("TJK-monitor")
+
+
+# default memory budget of the service in MB, the share of caches in the
+# memory budget (see tjk.get_cache_budget), but not more than 4 GB
+SHMCACHE_BUDGET = tjk.get_cache_budget( 4096*1024**2 ) / 1024**2
+
+
+def load_shot_shm( fname_data, n_workers=None ):
+    #{{{
+    """
+    Parses a tjk-monitor file into a new shared memory segment.
+
+    Parameters
+    ----------
+    fname_data : str
+        Filename of the tjk-monitor file.
+    n_workers : int, optional
+        Number of workers used to parse large files, os.cpu_count() if not
+        set.
+
+    Returns
+    -------
+    dict
+        Cache entry with the shared memory segment and its description,
+        returns errValue (-1) on error.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    if not os.path.isfile( fname_data ):
+        return errValue
+
+    stat    = os.stat( fname_data )
+    header  = tjk.parse_header( tjk.read_file( fname_data, n_bytes=64*1024 ) )
+    if isinstance(header, int):
+        return errValue
+
+    data    = tjk.read_data( fname_data, n_workers=n_workers or os.cpu_count() )
+    if isinstance(data, int):
+        return errValue
+
+    shm     = multiprocessing.shared_memory.SharedMemory( create=True, size=max( data.nbytes, 1 ) )
+    np.ndarray( data.shape, dtype=data.dtype, buffer=shm.buf )[...] = data
+
+    return { 'shm'      : shm,
+             'name'     : shm.name,
+             'shape'    : list( data.shape ),
+             'dtype'    : data.dtype.str,
+             'header'   : header,
+             'nbytes'   : data.nbytes,
+             'size'     : stat.st_size,
+             'mtime'    : stat.st_mtime,
+           }
+    #}}}
+
+
+def remove_entry( entry ):
+    #{{{
+    """
+    Removes the shared memory segment of a cache entry.
+
+    Processes which are attached to the segment keep their data, the memory
+    is released by the operating system once the last one detaches.
+
+    Parameters
+    ----------
+    entry : dict
+        Cache entry as returned by load_shot_shm.
+    """
+
+    entry['shm'].close()
+    try:
+        entry['shm'].unlink()
+    except FileNotFoundError:
+        pass
+    #}}}
+
+
+def get_entry( cache, fname_data, budget, silent=True ):
+    #{{{
+    """
+    Returns the cache entry of a file, parses it if required.
+
+    Concurrent requests for the same file wait for a single parse. Least
+    recently used entries are removed if the memory budget is exceeded.
+
+    Parameters
+    ----------
+    cache : dict
+        State of the service, see serve_shmcache.
+    fname_data : str
+        Filename of the tjk-monitor file.
+    budget : int
+        Memory budget in bytes.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    dict
+        Cache entry as returned by load_shot_shm, returns errValue (-1) if
+        the file could not be read.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    while True:
+        with cache['lock']:
+            entry   = cache['entries'].get( fname_data )
+            if entry is not None:
+                stat    = os.stat( fname_data ) if os.path.isfile( fname_data ) else None
+                if (stat is not None) and (stat.st_size == entry['size']) \
+                   and (stat.st_mtime == entry['mtime']):
+                    cache['entries'].move_to_end( fname_data )
+                    cache['hits']  += 1
+                    return entry
+                # file was changed (e.g. shot still being written)
+                del cache['entries'][fname_data]
+                cache['nbytes']    -= entry['nbytes']
+                remove_entry( entry )
+            loading = cache['loading'].get( fname_data )
+            if loading is None:
+                loading = threading.Event()
+                cache['loading'][fname_data]    = loading
+                break
+        # another client is already parsing this file
+        loading.wait()
+
+    try:
+        entry   = load_shot_shm( fname_data )
+    finally:
+        with cache['lock']:
+            del cache['loading'][fname_data]
+        loading.set()
+    if isinstance(entry, int):
+        return errValue
+
+    with cache['lock']:
+        cache['misses']    += 1
+        while (len(cache['entries']) > 0) and (cache['nbytes'] + entry['nbytes'] > budget):
+            fname_evict, entry_evict    = cache['entries'].popitem( last=False )
+            cache['nbytes']    -= entry_evict['nbytes']
+            remove_entry( entry_evict )
+            if not silent:
+                print( 'shmcache: evicted {0}'.format( fname_evict ) )
+        cache['entries'][fname_data]    = entry
+        cache['nbytes']    += entry['nbytes']
+
+    if not silent:
+        print( 'shmcache: loaded {0}, {1:.1f} MB'.format( fname_data, entry['nbytes']/1024**2 ) )
+
+    return entry
+    #}}}
+
+
+def handle_request( cache, request, budget, silent=True ):
+    #{{{
+    """
+    Returns the answer of the service to a single request.
+
+    Parameters
+    ----------
+    cache : dict
+        State of the service, see serve_shmcache.
+    request : dict
+        Request, see module docstring.
+    budget : int
+        Memory budget in bytes.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    dict
+        Answer to the request.
+    """
+
+    cmd = request.get( 'cmd' )
+    if cmd == 'get':
+        fname_data  = request.get( 'fname' )
+        if fname_data is None:
+            fname_data  = str( tjk.get_fname_data( int( request['shot'] ) ) )
+        fname_data  = os.path.abspath( fname_data )
+        entry   = get_entry( cache, fname_data, budget, silent=silent )
+        if isinstance(entry, int):
+            return { 'error': 'could not read <{0}>'.format( fname_data ) }
+        return { key: entry[key] for key in ['name', 'shape', 'dtype', 'header'] }
+    elif cmd == 'stats':
+        with cache['lock']:
+            return { 'files'    : list( cache['entries'] ),
+                     'nbytes'   : cache['nbytes'],
+                     'budget'   : budget,
+                     'hits'     : cache['hits'],
+                     'misses'   : cache['misses'] }
+    elif cmd == 'shutdown':
+        cache['stop'].set()
+        return { 'ok': True }
+
+    return { 'error': 'unknown command <{0}>'.format( cmd ) }
+    #}}}
+
+
+def handle_client( conn, cache, budget, silent=True ):
+    #{{{
+    """
+    Answers all requests of a connected client.
+
+    Parameters
+    ----------
+    conn : socket.socket
+        Connection to the client.
+    cache : dict
+        State of the service, see serve_shmcache.
+    budget : int
+        Memory budget in bytes.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+    """
+
+    with conn, conn.makefile( 'rb' ) as f_in:
+        for line in f_in:
+            try:
+                answer  = handle_request( cache, json.loads( line.decode() ), budget,
+                                          silent=silent )
+            except (ValueError, KeyError) as err:
+                answer  = { 'error': 'invalid request ({0})'.format( err ) }
+            try:
+                conn.sendall( json.dumps( answer ).encode() + b'\n' )
+            except OSError:
+                break
+    #}}}
+
+
+def serve_shmcache( socket_path=None, budget=SHMCACHE_BUDGET, silent=True ):
+    #{{{
+    """
+    Runs the cache service until a shutdown request is received.
+
+    Parameters
+    ----------
+    socket_path : str, optional
+        Unix socket of the service, tjk.SHMCACHE_SOCKET if not set.
+    budget : float, optional
+        Memory budget in MB.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    int
+        0 after shutdown, errValue (-1) if the service is already running.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    if socket_path is None:
+        socket_path = tjk.SHMCACHE_SOCKET
+
+    if os.path.exists( socket_path ):
+        if not isinstance( tjk.request_shmcache( {'cmd': 'stats'}, socket_path=socket_path ), int ):
+            print( 'serve_shmcache: ERROR, service already running on <{0}>'.format( socket_path ) )
+            return errValue
+        # left over from a service which was not shut down properly
+        os.remove( socket_path )
+    os.makedirs( os.path.dirname( os.path.abspath( socket_path ) ), exist_ok=True )
+
+    cache   = { 'entries'   : collections.OrderedDict(),
+                'loading'   : {},
+                'nbytes'    : 0,
+                'hits'      : 0,
+                'misses'    : 0,
+                'lock'      : threading.Lock(),
+                'stop'      : threading.Event(),
+              }
+    budget  = int( budget*1024**2 )
+
+    server  = socket.socket( socket.AF_UNIX, socket.SOCK_STREAM )
+    server.bind( socket_path )
+    server.listen()
+    # check regularly for shutdown requests
+    server.settimeout( .5 )
+    if not silent:
+        print( 'shmcache: listening on {0}, budget {1:.0f} MB'.format( socket_path, budget/1024**2 ) )
+
+    try:
+        while not cache['stop'].is_set():
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                continue
+            conn.settimeout( None )
+            threading.Thread( target=handle_client, args=(conn, cache, budget, silent),
+                              daemon=True ).start()
+    finally:
+        server.close()
+        os.remove( socket_path )
+        with cache['lock']:
+            for entry in cache['entries'].values():
+                remove_entry( entry )
+            cache['entries'].clear()
+
+    return 0
+    #}}}
+
+
+def main():
+#{{{
+    # initialize parser for command line options
+    parser  = argparse.ArgumentParser( description='local cache service keeping parsed shots in shared memory' )
+    parser.add_argument( "--socket", type=str, default=None,
+            help='Unix socket of the service (default: {0})'.format( tjk.SHMCACHE_SOCKET ) )
+    parser.add_argument( "-b", "--budget", type=float, default=SHMCACHE_BUDGET,
+            help='Memory budget in MB' )
+    parser.add_argument( "--stats", action='store_true',
+            help='Print statistics of the running service' )
+    parser.add_argument( "--shutdown", action='store_true',
+            help='Stop the running service' )
+    parser.add_argument( "-v", "--verbose", action='store_true',
+            help='Print loaded and evicted files' )
+    # read all arguments from command line
+    args    = parser.parse_args()
+
+    if args.stats or args.shutdown:
+        answer  = tjk.request_shmcache( {'cmd': 'shutdown' if args.shutdown else 'stats'},
+                                        socket_path=args.socket )
+        if isinstance(answer, int):
+            print( 'shot cache service is not running' )
+        else:
+            print( json.dumps( answer, indent=4 ) )
+        return
+
+    serve_shmcache( socket_path=args.socket, budget=args.budget, silent=not args.verbose )
+#}}}
+
+
+if __name__ == '__main__':
+    main()
@@ -11,6 +11,8 @@ bla
 
 
 from pathlib import Path
+import collections
+import concurrent.futures
 import matplotlib.pyplot as plt
 from matplotlib.figure import Figure
 import numpy as np
@@ -24,6 +26,11 @@ from matplotlib.backends.backend_tkagg import (FigureCanvasTkAgg,
 # import some TJ-K related function
 import importlib    # required due to the dash in the filena,e
 tjk = importlib.import_module("TJK-monitor")
+import tjk_quality
+import tjk_quicklook
+import tjk_rolling
+import tjk_spectral
+import tjk_watcher
 
 # change some default properties of matplotlib
 #plt.rcParams.update({'font.size':14})
@@ -32,30 +39,53 @@ plt.rcParams['ytick.direction'] = 'in'
 plt.rcParams['xtick.top']       = True
 plt.rcParams['ytick.right']     = True
 
+# rendered figures are kept as bitmaps (least recently used are removed if
+# the total size in bytes exceeds this, or the share of caches in the memory
+# budget, see tjk.get_cache_budget) to re-show previous views instantly
+FIGURE_CACHE_SIZE   = 256*1024**2
+figure_cache        = collections.OrderedDict()
+# view which is only shown as bitmap, fully re-rendered on user interaction
+figure_pending      = {}
+
+# gallery: number of thumbnails per row, number of shots shown if a single
+# shot is entered (this one and the previous ones), number of quicklooks
+# generated in parallel (see tjk_quicklook.py)
+GALLERY_COLUMNS     = 5
+GALLERY_N_SHOTS     = 200
+GALLERY_N_WORKERS   = 2
+
 
 def validate_shotnumber(shot, status_label, datapath_entry):
     #{{{
     # note: functions for widget-level validation must return True or False
+    # note: several shots can be entered, e.g. "12838-12845,12850"
 
     col_ok      = "#00CC00"
     col_notok   = "#FF6666"
 
     shot    = shot_entry.get()
     if shot:
-        if shot.isdigit() and int(shot) > 0:
+        shots   = tjk.parse_shot_list(shot)
+        if shots != -1:
+            if len(shots) == 1:
+                status_text = "status: shot #{0}".format(shots[0])
+            else:
+                status_text = "status: {0} shots #{1}...#{2}".format(
+                                len(shots), shots[0], shots[-1])
             status_label.config(
-                    text="status: shot #{0}".format(shot),
+                    text=status_text,
                     background=col_ok
                     )
             # update the field showing/setting the path to the data file
-            path2data = str(get_tjkmonitor_datapath(shot_entry.get()))
+            # (for several shots, the path of the first one is shown)
+            path2data = str(get_tjkmonitor_datapath(shots[0]))
             datapath_entry.delete(0,tk.END)
             datapath_entry.insert(0, path2data)
 
             return True
         else:
             status_label.config(
-                    text="status: shot must be an integer",
+                    text="status: shot must be an integer or a list/range of integers",
                     background=col_notok
                     )
             return False
@@ -81,7 +111,7 @@ def get_tjkmonitor_datapath(shot):
         shot_path   = tjk.get_shot_path(shot)
         if isinstance(shot_path, str):
             shot_path   = Path(shot_path + "interferometer/")
-        elif Path.exists(shot_path):
+        elif isinstance(shot_path, Path) and Path.exists(shot_path):
             shot_path   = shot_path / "interferometer/"
         else:
             shot_path   = errValue
@@ -90,46 +120,25 @@ def get_tjkmonitor_datapath(shot):
     #}}}
 
 
-def plot_timetraces(shot, 
-                    status_label, datapath_entry,
-                    fig, canvas,
-                    timetraces_options,
-                    silent=True
-                   ):
+def get_fname_data(datapath, shot):
     #{{{
     """
-    TODO:
-    [ ] only read and plot certain timetraces based on user choice
-        [ ] show all available channel to user (really all...?)
-        [ ] allow user to tick channels they want to plot
-        [ ] store choices in dict (?)
-        [ ] allow user to tick certain channels based on their role not 
-            their exact name, e.g. P_abs2.455Ghz or n_e
+    Returns the filename of the tjk-monitor file of a shot in a folder, 
+    the compressed file (see tjk_compress.py) if only that one exists.
     """
-   
-    # plot needs to be cleared otherwise x- and y-axis will be "over-drawn"
-    fig.clf()
-
-    col_ok      = "#00CC00"
 
-    if not validate_shotnumber(shot, status_label, datapath_entry):
-        return
-
-    shot        = int(shot)
-    #fname_data  = "{0}/shot{1}.dat".format(datapath_entry.get(),shot)
-    fname_data  = Path(datapath_entry.get() + '/shot'  + str(shot) + '.dat')
+    fname_data  = Path(str(datapath) + '/shot' + str(shot) + '.dat')
+    if not os.path.isfile(fname_data):
+        for suffix in tjk.COMPRESSED_SUFFIXES:
+            if os.path.isfile(str(fname_data) + suffix):
+                return Path(str(fname_data) + suffix)
 
-    # get time axis and scale it to seconds
-    time    = tjk.get_trace(shot, fname_in=fname_data, chName='Zeit [ms]', silent=silent)
-    time   *= 1e-3
+    return fname_data
+    #}}}
 
-    # get number of timetraces to be plotted based on choice made by user
-    # loop through dictionary and sum up every key starting with "plot"
-    n_traces    = 0
-    for key in timetraces_options:
-        if key.startswith('plot'):
-            n_traces    += timetraces_options[key]
 
+def get_chCfg(shot):
+    #{{{
     # idea: use dictionary for each diagnostics data stored via tjk-monitor
     #       which contains 
     #         (1) channel name in tjk-monitor
@@ -170,103 +179,729 @@ def plot_timetraces(shot,
         chCfg['plot_interf']    = ['Interferometer (Mueller)', 1, '1e17 m^-3', 
                                    r'$\bar{n}_e$ in a.u.']
 
-    n_rows      = n_traces
+    return chCfg
+    #}}}
+
+
+def get_plot_keys(timetraces_options):
+    #{{{
+    # keys of all timetraces which were chosen by the user to be plotted
+    return [key for key in timetraces_options 
+            if key.startswith('plot') and (timetraces_options[key] == 1)]
+    #}}}
+
+
+def get_quality_flags(shot, key, quality):
+    #{{{
+    """
+    Returns the names of the quality flags (see tjk_quality.py) of the 
+    channels used for one of the plot options, empty if the shot was not
+    scanned.
+    """
+
+    if isinstance(quality, int):
+        return []
+
+    chCfg   = get_chCfg(shot)
+    if key == 'plot_P2GHz_abs':
+        chNames = [chCfg['plot_P2GHz_in'][0], chCfg['plot_P2GHz_out'][0]]
+    else:
+        chNames = [chCfg[key][0]]
+
+    flags   = 0
+    for chName in chNames:
+        flags  |= quality.get(chName, 0)
+
+    return tjk_quality.decode_flags(flags)
+    #}}}
+
+
+def load_timetraces(shot, fname_data, keys, timetraces_options, silent=True):
+    #{{{
+    """
+    Reads all channels required for the chosen timetraces in one go.
+
+    Returns the traces of a tjk.Shot (a dictionary with the channel names 
+    as keys, further channels are read on access), or -1 if the file could 
+    not be read. Channels not recorded for this shot are skipped.
+    """
+
+    errValue    = -1
+
+    chCfg   = get_chCfg(shot)
+    chNames = ['Zeit [ms]']
+    for key in keys:
+        # P_abs for 2.45 GHz is calculated using two timetraces
+        if key == 'plot_P2GHz_abs':
+            chNames += [chCfg['plot_P2GHz_in'][0], chCfg['plot_P2GHz_out'][0]]
+        else:
+            chNames.append(chCfg[key][0])
+    # alignment on plasma breakdown uses P_abs of 2.45 GHz
+    if timetraces_options.get('align_breakdown', 0):
+        chNames += [chCfg['plot_P2GHz_in'][0], chCfg['plot_P2GHz_out'][0]]
+
+    shot_data   = tjk.Shot(shot, fname_in=fname_data)
+    if not shot_data.exists:
+        return errValue
+    chNames = [chName for chName in dict.fromkeys(chNames) if chName in shot_data.header]
+
+    try:
+        shot_data.traces.load(chNames)
+    except KeyError:
+        return errValue
+
+    return shot_data.traces
+    #}}}
+
+
+def calc_timetrace(key, shot, traces, timetraces_options, silent=True):
+    #{{{
+    """
+    Returns the timetrace (scaled to physical units if possible) and the
+    y-label for one of the plot options, calculated from the raw traces as
+    returned by load_timetraces.
+    """
+
+    chCfg   = get_chCfg(shot)
+
+    # P_abs for 2.45 GHz is calculated using two timetraces
+    # note: calc_2GHzPower and calc_8GHzPower modify their input, hence copies
+    if key == 'plot_P2GHz_abs':
+        timetrace_Pin2  = traces[chCfg['plot_P2GHz_in'][0]].copy()
+        timetrace_Pout2 = traces[chCfg['plot_P2GHz_out'][0]].copy()
+        timetrace       = ( tjk.calc_2GHzPower(timetrace_Pin2,  output='watt', direction='fw', shot=shot)
+                           -tjk.calc_2GHzPower(timetrace_Pout2, output='watt', direction='bw', shot=shot) )
+    # default case
+    else:
+        timetrace   = traces[chCfg[key][0]].copy()
+
+    ylabel  = chCfg[key][3]
+
+    # optionally, scale timetraces to physical units (instead of volts)
+    if np.isfinite(chCfg[key][1]):
+        timetrace *= chCfg[key][1]
+    if key == 'plot_P2GHz_in':
+        timetrace   = tjk.calc_2GHzPower(timetrace,  output='watt', direction='fw', shot=shot)
+    elif key == 'plot_P2GHz_out':
+        timetrace   = tjk.calc_2GHzPower(timetrace,  output='watt', direction='bw', shot=shot)
+    elif key == 'plot_P8GHz_in':
+        timetrace   = tjk.calc_8GHzPower(timetrace,  direction='fw', shot=shot)*1e-3
+    elif key == 'plot_p0':
+        # convert to mPa according to PKR261 manual
+        timetrace   = tjk.calc_PKR261Pressure(timetrace, shot=shot)
+        timetrace  *= 1e3
+    elif key == 'plot_interf':
+        # correct for drift
+        # correct for offset
+        # calculate actual electron plasma density
+        # number of points for offset calculation and drift correction
+        n_pts_offset    = 100
+        # optionally, correct for drift by subtracting straight line (slope)
+        # between offset before plasma turn-on and offset after plasma turn-off
+        if timetraces_options['interf_drift_correct']:
+            offset_start    = np.mean(timetrace[:n_pts_offset])
+            offset_end      = np.mean(timetrace[(-1*n_pts_offset):])
+            print("offset_start = {0}, offset_end = {1}".format(offset_start, offset_end))
+            # TODO: y = m*x + b, m = (y2-y1)/(x2-x1)
+            #       ==> y2 and y1 are just the offset values, neglecting the drift in the offset itself
+            #       ==> x2 and x1 and harder to get, we actually need to determine the jump-positions,
+            #           i.e. when the plasma is turned on and turned off again
+            #       then the function can be subtracted from original function of correct for drift
+            #       ==> new = old - ((offset_1-offset_0)/(jump_off-jump_on)*time + offset_0)
+            #       idea: do as with previous IDL version (look for min and max in derivative of interferometer)
+            #       as an easy check, include a button for marking the jumps in plot
+        if timetraces_options['interf_offset_correct']:
+            offset_end      = np.mean(timetrace[(-1*n_pts_offset):])
+            timetrace      += -1*offset_end 
+        if timetraces_options['interf_calc_ne']:
+            # TODO: for 'Interferometer (Mueller)' and 'Interferometer Phase' the
+            #       scaling factor is 3.883e17 until the damage and repair by e.ho
+            #       in summer 2022, then it was changed to half of that.
+            #       for 'Density (old)' and befor the factor is 6.7e16
+            timetrace      *= tjk.get_calibration('interferometer', shot)['factor']#e17
+            ylabel = r'$\bar{n}_e$ in $10^{17}\,\mathrm{m}^{-3}$'
+
+    return timetrace, ylabel
+    #}}}
+
+
+def plot_timetraces(shot, 
+                    status_label, datapath_entry,
+                    fig, canvas,
+                    timetraces_options,
+                    silent=True
+                   ):
+    #{{{
+    """
+    TODO:
+    [ ] only read and plot certain timetraces based on user choice
+        [ ] show all available channel to user (really all...?)
+        [ ] allow user to tick channels they want to plot
+        [ ] store choices in dict (?)
+        [ ] allow user to tick certain channels based on their role not 
+            their exact name, e.g. P_abs2.455Ghz or n_e
+    """
+   
+    # plot needs to be cleared otherwise x- and y-axis will be "over-drawn"
+    fig.clf()
+
+    col_ok      = "#00CC00"
+    col_warn    = "#FFAA33"
+
+    if not validate_shotnumber(shot, status_label, datapath_entry):
+        return
+
+    # several shots are overlayed in one plot
+    shots   = tjk.parse_shot_list(shot)
+    if len(shots) > 1:
+        plot_timetraces_overlay(shots, status_label, fig, canvas,
+                                timetraces_options, silent=silent)
+        return
+
+    shot        = shots[0]
+    #fname_data  = "{0}/shot{1}.dat".format(datapath_entry.get(),shot)
+    fname_data  = get_fname_data(datapath_entry.get(), shot)
+
+    # get the timetraces chosen by user, the file is only read once
+    keys    = get_plot_keys(timetraces_options)
+    traces  = load_timetraces(shot, fname_data, keys, timetraces_options, 
+                              silent=silent)
+    if isinstance(traces, int):
+        status_label.config(text="status: could not read {0}".format(fname_data),
+                            background="#FF6666")
+        return
+
+    # get time axis and scale it to seconds
+    time    = traces['Zeit [ms]']*1e-3
+
+    # data-quality flags, if the shot was already scanned
+    quality         = tjk_quality.get_quality(shot)
+    flags_shot      = []
+
+    n_rows      = len(keys)
     n_cols      = 1
     plot_count  = 1
-    for key in timetraces_options:
-        if key.startswith('plot') and (timetraces_options[key] == 1):
-            if not silent:
-                print( 'plot_timetraces: ', key, timetraces_options[key] )
-
-            ax  = fig.add_subplot(n_rows, n_cols, plot_count)
-
-            # P_abs for 2.45 GHz is calculated using two timetraces
-            if key == 'plot_P2GHz_abs':
-                timetrace_Pin2  = tjk.get_trace(shot, fname_in=fname_data, 
-                                                chName=chCfg['plot_P2GHz_in'][0], 
-                                                silent=silent)
-                timetrace_Pout2 = tjk.get_trace(shot, fname_in=fname_data, 
-                                                chName=chCfg['plot_P2GHz_out'][0],
-                                                silent=silent)
-                timetrace       = ( tjk.calc_2GHzPower(timetrace_Pin2,  output='watt', direction='fw')
-                                   -tjk.calc_2GHzPower(timetrace_Pout2, output='watt', direction='bw') )
-            # default case
-            else:
-                timetrace   = tjk.get_trace(shot, fname_in=fname_data, 
-                                            chName=chCfg[key][0],
-                                            silent=silent)
-
-            ylabel  = chCfg[key][3]
-
-            # optionally, scale timetraces to physical units (instead of volts)
-            if np.isfinite(chCfg[key][1]):
-                timetrace *= chCfg[key][1]
-            if key == 'plot_P2GHz_in':
-                timetrace   = tjk.calc_2GHzPower(timetrace_Pin2,  output='watt', direction='fw')
-            elif key == 'plot_P2GHz_out':
-                timetrace   = tjk.calc_2GHzPower(timetrace_Pin2,  output='watt', direction='bw')
-            elif key == 'plot_P8GHz_in':
-                timetrace   = tjk.calc_8GHzPower(timetrace,  direction='fw')*1e-3
-            elif key == 'plot_p0':
-                # convert to mPa according to PKR261 manual
-                d           = 9.33
-                timetrace   = 10.**(1.667*timetrace-d)
-                timetrace  *= 1e3
-            elif key == 'plot_interf':
-                # correct for drift
-                # correct for offset
-                # calculate actual electron plasma density
-                # number of points for offset calculation and drift correction
-                n_pts_offset    = 100
-                # optionally, correct for drift by subtracting straight line (slope)
-                # between offset before plasma turn-on and offset after plasma turn-off
-                if timetraces_options['interf_drift_correct']:
-                    offset_start    = np.mean(timetrace_ne[:n_pts_offset])
-                    offset_end      = np.mean(timetrace_ne[(-1*n_pts_offset):])
-                    print("offset_start = {0}, offset_end = {1}".format(offset_start, offset_end))
-                    # TODO: y = m*x + b, m = (y2-y1)/(x2-x1)
-                    #       ==> y2 and y1 are just the offset values, neglecting the drift in the offset itself
-                    #       ==> x2 and x1 and harder to get, we actually need to determine the jump-positions,
-                    #           i.e. when the plasma is turned on and turned off again
-                    #       then the function can be subtracted from original function of correct for drift
-                    #       ==> new = old - ((offset_1-offset_0)/(jump_off-jump_on)*time + offset_0)
-                    #       idea: do as with previous IDL version (look for min and max in derivative of interferometer)
-                    #       as an easy check, include a button for marking the jumps in plot
-                if timetraces_options['interf_offset_correct']:
-                    offset_end      = np.mean(timetrace[(-1*n_pts_offset):])
-                    timetrace      += -1*offset_end 
-                if timetraces_options['interf_calc_ne']:
-                    # TODO: for 'Interferometer (Mueller)' and 'Interferometer Phase' the
-                    #       scaling factor is 3.883e17 until the damage and repair by e.ho
-                    #       in summer 2022, then it was changed to half of that.
-                    #       for 'Density (old)' and befor the factor is 6.7e16
-                    if shot >= 13032:
-                        timetrace_ne    *= 3.883/2.#e17
-                    else:
-                        timetrace_ne    *= 3.883#e17
-                    ylabel = r'$\bar{n}_e$ in $10^{17}\,\mathrm{m}^{-3}$'
-
-            # optionally set y-range
-            if key == 'plot_Tcoil':
-                ax.set_ylim(20, 110)
-
+    for key in keys:
+        if not silent:
+            print( 'plot_timetraces: ', key, timetraces_options[key] )
+
+        ax  = fig.add_subplot(n_rows, n_cols, plot_count)
+
+        timetrace, ylabel   = calc_timetrace(key, shot, traces, 
+                                             timetraces_options, silent=silent)
+
+        # optionally set y-range
+        if key == 'plot_Tcoil':
+            ax.set_ylim(20, 110)
+
+        if (timetraces_options['rolling_band'] 
+            and (key in ['plot_p0', 'plot_interf'])):
+            # moving mean with +/- one standard deviation as uncertainty band
+            window  = timetraces_options['rolling_window']
+            stats   = tjk_rolling.rolling_stats(timetrace, window, 
+                                                stats=('mean', 'std'))
+            # trailing windows, centre them in time
+            time_roll   = time - .5*(time[min(window, len(time))-1] - time[0])
+            ax.plot(time, timetrace, color='lightgray')
+            ax.fill_between(time_roll, 
+                            stats['mean']-stats['std'], stats['mean']+stats['std'],
+                            alpha=.4)
+            ax.plot(time_roll, stats['mean'])
+        else:
             ax.plot(time, timetrace)
-            ax.set_ylabel(ylabel)
+        ax.set_ylabel(ylabel)
 
-            # plot shot number as title on top
-            if plot_count == 1:
-                ax.set_title('#{0}'.format(shot))
+        # mark channels with bad data quality
+        flags   = get_quality_flags(shot, key, quality)
+        if len(flags) > 0:
+            ax.text(.01, .95, 'quality: ' + ', '.join(flags), 
+                    transform=ax.transAxes, va='top', color='red', fontsize='small')
+            flags_shot  += [flag for flag in flags if flag not in flags_shot]
 
-            plot_count  += 1
+        # plot shot number as title on top
+        if plot_count == 1:
+            ax.set_title('#{0}'.format(shot))
+
+        plot_count  += 1
 
     # add x-label only to bottom axes object
     ax.set_xlabel( 'time in s' )
 
+    if len(flags_shot) > 0:
+        status_label.config(text="status: shot #{0} has quality flags: {1}".format(
+                                shot, ', '.join(flags_shot)),
+                            background=col_warn)
+
     canvas.draw()
 
     #}}}
 
 
+def plot_timetraces_overlay(shots, 
+                            status_label,
+                            fig, canvas,
+                            timetraces_options,
+                            n_workers=8,
+                            silent=True
+                           ):
+    #{{{
+    """
+    Overlays the chosen timetraces of several shots.
+
+    Shots are read concurrently, all traces are resampled in one vectorized
+    step onto a common time axis (optionally aligned on plasma breakdown) and
+    decimated before plotting.
+    """
+
+    col_notok   = "#FF6666"
+
+    keys    = get_plot_keys(timetraces_options)
+
+    # read all shots concurrently
+    def load_shot(shot):
+        fname_data  = get_fname_data(get_tjkmonitor_datapath(shot), shot)
+        return load_timetraces(shot, fname_data, keys, timetraces_options, 
+                               silent=silent)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=n_workers) as executor:
+        traces_all  = dict(zip(shots, executor.map(load_shot, shots)))
+
+    shots_ok    = [shot for shot in shots if not isinstance(traces_all[shot], int)]
+    if len(shots_ok) == 0:
+        status_label.config(text="status: none of the shots could be read",
+                            background=col_notok)
+        return
+    if len(shots_ok) < len(shots):
+        status_label.config(text="status: {0} of {1} shots could not be read".format(
+                                len(shots)-len(shots_ok), len(shots)),
+                            background=col_notok)
+
+    # data-quality flags of the shots which were already scanned
+    quality_all = {shot: tjk_quality.get_quality(shot) for shot in shots_ok}
+
+    # time axes in seconds, optionally shifted to plasma breakdown
+    times   = []
+    for shot in shots_ok:
+        time    = traces_all[shot]['Zeit [ms]']*1e-3
+        if timetraces_options['align_breakdown']:
+            try:
+                P_abs, ylabel   = calc_timetrace('plot_P2GHz_abs', shot, traces_all[shot],
+                                                 timetraces_options, silent=silent)
+                t_breakdown, t_off  = tjk.get_discharge_window(time, P_abs)
+            except KeyError:
+                t_breakdown = np.nan
+            if np.isfinite(t_breakdown):
+                time    = time - t_breakdown
+        times.append(time)
+
+    # common time axis, sampling is taken from finest sampled shot
+    dt          = min(np.median(np.diff(time)) for time in times if len(time) > 1)
+    time_common = np.arange(min(time[0] for time in times), 
+                            max(time[-1] for time in times) + .5*dt, dt)
+
+    n_rows      = len(keys)
+    n_cols      = 1
+    plot_count  = 1
+    for key in keys:
+        ax  = fig.add_subplot(n_rows, n_cols, plot_count)
+
+        shots_plot  = []
+        timetraces  = []
+        for shot, time in zip(shots_ok, times):
+            try:
+                timetrace, ylabel   = calc_timetrace(key, shot, traces_all[shot], 
+                                                     timetraces_options, silent=silent)
+            except KeyError:
+                # channel was not recorded for this shot
+                continue
+            shots_plot.append(shot)
+            timetraces.append(timetrace)
+        if len(timetraces) == 0:
+            continue
+
+        timetraces  = tjk.resample_traces([times[shots_ok.index(shot)] for shot in shots_plot],
+                                          timetraces, time_common)
+        time_dec, timetraces_dec    = tjk.decimate_minmax(time_common, timetraces)
+        for shot, timetrace_dec in zip(shots_plot, timetraces_dec):
+            # mark shots with bad data quality of this channel
+            if len(get_quality_flags(shot, key, quality_all[shot])) > 0:
+                label   = '#{0} (!)'.format(shot)
+            else:
+                label   = '#{0}'.format(shot)
+            ax.plot(time_dec, timetrace_dec, label=label, linewidth=.8)
+
+        # optionally set y-range
+        if key == 'plot_Tcoil':
+            ax.set_ylim(20, 110)
+        ax.set_ylabel(ylabel)
+
+        if plot_count == 1:
+            ax.set_title('#{0} - #{1}'.format(shots_ok[0], shots_ok[-1]))
+            ax.legend(fontsize='small', ncol=max(1, len(shots_ok)//5))
+
+        plot_count  += 1
+
+    # add x-label only to bottom axes object
+    if timetraces_options['align_breakdown']:
+        ax.set_xlabel( 'time after breakdown in s' )
+    else:
+        ax.set_xlabel( 'time in s' )
+
+    canvas.draw()
+
+    #}}}
+
+
+def plot_spectra_window(shot, 
+                        status_label, datapath_entry,
+                        timetraces_options,
+                        silent=True
+                       ):
+    #{{{
+    """
+    Opens a new window showing Welch spectra and spectrograms of the
+    fluctuation channels (interferometer, optical diode, bolometer) chosen by
+    the user. For several shots, the first one is used.
+    """
+
+    col_notok   = "#FF6666"
+
+    if not validate_shotnumber(shot, status_label, datapath_entry):
+        return
+
+    shot        = tjk.parse_shot_list(shot)[0]
+    fname_data  = get_fname_data(datapath_entry.get(), shot)
+
+    chCfg   = get_chCfg(shot)
+    keys    = [key for key in ['plot_interf', 'plot_optDiode', 'plot_BoloSum']
+               if timetraces_options[key] == 1]
+    if len(keys) == 0:
+        keys    = ['plot_interf']
+    chNames = [chCfg[key][0] for key in keys]
+
+    spectra = tjk_spectral.get_spectra(shot, chNames=chNames, fname_in=fname_data,
+                                       spectrogram=True, silent=silent)
+    if isinstance(spectra, int):
+        status_label.config(text="status: spectra of #{0} could not be calculated".format(shot),
+                            background=col_notok)
+        return
+
+    spectra_window  = tk.Toplevel(root)
+    spectra_window.title("TJ-K shot-view: spectra #{0}".format(shot))
+
+    fig_spectra     = Figure(figsize=(10,3*len(chNames)))
+    tjk_spectral.plot_spectra(spectra, chNames, fig_spectra, title='#{0}'.format(shot))
+
+    canvas_spectra  = FigureCanvasTkAgg(fig_spectra, spectra_window)
+    canvas_spectra.draw()
+    toolbar_spectra = NavigationToolbar2Tk(canvas_spectra, spectra_window)
+    toolbar_spectra.update()
+    toolbar_spectra.pack(anchor=tk.W, side=tk.BOTTOM, fill=tk.X)
+    canvas_spectra.get_tk_widget().pack(side="left", fill="both", expand=True)
+    #}}}
+
+
+def get_figure_key(shot, datapath_entry, fig, timetraces_options):
+    #{{{
+    """
+    Returns the key of a view for the figure cache: shots, data paths, 
+    options, modification times of the data files and size of the figure.
+    Returns None if a data file does not exist.
+    The data path is resolved for every shot (as validate_shotnumber does
+    before plotting), the entry field might still show the previous shot.
+    """
+
+    shots   = tjk.parse_shot_list(shot)
+    if shots == -1:
+        return None
+
+    datapaths   = []
+    mtimes      = []
+    for shot in shots:
+        datapath    = get_tjkmonitor_datapath(shot)
+        if isinstance(datapath, int):
+            return None
+        fname_data  = get_fname_data(datapath, shot)
+        if not os.path.isfile(fname_data):
+            return None
+        datapaths.append(str(datapath))
+        mtimes.append(os.stat(fname_data).st_mtime_ns)
+
+    return (tuple(shots), tuple(datapaths), 
+            tuple(sorted(timetraces_options.items())), tuple(mtimes),
+            tuple(fig.bbox.size))
+    #}}}
+
+
+def plot_timetraces_cached(shot, 
+                           status_label, datapath_entry,
+                           fig, canvas,
+                           timetraces_options,
+                           silent=True
+                          ):
+    #{{{
+    """
+    Same as plot_timetraces, but views which were already shown are blitted
+    from the figure cache instead of reading and plotting the data again.
+    The figure is fully re-rendered once the user interacts with it (see
+    render_pending and CachedViewToolbar).
+    """
+
+    col_ok      = "#00CC00"
+
+    key = get_figure_key(shot, datapath_entry, fig, timetraces_options)
+    if (key is not None) and (key in figure_cache):
+        # status and data path of the shot, as when plotting it
+        if not validate_shotnumber(shot, status_label, datapath_entry):
+            return
+        figure_cache.move_to_end(key)
+        canvas.restore_region(figure_cache[key])
+        canvas.blit(fig.bbox)
+        figure_pending['args']  = (shot, status_label, datapath_entry, fig, canvas,
+                                   dict(timetraces_options))
+        status_label.config(text="status: shot #{0} (from cache)".format(shot),
+                            background=col_ok)
+        return
+
+    figure_pending.clear()
+    plot_timetraces(shot, status_label, datapath_entry, fig, canvas,
+                    timetraces_options, silent=silent)
+    if (key is None) or (len(fig.axes) == 0):
+        return
+
+    figure_cache[key]   = canvas.copy_from_bbox(fig.bbox)
+    # RGBA bitmaps, size of figure is last element of key
+    while ((sum(4*int(np.prod(key_cached[-1])) for key_cached in figure_cache) 
+            > tjk.get_cache_budget(FIGURE_CACHE_SIZE))
+           and (len(figure_cache) > 1)):
+        figure_cache.popitem(last=False)
+    # memory is not available for reading data anymore
+    tjk.set_memory_resident('shotview figure cache',
+                            sum(4*int(np.prod(key_cached[-1])) for key_cached in figure_cache))
+    #}}}
+
+
+def render_pending(event=None):
+    #{{{
+    """
+    Fully re-renders a view which is only shown as bitmap from the figure
+    cache, called when the user interacts with the figure (mouse click, e.g.
+    to zoom or pan, figure is resized, toolbar actions).
+    """
+
+    if 'args' not in figure_pending:
+        return
+    shot, status_label, datapath_entry, fig, canvas, timetraces_options = figure_pending.pop('args')
+    plot_timetraces(shot, status_label, datapath_entry, fig, canvas,
+                    timetraces_options)
+    #}}}
+
+
+class CachedViewToolbar(NavigationToolbar2Tk):
+    #{{{
+    """
+    Toolbar of the time traces. A view shown from the figure cache is only a
+    bitmap, the figure still holds the previous view, hence it is fully
+    re-rendered before any action of the toolbar (buttons and keyboard
+    shortcuts) works on the figure, e.g. saving it.
+    """
+
+    def home(self, *args):
+        render_pending()
+        super().home(*args)
+
+    def back(self, *args):
+        render_pending()
+        super().back(*args)
+
+    def forward(self, *args):
+        render_pending()
+        super().forward(*args)
+
+    def pan(self, *args):
+        render_pending()
+        super().pan(*args)
+
+    def zoom(self, *args):
+        render_pending()
+        super().zoom(*args)
+
+    def configure_subplots(self, *args):
+        render_pending()
+        return super().configure_subplots(*args)
+
+    def save_figure(self, *args):
+        render_pending()
+        return super().save_figure(*args)
+    #}}}
+
+
+def plot_latest_shot(status_label, datapath_entry,
+                     fig, canvas,
+                     timetraces_options,
+                     silent=True
+                    ):
+    #{{{
+    """
+    Plots the time traces of the most recent shot ingested by tjk_watcher.py
+    (binary cache and summary are already there, hence this is fast).
+    """
+
+    col_notok   = "#FF6666"
+
+    shot    = tjk_watcher.get_latest_shot()
+    if shot == -1:
+        status_label.config(text="status: no shot ingested yet (is tjk_watcher.py running?)",
+                            background=col_notok)
+        return
+
+    shot_entry.delete(0, tk.END)
+    shot_entry.insert(0, str(shot))
+    plot_timetraces_cached(str(shot), status_label, datapath_entry, fig, canvas,
+                           timetraces_options, silent=silent)
+    #}}}
+
+
+def open_gallery_window(shot, 
+                        status_label, datapath_entry,
+                        fig, canvas,
+                        timetraces_options,
+                        silent=True
+                       ):
+    #{{{
+    """
+    Opens a new window showing a scrollable grid of thumbnails (quicklooks,
+    see tjk_quicklook.py) of several shots, clicking on a thumbnail plots 
+    that shot. If a single shot is entered, the GALLERY_N_SHOTS shots up to 
+    this one are shown. Only the thumbnails of the visible rows are loaded,
+    missing quicklooks are generated in the background.
+    """
+
+    col_ok      = "#00CC00"
+    col_notok   = "#FF6666"
+
+    if not validate_shotnumber(shot, status_label, datapath_entry):
+        return
+
+    shots   = tjk.parse_shot_list(shot)
+    if len(shots) == 1:
+        shots   = range(max(shots[0]-GALLERY_N_SHOTS+1, 0), shots[0]+1)
+    fnames  = {}
+    for shot in shots:
+        fname_data  = get_fname_data(get_tjkmonitor_datapath(shot), shot)
+        if os.path.isfile(fname_data):
+            fnames[shot]    = fname_data
+    shots   = sorted(fnames, reverse=True)
+    if len(shots) == 0:
+        status_label.config(text="status: no shots found for the gallery",
+                            background=col_notok)
+        return
+
+    width, height   = tjk_quicklook.QUICKLOOK_SIZE
+    pad             = 4
+    n_rows          = (len(shots)+GALLERY_COLUMNS-1) // GALLERY_COLUMNS
+
+    gallery_window  = tk.Toplevel(root)
+    gallery_window.title("TJ-K shot-view: gallery #{0}-#{1}".format(shots[-1], shots[0]))
+
+    gallery_canvas      = tk.Canvas(gallery_window, bg='white',
+                                    width=GALLERY_COLUMNS*(width+pad)+pad,
+                                    height=min(4, n_rows)*(height+pad)+pad,
+                                    scrollregion=(0, 0, GALLERY_COLUMNS*(width+pad)+pad,
+                                                  n_rows*(height+pad)+pad))
+    gallery_scrollbar   = tk.Scrollbar(gallery_window, orient=tk.VERTICAL, 
+                                       command=gallery_canvas.yview)
+    gallery_scrollbar.pack(side="right", fill="y")
+    gallery_canvas.pack(side="left", fill="both", expand=True)
+
+    # PhotoImages need to be referenced, otherwise they are not shown
+    thumbnails  = {}
+    pending     = {}
+    executor    = concurrent.futures.ThreadPoolExecutor(max_workers=GALLERY_N_WORKERS)
+
+    def plot_shot(shot):
+        shot_entry.delete(0, tk.END)
+        shot_entry.insert(0, str(shot))
+        plot_timetraces_cached(str(shot), status_label, datapath_entry, fig, canvas,
+                               timetraces_options, silent=silent)
+
+    # placeholders, replaced by the thumbnails once loaded
+    for ii, shot in enumerate(shots):
+        x0  = pad + (ii % GALLERY_COLUMNS)*(width+pad)
+        y0  = pad + (ii // GALLERY_COLUMNS)*(height+pad)
+        tag = 'shot{0}'.format(shot)
+        gallery_canvas.create_rectangle(x0, y0, x0+width, y0+height, 
+                                        outline='light gray', tags=(tag, 'frame'+tag))
+        gallery_canvas.create_text(x0+width/2, y0+height/2, text='#{0}'.format(shot), 
+                                   fill='gray', tags=(tag,))
+        gallery_canvas.tag_bind(tag, '<Button-1>', lambda event, shot=shot: plot_shot(shot))
+
+    def show_thumbnail(shot, fname_ql):
+        if isinstance(fname_ql, int):
+            # placeholder remains (marked), no further attempts
+            thumbnails[shot]    = None
+            gallery_canvas.itemconfig('frameshot{0}'.format(shot), outline=col_notok)
+            return
+        ii  = shots.index(shot)
+        thumbnails[shot]    = tk.PhotoImage(file=fname_ql)
+        gallery_canvas.create_image(pad + (ii % GALLERY_COLUMNS)*(width+pad),
+                                    pad + (ii // GALLERY_COLUMNS)*(height+pad),
+                                    image=thumbnails[shot], anchor='nw', 
+                                    tags=('shot{0}'.format(shot),))
+
+    def load_visible(event=None):
+        if not gallery_window.winfo_exists():
+            return
+        # visible rows and one row before and after
+        row_first   = int(gallery_canvas.canvasy(0) // (height+pad)) - 1
+        row_last    = int(gallery_canvas.canvasy(gallery_canvas.winfo_height()) // (height+pad)) + 1
+        for ii in range(max(row_first, 0)*GALLERY_COLUMNS, 
+                        min((row_last+1)*GALLERY_COLUMNS, len(shots))):
+            shot    = shots[ii]
+            if (shot in thumbnails) or (shot in pending):
+                continue
+            fname_ql    = tjk_quicklook.get_quicklook_fname(shot, fname_in=fnames[shot])
+            if (not isinstance(fname_ql, int)) and os.path.isfile(fname_ql):
+                show_thumbnail(shot, fname_ql)
+            else:
+                pending[shot]   = executor.submit(tjk_quicklook.make_quicklook, shot, 
+                                                  fname_in=fnames[shot])
+
+    def poll_pending():
+        if not gallery_window.winfo_exists():
+            return
+        # tkinter is not thread-safe, thumbnails are shown from the main thread
+        for shot in [shot for shot, future in pending.items() if future.done()]:
+            show_thumbnail(shot, pending.pop(shot).result())
+        gallery_window.after(100, poll_pending)
+
+    def scroll(*args):
+        gallery_scrollbar.set(*args)
+        load_visible()
+
+    def scroll_wheel(event):
+        if (event.num == 4) or (event.delta > 0):
+            gallery_canvas.yview_scroll(-1, 'units')
+        else:
+            gallery_canvas.yview_scroll(1, 'units')
+
+    def close_gallery():
+        executor.shutdown(wait=False, cancel_futures=True)
+        gallery_window.destroy()
+
+    gallery_canvas.config(yscrollcommand=scroll, yscrollincrement=(height+pad)//2)
+    gallery_canvas.bind('<Configure>', load_visible)
+    # mouse wheel: windows/macOS and X11
+    gallery_canvas.bind('<MouseWheel>', scroll_wheel)
+    gallery_canvas.bind('<Button-4>', scroll_wheel)
+    gallery_canvas.bind('<Button-5>', scroll_wheel)
+    gallery_window.protocol("WM_DELETE_WINDOW", close_gallery)
+    gallery_window.after(100, poll_pending)
+
+    status_label.config(text="status: gallery of {0} shots opened".format(len(shots)),
+                        background=col_ok)
+    #}}}
+
+
 def checkbutton_clicked(var, str_var, timetraces_options, status_label):
     #{{{
 
@@ -384,16 +1019,19 @@ timetraces_options  = {
         'interf_calc_ne'        : 0,
         'plot_BoloSum'          : 0,
         'plot_p0'               : 0,
+        'align_breakdown'       : 0,
+        'rolling_band'          : 0,
+        'rolling_window'        : 1000,     # number of samples
         }
 # plot button (for time traces)
 plot_button = tk.Button(side_frame_inner,
                         text="Plot time traces",
-                        command=lambda: plot_timetraces(shot_entry.get(), 
-                                                        status_label,
-                                                        datapath_entry,
-                                                        fig1, canvas1,
-                                                        timetraces_options
-                                                       )
+                        command=lambda: plot_timetraces_cached(shot_entry.get(), 
+                                                               status_label,
+                                                               datapath_entry,
+                                                               fig1, canvas1,
+                                                               timetraces_options
+                                                              )
                        )
 plot_button.grid(row=2, columnspan=2, sticky=tk.W+tk.E, padx=5, pady=10)
 
@@ -608,6 +1246,70 @@ plot_p0_check   = tk.Checkbutton(side_frame_inner,
                                      status_label)
                                  )
 plot_p0_check.grid(row=15, column=1, sticky=tk.W, padx=5)
+# checkbutton for aligning several shots on plasma breakdown
+align_breakdown_var     = tk.IntVar()
+align_breakdown_check   = tk.Checkbutton(side_frame_inner, 
+                                         text="align shots on breakdown",
+                                         variable=align_breakdown_var,
+                                         bd=0, highlightthickness=0,    # to fully remove border
+                                         bg=col_sideframe, 
+                                         state=tk.NORMAL,
+                                         command=lambda: checkbutton_clicked(
+                                             align_breakdown_var,
+                                             "align_breakdown",
+                                             timetraces_options,
+                                             status_label)
+                                         )
+align_breakdown_check.grid(row=16, column=1, sticky=tk.W, padx=5)
+# checkbutton for plotting p_0 and n_e as moving mean with uncertainty band
+rolling_band_var    = tk.IntVar()
+rolling_band_check  = tk.Checkbutton(side_frame_inner, 
+                                     text="moving mean +/- std (p_0, n_e)",
+                                     variable=rolling_band_var,
+                                     bd=0, highlightthickness=0,    # to fully remove border
+                                     bg=col_sideframe, 
+                                     state=tk.NORMAL,
+                                     command=lambda: checkbutton_clicked(
+                                         rolling_band_var,
+                                         "rolling_band",
+                                         timetraces_options,
+                                         status_label)
+                                     )
+rolling_band_check.grid(row=17, column=1, sticky=tk.W, padx=5)
+
+# button opening a window with spectra of the fluctuation channels
+spectra_button  = tk.Button(side_frame_inner,
+                            text="Plot spectra",
+                            command=lambda: plot_spectra_window(shot_entry.get(), 
+                                                                status_label,
+                                                                datapath_entry,
+                                                                timetraces_options
+                                                               )
+                           )
+spectra_button.grid(row=18, columnspan=2, sticky=tk.W+tk.E, padx=5, pady=10)
+
+# button plotting the most recent shot (pre-processed by tjk_watcher.py)
+latest_button   = tk.Button(side_frame_inner,
+                            text="Plot latest shot",
+                            command=lambda: plot_latest_shot(status_label,
+                                                             datapath_entry,
+                                                             fig1, canvas1,
+                                                             timetraces_options
+                                                            )
+                           )
+latest_button.grid(row=19, columnspan=2, sticky=tk.W+tk.E, padx=5, pady=10)
+
+# button opening a window with thumbnails of the shots (or of the previous shots)
+gallery_button  = tk.Button(side_frame_inner,
+                            text="Gallery",
+                            command=lambda: open_gallery_window(shot_entry.get(), 
+                                                                status_label,
+                                                                datapath_entry,
+                                                                fig1, canvas1,
+                                                                timetraces_options
+                                                               )
+                           )
+gallery_button.grid(row=20, columnspan=2, sticky=tk.W+tk.E, padx=5, pady=10)
 
 # some information deduced from time traces
 # calculate line-averaged density as value obtained from plasma-off
@@ -633,9 +1335,12 @@ status_label.pack(anchor="nw")
 # Canvas is used to generally draw pictures, graphs or any complex layout
 canvas1 = FigureCanvasTkAgg(fig1, timetraces_frame)
 canvas1.draw()
+# views shown from the figure cache are re-rendered on interaction
+canvas1.mpl_connect('button_press_event', render_pending)
+canvas1.mpl_connect('resize_event', render_pending)
 
 # matplotlib toolbar
-plot_toolbar    = NavigationToolbar2Tk( 
+plot_toolbar    = CachedViewToolbar( 
         canvas1, 
         timetraces_frame, 
         #pack_toolbar=False,      # recommended, but does not work for newer version of some libraries
@@ -0,0 +1,742 @@
+# coding=utf-8
+
+__author__      = 'Alf Köhn-Seemann'
+__email__       = 'koehn@igvp.uni-stuttgart.de'
+__copyright__   = 'University of Stuttgart'
+__license__     = 'MIT'
+
+"""
+Mergeable statistics sketches of fluctuation amplitudes.
+
+A sketch summarizes the distribution of a channel with a small, fixed amount
+of memory: moments (mean, variance, skewness, kurtosis, merged exactly with
+the pairwise update of Chan/Pebay), a histogram with fixed bins (merged
+exactly) and a quantile sketch with logarithmic buckets (quantiles with a
+relative error of at most alpha, merged exactly as well). Sketches are
+calculated chunk by chunk while streaming a shot (see iter_traces in
+TJK-monitor.py), shots are processed in parallel and the sketches are stored
+in the summary database (see tjk_summary.py). PDFs and quantiles of a
+campaign are then obtained by merging the stored sketches, without reading
+any time trace again, e.g.
+
+    python tjk_sketch.py ingest -s 12838 -e 12887
+    python tjk_sketch.py campaign -s 12838 -e 12887 -c Bolo_sum
+"""
+
+
+# import standard modules
+import argparse
+import concurrent.futures
+import io
+import numpy as np
+
+# import some TJ-K related function
+import importlib    # required due to the dash in the filename
+tjk = importlib.import_module("TJK-monitor")
+import tjk_rolling
+import tjk_spectral
+import tjk_summary
+
+
+# version of calc_shot_sketches, to be increased whenever its results change
+SKETCH_VERSION  = 1
+
+# fluctuations are taken relative to the trailing moving mean over this
+# number of samples (and normalized to the moving standard deviation)
+SKETCH_WINDOW   = 1000
+
+# default bin edges of the histograms (normalized fluctuations)
+SKETCH_EDGES    = np.linspace( -10., 10., 401 )
+
+# relative accuracy of the quantiles
+SKETCH_ALPHA    = .01
+
+# absolute values below this are counted as zero by the quantile sketch
+SKETCH_MIN_VALUE    = 1e-9
+
+
+def new_sketch( edges=SKETCH_EDGES, alpha=SKETCH_ALPHA ):
+    #{{{
+    """
+    Returns an empty sketch.
+
+    Parameters
+    ----------
+    edges : numpy.array, optional
+        Bin edges of the histogram, values outside are counted as under-
+        and overflow.
+    alpha : float, optional
+        Relative accuracy of the quantiles.
+
+    Returns
+    -------
+    dict
+        Sketch with keys 'n', 'mean', 'm2', 'm3', 'm4' (sums of powers of the
+        deviations from the mean), 'min', 'max', 'edges', 'hist' (counts,
+        under- and overflow as first and last element), 'alpha', 'q_pos' and
+        'q_neg' (keys and counts of the logarithmic buckets of positive and
+        negative values) and 'q_zero'.
+    """
+
+    return { 'n'        : 0,
+             'mean'     : 0.,
+             'm2'       : 0.,
+             'm3'       : 0.,
+             'm4'       : 0.,
+             'min'      : np.inf,
+             'max'      : -np.inf,
+             'edges'    : np.asarray( edges, dtype=np.float64 ),
+             'hist'     : np.zeros( len(edges)+1, dtype=np.int64 ),
+             'alpha'    : float( alpha ),
+             'q_pos'    : np.zeros( (2, 0), dtype=np.int64 ),
+             'q_neg'    : np.zeros( (2, 0), dtype=np.int64 ),
+             'q_zero'   : 0,
+           }
+    #}}}
+
+
+def get_bucket_keys( values, alpha ):
+    #{{{
+    """
+    Returns the keys of the logarithmic buckets of positive values.
+
+    Bucket k covers the values (gamma**(k-1), gamma**k] with
+    gamma = (1+alpha)/(1-alpha).
+    """
+    gamma   = (1.+alpha) / (1.-alpha)
+    return np.ceil( np.log( values ) / np.log( gamma ) ).astype( np.int64 )
+    #}}}
+
+
+def merge_buckets( buckets_a, buckets_b ):
+    #{{{
+    """
+    Merges two sets of buckets (keys in the first, counts in the second row).
+    """
+    keys            = np.concatenate( (buckets_a[0], buckets_b[0]) )
+    counts          = np.concatenate( (buckets_a[1], buckets_b[1]) )
+    keys, inverse   = np.unique( keys, return_inverse=True )
+    return np.array( [ keys, np.bincount( inverse, weights=counts, minlength=len(keys) ).astype( np.int64 ) ],
+                     dtype=np.int64 ).reshape( 2, -1 )
+    #}}}
+
+
+def calc_sketch( x, edges=SKETCH_EDGES, alpha=SKETCH_ALPHA ):
+    #{{{
+    """
+    Calculates the sketch of an array, non-finite values are ignored.
+
+    Parameters
+    ----------
+    x : numpy.array
+        Values.
+    edges : numpy.array, optional
+        Bin edges of the histogram.
+    alpha : float, optional
+        Relative accuracy of the quantiles.
+
+    Returns
+    -------
+    dict
+        Sketch, see new_sketch.
+    """
+
+    sketch  = new_sketch( edges=edges, alpha=alpha )
+    x       = np.asarray( x, dtype=np.float64 )
+    x       = x[ np.isfinite( x ) ]
+    if len(x) == 0:
+        return sketch
+
+    mean    = np.mean( x )
+    dev     = x - mean
+    dev2    = dev*dev
+    sketch.update( { 'n'    : len(x),
+                     'mean' : mean,
+                     'm2'   : np.sum( dev2 ),
+                     'm3'   : np.sum( dev2*dev ),
+                     'm4'   : np.sum( dev2*dev2 ),
+                     'min'  : np.min( x ),
+                     'max'  : np.max( x ),
+                   } )
+
+    # searchsorted: 0 is underflow, len(edges) is overflow, last edge inclusive
+    ids     = np.searchsorted( sketch['edges'], x, side='right' )
+    ids[x == sketch['edges'][-1]]   = len(sketch['edges']) - 1
+    sketch['hist']  = np.bincount( ids, minlength=len(edges)+1 ).astype( np.int64 )
+
+    for key, values in [ ('q_pos', x[x > SKETCH_MIN_VALUE]), ('q_neg', -x[x < -SKETCH_MIN_VALUE]) ]:
+        keys, counts    = np.unique( get_bucket_keys( values, alpha ), return_counts=True )
+        sketch[key]     = np.array( [ keys, counts ], dtype=np.int64 ).reshape( 2, -1 )
+    sketch['q_zero']    = int( np.sum( np.abs( x ) <= SKETCH_MIN_VALUE ) )
+
+    return sketch
+    #}}}
+
+
+def merge_sketches( sketch_a, sketch_b ):
+    #{{{
+    """
+    Merges two sketches, the result is the sketch of all values of both.
+
+    Moments are combined with the pairwise update formulas (Chan et al.,
+    Pebay 2008), histograms and quantile buckets are added.
+
+    Parameters
+    ----------
+    sketch_a : dict
+        Sketch, see new_sketch.
+    sketch_b : dict
+        Sketch with the same bin edges and accuracy.
+
+    Returns
+    -------
+    dict
+        Merged sketch, returns errValue (-1) if the sketches are not
+        compatible.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    if (not np.array_equal( sketch_a['edges'], sketch_b['edges'] )) or (sketch_a['alpha'] != sketch_b['alpha']):
+        print( 'merge_sketches: ERROR, sketches have different bin edges or accuracy' )
+        return errValue
+
+    n_a, n_b    = sketch_a['n'], sketch_b['n']
+    if n_b == 0:
+        return dict( sketch_a )
+    if n_a == 0:
+        return dict( sketch_b )
+
+    n       = n_a + n_b
+    delta   = sketch_b['mean'] - sketch_a['mean']
+    m2_a, m2_b  = sketch_a['m2'], sketch_b['m2']
+    m3_a, m3_b  = sketch_a['m3'], sketch_b['m3']
+
+    sketch  = new_sketch( edges=sketch_a['edges'], alpha=sketch_a['alpha'] )
+    sketch.update( {
+        'n'     : n,
+        'mean'  : sketch_a['mean'] + delta*n_b/n,
+        'm2'    : m2_a + m2_b + delta**2 * n_a*n_b/n,
+        'm3'    : ( m3_a + m3_b + delta**3 * n_a*n_b*(n_a-n_b)/n**2
+                    + 3.*delta * (n_a*m2_b - n_b*m2_a)/n ),
+        'm4'    : ( sketch_a['m4'] + sketch_b['m4']
+                    + delta**4 * n_a*n_b*(n_a**2 - n_a*n_b + n_b**2)/n**3
+                    + 6.*delta**2 * (n_a**2*m2_b + n_b**2*m2_a)/n**2
+                    + 4.*delta * (n_a*m3_b - n_b*m3_a)/n ),
+        'min'   : min( sketch_a['min'], sketch_b['min'] ),
+        'max'   : max( sketch_a['max'], sketch_b['max'] ),
+        'hist'  : sketch_a['hist'] + sketch_b['hist'],
+        'q_pos' : merge_buckets( sketch_a['q_pos'], sketch_b['q_pos'] ),
+        'q_neg' : merge_buckets( sketch_a['q_neg'], sketch_b['q_neg'] ),
+        'q_zero': sketch_a['q_zero'] + sketch_b['q_zero'],
+        } )
+
+    return sketch
+    #}}}
+
+
+def get_moments( sketch ):
+    #{{{
+    """
+    Returns mean, standard deviation, skewness and excess kurtosis.
+
+    Parameters
+    ----------
+    sketch : dict
+        Sketch, see new_sketch.
+
+    Returns
+    -------
+    dict
+        Dictionary with keys 'n', 'mean', 'std' (ddof=1), 'skewness',
+        'kurtosis' (excess), 'min' and 'max', NaN if there are not enough
+        values.
+    """
+
+    n       = sketch['n']
+    moments = { 'n': n, 'mean': np.nan, 'std': np.nan, 'skewness': np.nan, 'kurtosis': np.nan,
+                'min': sketch['min'] if n > 0 else np.nan, 'max': sketch['max'] if n > 0 else np.nan }
+    if n > 0:
+        moments['mean'] = sketch['mean']
+    if (n > 1) and (sketch['m2'] > 0):
+        moments['std']      = np.sqrt( sketch['m2']/(n-1) )
+        moments['skewness'] = np.sqrt( n ) * sketch['m3'] / sketch['m2']**1.5
+        moments['kurtosis'] = n * sketch['m4'] / sketch['m2']**2 - 3.
+
+    return moments
+    #}}}
+
+
+def get_quantiles( sketch, q ):
+    #{{{
+    """
+    Returns quantiles from the quantile sketch.
+
+    The relative error of the returned values is at most sketch['alpha']
+    (values with an absolute value below SKETCH_MIN_VALUE are returned as 0).
+
+    Parameters
+    ----------
+    sketch : dict
+        Sketch, see new_sketch.
+    q : float or numpy.array
+        Quantiles, between 0 and 1.
+
+    Returns
+    -------
+    numpy.array
+        Values of the quantiles, NaN for an empty sketch.
+    """
+
+    q       = np.atleast_1d( np.asarray( q, dtype=np.float64 ) )
+    if sketch['n'] == 0:
+        return np.full( q.shape, np.nan )
+
+    gamma   = (1.+sketch['alpha']) / (1.-sketch['alpha'])
+    # buckets in ascending order of their values: negative (largest key
+    # first), zero, positive; value of a bucket is the one with the least
+    # relative error to all values in it
+    keys_neg, counts_neg    = sketch['q_neg'][:,::-1]
+    keys_pos, counts_pos    = sketch['q_pos']
+    values  = np.concatenate( ( -2.*gamma**keys_neg/(gamma+1.), [0.], 2.*gamma**keys_pos/(gamma+1.) ) )
+    counts  = np.concatenate( ( counts_neg, [sketch['q_zero']], counts_pos ) )
+
+    # rank as for numpy.quantile with method='lower'
+    ranks   = np.floor( q*(sketch['n']-1) )
+    ids     = np.searchsorted( np.cumsum( counts ), ranks, side='right' )
+
+    return np.clip( values[ np.minimum( ids, len(values)-1 ) ], sketch['min'], sketch['max'] )
+    #}}}
+
+
+def get_pdf( sketch ):
+    #{{{
+    """
+    Returns the probability density from the histogram of a sketch.
+
+    Parameters
+    ----------
+    sketch : dict
+        Sketch, see new_sketch.
+
+    Returns
+    -------
+    list
+        List containing the bin centers and the probability density
+        (normalized to all values, including under- and overflow).
+    """
+
+    edges   = sketch['edges']
+    centers = .5*(edges[1:] + edges[:-1])
+    if sketch['n'] == 0:
+        return [ centers, np.full( len(centers), np.nan ) ]
+
+    return [ centers, sketch['hist'][1:-1] / (sketch['n']*np.diff( edges )) ]
+    #}}}
+
+
+def encode_sketch( sketch ):
+    #{{{
+    """
+    Encodes a sketch as bytes (npz), e.g. to be stored in the database.
+    """
+    f_sketch    = io.BytesIO()
+    np.savez( f_sketch, **sketch )
+    return f_sketch.getvalue()
+    #}}}
+
+
+def decode_sketch( data ):
+    #{{{
+    """
+    Decodes a sketch encoded with encode_sketch.
+    """
+    with np.load( io.BytesIO( data ) ) as f_sketch:
+        sketch  = { key: f_sketch[key] for key in f_sketch.files }
+    for key in [ 'n', 'q_zero' ]:
+        sketch[key] = int( sketch[key] )
+    for key in [ 'mean', 'm2', 'm3', 'm4', 'min', 'max', 'alpha' ]:
+        sketch[key] = float( sketch[key] )
+    return sketch
+    #}}}
+
+
+def get_sketch_params( chNames=tjk_spectral.CHANNELS_FLUCTUATION, window=SKETCH_WINDOW, normalize=True,
+                       edges=SKETCH_EDGES, alpha=SKETCH_ALPHA, discharge_only=True ):
+    #{{{
+    """
+    Returns the parameters of calc_shot_sketches as JSON-serializable dict.
+
+    Used for the provenance key of the stored sketches (see get_provenance in
+    TJK-monitor.py).
+    """
+    return { 'channels'         : list( chNames ),
+             'window'           : int( window ),
+             'normalize'        : bool( normalize ),
+             'edges'            : [ float( edge ) for edge in edges ],
+             'alpha'            : float( alpha ),
+             'discharge_only'   : bool( discharge_only ),
+           }
+    #}}}
+
+
+def calc_shot_sketches( shot, chNames=tjk_spectral.CHANNELS_FLUCTUATION, fname_in='',
+                        window=SKETCH_WINDOW, normalize=True, edges=SKETCH_EDGES, alpha=SKETCH_ALPHA,
+                        discharge_only=True, silent=True ):
+    #{{{
+    """
+    Calculates the sketches of the fluctuations of channels of a shot.
+
+    The fluctuations are the deviations from the trailing moving mean (see
+    tjk_rolling.py), optionally normalized to the moving standard deviation;
+    the first window-1 samples are skipped. The file is streamed (see
+    iter_traces in TJK-monitor.py), the sketch of every chunk is merged into
+    the sketch of the shot, i.e. the memory required does not depend on the
+    length of the shot.
+
+    Parameters
+    ----------
+    shot : int
+        Shot number
+    chNames : list of str, optional
+        Names of the channels as written in the header of the file, channels
+        which were not recorded are skipped.
+    fname_in : str, optional
+        Allows to optionally specify a filename explicitely (if it would not
+        be located at the default locations, for example).
+    window : int, optional
+        Number of samples of the moving window.
+    normalize : bool, optional
+        If True, the fluctuations are normalized to the moving standard
+        deviation.
+    edges : numpy.array, optional
+        Bin edges of the histograms.
+    alpha : float, optional
+        Relative accuracy of the quantiles.
+    discharge_only : bool, optional
+        If True, only the discharge (see get_discharge_window) is used.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    dict
+        Dictionary with keys 'sketches' (dictionary with the channel names as
+        keys and the sketches as values), 't_start' and 't_end' (time window
+        used in ms, None for the whole shot). Returns errValue (-1) on error.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    t_start = t_end = None
+    with tjk.Shot( shot, fname_in=fname_in ) as shot_data:
+        if not shot_data.exists:
+            print( 'calc_shot_sketches: ERROR, no data found for shot {0}'.format( shot ) )
+            return errValue
+        chNames = [ chName for chName in chNames if chName in shot_data.header ]
+        if len(chNames) == 0:
+            print( 'calc_shot_sketches: ERROR, no channel recorded in shot {0}'.format( shot ) )
+            return errValue
+        if discharge_only:
+            # only the heating power is read here, the channels are streamed
+            try:
+                shot_data.traces.load( [ 'Zeit [ms]', shot_data.chCfg['P2GHz_in'][0],
+                                         shot_data.chCfg['P2GHz_out'][0] ] )
+                t_on, t_off = tjk.get_discharge_window( shot_data.time, shot_data.pabs2 )
+            except KeyError:
+                t_on, t_off = np.nan, np.nan
+            if np.isfinite( t_on ):
+                t_start, t_end  = float( t_on ), float( t_off )
+            elif not silent:
+                print( 'calc_shot_sketches: no discharge found, whole shot {0} used'.format( shot ) )
+        fname_data  = shot_data.fname_data
+
+    sketches    = { chName: new_sketch( edges=edges, alpha=alpha ) for chName in chNames }
+    states      = { chName: None for chName in chNames }
+    n_skip      = window - 1
+    for chunk in tjk.iter_traces( shot, chNames, fname_in=fname_data, t_start=t_start, t_end=t_end,
+                                  silent=silent ):
+        for chName in chNames:
+            stats, states[chName]   = tjk_rolling.calc_rolling_stats( chunk[chName], window,
+                                                                      stats=('mean', 'std'),
+                                                                      state=states[chName] )
+            fluct   = chunk[chName] - stats['mean']
+            if normalize:
+                with np.errstate( divide='ignore', invalid='ignore' ):
+                    fluct  /= stats['std']
+            sketches[chName]    = merge_sketches( sketches[chName],
+                                                  calc_sketch( fluct[n_skip:], edges=edges, alpha=alpha ) )
+        n_skip  = max( n_skip - len(fluct), 0 )
+
+    if not silent:
+        for chName in chNames:
+            moments = get_moments( sketches[chName] )
+            print( '    shot={0:d}: {1}: n={2}, skewness={3:.3f}, kurtosis={4:.3f}'.format(
+                    shot, chName, moments['n'], moments['skewness'], moments['kurtosis'] ) )
+
+    return { 'sketches': sketches, 't_start': t_start, 't_end': t_end }
+    #}}}
+
+
+def open_sketch_db( fname_db='' ):
+    #{{{
+    """
+    Opens the summary database and creates the sketch table if necessary.
+
+    Parameters
+    ----------
+    fname_db : str, optional
+        Filename of the database, tjk_summary.FNAME_DB is used if not set.
+
+    Returns
+    -------
+    sqlite3.Connection
+    """
+
+    con = tjk_summary.open_db( fname_db )
+    con.execute( 'CREATE TABLE IF NOT EXISTS sketch ('
+                 'shot INTEGER, channel TEXT, provenance TEXT, t_start REAL, t_end REAL, '
+                 'n INTEGER, mean REAL, std REAL, skewness REAL, kurtosis REAL, min REAL, max REAL, '
+                 'data BLOB, PRIMARY KEY (shot, channel))' )
+    con.commit()
+
+    return con
+    #}}}
+
+
+def ingest_sketches( shots, chNames=tjk_spectral.CHANNELS_FLUCTUATION, n_workers=4, force=False,
+                     fname_db='', silent=True, **kwargs ):
+    #{{{
+    """
+    Calculates the sketches of many shots in parallel and stores them.
+
+    Shots already stored are only calculated again if their provenance key
+    changed (data file, SKETCH_VERSION, calibration of the heating power or
+    parameters) or if force is set. The database is only written from the
+    calling thread. Keyword arguments are passed to calc_shot_sketches.
+
+    Parameters
+    ----------
+    shots : list of int
+        Shot numbers.
+    chNames : list of str, optional
+        Names of the channels as written in the header of the file.
+    n_workers : int, optional
+        Number of shots processed in parallel.
+    force : bool, optional
+        If True, all shots are calculated again.
+    fname_db : str, optional
+        Filename of the database, tjk_summary.FNAME_DB is used if not set.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    int
+        Number of shots which were calculated.
+    """
+
+    params  = get_sketch_params( chNames=chNames, **kwargs )
+    con     = open_sketch_db( fname_db )
+
+    # select shots which were not calculated yet or are outdated
+    stored      = {}
+    for row in con.execute( 'SELECT shot, provenance FROM sketch' ):
+        stored.setdefault( row['shot'], set() ).add( row['provenance'] )
+    shots2do    = {}
+    for shot in shots:
+        key = tjk.get_provenance( shot, 'sketch', SKETCH_VERSION, calibrations=['P2GHz'], params=params )
+        if isinstance(key, int):
+            continue
+        if force or (stored.get( shot ) != {key}):
+            shots2do[shot]  = key
+
+    if not silent:
+        print( 'ingest_sketches: {0} of {1} shots need to be calculated'.format( len(shots2do), len(shots) ) )
+
+    n_done  = 0
+    with concurrent.futures.ThreadPoolExecutor( max_workers=n_workers ) as executor:
+        results = executor.map( lambda shot: calc_shot_sketches( shot, chNames=chNames, silent=silent,
+                                                                 **kwargs ), shots2do )
+        for shot, result in zip( shots2do, results ):
+            if isinstance(result, int):
+                continue
+            con.execute( 'DELETE FROM sketch WHERE shot=?', (shot,) )
+            rows    = []
+            for chName, sketch in result['sketches'].items():
+                moments = get_moments( sketch )
+                # sqlite3 does not know numpy types
+                rows.append( [ int(shot), chName, shots2do[shot], result['t_start'], result['t_end'] ]
+                             + [ int( moments['n'] ) ]
+                             + [ float( moments[key] ) for key in ['mean', 'std', 'skewness', 'kurtosis',
+                                                                   'min', 'max'] ]
+                             + [ encode_sketch( sketch ) ] )
+            con.executemany( 'INSERT INTO sketch VALUES ({0})'.format( ', '.join( ['?']*13 ) ), rows )
+            con.commit()
+            n_done += 1
+    con.close()
+
+    return n_done
+    #}}}
+
+
+def load_sketches( chName, shots=None, fname_db='' ):
+    #{{{
+    """
+    Loads the stored sketches of a channel.
+
+    Parameters
+    ----------
+    chName : str
+        Name of the channel as written in the header of the file.
+    shots : list of int, optional
+        Shot numbers, all stored shots if not set.
+    fname_db : str, optional
+        Filename of the database, tjk_summary.FNAME_DB is used if not set.
+
+    Returns
+    -------
+    dict
+        Dictionary with shot numbers as keys and sketches as values.
+    """
+
+    con     = open_sketch_db( fname_db )
+    rows    = con.execute( 'SELECT shot, data FROM sketch WHERE channel=? ORDER BY shot', (chName,) )
+    if shots is not None:
+        shots   = set( shots )
+        rows    = [ row for row in rows if row['shot'] in shots ]
+    sketches    = { row['shot']: decode_sketch( row['data'] ) for row in rows }
+    con.close()
+
+    return sketches
+    #}}}
+
+
+def get_campaign_sketch( chName, shots=None, fname_db='' ):
+    #{{{
+    """
+    Returns the sketch of a channel merged over many shots.
+
+    Parameters
+    ----------
+    chName : str
+        Name of the channel as written in the header of the file.
+    shots : list of int, optional
+        Shot numbers, all stored shots if not set.
+    fname_db : str, optional
+        Filename of the database, tjk_summary.FNAME_DB is used if not set.
+
+    Returns
+    -------
+    dict
+        Merged sketch, returns errValue (-1) if no sketch is stored or the
+        sketches are not compatible.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    sketches    = list( load_sketches( chName, shots=shots, fname_db=fname_db ).values() )
+    if len(sketches) == 0:
+        print( 'get_campaign_sketch: ERROR, no sketch stored for <{0}>'.format( chName ) )
+        return errValue
+
+    sketch  = sketches[0]
+    for sketch_shot in sketches[1:]:
+        sketch  = merge_sketches( sketch, sketch_shot )
+        if isinstance(sketch, int):
+            return errValue
+
+    return sketch
+    #}}}
+
+
+def plot_sketch( sketch, fig, title='' ):
+    #{{{
+    """
+    Plots the PDF of a sketch together with a Gaussian of the same variance.
+
+    Parameters
+    ----------
+    sketch : dict
+        Sketch, see new_sketch.
+    fig : matplotlib.figure.Figure
+        Figure to plot into.
+    title : str, optional
+        Title of the plot.
+    """
+
+    centers, pdf    = get_pdf( sketch )
+    moments         = get_moments( sketch )
+    quantiles       = get_quantiles( sketch, [.01, .5, .99] )
+
+    ax  = fig.add_subplot( 1, 1, 1 )
+    ax.semilogy( centers, pdf, drawstyle='steps-mid', label='PDF' )
+    ax.semilogy( centers, np.exp( -.5*((centers-moments['mean'])/moments['std'])**2 )
+                          / (np.sqrt( 2.*np.pi )*moments['std']),
+                 linestyle='--', color='gray', label='Gaussian' )
+    ax.set_xlabel( 'fluctuation' )
+    ax.set_ylabel( 'PDF' )
+    ax.set_title( title )
+    ax.legend( loc='upper right' )
+    ax.text( .02, .98, 'n={0}\nS={1:.3f}\nK={2:.3f}\nq01/50/99={3:.2f}/{4:.2f}/{5:.2f}'.format(
+                moments['n'], moments['skewness'], moments['kurtosis'], *quantiles ),
+             transform=ax.transAxes, va='top', fontsize=8 )
+    #}}}
+
+
+def main():
+#{{{
+    import matplotlib.pyplot as plt
+
+    # initialize parser for command line options
+    parser      = argparse.ArgumentParser( description='mergeable sketches of fluctuation PDFs of tjk-monitor data' )
+    subparsers  = parser.add_subparsers( dest='command', required=True )
+
+    parser_ingest   = subparsers.add_parser( 'ingest', help='calculate and store the sketches of shots' )
+    parser_campaign = subparsers.add_parser( 'campaign', help='PDF and quantiles merged over shots' )
+    for subparser in [ parser_ingest, parser_campaign ]:
+        subparser.add_argument( "-s", "--shot_start", type=int, required=True,
+                help='First shot number' )
+        subparser.add_argument( "-e", "--shot_end", type=int, default=None,
+                help='Last shot number (default: first shot number)' )
+    parser_ingest.add_argument( "-c", "--channels", type=str, nargs='+',
+            default=tjk_spectral.CHANNELS_FLUCTUATION, help='Names of the channels' )
+    parser_ingest.add_argument( "-j", "--n_workers", type=int, default=4,
+            help='Number of shots processed in parallel' )
+    parser_ingest.add_argument( "--force", action='store_true',
+            help='Calculate all shots again' )
+    parser_campaign.add_argument( "-c", "--channel", type=str, default=tjk_spectral.CHANNELS_FLUCTUATION[0],
+            help='Name of the channel' )
+    parser_campaign.add_argument( "--no_plot", action='store_true',
+            help='Only print moments and quantiles' )
+
+    # read all arguments from command line
+    args    = parser.parse_args()
+
+    shot_end    = args.shot_end if args.shot_end is not None else args.shot_start
+    shots       = range( args.shot_start, shot_end+1 )
+    if args.command == 'ingest':
+        n_done  = ingest_sketches( shots, chNames=args.channels, n_workers=args.n_workers,
+                                   force=args.force, silent=False )
+        print( '{0} shots calculated'.format( n_done ) )
+    elif args.command == 'campaign':
+        sketch  = get_campaign_sketch( args.channel, shots=shots )
+        if isinstance(sketch, int):
+            return
+        moments = get_moments( sketch )
+        print( '\n'.join( '{0:10s} {1}'.format( key, value ) for key, value in moments.items() ) )
+        for q, value in zip( [.01, .05, .25, .5, .75, .95, .99],
+                             get_quantiles( sketch, [.01, .05, .25, .5, .75, .95, .99] ) ):
+            print( 'q{0:<9.2f} {1:.4f}'.format( q, value ) )
+        if not args.no_plot:
+            fig = plt.figure( figsize=(8,6) )
+            plot_sketch( sketch, fig, title='{0}, #{1}-{2}'.format( args.channel, args.shot_start, shot_end ) )
+            plt.show()
+#}}}
+
+
+if __name__ == '__main__':
+    main()
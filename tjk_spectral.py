@@ -0,0 +1,376 @@
+# coding=utf-8
+
+__author__      = 'Alf Köhn-Seemann'
+__email__       = 'koehn@igvp.uni-stuttgart.de'
+__copyright__   = 'University of Stuttgart'
+__license__     = 'MIT'
+
+"""
+Spectral analysis of time traces acquired with tjk-monitor.
+
+Welch power spectral densities and spectrograms are calculated while
+streaming through the file chunk by chunk (see iter_traces in TJK-monitor.py),
+i.e. whole discharges can be analysed without keeping them in memory. All
+requested channels are processed together, several shots in parallel.
+"""
+
+
+# import standard modules
+import argparse
+import concurrent.futures
+import functools
+import itertools
+import numpy as np
+
+# import some TJ-K related function
+import importlib    # required due to the dash in the filename
+tjk = importlib.import_module("TJK-monitor")
+
+
+# channels typically used for fluctuation studies
+CHANNELS_FLUCTUATION    = [ 'Interferometer digital', 'optDiode', 'Bolo_sum' ]
+
+# available window functions, periodic versions as used for spectral analysis
+WINDOWS = { 'hann'      : lambda n: np.hanning( n+1 )[:-1],
+            'hamming'   : lambda n: np.hamming( n+1 )[:-1],
+            'blackman'  : lambda n: np.blackman( n+1 )[:-1],
+            'boxcar'    : np.ones,
+          }
+
+
+@functools.lru_cache( maxsize=32 )
+def get_window( window, nperseg, fs ):
+    #{{{
+    """
+    Returns window function and PSD scaling factor, results are cached.
+
+    Parameters
+    ----------
+    window : str
+        Name of the window function, one of WINDOWS.
+    nperseg : int
+        Length of a segment.
+    fs : float
+        Sampling frequency in Hz.
+
+    Returns
+    -------
+    list
+        List containing the window (read-only numpy.array) and the factor
+        converting the squared magnitude of the FFT into a one-sided power
+        spectral density.
+    """
+
+    win     = WINDOWS[window]( nperseg ).astype( np.float64 )
+    win.flags.writeable = False
+    scale   = 1. / (fs * np.sum( win**2 ))
+
+    return [ win, scale ]
+    #}}}
+
+
+def iter_segments( chunks, nperseg, noverlap ):
+    #{{{
+    """
+    Generator yielding overlapping segments from a stream of chunks.
+
+    Samples not filling a complete segment are carried over to the next
+    chunk, so the segmentation is the same as for the complete trace.
+
+    Parameters
+    ----------
+    chunks : iterable of numpy.array
+        2D numpy.arrays with shape (n_rows, n_channels).
+    nperseg : int
+        Length of a segment.
+    noverlap : int
+        Number of samples two neighbouring segments overlap.
+
+    Yields
+    ------
+    list
+        List containing the index of the first sample of each segment and
+        the segments as numpy.array with shape (n_seg, n_channels, nperseg)
+        (a strided view, not a copy).
+    """
+
+    step        = nperseg - noverlap
+    remainder   = None
+    id_first    = 0
+
+    for chunk in chunks:
+        if (remainder is None) or (len(remainder) == 0):
+            data    = chunk
+        else:
+            data    = np.concatenate( (remainder, chunk) )
+
+        n_seg   = (len(data) - nperseg) // step + 1 if len(data) >= nperseg else 0
+        if n_seg > 0:
+            segments    = np.lib.stride_tricks.sliding_window_view( data, nperseg, axis=0 )[::step][:n_seg]
+            yield [ id_first + np.arange( n_seg )*step, segments ]
+
+        remainder   = data[n_seg*step:]
+        id_first   += n_seg*step
+    #}}}
+
+
+def calc_spectra( chunks, fs, nperseg=1024, noverlap=None, window='hann',
+                  spectrogram=False ):
+    #{{{
+    """
+    Calculates Welch PSD and optionally spectrogram from a stream of chunks.
+
+    Parameters
+    ----------
+    chunks : iterable of numpy.array
+        2D numpy.arrays with shape (n_rows, n_channels).
+    fs : float
+        Sampling frequency in Hz.
+    nperseg : int, optional
+        Length of a segment.
+    noverlap : int, optional
+        Number of samples two neighbouring segments overlap, nperseg/2 if
+        not set.
+    window : str, optional
+        Name of the window function, one of WINDOWS.
+    spectrogram : bool, optional
+        If True, the PSD of every segment is returned as well.
+
+    Returns
+    -------
+    dict
+        Dictionary with keys 'freq' (frequencies in Hz), 'psd' (numpy.array
+        with shape (n_channels, n_freq)), 'n_seg' and, if spectrogram is set,
+        'id_seg' (index of first sample of each segment) and 'sxx' (numpy.array
+        with shape (n_seg, n_channels, n_freq)).
+    """
+
+    if noverlap is None:
+        noverlap    = nperseg // 2
+
+    win, scale  = get_window( window, nperseg, fs )
+    freq        = np.fft.rfftfreq( nperseg, d=1./fs )
+
+    # one-sided spectrum: double all bins except DC and Nyquist
+    factor      = np.full( len(freq), 2.*scale )
+    factor[0]   = scale
+    if nperseg % 2 == 0:
+        factor[-1]  = scale
+
+    psd_sum     = 0.
+    n_seg       = 0
+    id_seg      = []
+    sxx         = []
+    for id_first, segments in iter_segments( chunks, nperseg, noverlap ):
+        # remove mean of each segment, apply window, FFT of all segments
+        # and channels at once
+        segments    = segments - np.mean( segments, axis=-1, keepdims=True )
+        segments   *= win
+        spectra     = np.fft.rfft( segments, axis=-1 )
+        psd_block   = (spectra.real**2 + spectra.imag**2) * factor
+
+        psd_sum    += np.sum( psd_block, axis=0 )
+        n_seg      += len(psd_block)
+        if spectrogram:
+            id_seg.append( id_first )
+            sxx.append( psd_block )
+
+    result  = { 'freq'  : freq,
+                'psd'   : psd_sum / n_seg if n_seg > 0 else np.full( (0, len(freq)), np.nan ),
+                'n_seg' : n_seg,
+              }
+    if spectrogram:
+        result['id_seg']    = np.concatenate( id_seg ) if n_seg > 0 else np.zeros( 0, dtype=int )
+        result['sxx']       = np.concatenate( sxx ) if n_seg > 0 else np.zeros( (0, 0, len(freq)) )
+
+    return result
+    #}}}
+
+
+def get_spectra( shot, chNames=CHANNELS_FLUCTUATION, fname_in='',
+                 nperseg=1024, noverlap=None, window='hann', spectrogram=False,
+                 t_start=None, t_end=None, n_rows_chunk=100000, silent=True ):
+    #{{{
+    """
+    Calculates Welch PSD and optionally spectrogram of channels of a shot.
+
+    The file is streamed chunk by chunk, all channels are processed together.
+
+    Parameters
+    ----------
+    shot : int
+        Shot number
+    chNames : list of str, optional
+        Names of the channels as written in the header of the file.
+    fname_in : str, optional
+        Allows to optionally specify a filename explicitely (if it would not
+        be located at the default locations, for example).
+    nperseg : int, optional
+        Length of a segment.
+    noverlap : int, optional
+        Number of samples two neighbouring segments overlap, nperseg/2 if
+        not set.
+    window : str, optional
+        Name of the window function, one of WINDOWS.
+    spectrogram : bool, optional
+        If True, the spectrogram is calculated as well.
+    t_start : float, optional
+        Start of time window in ms.
+    t_end : float, optional
+        End of time window in ms.
+    n_rows_chunk : int, optional
+        Approximate number of rows read per chunk.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    dict
+        Dictionary with keys 'freq' (in Hz), 'fs' (in Hz) and channel names,
+        the values for the channels are the PSD (in units of V^2/Hz). If
+        spectrogram is set, 'time' (center of segments in s) and, for each
+        channel, chName+' spectrogram' with shape (n_time, n_freq) are
+        added. Returns errValue (-1) on error.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    chunk_iter  = tjk.iter_traces( shot, ['Zeit [ms]'] + list(chNames), fname_in=fname_in,
+                                   n_rows_chunk=n_rows_chunk, t_start=t_start, t_end=t_end,
+                                   silent=silent )
+
+    # sampling frequency from the time column of the first chunk
+    first_chunk = next( chunk_iter, None )
+    if (first_chunk is None) or (len(first_chunk['Zeit [ms]']) < 2):
+        print( 'get_spectra: ERROR, no data found for shot {0}'.format( shot ) )
+        return errValue
+    dt  = np.median( np.diff( first_chunk['Zeit [ms]'] ) ) * 1e-3
+    fs  = 1./dt
+    t0  = first_chunk['Zeit [ms]'][0] * 1e-3
+
+    # all channels are processed together
+    chunks  = ( np.column_stack( [ chunk[chName] for chName in chNames ] )
+                for chunk in itertools.chain( [first_chunk], chunk_iter ) )
+
+    spectra = calc_spectra( chunks, fs, nperseg=nperseg, noverlap=noverlap,
+                            window=window, spectrogram=spectrogram )
+
+    if not silent:
+        print( 'get_spectra: shot={0}, fs={1:.1f} Hz, {2} segments'.format( shot, fs, spectra['n_seg'] ) )
+
+    result  = { 'freq': spectra['freq'], 'fs': fs }
+    for ii, chName in enumerate( chNames ):
+        result[chName]  = spectra['psd'][ii]
+    if spectrogram:
+        result['time']  = t0 + (spectra['id_seg'] + .5*nperseg) * dt
+        for ii, chName in enumerate( chNames ):
+            result[chName + ' spectrogram'] = spectra['sxx'][:,ii,:]
+
+    return result
+    #}}}
+
+
+def get_spectra_shots( shots, chNames=CHANNELS_FLUCTUATION, n_workers=4, **kwargs ):
+    #{{{
+    """
+    Calculates Welch PSD (and optionally spectrograms) for several shots.
+
+    Shots are processed in parallel, keyword arguments are passed to
+    get_spectra.
+
+    Parameters
+    ----------
+    shots : list of int
+        Shot numbers.
+    chNames : list of str, optional
+        Names of the channels as written in the header of the file.
+    n_workers : int, optional
+        Number of shots processed in parallel.
+
+    Returns
+    -------
+    dict
+        Dictionary with shot numbers as keys and the results of get_spectra
+        as values, shots which could not be processed are omitted.
+    """
+
+    with concurrent.futures.ThreadPoolExecutor( max_workers=n_workers ) as executor:
+        results = executor.map( lambda shot: get_spectra( shot, chNames=chNames, **kwargs ), shots )
+        results = dict( zip( shots, results ) )
+
+    return { shot: result for shot, result in results.items() if not isinstance(result, int) }
+    #}}}
+
+
+def plot_spectra( spectra, chNames, fig, title='' ):
+    #{{{
+    """
+    Plots PSD (left column) and spectrogram (right column) for each channel.
+
+    Parameters
+    ----------
+    spectra : dict
+        Result of get_spectra, with spectrogram.
+    chNames : list of str
+        Names of the channels to plot.
+    fig : matplotlib.figure.Figure
+        Figure to plot into, will be cleared.
+    title : str, optional
+        Title on top of the figure.
+    """
+
+    fig.clf()
+
+    n_rows  = len(chNames)
+    freq    = spectra['freq']*1e-3
+    for ii, chName in enumerate( chNames ):
+        ax_psd  = fig.add_subplot( n_rows, 2, 2*ii+1 )
+        ax_psd.semilogy( freq[1:], spectra[chName][1:] )
+        ax_psd.set_ylabel( '{0}\nPSD in V$^2$/Hz'.format( chName ) )
+
+        ax_spec = fig.add_subplot( n_rows, 2, 2*ii+2 )
+        if 'time' in spectra and len(spectra['time']) > 0:
+            sxx     = spectra[chName + ' spectrogram']
+            ax_spec.pcolormesh( spectra['time'], freq[1:],
+                                10.*np.log10( sxx[:,1:].T + np.finfo(float).tiny ),
+                                shading='auto' )
+        ax_spec.set_ylabel( 'f in kHz' )
+
+        if ii == n_rows-1:
+            ax_psd.set_xlabel( 'f in kHz' )
+            ax_spec.set_xlabel( 'time in s' )
+
+    if len(title) > 0:
+        fig.suptitle( title )
+    #}}}
+
+
+def main():
+#{{{
+    import matplotlib.pyplot as plt
+
+    # initialize parser for command line options
+    parser  = argparse.ArgumentParser( description='Welch spectra and spectrograms of tjk-monitor data' )
+    parser.add_argument( "-s", "--shot", type=int, default=13277,
+            help='Shot number' )
+    parser.add_argument( "-c", "--channels", type=str, nargs='+', default=CHANNELS_FLUCTUATION,
+            help='Channel names' )
+    parser.add_argument( "-n", "--nperseg", type=int, default=1024,
+            help='Number of samples per segment' )
+    # read all arguments from command line
+    args    = parser.parse_args()
+
+    spectra = get_spectra( args.shot, chNames=args.channels, nperseg=args.nperseg,
+                           spectrogram=True, silent=False )
+    if isinstance(spectra, int):
+        return
+
+    fig = plt.figure( figsize=(10,8) )
+    plot_spectra( spectra, args.channels, fig, title='#{0}'.format( args.shot ) )
+    plt.show()
+#}}}
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,399 @@
+# coding=utf-8
+
+__author__      = 'Alf Köhn-Seemann'
+__email__       = 'koehn@igvp.uni-stuttgart.de'
+__copyright__   = 'University of Stuttgart'
+__license__     = 'MIT'
+
+"""
+Per-shot summary database for data acquired with tjk-monitor.
+
+For every shot, scalar values (mean/max of B0 and heating powers, neutral
+gas pressure, density plateau, discharge duration, gas) are computed once and
+stored in a single SQLite table. Questions like "which He shots had
+B0 > 70 mT and P_abs > 1 kW" can then be answered without reading any time
+traces, e.g.
+
+    python tjk_summary.py ingest -s 12838 -e 12887
+    python tjk_summary.py query --where "gas='He' AND B0_max>70 AND Pabs2_max>1000"
+"""
+
+
+# import standard modules
+import argparse
+import concurrent.futures
+import numpy as np
+import os
+import os.path
+import sqlite3
+
+# import some TJ-K related function
+import importlib    # required due to the dash in the filename
+tjk = importlib.import_module("TJK-monitor")
+
+
+# default location of the summary database
+FNAME_DB    = os.path.join( tjk.CACHE_DIR, 'summary.sqlite' )
+
+# columns of the summary table, name and SQL type
+# units: B0 in mT, powers in W, pressure in Pa, density in 1e17 m^-3, time in ms
+SUMMARY_COLUMNS = [
+        ( 'shot',           'INTEGER PRIMARY KEY' ),
+        ( 'gas',            'TEXT' ),
+        ( 'fname',          'TEXT' ),
+        ( 'size',           'INTEGER' ),    # size and mtime of the data file
+        ( 'mtime',          'INTEGER' ),    # are used to detect changes
+        ( 'B0_mean',        'REAL' ),
+        ( 'B0_max',         'REAL' ),
+        ( 'Pabs2_mean',     'REAL' ),
+        ( 'Pabs2_max',      'REAL' ),
+        ( 'P8GHz_mean',     'REAL' ),
+        ( 'P8GHz_max',      'REAL' ),
+        ( 'p0',             'REAL' ),
+        ( 'p0_err',         'REAL' ),
+        ( 'ne_plateau',     'REAL' ),
+        ( 'ne_plateau_err', 'REAL' ),
+        ( 't_on',           'REAL' ),
+        ( 't_off',          'REAL' ),
+        ( 'duration',       'REAL' ),
+        ( 'provenance',     'TEXT' ),       # see tjk.get_provenance
+        ]
+
+# version of calc_summary, to be increased whenever its results change
+SUMMARY_VERSION = 1
+
+# calibrations the summary depends on, see tjk.CALIBRATIONS
+SUMMARY_CALIBRATIONS    = [ 'P2GHz', 'P8GHz', 'PKR261', 'interferometer' ]
+
+# columns for which an index is created to speed up queries
+SUMMARY_INDICES = [ 'gas', 'B0_max', 'Pabs2_max', 'P8GHz_max', 'p0', 'ne_plateau', 'duration' ]
+
+
+def open_db( fname_db='' ):
+    #{{{
+    """
+    Opens the summary database, table and indices are created if necessary.
+
+    Columns missing in a database created by an older version are added.
+
+    Parameters
+    ----------
+    fname_db : str, optional
+        Filename of the database, FNAME_DB is used if not set.
+
+    Returns
+    -------
+    sqlite3.Connection
+    """
+
+    if len(fname_db) == 0:
+        fname_db    = FNAME_DB
+    if os.path.dirname( fname_db ):
+        os.makedirs( os.path.dirname( fname_db ), exist_ok=True )
+
+    con = sqlite3.connect( fname_db )
+    con.row_factory = sqlite3.Row
+
+    con.execute( 'CREATE TABLE IF NOT EXISTS summary ({0})'.format(
+        ', '.join( '{0} {1}'.format( name, sqltype ) for name, sqltype in SUMMARY_COLUMNS ) ) )
+    columns = [ row['name'] for row in con.execute( 'PRAGMA table_info(summary)' ) ]
+    for name, sqltype in SUMMARY_COLUMNS:
+        if name not in columns:
+            con.execute( 'ALTER TABLE summary ADD COLUMN {0} {1}'.format( name, sqltype ) )
+    for column in SUMMARY_INDICES:
+        con.execute( 'CREATE INDEX IF NOT EXISTS idx_summary_{0} ON summary ({0})'.format( column ) )
+    con.commit()
+
+    return con
+    #}}}
+
+
+def calc_summary( shot, fname_in='', silent=True ):
+    #{{{
+    """
+    Calculates the scalar summary values of a single shot.
+
+    The file is read only once, channels which were not recorded (and all
+    values of a file without data rows) are set to NaN.
+
+    Parameters
+    ----------
+    shot : int
+        Shot number
+    fname_in : str, optional
+        Allows to optionally specify a filename explicitely (if it would not
+        be located at the default locations, for example).
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    dict
+        Dictionary with the columns of the summary table as keys, returns
+        errValue (-1) if the file could not be read.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    fname_data  = tjk.get_fname_data( shot, fname_in=fname_in )
+    if not os.path.isfile( fname_data ):
+        if not silent:
+            print( '    ERROR: file <{0}> does not exist'.format( fname_data ))
+        return errValue
+
+    chCfg   = tjk.get_channel_config( shot )
+    header  = tjk.get_header( shot, fname_in=fname_data, silent=True )
+    if isinstance(header, int):
+        return errValue
+
+    # only request channels which were actually recorded
+    chNames = [ 'Zeit [ms]' ] + [ chCfg[key][0] for key in
+                                  ['B0', 'P2GHz_in', 'P2GHz_out', 'P8GHz_in', 'p0', 'interf'] ]
+    chNames = [ chName for chName in chNames if chName in header ]
+    traces  = tjk.get_traces( shot, chNames, fname_in=fname_data, silent=True )
+    if isinstance(traces, int) or ('Zeit [ms]' not in traces):
+        return errValue
+
+    fstat   = os.stat( fname_data )
+    summary = dict.fromkeys( [ name for name, sqltype in SUMMARY_COLUMNS ], np.nan )
+    summary.update( { 'shot'    : shot,
+                      'gas'     : tjk.get_gas( shot ),
+                      'fname'   : str( fname_data ),
+                      'size'    : fstat.st_size,
+                      'mtime'   : fstat.st_mtime_ns,
+                      'provenance'  : tjk.get_provenance( shot, 'summary', SUMMARY_VERSION,
+                                                          calibrations=SUMMARY_CALIBRATIONS,
+                                                          fname_in=fname_data ),
+                    } )
+
+    time    = traces['Zeit [ms]']
+    # header only, e.g. file still being written: nothing to calculate
+    if len(time) == 0:
+        return summary
+
+    # note: calc_2GHzPower and calc_8GHzPower modify their input, hence copies
+    if (chCfg['P2GHz_in'][0] in traces) and (chCfg['P2GHz_out'][0] in traces):
+        Pabs2   = ( tjk.calc_2GHzPower( traces[chCfg['P2GHz_in'][0]].copy(),  output='watt', direction='fw', shot=shot )
+                   -tjk.calc_2GHzPower( traces[chCfg['P2GHz_out'][0]].copy(), output='watt', direction='bw', shot=shot ) )
+    else:
+        Pabs2   = np.zeros( len(time) )
+    t_on, t_off = tjk.get_discharge_window( time, Pabs2 )
+    summary.update( { 't_on': t_on, 't_off': t_off, 'duration': t_off - t_on } )
+    in_discharge    = (time >= t_on) & (time <= t_off)
+
+    # mean values are taken during the discharge, maximum values over the whole shot
+    def mean_max( trace ):
+        # file might contain the header only (e.g. still being written)
+        if len(trace) == 0:
+            return [ np.nan, np.nan ]
+        if np.any( in_discharge ):
+            return [ np.mean( trace[in_discharge] ), np.max( trace ) ]
+        else:
+            return [ np.nan, np.max( trace ) ]
+
+    if chCfg['P2GHz_in'][0] in traces:
+        summary['Pabs2_mean'], summary['Pabs2_max'] = mean_max( Pabs2 )
+    if chCfg['B0'][0] in traces:
+        summary['B0_mean'], summary['B0_max'] = mean_max( traces[chCfg['B0'][0]]*chCfg['B0'][1] )
+    if chCfg['P8GHz_in'][0] in traces:
+        P8GHz   = tjk.calc_8GHzPower( traces[chCfg['P8GHz_in'][0]].copy(), direction='fw', shot=shot )
+        summary['P8GHz_mean'], summary['P8GHz_max'] = mean_max( P8GHz )
+    if chCfg['p0'][0] in traces:
+        summary['p0'], summary['p0_err'] = tjk.get_pressure( shot, pressure=traces[chCfg['p0'][0]] )
+    if chCfg['interf'][0] in traces:
+        n_e     = tjk.get_lineAvgDensity( traces[chCfg['interf'][0]], shot )
+        summary['ne_plateau'], summary['ne_plateau_err'] = tjk.get_plateau( time, n_e, t_on, t_off )
+
+    # sqlite3 does not know numpy types
+    for key in summary:
+        if isinstance(summary[key], np.generic):
+            summary[key]    = summary[key].item()
+
+    if not silent:
+        print( '    shot={0:d}: B0_max={1:.1f} mT, Pabs2_max={2:.1f} W, ne_plateau={3:.3f}'.format(
+            shot, summary['B0_max'], summary['Pabs2_max'], summary['ne_plateau'] ) )
+
+    return summary
+    #}}}
+
+
+def ingest_shots( shots, fname_db='', n_workers=4, force=False, silent=True ):
+    #{{{
+    """
+    Calculates the summary of several shots and stores them in the database.
+
+    Shots already in the database are only recalculated if their provenance
+    changed, i.e. the data file (size or modification time), SUMMARY_VERSION
+    or one of the calibrations valid for the shot, or if force is set. The
+    files are read in parallel, the database is only written from the calling
+    thread, every summary is committed as soon as it is calculated. Shots
+    that fail are skipped (and reported), the other shots are not affected.
+
+    Parameters
+    ----------
+    shots : list of int
+        Shot numbers.
+    fname_db : str, optional
+        Filename of the database, FNAME_DB is used if not set.
+    n_workers : int, optional
+        Number of shots processed in parallel.
+    force : bool, optional
+        If True, all shots are recalculated.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    int
+        Number of shots which were (re-)calculated.
+    """
+
+    con = open_db( fname_db )
+
+    # select shots for which the summary is missing or outdated
+    stored      = { row['shot']: row['provenance']
+                    for row in con.execute( 'SELECT shot, provenance FROM summary' ) }
+    shots2do    = []
+    for shot in shots:
+        provenance  = tjk.get_provenance( shot, 'summary', SUMMARY_VERSION,
+                                          calibrations=SUMMARY_CALIBRATIONS )
+        if isinstance(provenance, int):
+            continue
+        if force or (stored.get( shot ) != provenance):
+            shots2do.append( shot )
+
+    if not silent:
+        print( 'ingest_shots: {0} of {1} shots need to be (re-)calculated'.format( len(shots2do), len(shots) ) )
+
+    columns     = [ name for name, sqltype in SUMMARY_COLUMNS ]
+    sql_insert  = 'INSERT OR REPLACE INTO summary ({0}) VALUES ({1})'.format(
+                    ', '.join( columns ), ', '.join( ['?']*len(columns) ) )
+
+    n_done  = 0
+    with concurrent.futures.ThreadPoolExecutor( max_workers=n_workers ) as executor:
+        futures = { executor.submit( calc_summary, shot, silent=silent ): shot for shot in shots2do }
+        for future in concurrent.futures.as_completed( futures ):
+            try:
+                summary = future.result()
+            except Exception as err:
+                print( 'ingest_shots: ERROR, shot {0} skipped ({1}: {2})'.format(
+                        futures[future], type(err).__name__, err ) )
+                continue
+            if isinstance(summary, int):
+                continue
+            con.execute( sql_insert, [ summary[column] for column in columns ] )
+            con.commit()
+            n_done += 1
+    con.close()
+
+    return n_done
+    #}}}
+
+
+def query_summary( where='', params=(), columns='*', order_by='shot', fname_db='' ):
+    #{{{
+    """
+    Queries the summary database.
+
+    Parameters
+    ----------
+    where : str, optional
+        SQL condition, e.g. "gas=? AND B0_max>?", all shots if empty.
+    params : tuple, optional
+        Values for the placeholders in where.
+    columns : str, optional
+        Comma-separated list of columns to return.
+    order_by : str, optional
+        Column used to sort the result.
+    fname_db : str, optional
+        Filename of the database, FNAME_DB is used if not set.
+
+    Returns
+    -------
+    list
+        List of dictionaries, one per shot.
+    """
+
+    sql = 'SELECT {0} FROM summary'.format( columns )
+    if len(where) > 0:
+        sql += ' WHERE {0}'.format( where )
+    sql += ' ORDER BY {0}'.format( order_by )
+
+    con     = open_db( fname_db )
+    rows    = [ dict(row) for row in con.execute( sql, params ) ]
+    con.close()
+
+    return rows
+    #}}}
+
+
+def get_shots( where='', params=(), fname_db='' ):
+    #{{{
+    """
+    Returns the shot numbers matching a condition on the summary database.
+
+    Parameters
+    ----------
+    where : str, optional
+        SQL condition, e.g. "gas=? AND B0_max>?", all shots if empty.
+    params : tuple, optional
+        Values for the placeholders in where.
+    fname_db : str, optional
+        Filename of the database, FNAME_DB is used if not set.
+
+    Returns
+    -------
+    list
+        List of shot numbers.
+    """
+
+    return [ row['shot'] for row in query_summary( where=where, params=params,
+                                                   columns='shot', fname_db=fname_db ) ]
+    #}}}
+
+
+def main():
+#{{{
+    # initialize parser for command line options
+    parser      = argparse.ArgumentParser( description='per-shot summary database of tjk-monitor data' )
+    parser.add_argument( "--db", type=str, default='',
+            help='Filename of summary database (default: {0})'.format( FNAME_DB ) )
+    subparsers  = parser.add_subparsers( dest='command', required=True )
+
+    parser_ingest   = subparsers.add_parser( 'ingest', help='calculate summaries of a range of shots' )
+    parser_ingest.add_argument( "-s", "--shot_start", type=int, required=True,
+            help='First shot number' )
+    parser_ingest.add_argument( "-e", "--shot_end", type=int, default=None,
+            help='Last shot number (default: first shot number)' )
+    parser_ingest.add_argument( "-j", "--n_workers", type=int, default=4,
+            help='Number of shots processed in parallel' )
+    parser_ingest.add_argument( "--force", action='store_true',
+            help='Recalculate shots already stored in the database' )
+
+    parser_query    = subparsers.add_parser( 'query', help='query the summary database' )
+    parser_query.add_argument( "-w", "--where", type=str, default='',
+            help='SQL condition, e.g. "gas=\'He\' AND B0_max>70"' )
+    parser_query.add_argument( "-c", "--columns", type=str, default='*',
+            help='Comma-separated list of columns to print' )
+
+    # read all arguments from command line
+    args    = parser.parse_args()
+
+    if args.command == 'ingest':
+        shot_end    = args.shot_end if args.shot_end is not None else args.shot_start
+        n_done      = ingest_shots( range( args.shot_start, shot_end+1 ), fname_db=args.db,
+                                    n_workers=args.n_workers, force=args.force, silent=False )
+        print( '{0} shots ingested'.format( n_done ) )
+    elif args.command == 'query':
+        rows    = query_summary( where=args.where, columns=args.columns, fname_db=args.db )
+        if len(rows) > 0:
+            print( '\t'.join( rows[0].keys() ) )
+        for row in rows:
+            print( '\t'.join( str(value) for value in row.values() ) )
+        print( '{0} shots found'.format( len(rows) ) )
+#}}}
+
+
+if __name__ == '__main__':
+    main()
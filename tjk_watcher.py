@@ -0,0 +1,495 @@
+# coding=utf-8
+
+__author__      = 'Alf Köhn-Seemann'
+__email__       = 'koehn@igvp.uni-stuttgart.de'
+__copyright__   = 'University of Stuttgart'
+__license__     = 'MIT'
+
+"""
+Watches the data folders and pre-processes new shots as soon as they are
+written.
+
+Once a new file shotNNNNN/interferometer/shotNNNNN.dat stopped growing, the
+binary cache and the row index are built, the summary (including the
+discharge window) is written into the summary database and the quicklook
+for the gallery of tjk_shotview.py is generated. Opening the shot
+afterwards (shotview, get_traces, ...) does not require any parsing, e.g.
+
+    python tjk_watcher.py &
+
+On Linux, inotify is used (via ctypes), otherwise (or with --poll) the data
+folders are polled.
+"""
+
+
+# import standard modules
+import argparse
+import ctypes
+import ctypes.util
+import os
+import re
+import select
+import struct
+import time
+
+# import some TJ-K related function
+import importlib    # required due to the dash in the filename
+tjk = importlib.import_module("TJK-monitor")
+import tjk_quicklook
+import tjk_summary
+
+
+# a file is considered complete if its size did not change for this time in s
+SETTLE_TIME     = 5.
+
+# time between two scans of the data folders in s (polling mode)
+POLL_INTERVAL   = 2.
+
+# inotify event masks, see /usr/include/linux/inotify.h
+IN_MODIFY       = 0x00000002
+IN_CLOSE_WRITE  = 0x00000008
+IN_MOVED_TO     = 0x00000080
+IN_CREATE       = 0x00000100
+IN_ISDIR        = 0x40000000
+IN_NONBLOCK     = 0x00000800
+
+# pattern of the shot folders
+SHOT_FOLDER_PATTERN = re.compile( r'^shot(\d+)$' )
+
+
+def get_shot_folders( root ):
+    #{{{
+    """
+    Returns the shot folders in a data folder.
+
+    Parameters
+    ----------
+    root : str
+        Data folder, see DATA_ROOTS in TJK-monitor.py.
+
+    Returns
+    -------
+    dict
+        Dictionary with shot numbers as keys and folders as values.
+    """
+
+    folders = {}
+    try:
+        with os.scandir( root ) as entries:
+            for entry in entries:
+                match   = SHOT_FOLDER_PATTERN.match( entry.name )
+                if match and entry.is_dir():
+                    folders[int( match.group(1) )]  = entry.path
+    except OSError:
+        pass
+
+    return folders
+    #}}}
+
+
+def get_data_fname( folder, shot ):
+    #{{{
+    """
+    Returns the filename of the tjk-monitor file within a shot folder.
+
+    Parameters
+    ----------
+    folder : str
+        Shot folder.
+    shot : int
+        Shot number.
+
+    Returns
+    -------
+    str
+    """
+
+    return os.path.join( folder, 'interferometer', 'shot{0}.dat'.format( shot ) )
+    #}}}
+
+
+def scan_roots( roots, shot_min=0 ):
+    #{{{
+    """
+    Returns size and modification time of the tjk-monitor files of all shots
+    with a shot number of at least shot_min.
+
+    Only the (few) newest shot folders are accessed, i.e. scanning is cheap
+    even on network mounts.
+
+    Parameters
+    ----------
+    roots : list of str
+        Data folders.
+    shot_min : int, optional
+        Smallest shot number to consider.
+
+    Returns
+    -------
+    dict
+        Dictionary with filenames as keys and lists [shot, size, mtime] as
+        values.
+    """
+
+    files   = {}
+    for root in roots:
+        for shot, folder in get_shot_folders( root ).items():
+            if shot < shot_min:
+                continue
+            fname_data  = get_data_fname( folder, shot )
+            try:
+                fstat   = os.stat( fname_data )
+            except OSError:
+                continue
+            files[fname_data]   = [ shot, fstat.st_size, fstat.st_mtime_ns ]
+
+    return files
+    #}}}
+
+
+def init_inotify():
+    #{{{
+    """
+    Returns an inotify instance, accessed via ctypes.
+
+    Returns
+    -------
+    list
+        List containing the libc handle and the inotify file descriptor,
+        returns errValue (-1) if inotify is not available.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    fname_libc  = ctypes.util.find_library( 'c' )
+    if fname_libc is None:
+        return errValue
+    try:
+        libc    = ctypes.CDLL( fname_libc, use_errno=True )
+        libc.inotify_init1
+    except (OSError, AttributeError):
+        return errValue
+
+    fd  = libc.inotify_init1( IN_NONBLOCK )
+    if fd < 0:
+        return errValue
+
+    return [ libc, fd ]
+    #}}}
+
+
+def add_watch( inotify, path, watches ):
+    #{{{
+    """
+    Adds an inotify watch on a folder.
+
+    Parameters
+    ----------
+    inotify : list
+        As returned by init_inotify.
+    path : str
+        Folder to watch.
+    watches : dict
+        Dictionary with watch descriptors as keys and folders as values,
+        the new watch is added.
+
+    Returns
+    -------
+    int
+        Watch descriptor, returns errValue (-1) on error.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    libc, fd    = inotify
+    wd  = libc.inotify_add_watch( fd, os.fsencode( path ),
+                                  IN_CREATE | IN_MOVED_TO | IN_MODIFY | IN_CLOSE_WRITE )
+    if wd < 0:
+        return errValue
+    watches[wd] = path
+
+    return wd
+    #}}}
+
+
+def read_inotify( inotify, watches ):
+    #{{{
+    """
+    Returns the paths changed since the last call.
+
+    New shot folders and their interferometer folders are watched as well.
+
+    Parameters
+    ----------
+    inotify : list
+        As returned by init_inotify.
+    watches : dict
+        Dictionary with watch descriptors as keys and folders as values.
+
+    Returns
+    -------
+    list
+        Changed (or created) paths.
+    """
+
+    libc, fd    = inotify
+    header_size = struct.calcsize( 'iIII' )
+
+    paths   = []
+    while True:
+        try:
+            buf = os.read( fd, 64*1024 )
+        except BlockingIOError:
+            break
+        pos = 0
+        while pos < len(buf):
+            wd, mask, cookie, name_len  = struct.unpack_from( 'iIII', buf, pos )
+            name    = buf[ pos+header_size:pos+header_size+name_len ].rstrip( b'\0' )
+            pos    += header_size + name_len
+            if wd not in watches:
+                continue
+            path    = os.path.join( watches[wd], os.fsdecode( name ) )
+            if mask & IN_ISDIR:
+                # new shot folder or its interferometer folder
+                if SHOT_FOLDER_PATTERN.match( os.path.basename( path ) ) \
+                   or (os.path.basename( path ) == 'interferometer'):
+                    add_watch( inotify, path, watches )
+                    # files created before the watch was added
+                    for dirpath, dirnames, fnames in os.walk( path ):
+                        paths  += [ os.path.join( dirpath, fname ) for fname in fnames ]
+                        for dirname in dirnames:
+                            add_watch( inotify, os.path.join( dirpath, dirname ), watches )
+            else:
+                paths.append( path )
+
+    return paths
+    #}}}
+
+
+def ingest_new_shot( shot, fname_data, fname_db='', silent=True ):
+    #{{{
+    """
+    Pre-processes a new shot: binary cache, row index, summary and quicklook.
+
+    Parameters
+    ----------
+    shot : int
+        Shot number.
+    fname_data : str
+        Filename of the tjk-monitor file.
+    fname_db : str, optional
+        Filename of the summary database, tjk_summary.FNAME_DB if not set.
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+
+    Returns
+    -------
+    int
+        1 if the shot was processed, errValue (-1) on error.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    t_start = time.time()
+
+    if isinstance( tjk.build_npy_cache( fname_data, n_workers=os.cpu_count(), silent=silent ), int ):
+        return errValue
+    if isinstance( tjk.get_row_index( fname_data, silent=silent ), int ):
+        return errValue
+    # summary includes the discharge window (segmentation)
+    tjk_summary.ingest_shots( [shot], fname_db=fname_db, n_workers=1, silent=silent )
+    tjk_quicklook.make_quicklook( shot, fname_in=fname_data, silent=silent )
+
+    if not silent:
+        print( 'tjk_watcher: shot {0} ingested in {1:.1f} s'.format( shot, time.time()-t_start ) )
+
+    return 1
+    #}}}
+
+
+def ingest_new_shot_safe( shot, fname_data, fname_db='', silent=True ):
+    #{{{
+    """
+    Same as ingest_new_shot, but a failing shot is reported instead of
+    raising, i.e. a single bad shot does not stop the watcher.
+
+    Returns
+    -------
+    int
+        1 if the shot was processed, errValue (-1) on error.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    try:
+        return ingest_new_shot( shot, fname_data, fname_db=fname_db, silent=silent )
+    except Exception as err:
+        print( 'tjk_watcher: ERROR, shot {0} could not be ingested ({1}: {2})'.format(
+                shot, type(err).__name__, err ) )
+        return errValue
+    #}}}
+
+
+def watch_roots( roots=None, settle_time=SETTLE_TIME, poll_interval=POLL_INTERVAL,
+                 use_inotify=True, fname_db='', backfill=0, max_iter=None, silent=True ):
+    #{{{
+    """
+    Watches the data folders and ingests new shots once they are complete.
+
+    Parameters
+    ----------
+    roots : list of str, optional
+        Data folders, existing folders of DATA_ROOTS if not set.
+    settle_time : float, optional
+        A file is considered complete if its size did not change for this
+        time in s.
+    poll_interval : float, optional
+        Time between two checks in s.
+    use_inotify : bool, optional
+        If False, the folders are polled even if inotify is available.
+    fname_db : str, optional
+        Filename of the summary database, tjk_summary.FNAME_DB if not set.
+    backfill : int, optional
+        Number of most recent existing shots ingested at start (if not yet
+        in the summary database).
+    max_iter : int, optional
+        Stop after this number of checks (runs forever if not set).
+    silent : bool, optional
+        If True some useful (?) output will be printed to console.
+    """
+
+    if roots is None:
+        roots   = [ root for root in tjk.DATA_ROOTS if os.path.isdir( root ) ]
+
+    inotify = init_inotify() if use_inotify else -1
+    watches = {}
+    if not isinstance(inotify, int):
+        for root in roots:
+            add_watch( inotify, root, watches )
+        # newest shot folders might still be written to
+        for root in roots:
+            folders = get_shot_folders( root )
+            for shot in sorted( folders )[-2:]:
+                add_watch( inotify, folders[shot], watches )
+                add_watch( inotify, os.path.join( folders[shot], 'interferometer' ), watches )
+
+    # newest existing shots, only shots from here on are considered
+    shots_existing  = sorted( shot for root in roots for shot in get_shot_folders( root ) )
+    shot_min    = shots_existing[-1] if len(shots_existing) > 0 else 0
+    known       = scan_roots( roots, shot_min=shot_min )
+    if backfill > 0:
+        shots_done  = set( tjk_summary.get_shots( fname_db=fname_db ) )
+        for shot in shots_existing[-backfill:]:
+            if shot not in shots_done:
+                ingest_new_shot_safe( shot, str( tjk.get_fname_data( shot ) ), fname_db=fname_db,
+                                      silent=silent )
+
+    if not silent:
+        print( 'tjk_watcher: watching {0} ({1}), latest shot {2}'.format(
+               ', '.join( roots ), 'polling' if isinstance(inotify, int) else 'inotify',
+               shot_min ) )
+
+    # files which changed, with time of last change
+    pending = {}
+    scanned = dict( known )
+    n_iter  = 0
+    while (max_iter is None) or (n_iter < max_iter):
+        n_iter += 1
+        if isinstance(inotify, int):
+            time.sleep( poll_interval )
+            current = scan_roots( roots, shot_min=shot_min )
+            changed = [ fname for fname in current if current[fname] != scanned.get( fname ) ]
+            scanned = current
+        else:
+            select.select( [inotify[1]], [], [], poll_interval )
+            changed = []
+            for path in read_inotify( inotify, watches ):
+                match   = re.search( r'shot(\d+)[/\\]interferometer[/\\]shot(\d+)\.dat$', path )
+                if match and (match.group(1) == match.group(2)):
+                    changed.append( path )
+
+        now = time.time()
+        for fname_data in changed:
+            pending[fname_data] = now
+
+        # files which did not change for settle_time are complete
+        for fname_data, t_change in list( pending.items() ):
+            if now - t_change < settle_time:
+                continue
+            del pending[fname_data]
+            try:
+                fstat   = os.stat( fname_data )
+            except OSError:
+                continue
+            shot    = int( re.search( r'shot(\d+)\.dat$', fname_data ).group(1) )
+            state   = [ shot, fstat.st_size, fstat.st_mtime_ns ]
+            if state == known.get( fname_data ):
+                continue
+            known[fname_data]   = state
+            shot_min    = max( shot_min, shot )
+            ingest_new_shot_safe( shot, fname_data, fname_db=fname_db, silent=silent )
+
+    if not isinstance(inotify, int):
+        os.close( inotify[1] )
+    #}}}
+
+
+def get_latest_shot( fname_db='' ):
+    #{{{
+    """
+    Returns the most recent shot in the summary database.
+
+    Parameters
+    ----------
+    fname_db : str, optional
+        Filename of the summary database, tjk_summary.FNAME_DB if not set.
+
+    Returns
+    -------
+    int
+        Shot number, returns errValue (-1) if the database is empty.
+    """
+
+    # value to return in case of error
+    errValue    = -1
+
+    rows    = tjk_summary.query_summary( columns='MAX(shot) AS shot', order_by='1',
+                                         fname_db=fname_db )
+    if (len(rows) == 0) or (rows[0]['shot'] is None):
+        return errValue
+
+    return rows[0]['shot']
+    #}}}
+
+
+def main():
+#{{{
+    # initialize parser for command line options
+    parser  = argparse.ArgumentParser( description='pre-process new shots as soon as they are written' )
+    parser.add_argument( "-r", "--roots", type=str, nargs='+', default=None,
+            help='Data folders to watch, must be part of DATA_ROOTS or TJKPY_DATA (default: existing folders of DATA_ROOTS)' )
+    parser.add_argument( "--db", type=str, default='',
+            help='Filename of summary database (default: {0})'.format( tjk_summary.FNAME_DB ) )
+    parser.add_argument( "--settle", type=float, default=SETTLE_TIME,
+            help='Time in s without change after which a file is complete' )
+    parser.add_argument( "--poll", action='store_true',
+            help='Poll the data folders instead of using inotify' )
+    parser.add_argument( "--backfill", type=int, default=0,
+            help='Number of most recent existing shots to ingest at start' )
+    # read all arguments from command line
+    args    = parser.parse_args()
+
+    try:
+        watch_roots( roots=args.roots, settle_time=args.settle, use_inotify=not args.poll,
+                     fname_db=args.db, backfill=args.backfill, silent=False )
+    except KeyboardInterrupt:
+        pass
+#}}}
+
+
+if __name__ == '__main__':
+    main()